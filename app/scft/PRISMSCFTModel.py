@@ -3,7 +3,6 @@ import matplotlib.pyplot as plt
 from fealpy.functionspace import PrismFiniteElementSpace
 
 from fealpy.timeintegratoralg.timeline_new import ChebyshevTimeLine, UniformTimeLine
-from fealpy.solver import MatlabSolver
 from scipy.sparse.linalg import spsolve
 
 def pscftmodel_options(
@@ -42,64 +41,66 @@ def pscftmodel_options(
     return options
 
 class PDEModel():
+    """
+    The Crank-Nicolson scheme of the propagator equation `q_t = -(A + F)q`,
+    where `F` is the mass matrix weighted by the current field, it is set
+    by `PRISMSCFTFEMModel.compute_propagator` before every integration.
+    """
     def __init__(self, A, M):
         self.A = A
         self.M = M
+        self.F = 0*M
 
     def init_solution(self, timeline):
         NL = timeline.number_of_time_levels()
-        gdof = self.space.number_of_global_dofs()
-        uh = np.zeros((gdof, NL), dtype=self.mesh.ftype)
+        gdof = self.M.shape[0]
+        uh = np.zeros((gdof, NL), dtype=self.M.dtype)
         uh[:, 0] = 1
         return uh
 
     def init_delta(self, timeline):
         NL = timeline.number_of_time_levels()
-        gdof = self.space.number_of_global_dofs()
-        delta = np.zeros((gdof, NL), dtype=self.mesh.ftype)
+        gdof = self.M.shape[0]
+        delta = np.zeros((gdof, NL), dtype=self.M.dtype)
         return delta
 
-    def get_current_left_matrix(self, dt, F):
+    def get_current_left_matrix(self, timeline):
         ##　F的加入
         dt = timeline.current_time_step_length()
-        return self.M + 0.5*dt*(self.A + F)
+        return self.M + 0.5*dt*(self.A + self.F)
 
-    def get_current_right_vector(self, uh, F, timeline):
+    def get_current_right_vector(self, uh, timeline):
         dt = timeline.current_time_step_length()
         i = timeline.current
-        return self.M@uh[:, i] - 0.5*dt*(self.A@uh[:, i] + F@uh[:,i])
+        return self.M@uh[:, i] - 0.5*dt*(self.A@uh[:, i] + self.F@uh[:,i])
 
 
     def solve(self, uh, A, b, solver, timeline):
         i = timeline.current
         uh[:,i+1] = solver(A,b)
 
-    def apply_boundary_condition(self, A, b):
+    def apply_boundary_condition(self, A, b, timeline, sdc=False):
         ##TODO
         return A, b
 
-    def residual_integration(self, uh, F,timeline):
+    def residual_integration(self, uh, timeline):
         ##残差的积分项
-        A = self.space.stiff_matrix()
-        q = -A@uh - F@uh
+        q = -self.A@uh - self.F@uh
         return timeline.dct_time_integral(q, return_all=True)
 
     def error_integration(self, data, timeline):
         ##残差的导数
         uh = data[0]
         intq = data[1]
-        M = self.space.mass_matrix()
-        r = uh[:, [0]] + spsolve(M, intq) - uh
+        r = uh[:, [0]] + spsolve(self.M, intq) - uh
         return timeline.diff(r)
 
     def get_error_right_vector(self, data, timeline):
-        uh = data[0]
         d = data[2]
         delta = data[-1]
-        M = self.space.mass_matrix()
         i = timeline.current
         dt = timeline.current_time_step_length()
-        return self.get_current_right_vector(delta, timeline, sdc=True) + dt*M@d[:, i+1]
+        return self.get_current_right_vector(delta, timeline) + dt*self.M@d[:, i+1]
 
 
 class PRISMSCFTFEMModel():
@@ -136,8 +137,6 @@ class PRISMSCFTFEMModel():
         self.M = self.space.mass_matrix()
         self.dmodel = PDEModel(self.A, self.M)
 
-        self.solver = MatlabSolver()
-
     def reinit(self, mesh):
         options = self.options
         self.space = PrismFiniteElementSpace(mesh, p=options['order'])
@@ -168,9 +167,7 @@ class PRISMSCFTFEMModel():
         self.M = self.space.mass_matrix()
         self.dmodel = PDEModel(self.A, self.M)
 
-        self.solver = MatlabSolver()
-
-   def init_value(self, fieldstype = 1):
+    def init_value(self, fieldstype = 1):
         gdof = self.space.number_of_global_dofs()
         mesh = self.space.mesh
         node = mesh.node
@@ -230,25 +227,32 @@ class PRISMSCFTFEMModel():
 
     def compute_propagator(self):
         ###TODO
-        n0 = self.timeline0.NT
-        n1 = self.timeline1.NT
-
-#        w = self.space.function(array = self.w[:, 0]).value
-#        F0 = self.space.mass_matrix(cfun=w)
-#
-#        w = self.space.function(array = self.w[:, 1]).value
-#        F1 = self.space.mass_matrix(cfun=w)
+        n0 = self.timeline0.number_of_time_levels()
+        n1 = self.timeline1.number_of_time_levels()
+
+        w = self.space.function(array = self.w[:, 0]).value
+        F0 = self.space.mass_matrix(cfun=w)
+
+        w = self.space.function(array = self.w[:, 1]).value
+        F1 = self.space.mass_matrix(cfun=w)
+
+        # every timeline factorizes the left matrix of each of its time levels
+        # only once, see `SolverCache`, the correction sweeps and the second
+        # integration on the same block only do the triangular solves
         self.q0[:,0:n0] = self.dmodel.init_solution(self.timeline0)
-        self.timeline0.time_integration(self.q0[:,0:n0], self.dmodel, self.solver.divide,
-                self.options['nupdate'])
-        self.t imeline1.time_integration(self.q0[:,n0-1:], self.dmodel, self.solver.divide,
-                self.options['nupdate'])
+        self.dmodel.F = F0
+        self.timeline0.time_integration(self.q0[:,0:n0], self.dmodel,
+                nupdate=self.options['nupdate'])
+        self.dmodel.F = F1
+        self.timeline1.time_integration(self.q0[:,n0-1:], self.dmodel,
+                nupdate=self.options['nupdate'])
 
         self.q1[:,0:n1] = self.dmodel.init_solution(self.timeline1)
-        self.t imeline1.time_integration(self.q1[:,0:n1], self.dmodel, self.solver.divide,
-                self.options['nupdate'])
-        self.timeline0.time_integration(self.q1[:,n1-1:], self.dmodel, self.solver.divide,
-                self.options['nupdate'])
+        self.timeline1.time_integration(self.q1[:,0:n1], self.dmodel,
+                nupdate=self.options['nupdate'])
+        self.dmodel.F = F0
+        self.timeline0.time_integration(self.q1[:,n1-1:], self.dmodel,
+                nupdate=self.options['nupdate'])
 
     def compute_singleQ(self):
         q = self.q0*self.q1[:, -1::-1]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# The speedup of the parallel assembly of the Lagrange finite element and
+# the conforming virtual element matrices with the number of the worker
+# processes.
+#
+# python3 ParallelAssemblyBenchmark.py [n] [p] [maxworkers]
+
+import sys
+import os
+from timeit import default_timer as timer
+
+import numpy as np
+
+from fealpy.mesh import TriangleMesh, Quadtree
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.functionspace import ConformingVirtualElementSpace2d
+
+
+def diffusion(p):
+    x = p[..., 0]
+    y = p[..., 1]
+    return 1 + x**2 + y**2
+
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+p = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+maxworkers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+node = np.array([
+    (0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)], dtype=np.float)
+cell = np.array([(1, 2, 0), (3, 0, 2)], dtype=np.int)
+mesh = TriangleMesh(node, cell)
+mesh.uniform_refine(n)
+
+space = LagrangeFiniteElementSpace(mesh, p=p)
+print("NC:", mesh.number_of_cells(), "gdof:", space.number_of_global_dofs())
+
+# the assembler with the sparsity pattern is built once
+space.global_assembler()
+
+workers = [1]
+while workers[-1]*2 <= maxworkers:
+    workers.append(workers[-1]*2)
+if workers[-1] != maxworkers:
+    workers.append(maxworkers)
+
+A0 = None
+T0 = None
+for w in workers:
+    start = timer()
+    A = space.stiff_matrix(cfun=diffusion, workers=w)
+    M = space.mass_matrix(workers=w)
+    end = timer()
+    if A0 is None:
+        A0 = A
+        T0 = end - start
+    print("workers: %3d, time: %8.3f s, speedup: %5.2f, error: %.2e" %
+            (w, end - start, T0/(end - start), abs(A - A0).max()))
+
+# the virtual element space on a polygon mesh with the hanging nodes, the
+# projection matrices are computed by the workers as well
+qtree = Quadtree(node, np.array([(0, 1, 2, 3)], dtype=np.int))
+qtree.uniform_refine(n-1)
+c = qtree.entity_barycenter('cell')
+isMarkedCell = qtree.is_leaf_cell() & (np.sum(c**2, axis=1) < 0.3)
+qtree.refine_1(isMarkedCell, options={'disp': False})
+mesh = qtree.to_pmesh()
+print("NC:", mesh.number_of_cells())
+
+A0 = None
+T0 = None
+for w in workers:
+    start = timer()
+    space = ConformingVirtualElementSpace2d(mesh, p=p)
+    A = space.stiff_matrix(cfun=diffusion, workers=w)
+    M = space.mass_matrix(workers=w)
+    end = timer()
+    if A0 is None:
+        A0 = A
+        T0 = end - start
+    print("workers: %3d, time: %8.3f s, speedup: %5.2f, error: %.2e" %
+            (w, end - start, T0/(end - start), abs(A - A0).max()))
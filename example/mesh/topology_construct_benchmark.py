@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+#
+# Compare the two methods of `unique_entity` used to construct the topology
+# of the mesh data structures:
+#   'row' : np.unique on the rows of the sorted vertex array (the old path)
+#   'key' : np.unique on the int64 keys of the sorted vertex tuples
+#
+# python3 topology_construct_benchmark.py [n]
+
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.mesh.simple_mesh_generator import rectangledomainmesh
+from fealpy.mesh.mesh_tools import unique_entity
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+meshes = [
+    ('tri', CosCosData().init_mesh(n+4)),
+    ('quad', rectangledomainmesh([0, 1, 0, 1], nx=2**(n+4), ny=2**(n+4),
+        meshtype='quad')),
+    ('tet', CosCosCosData().init_mesh(n))]
+
+for name, mesh in meshes:
+    NN = mesh.number_of_nodes()
+    NC = mesh.number_of_cells()
+    entities = [('edge', mesh.ds.total_edge())]
+    if hasattr(mesh.ds, 'total_face'):
+        entities.append(('face', mesh.ds.total_face()))
+
+    for ename, totalEntity in entities:
+        t0 = timer()
+        i0, j0 = unique_entity(totalEntity, NN, method='row')
+        t1 = timer()
+        i1, j1 = unique_entity(totalEntity, NN, method='key')
+        t2 = timer()
+        isSame = np.all(i0 == i1) & np.all(j0 == j1)
+        print('{:>4} NC={:>9} {:>4}: row {:8.4f}s, key {:8.4f}s, '
+                'speedup {:6.2f}, same {}'.format(
+                    name, NC, ename, t1 - t0, t2 - t1, (t1 - t0)/(t2 - t1),
+                    isSame))
+
+    t0 = timer()
+    mesh.ds.reinit(NN, mesh.entity('cell'))
+    t1 = timer()
+    print('{:>4} NC={:>9} reinit: {:8.4f}s'.format(name, NC, t1 - t0))
@@ -7,6 +7,7 @@ class BoundaryCondition():
         self.dirichlet = dirichlet
         self.neuman = neuman
         self.robin = robin
+        self.handler = None
 
     def apply_neuman_bc(self, b, is_neuman_boundary=None):
         """
@@ -85,16 +86,217 @@ class BoundaryCondition():
             if dim > 1:
                 isDDof = np.tile(isDDof, dim)
                 b = b.T.flat
-            gdof = self.space.number_of_global_dofs()
             x = uh.T.flat # 把 uh 按列展平
-            b -= A@x
-            bdIdx = np.zeros(dim*gdof, dtype=np.int)
-            bdIdx[isDDof] = 1
-            Tbd = spdiags(bdIdx, 0, dim*gdof, dim*gdof)
-            T = spdiags(1-bdIdx, 0, dim*gdof, dim*gdof)
-            A = T@A@T + Tbd
-            b[isDDof] = x[isDDof]
-            return A, b
+            A = A.tocsr()
+            self.handler = dirichlet_handler(self.handler, A, isDDof)
+            return self.handler.apply(self.handler.copy(A), b, x[:])
+
+
+
+class DirichletHandler():
+    """
+    Apply the Dirichlet boundary condition on the CSR matrices with the same
+    sparsity pattern.
+
+    The positions of the boundary rows and columns in `A.data` are computed
+    once, then the boundary rows and columns are set to the identity in
+    place, and the right hand side is lifted by the entries of the boundary
+    columns, so there are no sparse matrix products.
+
+    Parameters
+    ----------
+    A : scipy.sparse.csr_matrix
+        the matrix with the sparsity pattern
+    isDDof : numpy.ndarray
+        the flags of the Dirichlet dofs with shape `(N, )`
+
+    Notes
+    -----
+    The diagonal entries of the Dirichlet dofs which are not in the sparsity
+    pattern of `A` are inserted, the handler then works on its own pattern
+    `(self.indptr, self.indices)`, and `copy` (or `apply_on_matrix`) puts a
+    matrix with the pattern of `A` on it.
+
+    The entries set to zero in the boundary rows and columns are kept in the
+    pattern on purpose: the positions computed here stay valid for the
+    result, so it can be modified again, and the AMG hierarchy and the
+    factorization caches (see `amg_solver` and `SolverCache`), which are
+    keyed by the pattern, are reused in the following steps. The solvers
+    treat the stored zeros as zeros, call `A.eliminate_zeros()` on the
+    result when a pattern without them is needed.
+
+    The entries of the boundary columns of the last `apply_on_matrix` are
+    kept in `self.lift`, so `apply_on_vector` can be called many times with
+    different boundary values after the matrix is modified, e.g. in the time
+    dependent problems.
+    """
+    def __init__(self, A, isDDof):
+        A = A.tocsr()
+        N = A.shape[0]
+        self.shape = A.shape
+        # the pattern of the input matrices
+        self.inindptr = A.indptr
+        self.inindices = A.indices
+        self.isDDof = isDDof = np.array(isDDof, dtype=np.bool_)
+
+        row = np.repeat(np.arange(N), np.diff(A.indptr))
+        col = A.indices
+        isMissing = isDDof.copy()
+        isMissing[row[(row == col) & isDDof[row]]] = False
+        if np.any(isMissing):
+            # insert the missing diagonal entries of the Dirichlet dofs
+            idx, = np.nonzero(isMissing)
+            row = np.r_[row, idx]
+            col = np.r_[col, idx.astype(col.dtype)]
+            order = np.lexsort((col, row))
+            row = row[order]
+            col = col[order]
+            # the positions of the entries of `A.data` in the new data
+            self.datapos = np.argsort(order)[:A.nnz]
+            self.indptr = np.zeros(N+1, dtype=A.indptr.dtype)
+            np.cumsum(np.bincount(row, minlength=N), out=self.indptr[1:])
+            self.indices = col
+        else:
+            self.datapos = None
+            self.indptr = A.indptr
+            self.indices = A.indices
+
+        isDRow = isDDof[row]
+        isDCol = isDDof[col]
+        isDiag = isDRow & (row == col)
+
+        self.zeropos, = np.nonzero((isDRow | isDCol) & ~isDiag)
+        self.diagpos, = np.nonzero(isDiag)
+        # the entries in the free rows and the boundary columns
+        self.liftpos, = np.nonzero(~isDRow & isDCol)
+        self.liftrow = row[self.liftpos]
+        self.liftcol = col[self.liftpos]
+        self.lift = None
+
+        # the index maps of the condensed matrix of the free dofs
+        self.freedof, = np.nonzero(~isDDof)
+        self.freepos, = np.nonzero(~(isDRow | isDCol))
+        old2new = np.full(N, -1, dtype=self.indices.dtype)
+        old2new[self.freedof] = np.arange(len(self.freedof))
+        self.freeindices = old2new[col[self.freepos]]
+        self.freeindptr = np.zeros(len(self.freedof)+1, dtype=self.indptr.dtype)
+        np.cumsum(np.bincount(row[self.freepos], minlength=N)[self.freedof],
+                out=self.freeindptr[1:])
+
+    def is_compatible(self, A, isDDof=None):
+        """
+        Check if the handler works on the matrix `A` and the Dirichlet dofs,
+        that is `A` has the pattern of the input matrix or of the handler.
+
+        The pattern arrays are compared by identity first, which holds when
+        the same matrix (e.g. the `out` matrix of `CSRAssembler.tocsr`) is
+        given again, so only the other matrices pay for the comparison of
+        the arrays. The callers check `A` before they copy it.
+        """
+        if (not isinstance(A, csr_matrix)) or (A.shape != self.shape):
+            return False
+        if (isDDof is not None) and (not np.array_equal(isDDof, self.isDDof)):
+            return False
+        for indptr, indices in [(self.inindptr, self.inindices),
+                (self.indptr, self.indices)]:
+            if (A.indptr is indptr) and (A.indices is indices):
+                return True
+        for indptr, indices in [(self.inindptr, self.inindices),
+                (self.indptr, self.indices)]:
+            if np.array_equal(A.indptr, indptr) and \
+                    np.array_equal(A.indices, indices):
+                return True
+        return False
+
+    def copy(self, A):
+        """
+        A copy of `A` on the pattern of the handler, the missing diagonal
+        entries of the Dirichlet dofs are zeros.
+        """
+        if len(A.data) == len(self.indices):
+            return A.copy()
+        data = np.zeros(len(self.indices), dtype=A.dtype)
+        data[self.datapos] = A.data
+        return csr_matrix((data, self.indices.copy(), self.indptr.copy()),
+                shape=self.shape)
+
+    def apply_on_matrix(self, A):
+        """
+        Set the boundary rows and columns of the CSR matrix `A` to the
+        identity in place, or on a `copy` of `A` when the diagonal entries of
+        some Dirichlet dofs are not in its pattern.
+        """
+        if len(A.data) != len(self.indices):
+            A = self.copy(A)
+        self.lift = A.data[self.liftpos]
+        A.data[self.zeropos] = 0
+        A.data[self.diagpos] = 1
+        return A
+
+    def apply_on_vector(self, b, x):
+        """
+        Lift the right hand side `b` in place by the boundary values in `x`
+        with the boundary entries of the last `apply_on_matrix`.
+        """
+        N = self.shape[0]
+        b -= np.bincount(self.liftrow, weights=self.lift*x[self.liftcol],
+                minlength=N)
+        b[self.isDDof] = x[self.isDDof]
+        return b
+
+    def apply(self, A, b, x):
+        """
+        Apply the Dirichlet boundary condition on `A` and `b` in place.
+
+        Parameters
+        ----------
+        A : scipy.sparse.csr_matrix
+        b : numpy.ndarray
+            with shape `(N, )`
+        x : numpy.ndarray
+            with shape `(N, )`, the values on the Dirichlet dofs are used
+        """
+        A = self.apply_on_matrix(A)
+        b = self.apply_on_vector(b, x)
+        return A, b
+
+    def condense(self, A, b, x):
+        """
+        Get the linear system of the free dofs.
+
+        Returns
+        -------
+        A0 : scipy.sparse.csr_matrix
+            with shape `(NF, NF)`, `NF` is the number of the free dofs
+        b0 : numpy.ndarray
+            with shape `(NF, )`
+        """
+        if len(A.data) != len(self.indices):
+            A = self.copy(A)
+        NF = len(self.freedof)
+        A0 = csr_matrix((A.data[self.freepos], self.freeindices,
+            self.freeindptr), shape=(NF, NF))
+        N = self.shape[0]
+        val = A.data[self.liftpos]*x[self.liftcol]
+        b0 = b[self.freedof] - np.bincount(self.liftrow, weights=val,
+                minlength=N)[self.freedof]
+        return A0, b0
+
+    def expand(self, x0, x):
+        """
+        Put the solution `x0` of the condensed system into `x` in place.
+        """
+        x[self.freedof] = x0
+        return x
+
+
+def dirichlet_handler(handler, A, isDDof):
+    """
+    Return `handler` when it works on `A` and `isDDof`, otherwise a new one.
+    """
+    if (handler is None) or (not handler.is_compatible(A, isDDof)):
+        handler = DirichletHandler(A, isDDof)
+    return handler
 
 
 class DirichletBC:
@@ -109,6 +311,15 @@ class DirichletBC:
             isBdDof = is_dirichlet_dof(ipoints)
 
         self.isBdDof = isBdDof
+        self.handler = None
+
+    def get_handler(self, A):
+        """
+        The Dirichlet handler of the sparsity pattern of `A`, which is reused
+        while the pattern is not changed.
+        """
+        self.handler = dirichlet_handler(self.handler, A, self.isBdDof)
+        return self.handler
 
     def apply(self, A, b):
         """ Modify matrix A and b
@@ -123,15 +334,16 @@ class DirichletBC:
         # the length of ipoints and isBdDof maybe different
         idx, = np.nonzero(isBdDof)
         x[isBdDof] = g0(ipoints[idx])
-        b -= A@x
-        bdIdx = np.zeros(gdof, dtype=np.int)
-        bdIdx[isBdDof] = 1
-        Tbd = spdiags(bdIdx, 0, gdof, gdof)
-        T = spdiags(1-bdIdx, 0, gdof, gdof)
-        A = T@A@T + Tbd
-
-        b[isBdDof] = x[isBdDof]
-        return A, b
+        if hasattr(A, 'dirichlet'):
+            # the matrix-free operator
+            b -= A@x
+            A = A.dirichlet(isBdDof)
+            b[isBdDof] = x[isBdDof]
+            return A, b
+        else:
+            A = A.tocsr()
+            handler = self.get_handler(A)
+            return handler.apply(handler.copy(A), b, x)
 
     def apply_on_matrix(self, A):
 
@@ -139,13 +351,12 @@ class DirichletBC:
         isBdDof = self.isBdDof
         gdof = V.number_of_global_dofs()
 
-        bdIdx = np.zeros((A.shape[0], ), np.int)
-        bdIdx[isBdDof] = 1
-        Tbd = spdiags(bdIdx, 0, A.shape[0], A.shape[0])
-        T = spdiags(1-bdIdx, 0, A.shape[0], A.shape[0])
-        A = T@A@T + Tbd
+        if hasattr(A, 'dirichlet'):
+            return A.dirichlet(isBdDof)
 
-        return A
+        A = A.tocsr()
+        handler = self.get_handler(A)
+        return handler.apply_on_matrix(handler.copy(A))
 
     def apply_on_vector(self, b, A):
         
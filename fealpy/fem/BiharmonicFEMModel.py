@@ -114,7 +114,7 @@ class BiharmonicRecoveryFEMModel:
 
         if self.rtype is 'simple':
             D = spdiags(1.0/np.bincount(cell.flat), 0, NN, NN)
-            I = np.einsum('k, ij->ijk', np.ones(3), cell)
+            I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
             J = I.swapaxes(-1, -2)
             val = np.einsum('k, ij->ikj', np.ones(3), gradphi[:, :, 0])
             A = D@csc_matrix((val.flat, (I.flat, J.flat)), shape=(NN, NN))
@@ -125,7 +125,7 @@ class BiharmonicRecoveryFEMModel:
             d = np.zeros(NN, dtype=np.float)
             np.add.at(d, cell, 1/measure.reshape(-1, 1))
             D = spdiags(1/d, 0, NN, NN)
-            I = np.einsum('k, ij->ijk', np.ones(3), cell)
+            I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
             J = I.swapaxes(-1, -2)
             val = np.einsum('ij, k->ikj',  gphi[:, :, 0], np.ones(3))
             A = D@csc_matrix((val.flat, (I.flat, J.flat)), shape=(NN, NN))
@@ -177,7 +177,7 @@ class BiharmonicRecoveryFEMModel:
         gradphi, measure = self.gradphi, self.measure
 
 
-        I = np.einsum('ij, k->ijk',  cell, np.ones(3))
+        I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
         J = I.swapaxes(-1, -2)
         val = np.einsum('i, ij, ik->ijk', measure, gradphi[:, :, 0], gradphi[:, :, 0])
         P = csc_matrix((val.flat, (I.flat, J.flat)), shape=(N, N))
@@ -201,7 +201,7 @@ class BiharmonicRecoveryFEMModel:
         h = np.sqrt(np.sum(n**2, axis=1)) 
         n /= h.reshape(-1, 1)
 
-        I = np.einsum('ij, k->ijk', bdEdge, np.ones(2))
+        I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (2, ))
         J = I.swapaxes(-1, -2)
         val = np.array([(1/3, 1/6), (1/6, 1/3)])
         val0 = np.einsum('i, jk->ijk', n[:, 0]*n[:, 0]/h, val)
@@ -215,7 +215,7 @@ class BiharmonicRecoveryFEMModel:
 
         # Drichlet term 
         if self.dirichlet:
-            I = np.einsum('ij, k->ijk', bdEdge, np.ones(2))
+            I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (2, ))
             J = I.swapaxes(-1, -2)
             val = np.array([(1/3, 1/6), (1/6, 1/3)])
             val = np.einsum('i, jk->ijk', 1/h**3, val)
@@ -266,7 +266,7 @@ class BiharmonicRecoveryFEMModel:
         h = np.sqrt(np.sum(n**2, axis=1)) 
         n /= h.reshape(-1, 1)
 
-        I = np.einsum('ij, k->ijk', bdEdge, np.ones(2))
+        I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (2, ))
         J = I.swapaxes(-1, -2)
         val = np.array([(1/3, 1/6), (1/6, 1/3)])
         val0 = np.einsum('i, jk->ijk', n[:, 0]*n[:, 0]/h, val)
@@ -295,7 +295,7 @@ class BiharmonicRecoveryFEMModel:
         n = (node[bdEdge[:,1],] - node[bdEdge[:,0],:])@W
         h = np.sqrt(np.sum(n**2, axis=1)) 
         n /= h.reshape(-1, 1)
-        I = np.einsum('ij, k->ijk', bdEdge, np.ones(2))
+        I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (2, ))
         J = I.swapaxes(-1, -2)
         val = np.array([(1/3, 1/6), (1/6, 1/3)])
         val = np.einsum('i, jk->ijk', 1/h**3, val)
@@ -311,7 +311,7 @@ class BiharmonicRecoveryFEMModel:
         
         gradphi, measure = self.gradphi, self.measure
 
-        I = np.einsum('ij, k->ijk',  cell, np.ones(3))
+        I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
         J = I.swapaxes(-1, -2)
         val = np.einsum('i, ij, ik->ijk', measure, gradphi[:, :, 0], gradphi[:, :, 0])
         P = csc_matrix((val.flat, (I.flat, J.flat)), shape=(N, N))
@@ -120,7 +120,7 @@ class BiharmonicRecoveryFEMModel:
 
         if self.rtype is 'simple':
             D = spdiags(1.0/np.bincount(cell.flat), 0, N, N)
-            I = np.einsum('k, ij->ijk', np.ones(3), cell)
+            I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
             J = I.swapaxes(-1, -2)
             val = np.einsum('k, ij->ikj', np.ones(3), gradphi[:, :, 0])
             A = D@csc_matrix((val.flat, (I.flat, J.flat)), shape=(N, N))
@@ -131,7 +131,7 @@ class BiharmonicRecoveryFEMModel:
             d = np.zeros(N, dtype=np.float)
             np.add.at(d, cell, 1/area.reshape(-1, 1))
             D = spdiags(1/d, 0, N, N)
-            I = np.einsum('k, ij->ijk', np.ones(3), cell)
+            I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
             J = I.swapaxes(-1, -2)
             val = np.einsum('ij, k->ikj',  gphi[:, :, 0], np.ones(3))
             A = D@csc_matrix((val.flat, (I.flat, J.flat)), shape=(N, N))
@@ -164,7 +164,7 @@ class BiharmonicRecoveryFEMModel:
         gradphi, area = self.gradphi, self.area
 
 
-        I = np.einsum('ij, k->ijk',  cell, np.ones(3))
+        I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
         J = I.swapaxes(-1, -2)
         val = np.einsum('i, ij, ik->ijk', area, gradphi[:, :, 0], gradphi[:, :, 0])
         P = csc_matrix((val.flat, (I.flat, J.flat)), shape=(N, N))
@@ -179,7 +179,7 @@ class BiharmonicRecoveryFEMModel:
 
         M = A.transpose()@P@A + A.transpose()@Q@B + B.transpose()@Q.transpose()@A+B.transpose()@S@B 
 
-        I = np.einsum('ij, k->ijk', bdEdge, np.ones(2))
+        I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (2, ))
         J = I.swapaxes(-1, -2)
         val = np.array([(1/3, 1/6), (1/6, 1/3)])
         val0 = np.einsum('i, jk->ijk', n[:, 0]*n[:, 0]/h, val)
@@ -60,7 +60,7 @@ class CahnHilliardRFEMModel():
         n /= h.reshape(-1, 1)
 
         # 计算梯度的恢复矩阵
-        I = np.einsum('ij, k->ijk',  cell, np.ones(3))
+        I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
         J = I.swapaxes(-1, -2)
         
         val = np.einsum('i, ij, ik->ijk', area, gradphi[:, :, 0], gradphi[:, :, 0])
@@ -76,8 +76,8 @@ class CahnHilliardRFEMModel():
 
 
         # 中间的边界上的两项
-        I = np.einsum('ij, k->ijk', bdEdge, np.ones(3))
-        J = np.einsum('ij, k->ikj', cell[cellIdx], np.ones(2)) 
+        I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (3, ))
+        J = np.broadcast_to(cell[cellIdx, None, :], shape=(len(cellIdx), 2, 3))
         val0 = 0.5*h.reshape(-1, 1)*n[:, [0]]*gradphi[cellIdx, :, 0]  
         val0 = np.repeat(val0, 2, axis=0).reshape(-1, 2, 2)
         P0 = csc_matrix((val0.flat, (I.flat, J.flat)), shape=(NN, NN))
@@ -100,7 +100,7 @@ class CahnHilliardRFEMModel():
         K *= self.pde.epsilon**2
 
         # 边界上两个方向导数相乘的积分
-        I = np.einsum('ij, k->ijk', bdEdge, np.ones(2))
+        I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (2, ))
         J = I.swapaxes(-1, -2)
         val = np.array([(1/3, 1/6), (1/6, 1/3)])
         val0 = np.einsum('i, jk->ijk', n[:, 0]*n[:, 0]/h, val)        
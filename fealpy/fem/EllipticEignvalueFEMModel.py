@@ -3,7 +3,7 @@ import matplotlib.pyplot as plt
 from scipy.sparse import eye, csr_matrix, bmat
 from scipy.sparse.linalg import spsolve, eigs, LinearOperator
 import scipy.io as sio
-import pyamg
+from fealpy.solver.amg import amg_solver
 from timeit import default_timer as timer
 from mpl_toolkits.mplot3d import Axes3D
 
@@ -29,6 +29,7 @@ class EllipticEignvalueFEMModel:
         self.resultdir = resultdir
         self.picard = False
         self.matlab = matlab
+        self.ml = None # the AMG solver, reused when the matrix is the same
 
     def residual_estimate(self, uh):
         mesh = uh.space.mesh
@@ -85,6 +86,23 @@ class EllipticEignvalueFEMModel:
 
         return A
 
+    def update_stiff_matrix(self, space, A, update):
+        """
+        Update the matrix of `get_stiff_matrix` after `space.refine_update`.
+        """
+        def cellmatrix(space):
+            try:
+                K = space.cell_stiff_matrix(cfun=self.pde.diffusion_coefficient)
+            except AttributeError:
+                K = space.cell_stiff_matrix()
+
+            try:
+                K += space.cell_mass_matrix(cfun=self.pde.reaction_coefficient)
+            except AttributeError:
+                pass
+            return K
+        return space.update_matrix(A, update, cellmatrix=cellmatrix)
+
     def get_mass_matrix(self, space):
         M = space.mass_matrix()
         return M
@@ -104,9 +122,9 @@ class EllipticEignvalueFEMModel:
         NN = A.shape[0]
         self.M = M
         if self.sigma is None:
-            self.ml = pyamg.ruge_stuben_solver(A)
+            self.ml = amg_solver(self.ml, A)
         else:
-            self.ml = pyamg.ruge_stuben_solver(A + self.sigma*M)
+            self.ml = amg_solver(self.ml, A + self.sigma*M)
         P = LinearOperator((NN, NN), matvec=self.linear_operator)
         vals, vecs = eigs(P, k=1)
         if self.sigma is None:
@@ -116,9 +134,9 @@ class EllipticEignvalueFEMModel:
 
     def psolve(self, A, b, M):
         if self.sigma is None:
-            self.ml = pyamg.ruge_stuben_solver(A)
+            self.ml = amg_solver(self.ml, A)
         else:
-            self.ml = pyamg.ruge_stuben_solver(A + self.sigma*M)
+            self.ml = amg_solver(self.ml, A + self.sigma*M)
         return self.ml.solve(b, tol=1e-12, accel='cg').reshape((-1,))
 
     def deig(self, A, M):
@@ -186,12 +204,13 @@ class EllipticEignvalueFEMModel:
             self.savemesh(mesh, self.resultdir + 'mesh_0_0_' + str(NN) +'.mat')
 
         # 2. 以 u_h 为右端项自适应求解 -\Deta u = d*u_h
-        I = eye(gdof)
+        A = AH
+        M = MH
         for i in range(maxit):
             uh = space.function(array=uh)
             eta = self.residual_estimate(uh)
             markedCell = mark(eta, self.theta)
-            IM = mesh.bisect(markedCell, returnim=True)
+            record = mesh.bisect(markedCell, returnrecord=True)
             print(i+1, "refine: ", mesh.number_of_nodes())
             if (self.step > 0) and (i in idx):
                 NN = mesh.number_of_nodes()
@@ -208,22 +227,22 @@ class EllipticEignvalueFEMModel:
                         mesh,
                         self.resultdir + 'mesh_0_' + str(i+1) + '_' + str(NN) +'.mat')
 
-            I = IM@I
-            uh = IM@uh
-            space = LagrangeFiniteElementSpace(mesh, 1)
+            # update the space and the matrices only on the refined cells
+            update = space.refine_update(record)
+            uh = update.prolongate(uh)
             gdof = space.number_of_global_dofs()
-            A = self.get_stiff_matrix(space)
-            M = self.get_mass_matrix(space)
+            A = self.update_stiff_matrix(space, A, update)
+            M = space.update_matrix(M, update, cellmatrix='mass')
             isFreeDof = ~(space.boundary_dof())
             b = d*M@uh
             if self.sigma is None:
-                ml = pyamg.ruge_stuben_solver(A[isFreeDof, :][:, isFreeDof].tocsr())
-                uh[isFreeDof] = ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
+                self.ml = amg_solver(self.ml, A[isFreeDof, :][:, isFreeDof].tocsr())
+                uh[isFreeDof] = self.ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
             else:
                 K = A[isFreeDof, :][:, isFreeDof].tocsr() + self.sigma*M[isFreeDof, :][:, isFreeDof].tocsr()
                 b += self.sigma*M@uh
-                ml = pyamg.ruge_stuben_solver(K)
-                uh[isFreeDof] = ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape(-1)
+                self.ml = amg_solver(self.ml, K)
+                uh[isFreeDof] = self.ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape(-1)
                 # uh[isFreeDof] = spsolve(A[isFreeDof, :][:, isFreeDof].tocsr(), b[isFreeDof])
             d = uh@A@uh/(uh@M@uh)
 
@@ -235,7 +254,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A[isFreeDof, :][:, isFreeDof].tocsr()
             self.M = M[isFreeDof, :][:, isFreeDof].tocsr()
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = amg_solver(self.ml, self.A)
             self.eigs()
 
         end = timer()
@@ -342,7 +361,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A
             self.M = M
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = amg_solver(self.ml, self.A)
             self.eigs()
 
         end = timer()
@@ -452,7 +471,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A
             self.M = M
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = amg_solver(self.ml, self.A)
             self.eigs()
         else:
             uh = IM@uh
@@ -595,7 +614,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A
             self.M = M
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = amg_solver(self.ml, self.A)
             self.eigs()
         else:
             if self.matlab is False:
@@ -751,7 +770,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A
             self.M = M
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = amg_solver(self.ml, self.A)
             self.eigs()
         else:
             if self.matlab is False:
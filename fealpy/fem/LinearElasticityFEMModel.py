@@ -77,8 +77,8 @@ class LinearElasticityFEMModel:
         c2d1 = self.cspace.cell_to_dof()
 
         gdim = self.tensorspace.geo_dimension()
-        I = np.einsum('ij, k->ijk', c2d0, np.ones(gdim+1))
-        J = np.einsum('ik, j->ijk', c2d1, np.ones(len(bc)))
+        I = np.broadcast_to(c2d0[:, :, None], shape=c2d0.shape + (gdim+1, ))
+        J = np.broadcast_to(c2d1[:, None, :], shape=(len(c2d1), len(bc), c2d1.shape[1]))
         cgdof = self.cspace.number_of_global_dofs()
         fgdof = self.vectorspace.number_of_global_dofs()/self.mesh.geo_dimension()
         self.PI = csr_matrix((val.flat, (I.flat, J.flat)), shape=(fgdof, cgdof))
@@ -112,7 +112,7 @@ class LinearElasticityFEMModel:
             M = np.einsum('i, ijkm, m, ijom, j->jko', ws, aphi, d, phi, self.measure, optimize=True)
 
         tcell2dof = tspace.cell_to_dof()
-        I = np.einsum('ij, k->ijk', tcell2dof, np.ones(tldof))
+        I = np.broadcast_to(tcell2dof[:, :, None], shape=tcell2dof.shape + (tldof, ))
         J = I.swapaxes(-1, -2)
         tgdof = tspace.number_of_global_dofs()
         M = csr_matrix((M.flat, (I.flat, J.flat)), shape=(tgdof, tgdof))
@@ -131,8 +131,9 @@ class LinearElasticityFEMModel:
             uphi = vspace.basis(bcs)
             B = np.einsum('i, ikm, ijom, j->jko', ws, uphi, dphi, self.measure, optimize=True)
 
-        I = np.einsum('ij, k->ijk', vspace.cell_to_dof(), np.ones(tldof))
-        J = np.einsum('ij, k->ikj', tspace.cell_to_dof(), np.ones(vldof))
+        vcell2dof = vspace.cell_to_dof()
+        I = np.broadcast_to(vcell2dof[:, :, None], shape=vcell2dof.shape + (tldof, ))
+        J = np.broadcast_to(tcell2dof[:, None, :], shape=(len(tcell2dof), vldof, tldof))
         B = csr_matrix((B.flat, (I.flat, J.flat)), shape=(vgdof, tgdof))
         return  M, B
 
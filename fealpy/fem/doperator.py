@@ -3,20 +3,54 @@ from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye
 from timeit import default_timer as timer
 from itertools import combinations
 
-def stiff_matrix(space, qf, measure, cfun=None, barycenter=True):
+from ..functionspace.assembler import CSRAssembler, cell_blocks
+
+
+def global_assembler(space):
+    if hasattr(space, 'global_assembler'):
+        return space.global_assembler()
+    else:
+        gdof = space.number_of_global_dofs()
+        return CSRAssembler(space.cell_to_dof(), gdof)
+
+def assembly_blocks(space, qf, measure, blocksize=None):
+    """
+    The blocks of cells of the assembly, the block size is chosen from the
+    available memory by default, see `assembler.cell_blocks`.
+    """
+    NQ = len(qf.weights)
+    ldof = space.number_of_local_dofs()
+    GD = space.mesh.geo_dimension()
+    nbytes = 8*(4*NQ*ldof*(GD + 1) + 2*ldof*ldof)
+    return cell_blocks(len(measure), nbytes, blocksize=blocksize)
+
+def stiff_matrix(space, qf, measure, cfun=None, barycenter=True,
+        blocksize=None):
     bcs, ws = qf.quadpts, qf.weights
-    gphi = space.grad_basis(bcs)
 
-    # Compute the element sitffness matrix
-    A = np.einsum('i, ijkm, ijpm, j->jkp', ws, gphi, gphi, measure, optimize=True)
-    cell2dof = space.cell_to_dof()
+    # Compute the upper triangle of the element sitffness matrix block by
+    # block, and add them into the CSR data at once
+    assembler = global_assembler(space)
+    iu, ju = assembler.upper_triangle_index()
     ldof = space.number_of_local_dofs()
-    I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-    J = I.swapaxes(-1, -2)
-    gdof = space.number_of_global_dofs()
+    data = np.zeros(assembler.number_of_nonzeros(), dtype=np.float)
+    for index in assembly_blocks(space, qf, measure, blocksize=blocksize):
+        if index is None:
+            gphi = space.grad_basis(bcs)
+            m = measure
+        else:
+            gphi = space.grad_basis(bcs, index=index)
+            m = measure[index]
+        A = np.zeros((len(m), len(iu)), dtype=gphi.dtype)
+        start = 0
+        for i in range(ldof):
+            A[:, start:start+ldof-i] = np.einsum('i, ijm, ijpm, j->jp',
+                    ws, gphi[..., i, :], gphi[..., i:, :], m, optimize=True)
+            start += ldof - i
+        assembler.add(data, A, index=index, symmetric=True)
 
     # Construct the stiffness matrix
-    A = csr_matrix((A.flat, (I.flat, J.flat)), shape=(gdof, gdof))
+    A = assembler.tocsr(data)
     return A
 
 def stiff_matrix_1(space, qf, measure):
@@ -36,41 +70,62 @@ def stiff_matrix_1(space, qf, measure):
     return A.tocsr() 
 
 
-def mass_matrix(space, qf, measure, cfun=None, barycenter=True):
+def mass_matrix(space, qf, measure, cfun=None, barycenter=True,
+        blocksize=None):
 
     bcs, ws = qf.quadpts, qf.weights
     phi = space.basis(bcs)
-    if cfun is None:
-        A = np.einsum('m, mij, mik, i->ijk', ws, phi, phi, measure)
-    else:
-        if barycenter is True:
-            val = cfun(bcs)
-        else:
-            pp = space.mesh.bc_to_point(bcs)
-            val = cfun(pp)
-        A = np.einsum('m, mi, mij, mik, i->ijk', ws, val, phi, phi, measure)
+    if (cfun is not None) and (barycenter is True):
+        # `cfun` gives the values on all the cells
+        val = cfun(bcs)
 
-    cell2dof = space.cell_to_dof()
+    # Compute the upper triangle of the element mass matrix block by block
+    assembler = global_assembler(space)
+    iu, ju = assembler.upper_triangle_index()
     ldof = space.number_of_local_dofs()
-    I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-    J = I.swapaxes(-1, -2)
-
-    gdof = space.number_of_global_dofs()
-    A = csr_matrix((A.flat, (I.flat, J.flat)), shape=(gdof, gdof))
+    data = np.zeros(assembler.number_of_nonzeros(), dtype=np.float)
+    for index in assembly_blocks(space, qf, measure, blocksize=blocksize):
+        m = measure if index is None else measure[index]
+        if cfun is None:
+            dphi = phi
+        else:
+            if barycenter is True:
+                v = val if index is None else val[:, index]
+            elif index is None:
+                v = cfun(space.mesh.bc_to_point(bcs))
+            else:
+                v = cfun(space.mesh.bc_to_point(bcs, index=index))
+            dphi = np.einsum('mi, mij->mij', v, phi)
+
+        A = np.zeros((len(m), len(iu)), dtype=phi.dtype)
+        start = 0
+        for i in range(ldof):
+            A[:, start:start+ldof-i] = np.einsum('m, mj, mjk, j->jk',
+                    ws, dphi[..., i], phi[..., i:], m, optimize=True)
+            start += ldof - i
+        assembler.add(data, A, index=index, symmetric=True)
+
+    A = assembler.tocsr(data)
     return A
 
-def source_vector(f, space, qf, measure, surface=None):
+def source_vector(f, space, qf, measure, surface=None, blocksize=None):
     bcs, ws = qf.quadpts, qf.weights
-    pp = space.mesh.bc_to_point(bcs)
-    if surface is not None:
-        pp, _ = surface.project(pp)
-    fval = f(pp)
     phi = space.basis(bcs)
-    bb = np.einsum('i, ik, i..., k->k...', ws, fval, phi, measure)
-
     cell2dof = space.dof.cell2dof
     gdof = space.number_of_global_dofs()
-    b = np.bincount(cell2dof.flat, weights=bb.flat, minlength=gdof)
+    b = np.zeros(gdof, dtype=np.float)
+    for index in assembly_blocks(space, qf, measure, blocksize=blocksize):
+        if index is None:
+            pp = space.mesh.bc_to_point(bcs)
+        else:
+            pp = space.mesh.bc_to_point(bcs, index=index)
+        if surface is not None:
+            pp, _ = surface.project(pp)
+        fval = f(pp)
+        m = measure if index is None else measure[index]
+        bb = np.einsum('i, ik, i..., k->k...', ws, fval, phi, m)
+        c2d = cell2dof if index is None else cell2dof[index]
+        b += np.bincount(c2d.flat, weights=bb.flat, minlength=gdof)
     return b
 
 def grad_recovery_matrix(space, rtype='simple'):
@@ -84,7 +139,7 @@ def grad_recovery_matrix(space, rtype='simple'):
 
     if rtype is 'simple':
         D = spdiags(1.0/np.bincount(cell.flat), 0, NN, NN)
-        I = np.einsum('k, ij->ijk', np.ones(3), cell)
+        I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
         J = I.swapaxes(-1, -2)
         val = np.einsum('k, ij->ikj', np.ones(3), gradphi[:, :, 0])
         A = D@csc_matrix((val.flat, (I.flat, J.flat)), shape=(NN, NN))
@@ -95,7 +150,7 @@ def grad_recovery_matrix(space, rtype='simple'):
         d = np.zeros(NN, dtype=np.float)
         np.add.at(d, cell, 1/area.reshape(-1, 1))
         D = spdiags(1/d, 0, N, N)
-        I = np.einsum('k, ij->ijk', np.ones(3), cell)
+        I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
         J = I.swapaxes(-1, -2)
         val = np.einsum('ij, k->ikj',  gphi[:, :, 0], np.ones(3))
         A = D@csc_matrix((val.flat, (I.flat, J.flat)), shape=(NN, NN))
@@ -125,7 +180,7 @@ def recovery_biharmonic_matirx(space, area, A, B, epsilon):
     h = np.sqrt(np.sum(n**2, axis=1)) 
     n /= h.reshape(-1, 1)
 
-    I = np.einsum('ij, k->ijk',  cell, np.ones(3))
+    I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (3, ))
     J = I.swapaxes(-1, -2)
     val = np.einsum('i, ij, ik->ijk', area, gradphi[:, :, 0], gradphi[:, :, 0])
     P = csc_matrix((val.flat, (I.flat, J.flat)), shape=(NN, NN))
@@ -137,7 +192,7 @@ def recovery_biharmonic_matirx(space, area, A, B, epsilon):
     M = A.transpose()@P@A + A.transpose()@Q@B + B.transpose()@Q.transpose()@A+B.transpose()@S@B 
     M *= epsilon**2
 
-    I = np.einsum('ij, k->ijk', bdEdge, np.ones(2))
+    I = np.broadcast_to(bdEdge[:, :, None], shape=bdEdge.shape + (2, ))
     J = I.swapaxes(-1, -2)
     val = np.array([(1/3, 1/6), (1/6, 1/3)])
     val0 = np.einsum('i, jk->ijk', n[:, 0]*n[:, 0]/h, val)
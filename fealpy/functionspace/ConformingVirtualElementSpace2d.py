@@ -1,14 +1,266 @@
 import numpy as np
 from numpy.linalg import inv
+from functools import partial
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye
 
 from .function import Function
+from .assembler import CSRAssembler
+from .parallel_assembly import cell_kernel_map, worker_pool
 from ..quadrature import GaussLobattoQuadrature
 from ..quadrature import GaussLegendreQuadrature
 from ..quadrature import PolygonMeshIntegralAlg
 from .ScaledMonomialSpace2d import ScaledMonomialSpace2d
 
 
+class CellMatrixList(list):
+    """
+    The list of the matrices of all the cells, which are the views of the
+    columns `location[i]:location[i+1]` of the 2D array `data`, so the
+    matrices of a group of cells can be gathered without a loop.
+    """
+    def __init__(self, data, location):
+        super().__init__(np.hsplit(data, location[1:-1]))
+        self.data = data
+        self.location = location
+
+    def stack(self, index):
+        n = self.location[index[0]+1] - self.location[index[0]]
+        idx = self.location[index].reshape(-1, 1) + np.arange(n)
+        return self.data[:, idx].swapaxes(0, 1)
+
+
+def edge_to_cell_add(B, val, cellidx, localidx, cell2dofLocation, NV, p, k=1):
+    """
+    Add the edge contributions to the columns of the local dofs of the
+    cells, the edge is the `localidx`-th edge of the cell `cellidx`.
+
+    Parameters
+    ----------
+    B : numpy.ndarray
+        the shape is `(m, len(cell2dof))`
+    val : numpy.ndarray
+        the shape is `(NE, m, k*(p+1))`, the contributions of the `k*(p+1)`
+        dofs on every edge, `k` is the number of the components of the dofs
+    cellidx : numpy.ndarray
+        the shape is `(NE, )`
+    localidx : numpy.ndarray
+        the shape is `(NE, )`
+    """
+    n = k*p
+    NE = len(cellidx)
+    idx = cell2dofLocation[cellidx].reshape(-1, 1) + \
+            (localidx.reshape(-1, 1)*n + np.arange(n+k)) \
+            %(NV[cellidx].reshape(-1, 1)*n)
+    m, N = B.shape
+    idx = N*np.arange(m).reshape(-1, 1, 1) + idx
+    B += np.bincount(idx.flat, weights=val.swapaxes(0, 1).flat,
+            minlength=m*N).reshape(m, N)
+    return B
+
+
+def scaled_monomial_basis(x, p):
+    """
+    The scaled monomials of degree `p` at the scaled points `x`, i.e.
+    `(point - barycenter)/h` with shape `(..., 2)`, in the order of
+    `ScaledMonomialSpace2d.basis`.
+    """
+    ldof = (p+1)*(p+2)//2
+    phi = np.ones(x.shape[:-1] + (ldof, ), dtype=x.dtype)
+    if p > 0:
+        phi[..., 1:3] = x
+        start = 3
+        for i in range(2, p+1):
+            phi[..., start:start+i] = phi[..., start-i:start]*phi[..., [1]]
+            phi[..., start+i] = phi[..., start-1]*phi[..., 2]
+            start += i+1
+    return phi
+
+
+def scaled_monomial_grad(x, p):
+    """
+    The gradients of the scaled monomials of degree `p` with respect to the
+    scaled points `x`, with shape `(..., ldof, 2)`, they are divided by `h`
+    to get the gradients with respect to the points.
+    """
+    ldof = (p+1)*(p+2)//2
+    gphi = np.zeros(x.shape[:-1] + (ldof, 2), dtype=x.dtype)
+    if p > 0:
+        phi = scaled_monomial_basis(x, p-1)
+        # the degree `q` and the multi-index `(a, b)` of every monomial
+        q = np.repeat(np.arange(p+1), np.arange(1, p+2))
+        b = np.arange(ldof) - q*(q+1)//2
+        a = q - b
+        loc = (q-1)*q//2 + b # the index of x^(a-1)y^b of degree q-1
+        idx, = np.nonzero(a > 0)
+        gphi[..., idx, 0] = a[idx]*phi[..., loc[idx]]
+        idx, = np.nonzero(b > 0)
+        gphi[..., idx, 1] = b[idx]*phi[..., loc[idx]-1]
+    return gphi
+
+
+def cell_projection(p, arrays, start, end, pi0=False):
+    """
+    The projection matrices `H`, `D`, `B`, `G` and `PI1` (and `PI0` when
+    `pi0` is True) of the cells `start:end` of a cell group, computed from
+    the geometry of the cells only.
+
+    Parameters
+    ----------
+    p : int
+        the order of the space
+    arrays : dict
+        `node` with shape `(NC, NV, 2)`, the vertices of the cells in the
+        counterclockwise order, and `barycenter`, `h` and `area` of the
+        cells
+
+    Returns
+    -------
+    P : dict
+        the matrices with the same shapes as the ones of
+        `ConformingVirtualElementSpace2d` stacked for the cells
+
+    Notes
+    -----
+    The `i`-th edge of a cell joins the vertices `i` and `i+1`, and its
+    local dofs are `i*p:i*p+p+1` (modulo `NV*p`), so the edge integrals of
+    `matrix_D`, `matrix_B` and `ScaledMonomialSpace2d.matrix_H` are
+    computed cell by cell without the edge data of the mesh.
+    """
+    node = arrays['node'][start:end]
+    bc = arrays['barycenter'][start:end].reshape(-1, 1, 2)
+    h = arrays['h'][start:end].reshape(-1, 1, 1)
+    area = arrays['area'][start:end].reshape(-1, 1, 1)
+
+    NC, NV, _ = node.shape
+    smldof = (p+1)*(p+2)//2
+    idof = (p-1)*p//2
+    ldof = NV*p + idof
+
+    v0 = node
+    v1 = np.roll(node, -1, axis=1)
+    w = np.array([(0, -1), (1, 0)])
+    nm = (v1 - v0)@w # the outward normals with the length of the edges
+
+    qf = GaussLegendreQuadrature(p + 1)
+    bcs, ws = qf.quadpts, qf.weights
+    ps = np.einsum('q, cem->qcem', bcs[:, 0], v0) \
+            + np.einsum('q, cem->qcem', bcs[:, 1], v1)
+    phi = scaled_monomial_basis((ps - bc)/h, p)
+    H = np.einsum('q, qcek, qcem, ce->ckm', ws, phi, phi,
+            np.sum((v0 - bc)*nm, axis=-1), optimize=True)
+    q = np.repeat(np.arange(p+1), np.arange(1, p+2))
+    H /= q + q.reshape(-1, 1) + 2
+
+    if p == 1:
+        D = np.ones((NC, NV, smldof), dtype=node.dtype)
+        D[..., 1:] = (node - bc)/h
+        B = np.zeros((NC, smldof, NV), dtype=node.dtype)
+        B[:, 0, :] = 1/NV
+        B[:, 1:, :] = (0.5*(v1 - np.roll(node, 1, axis=1))@w).swapaxes(-1, -2)/h
+        G = np.array([(1, 0, 0), (0, 1, 0), (0, 0, 1)])
+        PI1 = B
+    else:
+        qf = GaussLobattoQuadrature(p + 1)
+        bcs, ws = qf.quadpts, qf.weights
+        ps = np.einsum('q, cem->qcem', bcs[:, 0], v0) \
+                + np.einsum('q, cem->qcem', bcs[:, 1], v1)
+        x = (ps - bc)/h
+
+        D = np.ones((NC, ldof, smldof), dtype=node.dtype)
+        D[:, :NV*p] = scaled_monomial_basis(x[:-1], p).transpose(1, 2, 0, 3
+                ).reshape(NC, NV*p, smldof)
+        D[:, NV*p:] = H[:, :idof, :]/area
+
+        B = np.zeros((NC, smldof, ldof), dtype=node.dtype)
+        B[:, 0, NV*p] = 1
+        n = 3
+        r = np.arange(1, p+1)
+        r = r[0:-1]*r[1:]
+        for i in range(2, p+1):
+            idx0 = np.arange(n, n+i-1)
+            idx1 = NV*p + np.arange(n-2*i+1, n-i)
+            B[:, idx0, idx1] -= r[i-2::-1]
+            B[:, idx0+2, idx1] -= r[0:i-1]
+            n += i+1
+
+        gphi = scaled_monomial_grad(x, p)/h.reshape(-1, 1, 1, 1)
+        val = np.einsum('q, qcemk, cek->qcme', ws, gphi, nm, optimize=True)
+        for i in range(p+1):
+            idx = (np.arange(NV)*p + i)%(NV*p)
+            B[:, :, idx] += val[i]
+
+        G = B@D
+        PI1 = np.linalg.solve(G, B)
+
+    P = {'H': H, 'D': D, 'B': B, 'G': G, 'PI1': PI1}
+    if pi0:
+        C = H@PI1
+        if p > 1:
+            C[:, :idof, :] = 0
+            C[:, :idof, ldof-idof:] = area*np.eye(idof)
+        P['PI0'] = np.linalg.solve(H, C)
+    return P
+
+
+def element_stiff_matrix(p, D, PI1, G, k=None):
+    """
+    The element stiffness matrices of a cell group from the projection
+    matrices stacked for the cells, `G` is the one with the first row set
+    to zero for `p > 1`.
+    """
+    ldof = PI1.shape[-1]
+    M = np.eye(ldof) - D@PI1
+    if p == 1:
+        tG = np.array([(0, 0, 0), (0, 1, 0), (0, 0, 1)])
+        if k is None:
+            # the stabilization matrix of the polygon boundary
+            A = 2*np.eye(ldof) - np.roll(np.eye(ldof), 1, axis=1) \
+                    - np.roll(np.eye(ldof), -1, axis=1)
+            return PI1.swapaxes(-1, -2)@tG@PI1 + M.swapaxes(-1, -2)@A@M
+        K = PI1.swapaxes(-1, -2)@tG@PI1 + M.swapaxes(-1, -2)@M
+    else:
+        K = PI1.swapaxes(-1, -2)@G@PI1 + M.swapaxes(-1, -2)@M
+    if k is not None:
+        K *= k.reshape(-1, 1, 1)
+    return K
+
+
+def element_mass_matrix(D, H, PI0, area):
+    """
+    The element mass matrices of a cell group from the projection matrices
+    stacked for the cells.
+    """
+    ldof = PI0.shape[-1]
+    M = np.eye(ldof) - D@PI0
+    return PI0.swapaxes(-1, -2)@H@PI0 \
+            + area.reshape(-1, 1, 1)*M.swapaxes(-1, -2)@M
+
+
+def stiff_kernel(p, arrays, start, end):
+    """
+    The element stiffness matrices of the cells `start:end` of a cell group,
+    the projections are computed by `cell_projection` in the kernel, see
+    `ConformingVirtualElementSpace2d.stiff_matrix`.
+    """
+    P = cell_projection(p, arrays, start, end)
+    G = P['G']
+    if p > 1:
+        G[:, 0, :] = 0
+    k = arrays['k'][start:end] if 'k' in arrays else None
+    return element_stiff_matrix(p, P['D'], P['PI1'], G, k=k)
+
+
+def mass_kernel(p, arrays, start, end):
+    """
+    The element mass matrices of the cells `start:end` of a cell group, the
+    projections are computed by `cell_projection` in the kernel, see
+    `ConformingVirtualElementSpace2d.mass_matrix`.
+    """
+    P = cell_projection(p, arrays, start, end, pi0=True)
+    return element_mass_matrix(P['D'], P['H'], P['PI0'],
+            arrays['area'][start:end])
+
+
 class CVEMDof2d():
     def __init__(self, mesh, p):
         self.p = p
@@ -129,7 +381,26 @@ class ConformingVirtualElementSpace2d():
         self.smspace = ScaledMonomialSpace2d(mesh, p, q=q, bc=bc)
         self.cellmeasure = self.smspace.cellmeasure
         self.dof = CVEMDof2d(mesh, p)
+        self.cellgroup = self.cell_group()
+        self.assembler = None
 
+        self.integralalg = self.smspace.integralalg
+        self.itype = self.mesh.itype
+        self.ftype = self.mesh.ftype
+
+    def __getattr__(self, name):
+        """
+        The projection matrices `H`, `D`, `B`, `G`, `PI1`, `C` and `PI0` are
+        computed at the first use, so `stiff_matrix` and `mass_matrix` with
+        `workers > 1`, which compute them in the workers, do not wait for
+        them.
+        """
+        if name not in ('H', 'D', 'B', 'G', 'PI1', 'C', 'PI0'):
+            raise AttributeError(name)
+        self.init_projection()
+        return self.__dict__[name]
+
+    def init_projection(self):
         self.H = self.smspace.matrix_H()
         self.D = self.matrix_D(self.H)
         self.B = self.matrix_B()
@@ -140,10 +411,6 @@ class ConformingVirtualElementSpace2d():
 
         self.PI0 = self.matrix_PI_0(self.H, self.C)
 
-        self.integralalg = self.smspace.integralalg
-        self.itype = self.mesh.itype
-        self.ftype = self.mesh.ftype
-
     def integral(self, uh):
         """
         计算虚单元函数的积分 \int_\Omega uh dx
@@ -240,105 +507,158 @@ class ConformingVirtualElementSpace2d():
         SS[:] = np.einsum('ikj, ij->ik', PI0, S[smspace.cell_to_dof()]).reshape(-1)
         return SS
 
-    def stiff_matrix(self, cfun=None):
-        area = self.smspace.cellmeasure
+    def cell_group(self):
+        """
+        Group the cells by the number of vertices.
 
-        def f(x):
-            x[0, :] = 0
-            return x
+        The cells in one group have the same number of local dofs, so their
+        matrices can be stacked into 3D arrays and computed in batch.
 
+        Returns
+        -------
+        group : list of tuple
+            `(index, location)` of every group, `index` is the indices of the
+            cells in the group, and `cell2dof[location[i]]` is the local dofs
+            of the cell `index[i]`
+        """
         p = self.p
-        G = self.G
-        D = self.D
-        PI1 = self.PI1
+        NV = self.mesh.number_of_vertices_of_cells()
+        idof = (p-1)*p//2
+        cell2dofLocation = self.dof.cell2dofLocation
+        group = []
+        for nv in np.unique(NV):
+            index, = np.nonzero(NV == nv)
+            location = cell2dofLocation[index].reshape(-1, 1) + np.arange(nv*p + idof)
+            group.append((index, location))
+        return group
+
+    def group_stack(self, M, index):
+        """
+        Stack the matrices `M[i]` of the cells `i` in `index` into a 3D
+        array, `M` is a 3D array, a `CellMatrixList` or a list of the
+        matrices of all the cells.
+        """
+        if isinstance(M, np.ndarray):
+            return M[index]
+        elif isinstance(M, CellMatrixList):
+            return M.stack(index)
+        else:
+            return np.array([M[i] for i in index])
 
-        cell2dof, cell2dofLocation = self.cell_to_dof()
-        NC = len(cell2dofLocation) - 1
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-        DD = np.vsplit(D, cell2dofLocation[1:-1])
+    def group_split(self, M):
+        """
+        Split the stacked matrices of every group into the list of the
+        matrices of all the cells.
 
-        if p == 1:
-            tG = np.array([(0, 0, 0), (0, 1, 0), (0, 0, 1)])
-            if cfun is None:
-                def f1(x):
-                    M = np.eye(x[1].shape[1])
-                    M -= x[0]@x[1]
-                    N = x[1].shape[1]
-                    A = np.zeros((N, N))
-                    idx = np.arange(N)
-                    A[idx, idx] = 2
-                    A[idx[:-1], idx[1:]] = -1
-                    A[idx[1:], idx[:-1]] = -1
-                    A[0, -1] = -1
-                    A[-1, 0] = -1
-                    return x[1].T@tG@x[1] + M.T@A@M
-                #f1 = lambda x: x[1].T@tG@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1])
-                K = list(map(f1, zip(DD, PI1)))
-            else:
-                cellbarycenter = self.smspace.cellbarycenter
-                k = cfun(cellbarycenter)
-                f1 = lambda x: (x[1].T@tG@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1]))*x[2]
-                K = list(map(f1, zip(DD, PI1, k)))
+        The matrices of all the cells have the same number of rows, they are
+        put side by side into one 2D array, the columns of the cell `i` begin
+        at the offset `cumsum` of the numbers of the columns of the previous
+        cells, and the list is the `np.hsplit` of it.
+        """
+        NC = self.mesh.number_of_cells()
+        ncol = np.zeros(NC, dtype=self.mesh.itype)
+        for (index, _), m in zip(self.cellgroup, M):
+            ncol[index] = m.shape[-1]
+        location = np.zeros(NC+1, dtype=self.mesh.itype)
+        np.cumsum(ncol, out=location[1:])
+
+        data = np.zeros((M[0].shape[1], location[-1]), dtype=M[0].dtype)
+        for (index, _), m in zip(self.cellgroup, M):
+            idx = location[index].reshape(-1, 1) + np.arange(m.shape[-1])
+            data[:, idx] = m.swapaxes(0, 1)
+        return CellMatrixList(data, location)
+
+    def global_assembler(self):
+        """
+        Get the assembler with the precomputed CSR sparsity pattern of the
+        global matrices.
+        """
+        if self.assembler is None:
+            cell2dof = self.dof.cell2dof
+            gdof = self.number_of_global_dofs()
+            self.assembler = CSRAssembler(
+                    [cell2dof[location] for index, location in self.cellgroup],
+                    gdof)
+        return self.assembler
+
+    def group_geometry(self, index):
+        """
+        The geometric data of the cells `index` of a cell group, which are
+        the input arrays of `cell_projection`.
+        """
+        cell, cellLocation = self.mesh.entity('cell')
+        node = self.mesh.entity('node')
+        NV = cellLocation[index[0]+1] - cellLocation[index[0]]
+        return {
+                'node': node[cell[cellLocation[index].reshape(-1, 1) +
+                    np.arange(NV)]],
+                'barycenter': self.smspace.cellbarycenter[index],
+                'h': self.smspace.cellsize[index],
+                'area': self.smspace.cellmeasure[index]}
+
+    def stiff_matrix(self, cfun=None, workers=None):
+        """
+        The stiffness matrix.
+
+        With `workers > 1` the projection and the element matrices of every
+        cell group are computed from the geometry of the cells by the
+        workers, see `stiff_kernel`, and one pool of the workers is used
+        for all the groups.
+        """
+        p = self.p
+        if cfun is not None:
+            k = cfun(self.smspace.cellbarycenter)
+
+        K = []
+        if (workers is None) or (workers <= 1):
+            for index, location in self.cellgroup:
+                G = None
+                if p > 1:
+                    G = self.group_stack(self.G, index)
+                    G[:, 0, :] = 0
+                K.append(element_stiff_matrix(p, self.D[location],
+                    self.group_stack(self.PI1, index), G,
+                    k=None if cfun is None else k[index]))
         else:
-            tG = list(map(f, G))
-            if cfun is None:
-                f1 = lambda x: x[1].T@x[2]@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1])
-                K = list(map(f1, zip(DD, PI1, tG)))
-            else:
-                cellbarycenter = self.smspace.cellbarycenter
-                k = cfun(cellbarycenter)
-                f1 = lambda x: (x[1].T@x[2]@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1]))*x[3]
-                K = list(map(f1, zip(DD, PI1, tG, k)))
-
-        f2 = lambda x: np.repeat(x, x.shape[0])
-        f3 = lambda x: np.tile(x, x.shape[0])
-        f4 = lambda x: x.flatten()
-
-        I = np.concatenate(list(map(f2, cd)))
-        J = np.concatenate(list(map(f3, cd)))
-        val = np.concatenate(list(map(f4, K)))
-        gdof = self.number_of_global_dofs()
-        A = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
+            with worker_pool(workers) as pool:
+                for index, location in self.cellgroup:
+                    arrays = self.group_geometry(index)
+                    if cfun is not None:
+                        arrays['k'] = k[index]
+                    K.append(cell_kernel_map(partial(stiff_kernel, p), arrays,
+                        len(index), workers=workers, pool=pool))
+
+        assembler = self.global_assembler()
+        A = assembler.assemble(K)
         return A
 
-    def mass_matrix(self, cfun=None):
-        area = self.smspace.cellmeasure
+    def mass_matrix(self, cfun=None, workers=None):
+        """
+        The mass matrix, see `stiff_matrix` for `workers`.
+        """
         p = self.p
+        area = self.smspace.cellmeasure
 
-        PI0 = self.PI0
-        D = self.D
-        H = self.H
-        C = self.C
-
-        cell2dof, cell2dofLocation = self.cell_to_dof()
-        NC = len(cell2dofLocation) - 1
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-        DD = np.vsplit(D, cell2dofLocation[1:-1])
-
-        f1 = lambda x: x[0]@x[1]
-        PIS = list(map(f1, zip(DD, PI0)))
-
-        f1 = lambda x: x[0].T@x[1]@x[0] + x[3]*(np.eye(x[2].shape[1]) - x[2]).T@(np.eye(x[2].shape[1]) - x[2])
-        K = list(map(f1, zip(PI0, H, PIS, area)))
-
-        f2 = lambda x: np.repeat(x, x.shape[0])
-        f3 = lambda x: np.tile(x, x.shape[0])
-        f4 = lambda x: x.flatten()
-
-        I = np.concatenate(list(map(f2, cd)))
-        J = np.concatenate(list(map(f3, cd)))
-        val = np.concatenate(list(map(f4, K)))
-        gdof = self.number_of_global_dofs()
-        M = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
+        K = []
+        if (workers is None) or (workers <= 1):
+            for index, location in self.cellgroup:
+                K.append(element_mass_matrix(self.D[location], self.H[index],
+                    self.group_stack(self.PI0, index), area[index]))
+        else:
+            with worker_pool(workers) as pool:
+                for index, location in self.cellgroup:
+                    arrays = self.group_geometry(index)
+                    K.append(cell_kernel_map(partial(mass_kernel, p), arrays,
+                        len(index), workers=workers, pool=pool))
+
+        assembler = self.global_assembler()
+        M = assembler.assemble(K)
         return M
 
     def cross_mass_matrix(self, wh):
         p = self.p
         mesh = self.mesh
 
-        area = self.smspace.cellmeasure
-        PI0 = self.PI0
-
         phi = self.smspace.basis
         def u(x, index):
             val = phi(x, index=index)
@@ -346,22 +666,13 @@ class ConformingVirtualElementSpace2d():
             return np.einsum('ij, ijm, ijn->ijmn', wval, val, val)
         H = self.integralalg.integral(u, celltype=True)
 
-        cell2dof, cell2dofLocation = self.cell_to_dof()
-        NC = len(cell2dofLocation) - 1
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-
-        f1 = lambda x: x[0].T@x[1]@x[0]
-        K = list(map(f1, zip(PI0, H)))
-
-        f2 = lambda x: np.repeat(x, x.shape[0])
-        f3 = lambda x: np.tile(x, x.shape[0])
-        f4 = lambda x: x.flatten()
+        K = []
+        for index, location in self.cellgroup:
+            PI0 = self.group_stack(self.PI0, index)
+            K.append(PI0.swapaxes(-1, -2)@H[index]@PI0)
 
-        I = np.concatenate(list(map(f2, cd)))
-        J = np.concatenate(list(map(f3, cd)))
-        val = np.concatenate(list(map(f4, K)))
-        gdof = self.number_of_global_dofs()
-        M = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
+        assembler = self.global_assembler()
+        M = assembler.assemble(K)
         return M
 
     def source_vector(self, f):
@@ -377,44 +688,22 @@ class ConformingVirtualElementSpace2d():
         return b
 
     def chen_stability_term(self):
-        area = self.smspace.cellmeasure
-
-        p = self.p
-        G = self.G
-        D = self.D
-        PI1 = self.PI1
-
-        cell2dof, cell2dofLocation = self.cell_to_dof()
-        NC = len(cell2dofLocation) - 1
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-        DD = np.vsplit(D, cell2dofLocation[1:-1])
-
         tG = np.array([(0, 0, 0), (0, 1, 0), (0, 0, 1)])
-        def f1(x):
-            M = np.eye(x[1].shape[1])
-            M -= x[0]@x[1]
-            N = x[1].shape[1]
-            A = np.zeros((N, N))
-            idx = np.arange(N)
-            A[idx, idx] = 2
-            A[idx[:-1], idx[1:]] = -1
-            A[idx[1:], idx[:-1]] = -1
-            A[0, -1] = -1
-            A[-1, 0] = -1
-            return x[1].T@tG@x[1],  M.T@A@M
-        K = list(map(f1, zip(DD, PI1)))
-        f2 = lambda x: np.repeat(x, x.shape[0])
-        f3 = lambda x: np.tile(x, x.shape[0])
-        f4 = lambda x: x[0].flatten()
-        f5 = lambda x: x[1].flatten()
-
-        I = np.concatenate(list(map(f2, cd)))
-        J = np.concatenate(list(map(f3, cd)))
-        val0 = np.concatenate(list(map(f4, K)))
-        val1 = np.concatenate(list(map(f5, K)))
-        gdof = self.number_of_global_dofs()
-        A = csr_matrix((val0, (I, J)), shape=(gdof, gdof), dtype=np.float)
-        S = csr_matrix((val1, (I, J)), shape=(gdof, gdof), dtype=np.float)
+        K0 = []
+        K1 = []
+        for index, location in self.cellgroup:
+            D = self.D[location]
+            PI1 = self.group_stack(self.PI1, index)
+            ldof = PI1.shape[-1]
+            M = np.eye(ldof) - D@PI1
+            A = 2*np.eye(ldof) - np.roll(np.eye(ldof), 1, axis=1) \
+                    - np.roll(np.eye(ldof), -1, axis=1)
+            K0.append(PI1.swapaxes(-1, -2)@tG@PI1)
+            K1.append(M.swapaxes(-1, -2)@A@M)
+
+        assembler = self.global_assembler()
+        A = assembler.assemble(K0)
+        S = assembler.assemble(K1)
         return A, S
 
     def cell_to_dof(self):
@@ -615,18 +904,14 @@ class ConformingVirtualElementSpace2d():
 
             NV = mesh.number_of_vertices_of_cells()
 
-            val = np.einsum('i, ijmk, jk->mji', ws, gphi0, nm, optimize=True)
-            idx = cell2dofLocation[edge2cell[:, [0]]] + \
-                    (edge2cell[:, [2]]*p + np.arange(p+1))%(NV[edge2cell[:, [0]]]*p)
-            np.add.at(B, (np.s_[:], idx), val)
-
+            val = np.einsum('i, ijmk, jk->jmi', ws, gphi0, nm, optimize=True)
+            edge_to_cell_add(B, val, edge2cell[:, 0], edge2cell[:, 2],
+                    cell2dofLocation, NV, p)
 
             if isInEdge.sum() > 0:
-                val = np.einsum('i, ijmk, jk->mji', ws, gphi1, -nm[isInEdge], optimize=True)
-                idx = cell2dofLocation[edge2cell[isInEdge, 1]].reshape(-1, 1) + \
-                        (edge2cell[isInEdge, 3].reshape(-1, 1)*p + np.arange(p+1)) \
-                        %(NV[edge2cell[isInEdge, 1]].reshape(-1, 1)*p)
-                np.add.at(B, (np.s_[:], idx), val)
+                val = np.einsum('i, ijmk, jk->jmi', ws, gphi1, -nm[isInEdge], optimize=True)
+                edge_to_cell_add(B, val, edge2cell[isInEdge, 1], edge2cell[isInEdge, 3],
+                        cell2dofLocation, NV, p)
             return B
 
     def matrix_G(self, B, D):
@@ -634,44 +919,40 @@ class ConformingVirtualElementSpace2d():
         if p == 1:
             G = np.array([(1, 0, 0), (0, 1, 0), (0, 0, 1)])
         else:
-            cell2dof, cell2dofLocation = self.cell_to_dof()
-            BB = np.hsplit(B, cell2dofLocation[1:-1])
-            DD = np.vsplit(D, cell2dofLocation[1:-1])
-            g = lambda x: x[0]@x[1]
-            G = list(map(g, zip(BB, DD)))
+            G = self.group_split([B[:, location].swapaxes(0, 1)@D[location]
+                for index, location in self.cellgroup])
         return G
 
     def matrix_C(self, H, PI1):
         p = self.p
-
-        smldof = self.smspace.number_of_local_dofs()
         idof = (p-1)*p//2
+        area = self.smspace.cellmeasure
 
-        mesh = self.mesh
-        NV = mesh.number_of_vertices_of_cells()
-        d = lambda x: x[0]@x[1]
-        C = list(map(d, zip(H, PI1)))
-        if p == 1:
-            return C
-        else:
-            l = lambda x: np.r_[
-                    '0',
-                    np.r_['1', np.zeros((idof, p*x[0])), x[1]*np.eye(idof)],
-                    x[2][idof:, :]]
-            return list(map(l, zip(NV, self.smspace.cellmeasure, C)))
+        C = []
+        for index, location in self.cellgroup:
+            HPI1 = H[index]@self.group_stack(PI1, index)
+            if p == 1:
+                C.append(HPI1)
+            else:
+                c = np.zeros_like(HPI1)
+                ldof = c.shape[-1]
+                c[:, :idof, ldof-idof:] = area[index].reshape(-1, 1, 1)*np.eye(idof)
+                c[:, idof:, :] = HPI1[:, idof:, :]
+                C.append(c)
+        return self.group_split(C)
 
     def matrix_PI_0(self, H, C):
-        cell2dof, cell2dofLocation = self.cell_to_dof()
-        pi0 = lambda x: inv(x[0])@x[1]
-        return list(map(pi0, zip(H, C)))
+        PI0 = [np.linalg.solve(H[index], self.group_stack(C, index))
+                for index, location in self.cellgroup]
+        return self.group_split(PI0)
 
     def matrix_PI_1(self, G, B):
         p = self.p
-        cell2dof, cell2dofLocation = self.cell_to_dof()
         if p == 1:
-            return np.hsplit(B, cell2dofLocation[1:-1])
+            cell2dof, cell2dofLocation = self.cell_to_dof()
+            return CellMatrixList(B, cell2dofLocation)
         else:
-            BB = np.hsplit(B, cell2dofLocation[1:-1])
-            g = lambda x: inv(x[0])@x[1]
-            return list(map(g, zip(G, BB)))
-
+            PI1 = [np.linalg.solve(self.group_stack(G, index),
+                B[:, location].swapaxes(0, 1))
+                for index, location in self.cellgroup]
+            return self.group_split(PI1)
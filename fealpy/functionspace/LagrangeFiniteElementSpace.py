@@ -1,8 +1,14 @@
 import numpy as np
+from collections import OrderedDict
+from operator import methodcaller
 from scipy.sparse import coo_matrix, csr_matrix, csc_matrix, spdiags, bmat
 from scipy.sparse.linalg import spsolve
 
 from .function import Function
+from .tabulation import ReferenceBasisCache
+from .assembler import CSRAssembler, cell_blocks
+from .matrixfree import CellOperator
+from .parallel_assembly import cell_kernel_map
 
 from .femdof import multi_index_matrix1d
 from .femdof import multi_index_matrix2d
@@ -10,37 +16,104 @@ from .femdof import multi_index_matrix3d
 
 from .femdof import CPLFEMDof1d, CPLFEMDof2d, CPLFEMDof3d
 from .femdof import DPLFEMDof1d, DPLFEMDof2d, DPLFEMDof3d
+from .femdof import DofUpdate
 
 from ..quadrature import FEMeshIntegralAlg
 
 
+class CellKernel():
+    """
+    Compute the cell-wise data `method(**kwargs)` of a Lagrange space on a
+    chunk of cells, which is the kernel of `cell_kernel_map` in the worker
+    processes.
+
+    The element data only depend on the geometry of the cells, so the mesh
+    and the space are not built for every chunk. Every process keeps one
+    space on a single cell, whose node, cell and `cell2dof` arrays are
+    replaced by the shared arrays and the slices of the chunk during the
+    call, the topology of the mesh is left empty.
+    """
+    spaces = {}
+
+    def __init__(self, space, method, **kwargs):
+        self.meshclass = type(space.mesh)
+        self.p = space.p
+        self.spacetype = space.spacetype
+        self.q = space.q
+        self.method = method
+        self.kwargs = kwargs
+
+    def chunk_space(self, arrays, start, end):
+        key = (self.meshclass, self.p, self.spacetype, self.q)
+        space = self.spaces.get(key)
+        if space is None:
+            cell = arrays['cell'][start:start+1]
+            mesh = self.meshclass(arrays['node'][cell[0]],
+                    np.arange(cell.shape[1], dtype=cell.dtype).reshape(1, -1))
+            space = LagrangeFiniteElementSpace(mesh, p=self.p,
+                    spacetype=self.spacetype, q=self.q)
+            self.spaces[key] = space
+
+        mesh = space.mesh
+        cell = arrays['cell'][start:end]
+        mesh.node = arrays['node']
+        mesh.ds.NN = len(mesh.node)
+        mesh.ds.NC = len(cell)
+        mesh.ds.cell = cell
+        if hasattr(mesh.ds, 'clear'):
+            mesh.ds.clear()
+        space.dof.cell2dof = arrays['cell2dof'][start:end]
+        space.cellmeasure = mesh.entity_measure('cell')
+        space.integralalg.cellmeasure = space.cellmeasure
+        return space
+
+    def __call__(self, arrays, start, end):
+        space = self.chunk_space(arrays, start, end)
+        try:
+            return getattr(space, self.method)(**self.kwargs)
+        finally:
+            # do not hold the shared memory after the chunk
+            space.mesh.node = None
+            space.mesh.ds.cell = None
+            space.dof.cell2dof = None
+            space.cellmeasure = None
+            space.integralalg.cellmeasure = None
+
+
 class LagrangeFiniteElementSpace():
-    def __init__(self, mesh, p=1, spacetype='C', q=None):
+    def __init__(self, mesh, p=1, spacetype='C', q=None, itype=None):
+        """
+        `itype` is the integer type of the dof index arrays, by default it is
+        int32 when the number of global dofs allows, see `femdof.index_type`.
+        For the continuous space with `p = 1` the `cell2dof` is the cell array
+        of the mesh, so the index type is the one of the mesh and `itype` is
+        not used.
+        """
         self.mesh = mesh
         self.cellmeasure = mesh.entity_measure('cell')
         self.p = p
         if spacetype == 'C':
             if mesh.meshtype == 'interval':
-                self.dof = CPLFEMDof1d(mesh, p)
+                self.dof = CPLFEMDof1d(mesh, p, itype=itype)
                 self.TD = 1
             elif mesh.meshtype == 'tri':
-                self.dof = CPLFEMDof2d(mesh, p)
+                self.dof = CPLFEMDof2d(mesh, p, itype=itype)
                 self.TD = 2
             elif mesh.meshtype == 'stri':
-                self.dof = CPLFEMDof2d(mesh, p)
+                self.dof = CPLFEMDof2d(mesh, p, itype=itype)
                 self.TD = 2
             elif mesh.meshtype == 'tet':
-                self.dof = CPLFEMDof3d(mesh, p)
+                self.dof = CPLFEMDof3d(mesh, p, itype=itype)
                 self.TD = 3
         elif spacetype == 'D':
             if mesh.meshtype == 'interval':
-                self.dof = DPLFEMDof1d(mesh, p)
+                self.dof = DPLFEMDof1d(mesh, p, itype=itype)
                 self.TD = 1
             elif mesh.meshtype == 'tri':
-                self.dof = DPLFEMDof2d(mesh, p)
+                self.dof = DPLFEMDof2d(mesh, p, itype=itype)
                 self.TD = 2
             elif mesh.meshtype == 'tet':
-                self.dof = DPLFEMDof3d(mesh, p)
+                self.dof = DPLFEMDof3d(mesh, p, itype=itype)
                 self.TD = 3
 
         if len(mesh.node.shape) == 1:
@@ -49,16 +122,19 @@ class LagrangeFiniteElementSpace():
             self.GD = mesh.node.shape[1]
 
         self.spacetype = spacetype
-        self.itype = mesh.itype
+        self.itype = self.dof.itype
         self.ftype = mesh.ftype
 
         q = q if q is not None else p+3
+        self.q = q
         self.integralalg = FEMeshIntegralAlg(
                 self.mesh, q,
                 cellmeasure=self.cellmeasure)
         self.integrator = self.integralalg.integrator
 
         self.multi_index_matrix = [multi_index_matrix1d, multi_index_matrix2d, multi_index_matrix3d]
+        self.basiscache = ReferenceBasisCache(mesh)
+        self.assembler = None
 
     def __str__(self):
         return "Lagrange finite element space!"
@@ -82,6 +158,173 @@ class LagrangeFiniteElementSpace():
     def edge_to_dof(self, index=None):
         return self.dof.edge_to_dof()
 
+    def global_assembler(self):
+        """
+        Get the assembler with the precomputed CSR sparsity pattern of the
+        global matrices, it is rebuilt when `cell2dof` changes.
+        """
+        cell2dof = self.dof.cell2dof
+        if (self.assembler is None) or (self.assembler.cell2dof is not cell2dof):
+            gdof = self.number_of_global_dofs()
+            self.assembler = CSRAssembler(cell2dof, gdof)
+        return self.assembler
+
+    def refine_update(self, record):
+        """
+        Update the space in place after the mesh is refined by
+        `mesh.bisect(..., returnrecord=True)`.
+
+        The dofs of the unchanged cells are mapped to the old ones, the other
+        dofs are interpolated on the parent cells, so the prolongation is
+        exact for any degree `p`.
+
+        Parameters
+        ----------
+        record : RefinementRecord
+
+        Returns
+        -------
+        update : DofUpdate
+
+        Notes
+        -----
+        For `p = 1` the `cell2dof` of the continuous space is the cell array
+        of the mesh itself (not a copy with the dof index type), which the
+        bisection may have changed in place, so the old dofs of the refined
+        cells are taken from the snapshot `record.oldcell` and the old array
+        is not read. For `p > 1` it is renumbered by the dof manager with the
+        updated mesh topology.
+        """
+        p = self.p
+        mesh = self.mesh
+        TD = self.TD
+        NC0 = record.NC0
+        NN0 = record.NN0
+        isChangedCell = record.isChangedCell
+        dirtyCell = record.dirty_cell()
+
+        isNodalDof = (self.spacetype == 'C') and (p == 1)
+        if isNodalDof:
+            # the dofs are the nodes, the old nodes keep their index
+            gdof0 = NN0
+            oldcell2dof = record.oldcell
+        else:
+            cell2dof0 = self.dof.cell2dof
+            gdof0 = cell2dof0.max() + 1
+            oldcell2dof = cell2dof0[record.changedCell]
+
+        cell2dof = self.dof.cell_to_dof()
+        self.dof.cell2dof = cell2dof
+        gdof = self.number_of_global_dofs()
+        ldof = self.number_of_local_dofs()
+
+        new2old = np.full(gdof, -1, dtype=np.int_)
+        if not isNodalDof:
+            keep, = np.nonzero(~isChangedCell[:NC0])
+            new2old[cell2dof[keep]] = cell2dof0[keep]
+        if self.spacetype == 'C':
+            new2old[:NN0] = np.arange(NN0)
+
+        # the other dofs are interpolated on the parent cells
+        isNewDof = new2old < 0
+        flag = isNewDof[cell2dof[dirtyCell]]
+        cidx, lidx = np.nonzero(flag)
+        dof, k = np.unique(cell2dof[dirtyCell[cidx], lidx], return_index=True)
+        cidx = dirtyCell[cidx[k]]
+        lidx = lidx[k]
+        if p == 0:
+            bc = np.full((len(cidx), TD+1), 1/(TD+1), dtype=self.ftype)
+        else:
+            bc = self.dof.multiIndex[lidx]/p
+
+        node = mesh.entity('node')
+        cell = mesh.entity('cell')
+        pidx = record.parent_index(cidx)
+        ps = np.einsum('ij, ijm->im', bc, node[cell[cidx]])
+        # the barycentric coordinates of the points on the parent cells
+        A = np.ones((len(cidx), TD+1, TD+1), dtype=self.ftype)
+        A[:, :-1, :] = node[record.oldcell[pidx]].swapaxes(-1, -2)
+        b = np.ones((len(cidx), TD+1, 1), dtype=self.ftype)
+        b[:, :-1, 0] = ps
+        bc0 = np.linalg.solve(A, b)[..., 0]
+        phi = self.reference_basis(bc0)
+        phi[np.abs(phi) < 1e-12] = 0 # the rounding errors of the zeros
+
+        isOldDof = ~isNewDof
+        I = np.r_[np.nonzero(isOldDof)[0], np.repeat(dof, ldof)]
+        J = np.r_[new2old[isOldDof], oldcell2dof[pidx].flat]
+        val = np.r_[np.ones(isOldDof.sum(), dtype=self.ftype), phi.flat]
+        P = csr_matrix((val, (I, J)), shape=(gdof, gdof0))
+        P.eliminate_zeros()
+
+        NC = mesh.number_of_cells()
+        cellmeasure = np.zeros(NC, dtype=self.ftype)
+        cellmeasure[:NC0] = self.cellmeasure[:NC0]
+        cellmeasure[dirtyCell] = mesh.entity_measure('cell', index=dirtyCell)
+        self.cellmeasure = cellmeasure
+        self.integralalg.cellmeasure = cellmeasure
+        self.assembler = None
+
+        return DofUpdate(gdof0, new2old, P, dirtyCell, oldcell2dof, record)
+
+    def cell_map(self, method, workers=None, **kwargs):
+        """
+        The cell-wise data `getattr(self, method)(**kwargs)`, e.g. the
+        element matrices, computed by `workers` processes in parallel.
+
+        The node, the cell and the `cell2dof` arrays are shared with the
+        workers by the shared memory, every worker computes the data of a
+        chunk of cells on the slices of them, see `CellKernel`. When the
+        arguments can not be pickled, e.g. a lambda `cfun`, the data are
+        computed in the current process, see `cell_kernel_map`.
+        """
+        if (workers is None) or (workers <= 1):
+            return getattr(self, method)(**kwargs)
+
+        mesh = self.mesh
+        arrays = {'node': mesh.entity('node'), 'cell': mesh.entity('cell'),
+                'cell2dof': self.dof.cell2dof}
+        kernel = CellKernel(self, method, **kwargs)
+        return cell_kernel_map(kernel, arrays, mesh.number_of_cells(),
+                workers=workers)
+
+    def cell_blocks(self, blocksize=None):
+        """
+        The slices of the blocks of cells for the assembly, see
+        `assembler.cell_blocks`. By default the block size is chosen from
+        the available memory and the estimated size of the temporaries of
+        one cell, i.e. the basis gradients at the quadrature points.
+        """
+        NC = self.mesh.number_of_cells()
+        NQ = len(self.integrator.get_quadrature_points_and_weights()[1])
+        ldof = self.number_of_local_dofs()
+        itemsize = np.dtype(self.ftype).itemsize
+        nbytes = 4*NQ*ldof*(self.GD + 1)*itemsize + 2*ldof*ldof*itemsize
+        return cell_blocks(NC, nbytes, blocksize=blocksize)
+
+    def assemble_cell_matrix(self, method, out=None, workers=None,
+            blocksize=None, **kwargs):
+        """
+        Assemble the element matrices `getattr(self, method)(**kwargs)` into
+        the global CSR matrix.
+
+        With `workers > 1` the element matrices of all the cells are computed
+        in parallel by `cell_map`. Otherwise they are computed block by
+        block of `blocksize` cells and added into the CSR data array at
+        once, so the peak memory is bounded by the temporaries of one block
+        besides the global matrix.
+        """
+        assembler = self.global_assembler()
+        if (workers is not None) and (workers > 1):
+            A = self.cell_map(method, workers=workers, **kwargs)
+            return assembler.assemble(A, symmetric=(A.ndim == 2), out=out)
+
+        data = np.zeros(assembler.number_of_nonzeros(), dtype=self.ftype)
+        for index in self.cell_blocks(blocksize=blocksize):
+            A = getattr(self, method)(index=index, **kwargs)
+            assembler.add(data, A, index=index, symmetric=(A.ndim == 2))
+        return assembler.tocsr(data, out=out)
+
     def boundary_dof(self, threshold=None):
         if self.spacetype == 'C':
             return self.dof.boundary_dof(threshold=threshold)
@@ -215,38 +458,7 @@ class LagrangeFiniteElementSpace():
             bcs[idx, ..., nmap[lidx]] = bc[..., 1]
             bcs[idx, ..., pmap[lidx]] = bc[..., 0]
 
-        p = self.p   # the degree of polynomial basis function
-        TD = self.TD
-
-        multiIndex = self.dof.multiIndex
-
-        c = np.arange(1, p+1, dtype=self.itype)
-        P = 1.0/np.multiply.accumulate(c)
-
-        t = np.arange(0, p)
-        shape = bcs.shape[:-1]+(p+1, TD+1)
-        A = np.ones(shape, dtype=self.ftype)
-        A[..., 1:, :] = p*bcs[..., np.newaxis, :] - t.reshape(-1, 1)
-
-        FF = np.einsum('...jk, m->...kjm', A[..., 1:, :], np.ones(p))
-        FF[..., range(p), range(p)] = p
-        np.cumprod(FF, axis=-2, out=FF)
-        F = np.zeros(shape, dtype=self.ftype)
-        F[..., 1:, :] = np.sum(np.tril(FF), axis=-1).swapaxes(-1, -2)
-        F[..., 1:, :] *= P.reshape(-1, 1)
-
-        np.cumprod(A, axis=-2, out=A)
-        A[..., 1:, :] *= P.reshape(-1, 1)
-
-        Q = A[..., multiIndex, range(TD+1)]
-        M = F[..., multiIndex, range(TD+1)]
-        ldof = self.number_of_local_dofs()
-        shape = bcs.shape[:-1]+(ldof, TD+1)
-        R = np.zeros(shape, dtype=self.ftype)
-        for i in range(TD+1):
-            idx = list(range(TD+1))
-            idx.remove(i)
-            R[..., i] = M[..., i]*np.prod(Q[..., idx], axis=-1)
+        R = self.reference_grad_basis(bcs)
 
         Dlambda = self.mesh.grad_lambda()
         gphi = np.einsum('k...ij, kjm->k...im', R, Dlambda[index, :, :])
@@ -298,6 +510,15 @@ class LagrangeFiniteElementSpace():
             else:
                 return np.ones((bc.shape[0], 1), dtype=self.ftype)
 
+        phi = self.basiscache.get(bc, (p, self.TD, 0), self.reference_basis)
+        return phi[..., np.newaxis, :] # (..., 1, ldof)
+
+    def reference_basis(self, bc):
+        """
+        compute the basis function values at barycentric point bc on the
+        reference element, the shape of the return is `(..., ldof)`.
+        """
+        p = self.p
         TD = self.TD
         multiIndex = self.dof.multiIndex
 
@@ -311,7 +532,7 @@ class LagrangeFiniteElementSpace():
         A[..., 1:, :] *= P.reshape(-1, 1)
         idx = np.arange(TD+1)
         phi = np.prod(A[..., multiIndex, idx], axis=-1)
-        return phi[..., np.newaxis, :] # (..., 1, ldof)
+        return phi
 
     def grad_basis(self, bc, index=None):
         """
@@ -334,6 +555,22 @@ class LagrangeFiniteElementSpace():
         Notes
         -----
 
+        """
+        p = self.p   # the degree of polynomial basis function
+        R = self.basiscache.get(bc, (p, self.TD, 1), self.reference_grad_basis)
+
+        if index is None:
+            Dlambda = self.mesh.grad_lambda()
+        else:
+            Dlambda = self.mesh.grad_lambda(index=index)
+        gphi = np.einsum('...ij, kjm->...kim', R, Dlambda)
+        return gphi #(..., NC, ldof, GD)
+
+    def reference_grad_basis(self, bc):
+        """
+        compute the derivatives of the basis functions with respect to the
+        barycentric coordinates at bc, the shape of the return is
+        `(..., ldof, TD+1)`.
         """
         p = self.p   # the degree of polynomial basis function
         TD = self.TD
@@ -368,10 +605,7 @@ class LagrangeFiniteElementSpace():
             idx.remove(i)
             R[..., i] = M[..., i]*np.prod(Q[..., idx], axis=-1)
 
-        Dlambda = self.mesh.grad_lambda()
-        index = index if index is not None else np.s_[:]
-        gphi = np.einsum('...ij, kjm->...kim', R, Dlambda[index, :, :])
-        return gphi #(..., NC, ldof, GD)
+        return R
 
     def value(self, uh, bc, index=None):
         phi = self.basis(bc)
@@ -407,6 +641,130 @@ class LagrangeFiniteElementSpace():
         uI = u(ipoint)
         return self.function(dim=dim, array=uI)
 
+    def interpolate_from(self, uh, nearest=True):
+        """
+        Interpolate a finite element function `uh` of another Lagrange space,
+        e.g. on an independently generated mesh of the same domain, into
+        this space.
+
+        The interpolation points of this space are located in the mesh of
+        `uh` at once by `mesh.location`, and `uh` is evaluated there.
+
+        Parameters
+        ----------
+        uh : Function
+            a function of a Lagrange space on a triangle or a tetrahedron mesh
+        nearest : bool
+            the points outside the other mesh take the values of `uh` on the
+            nearby boundary cells when it is True, otherwise they are NaN
+
+        Returns
+        -------
+        uI : Function
+        """
+        ipoint = self.interpolation_points()
+        uI = self.function(dim=uh.shape[1:] if uh.ndim > 1 else None)
+        uI[:] = uh.space.value_at_points(uh, ipoint, nearest=nearest,
+                cache=False)
+        return uI
+
+    def point_location(self, points, nearest=False, cache=True, maxsize=8):
+        """
+        Locate the points in the mesh by `mesh.location`.
+
+        The results of the last `maxsize` point sets are cached in the
+        connectivity cache of the mesh with the node and the cell arrays,
+        see `ConnectivityCache.get_geometric`, so they are cleared when the
+        mesh is refined or the node array is replaced, and the same points,
+        e.g. the probes of a time dependent problem, are located only once.
+        The nodes moved in place are not detected, then use `cache=False`.
+
+        Returns
+        -------
+        cidx : numpy.ndarray
+            the cells containing the points, -1 for the points outside
+        bc : numpy.ndarray
+            the barycentric coordinates of the points in the cells
+        """
+        mesh = self.mesh
+        points = np.ascontiguousarray(points, dtype=self.ftype)
+        if not cache:
+            return mesh.location(points, nearest=nearest)
+
+        table = mesh.ds.conncache.get_geometric('point_location',
+                ('point_location', ), mesh.entity('node'), mesh.entity('cell'),
+                OrderedDict)
+        key = (nearest, points.shape, points.tobytes())
+        if key in table:
+            table.move_to_end(key)
+            return table[key]
+        val = mesh.location(points, nearest=nearest)
+        for a in val:
+            a.setflags(write=False)
+        table[key] = val
+        if len(table) > maxsize:
+            table.popitem(last=False)
+        return val
+
+    def value_at_points(self, uh, points, nearest=False, cache=True):
+        """
+        Evaluate `uh` at the points, only on the cells containing them.
+
+        Parameters
+        ----------
+        uh : numpy.ndarray
+            with shape `(gdof, ...)`
+        points : numpy.ndarray
+            with shape `(NP, GD)`
+        nearest : bool
+            see `mesh.location`, the values at the points outside the mesh
+            are NaN when it is False
+        cache : bool
+            cache the location of the points, see `point_location`
+
+        Returns
+        -------
+        val : numpy.ndarray
+            with shape `(NP, ...)`
+        """
+        cidx, bc = self.point_location(points, nearest=nearest, cache=cache)
+        isIn = cidx >= 0
+        if self.p == 0:
+            phi = np.ones((isIn.sum(), 1), dtype=self.ftype)
+        else:
+            # the points are different, so the tables are not cached
+            phi = self.reference_basis(bc[isIn])
+        cell2dof = self.cell_to_dof()
+
+        val = np.full((len(cidx), ) + uh.shape[1:], np.nan, dtype=self.ftype)
+        val[isIn] = np.einsum('ij, ij...->i...', phi,
+                np.asarray(uh)[cell2dof[cidx[isIn]]])
+        return val
+
+    def grad_value_at_points(self, uh, points, nearest=False, cache=True):
+        """
+        Evaluate the gradient of `uh` at the points, see `value_at_points`.
+
+        Returns
+        -------
+        val : numpy.ndarray
+            with shape `(NP, ..., GD)`
+        """
+        cidx, bc = self.point_location(points, nearest=nearest, cache=cache)
+        isIn = cidx >= 0
+        index = cidx[isIn]
+        R = self.reference_grad_basis(bc[isIn]) # (NP, ldof, TD+1)
+        Dlambda = self.mesh.grad_lambda(index=index) # (NP, TD+1, GD)
+        gphi = np.einsum('ijk, ikm->ijm', R, Dlambda)
+        cell2dof = self.cell_to_dof()
+
+        GD = self.GD
+        val = np.full((len(cidx), ) + uh.shape[1:] + (GD, ), np.nan,
+                dtype=self.ftype)
+        val[isIn] = np.einsum('ijm, ij...->i...m', gphi,
+                np.asarray(uh)[cell2dof[index]])
+        return val
+
     def projection(self, u):
         """
         """
@@ -458,30 +816,49 @@ class LagrangeFiniteElementSpace():
             np.add.at(d, cell, 1/cellmeasure.reshape(-1, 1))
             D = spdiags(1/d, 0, NN, NN)
 
-        I = np.einsum('k, ij->ijk', np.ones(GD+1), cell)
+        I = np.broadcast_to(cell[:, :, None], shape=cell.shape + (GD+1, ))
         J = I.swapaxes(-1, -2)
         for i in range(GD):
             val = np.einsum('k, ij->ikj', np.ones(GD+1), gphi[:, :, i])
             G.append(D@csc_matrix((val.flat, (I.flat, J.flat)), shape=(NN, NN)))
         return G
 
-    def linear_elasticity_matrix(self, mu, lam, format='csr'):
+    def cell_grad_component_matrix(self, index=None):
         """
-        construct the linear elasticity fem matrix
+        The element matrices of the integrals of `d_i phi_m * d_j phi_n`
+        for `i <= j` with shape `(NC, GD*(GD+1)//2, ldof, ldof)`, the pairs
+        `(i, j)` are in the order of `np.triu_indices(GD)`. Only the cells
+        `index` are computed when it is not None.
         """
         cellmeasure = self.cellmeasure
-        cell2dof = self.cell_to_dof()
-        GD = self.GD
-
-        qf = self.integrator
-        bcs, ws = qf.get_quadrature_points_and_weights()
-        grad = self.grad_basis(bcs)
+        if index is not None:
+            cellmeasure = cellmeasure[index]
+        bcs, ws = self.integrator.get_quadrature_points_and_weights()
+        grad = self.grad_basis(bcs, index=index)
+        i, j = np.triu_indices(self.GD)
+        return np.einsum('q, qcmk, qcnk, c->ckmn', ws, grad[..., i],
+                grad[..., j], cellmeasure, optimize=True)
 
-        ldof = self.number_of_local_dofs()
+    def linear_elasticity_matrix(self, mu, lam, format='csr', workers=None,
+            blocksize=None):
+        """
+        construct the linear elasticity fem matrix
+        """
+        GD = self.GD
         gdof = self.number_of_global_dofs()
 
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-        J = I.swapaxes(-1, -2)
+        assembler = self.global_assembler()
+        nnz = assembler.number_of_nonzeros()
+        data = np.zeros((GD*(GD+1)//2, nnz), dtype=self.ftype)
+        if (workers is not None) and (workers > 1):
+            Ac = self.cell_map('cell_grad_component_matrix', workers=workers)
+            for k in range(len(data)):
+                assembler.add(data[k], Ac[:, k])
+        else:
+            for index in self.cell_blocks(blocksize=blocksize):
+                Ac = self.cell_grad_component_matrix(index=index)
+                for k in range(len(data)):
+                    assembler.add(data[k], Ac[:, k], index=index)
 
         if GD == 2:
             idx = [(0, 0), (0, 1),  (1, 1)]
@@ -491,8 +868,7 @@ class LagrangeFiniteElementSpace():
             imap = {(0, 0):0, (0, 1):1, (0, 2):2, (1, 1):3, (1, 2):4, (2, 2):5}
         A = []
         for k, (i, j) in enumerate(idx):
-            Aij = np.einsum('i, ijm, ijn, j->jmn', ws, grad[..., i], grad[..., j], cellmeasure)
-            A.append(csr_matrix((Aij.flat, (I.flat, J.flat)), shape=(gdof, gdof)))
+            A.append(assembler.tocsr(data[k]))
 
         T = csr_matrix((gdof, gdof), dtype=self.ftype)
         D = csr_matrix((gdof, gdof), dtype=self.ftype)
@@ -534,7 +910,7 @@ class LagrangeFiniteElementSpace():
         ldof = self.number_of_local_dofs()
         gdof = self.number_of_global_dofs()
 
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
 
         if GD == 2:
@@ -568,18 +944,33 @@ class LagrangeFiniteElementSpace():
         elif format == 'list':
             return C
 
-    def stiff_matrix(self, cfun=None):
+    def stiff_matrix(self, cfun=None, out=None, workers=None, blocksize=None):
+        return self.assemble_cell_matrix('cell_stiff_matrix', out=out,
+                workers=workers, blocksize=blocksize, cfun=cfun)
+
+    def cell_stiff_matrix(self, cfun=None, index=None):
+        """
+        The element stiffness matrices, only the upper triangle entries with
+        shape `(NC, ldof*(ldof+1)//2)` are computed for the symmetric ones,
+        otherwise the shape is `(NC, ldof, ldof)`. Only the cells `index`
+        are computed when it is not None.
+        """
         p = self.p
         GD = self.geo_dimension()
 
         if p == 0:
             raise ValueError('The space order is 0!')
 
+        cellmeasure = self.cellmeasure
+        if index is not None:
+            cellmeasure = cellmeasure[index]
+
         bcs, ws = self.integrator.get_quadrature_points_and_weights()
-        gphi = self.grad_basis(bcs)
+        gphi = self.grad_basis(bcs, index=index)
 
+        symmetric = True
         if cfun is not None:
-            ps = self.mesh.bc_to_point(bcs)
+            ps = self.mesh.bc_to_point(bcs, index=index)
             d = cfun(ps)
 
             if isinstance(d, (int, float)):
@@ -592,8 +983,10 @@ class LagrangeFiniteElementSpace():
                 elif len(d.shape) == 2:
                     dgphi = np.einsum('...i, ...imn->...imn', d, gphi)
                 elif len(d.shape) == 3: #TODO:
+                    symmetric = False
                     dgphi = np.einsum('...imn, ...in->...im', d, gphi)
                 elif len(d.shape) == 4: #TODO:
+                    symmetric = False
                     dgphi = np.einsum('...imn, ...in->...im', d, gphi)
                 else:
                     raise ValueError("The ndarray shape length should < 5!")
@@ -607,20 +1000,25 @@ class LagrangeFiniteElementSpace():
         # Compute the element sitffness matrix
         # ws:(NQ,)
         # dgphi: (NQ, NC, ldof, GD)
-        A = np.einsum('i, ijkm, ijpm, j->jkp',
-                ws, dgphi, gphi, self.cellmeasure,
-                optimize=True)
-        cell2dof = self.cell_to_dof()
-        ldof = self.number_of_local_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-        J = I.swapaxes(-1, -2)
-        gdof = self.number_of_global_dofs()
-
-        # Construct the stiffness matrix
-        A = csr_matrix((A.flat, (I.flat, J.flat)), shape=(gdof, gdof))
+        if symmetric:
+            # only the upper triangle entries of the element matrix
+            ldof = self.number_of_local_dofs()
+            NC = len(cellmeasure)
+            A = np.zeros((NC, ldof*(ldof+1)//2), dtype=self.ftype)
+            start = 0
+            for i in range(ldof):
+                A[:, start:start+ldof-i] = np.einsum('i, ijm, ijpm, j->jp',
+                        ws, dgphi[..., i, :], gphi[..., i:, :],
+                        cellmeasure, optimize=True)
+                start += ldof - i
+        else:
+            A = np.einsum('i, ijkm, ijpm, j->jkp',
+                    ws, dgphi, gphi, cellmeasure,
+                    optimize=True)
         return A
 
-    def mass_matrix(self, cfun=None, barycenter=False):
+    def mass_matrix(self, cfun=None, barycenter=False, out=None, workers=None,
+            blocksize=None):
         p = self.p
         mesh = self.mesh
         cellmeasure = self.cellmeasure
@@ -630,6 +1028,25 @@ class LagrangeFiniteElementSpace():
             M = spdiags(cellmeasure, 0, NC, NC)
             return M
 
+        if (barycenter is True) and (cfun is not None):
+            # `cfun` gives the values on all the cells
+            workers = None
+            blocksize = mesh.number_of_cells()
+        return self.assemble_cell_matrix('cell_mass_matrix', out=out,
+                workers=workers, blocksize=blocksize, cfun=cfun,
+                barycenter=barycenter)
+
+    def cell_mass_matrix(self, cfun=None, barycenter=False, index=None):
+        """
+        The upper triangle entries of the element mass matrices with shape
+        `(NC, ldof*(ldof+1)//2)`. Only the cells `index` are computed when
+        it is not None.
+        """
+        mesh = self.mesh
+        cellmeasure = self.cellmeasure
+        if index is not None:
+            cellmeasure = cellmeasure[index]
+
         # bcs: (NQ, TD+1)
         # ws: (NQ, )
         bcs, ws = self.integrator.get_quadrature_points_and_weights()
@@ -639,8 +1056,10 @@ class LagrangeFiniteElementSpace():
         if cfun is not None:
             if barycenter is True:
                 d = cfun(bcs) # (NQ, NC)
+                if index is not None:
+                    d = d[..., index]
             else:
-                ps = self.mesh.bc_to_point(bcs) # (NQ, NC, GD)
+                ps = self.mesh.bc_to_point(bcs, index=index) # (NQ, NC, GD)
                 d = cfun(ps) # (NQ, NC)
 
             if isinstance(d, (int, float)):
@@ -658,50 +1077,269 @@ class LagrangeFiniteElementSpace():
                         )
         else:
             dphi = phi
-        M = np.einsum(
-                'm, mij, mik, i->ijk',
-                ws, dphi, phi, self.cellmeasure,
-                optimize=True)
 
-        cell2dof = self.cell_to_dof()
+        # only the upper triangle entries of the element matrix
         ldof = self.number_of_local_dofs()
-        I = np.einsum('ij, k->ijk',  cell2dof, np.ones(ldof))
-        J = I.swapaxes(-1, -2)
+        NC = len(cellmeasure)
+        M = np.zeros((NC, ldof*(ldof+1)//2), dtype=self.ftype)
+        start = 0
+        for i in range(ldof):
+            M[:, start:start+ldof-i] = np.einsum('m, mj, mjk, j->jk',
+                    ws, dphi[..., i], phi[..., i:], cellmeasure,
+                    optimize=True)
+            start += ldof - i
+        return M
+
+    def update_matrix(self, A, update, cellmatrix='stiff', cfun=None):
+        """
+        Update the global matrix `A` of the old space after `refine_update`,
+        only the element matrices of the refined and the new cells are
+        computed.
+
+        Parameters
+        ----------
+        A : scipy.sparse.spmatrix
+            the old global matrix with shape `(gdof0, gdof0)`
+        update : DofUpdate
+        cellmatrix : str or callable
+            'stiff', 'mass', or a function which takes a space and returns
+            its element matrices in the form of `cell_stiff_matrix`
+        cfun : callable
+            the coefficient of 'stiff' or 'mass'
+
+        Returns
+        -------
+        A : scipy.sparse.csr_matrix
+            the new global matrix
+
+        Notes
+        -----
+        The contributions of the refined cells are computed on the old
+        cells and subtracted from `A`, the rest is renumbered by
+        `update.new2old`, and then the element matrices of the dirty cells
+        are added. The entries left by the rounding errors of the
+        subtraction are removed. `A` is returned as it is when no cell is
+        refined.
+
+        Only the element matrices are local, the sparse additions (and the
+        renumbering when the old dofs do not keep their index, e.g. for
+        `p > 1`) still go through all the nonzeros of `A`, and
+        `refine_update` builds the whole `cell2dof` again for `p > 1`. So
+        the cost is `O(nnz)` with a small constant plus the integrals on the
+        dirty cells, instead of the integrals on all the cells.
+        """
+        if callable(cellmatrix):
+            element_matrix = cellmatrix
+        elif cellmatrix == 'stiff':
+            element_matrix = methodcaller('cell_stiff_matrix', cfun=cfun)
+        elif cellmatrix == 'mass':
+            element_matrix = methodcaller('cell_mass_matrix', cfun=cfun)
+        else:
+            raise ValueError("`cellmatrix` should be 'stiff', 'mass' or callable!")
+
+        mesh = self.mesh
+        record = update.record
+        if record.oldcell.shape[0] == 0:
+            return A
+
+        node = mesh.entity('node')
+        cell = mesh.entity('cell')
+        gdof0 = update.gdof0
+        gdof = update.number_of_global_dofs()
+        ldof = self.number_of_local_dofs()
+
+        def local_matrix(space):
+            M = element_matrix(space)
+            if M.ndim == 2:
+                iu, ju = np.triu_indices(ldof)
+                S = np.zeros((M.shape[0], ldof, ldof), dtype=M.dtype)
+                S[:, iu, ju] = M
+                S[:, ju, iu] = M
+                M = S
+            return M
+
+        def scatter(M, cell2dof, n):
+            I = np.broadcast_to(cell2dof[:, :, None], M.shape)
+            J = np.broadcast_to(cell2dof[:, None, :], M.shape)
+            return coo_matrix((M.flat, (I.flat, J.flat)), shape=(n, n))
+
+        # the spaces on the refined old cells and the dirty new cells
+        space0 = LagrangeFiniteElementSpace(
+                type(mesh)(node[:record.NN0], record.oldcell),
+                p=self.p, spacetype=self.spacetype, q=self.q)
+        space1 = LagrangeFiniteElementSpace(
+                type(mesh)(node, cell[update.dirtyCell]),
+                p=self.p, spacetype=self.spacetype, q=self.q)
+
+        B = (A - scatter(local_matrix(space0), update.oldcell2dof, gdof0)).tocsr()
+        new2old = update.new2old
+        if np.all(new2old[:gdof0] == np.arange(gdof0)):
+            # the old dofs keep their index, only append the empty rows and
+            # columns of the new dofs
+            B.resize((gdof, gdof))
+        else:
+            isOldDof = new2old >= 0
+            E = csr_matrix((np.ones(isOldDof.sum(), dtype=self.ftype),
+                (np.nonzero(isOldDof)[0], new2old[isOldDof])),
+                shape=(gdof, gdof0))
+            B = E@B@E.T
+        cell2dof = self.dof.cell2dof[update.dirtyCell]
+        A = B + scatter(local_matrix(space1), cell2dof, gdof)
+        A = A.tocsr()
+
+        d = np.abs(A.diagonal())
+        I = np.repeat(np.arange(gdof), np.diff(A.indptr))
+        J = A.indices
+        isZero = np.abs(A.data) <= 1e-12*np.sqrt(d[I]*d[J])
+        A.data[isZero & (I != J)] = 0
+        A.eliminate_zeros()
+        return A
+
+    def coefficient_weights(self, cfun, bcs, ws):
+        """
+        The quadrature weights times the coefficient values, with shape
+        `(NQ, 1)` when `cfun` is None, `(NQ, NC)` for the scalar coefficient
+        and `(NQ, NC, GD, GD)` for the matrix coefficient. The cell measures
+        are not included.
+        """
+        if cfun is None:
+            return ws[:, None]
+
+        ps = self.mesh.bc_to_point(bcs)
+        d = cfun(ps)
+        if isinstance(d, (int, float)):
+            return d*ws[:, None]
+        elif isinstance(d, np.ndarray) and (len(d.shape) == 1):
+            return np.einsum('q, c->qc', ws, d)
+        elif isinstance(d, np.ndarray) and (len(d.shape) == 2):
+            return np.einsum('q, qc->qc', ws, d)
+        elif isinstance(d, np.ndarray) and (len(d.shape) == 4):
+            return np.einsum('q, qcmn->qcmn', ws, d)
+        else:
+            raise ValueError(
+                    "The return of cfun is not a number, (NQ, NC) or (NQ, NC, GD, GD) ndarray!"
+                    )
+
+    def stiff_operator(self, cfun=None):
+        """
+        The matrix-free stiffness operator, which can be used by the Krylov
+        solvers in `scipy.sparse.linalg` and has a `diagonal` method for the
+        Jacobi preconditioner.
+
+        Only the geometric factors `|K| grad_lambda@grad_lambda^T` of the
+        cells and the coefficient values at the quadrature points are stored,
+        the reference gradients of the basis functions at the quadrature
+        points are shared by all the cells.
+        """
+        p = self.p
+        if p == 0:
+            raise ValueError('The space order is 0!')
+
+        bcs, ws = self.integrator.get_quadrature_points_and_weights()
+        # R: (NQ, ldof, TD+1)
+        R = self.basiscache.get(bcs, (p, self.TD, 1), self.reference_grad_basis)
+        Dlambda = self.mesh.grad_lambda()
+        cw = self.coefficient_weights(cfun, bcs, ws)
+        if len(cw.shape) == 2:
+            G = np.einsum('c, cim, cjm->cij', self.cellmeasure, Dlambda, Dlambda)
+            diag = np.einsum('qmi, cij, qmj, qc->cm', R, G, R,
+                    np.broadcast_to(cw, (len(ws), len(G))), optimize=True)
+        else:
+            G = np.einsum('c, cim, qcmn, cjn->qcij',
+                    self.cellmeasure, Dlambda, cw, Dlambda, optimize=True)
+            diag = np.einsum('qmi, qcij, qmj->cm', R, G, R, optimize=True)
+
+        def kernel(U):
+            # the reference gradients at the quadrature points
+            gu = np.einsum('qmi, cm...->qci...', R, U, optimize=True)
+            if len(cw.shape) == 2:
+                gu = np.einsum('cij, qcj...->qci...', G, gu, optimize=True)
+                gu *= cw.reshape(cw.shape + (1, )*(gu.ndim - 2))
+            else:
+                gu = np.einsum('qcij, qcj...->qci...', G, gu, optimize=True)
+            return np.einsum('qmi, qci...->cm...', R, gu, optimize=True)
 
         gdof = self.number_of_global_dofs()
-        M = csr_matrix((M.flat, (I.flat, J.flat)), shape=(gdof, gdof))
-        return M
+        return CellOperator(self.cell_to_dof(), gdof, kernel, diag,
+                dtype=self.ftype)
 
-    def source_vector(self, f, dim=None):
+    def mass_operator(self, cfun=None):
+        """
+        The matrix-free mass operator, see `stiff_operator`.
+        """
         p = self.p
+        if p == 0:
+            raise ValueError('The space order is 0!')
+
+        bcs, ws = self.integrator.get_quadrature_points_and_weights()
+        phi = self.basis(bcs)[:, 0, :] # (NQ, ldof)
+        cw = self.coefficient_weights(cfun, bcs, ws)
+        if len(cw.shape) != 2:
+            raise ValueError("The coefficient of the mass operator should be a scalar!")
+        cellmeasure = self.cellmeasure
+
+        def kernel(U):
+            val = np.einsum('qm, cm...->qc...', phi, U, optimize=True)
+            val *= cw.reshape(cw.shape + (1, )*(val.ndim - 2))
+            val = np.einsum('qm, qc...->cm...', phi, val, optimize=True)
+            val *= cellmeasure.reshape((-1, 1) + (1, )*(val.ndim - 2))
+            return val
+
+        diag = np.einsum('qm, qc, c->cm', phi**2,
+                np.broadcast_to(cw, (len(ws), len(cellmeasure))), cellmeasure)
+        gdof = self.number_of_global_dofs()
+        return CellOperator(self.cell_to_dof(), gdof, kernel, diag,
+                dtype=self.ftype)
+
+    def cell_source_vector(self, f, index=None):
+        """
+        The element load vectors with shape `(NC, ldof, ...)`. Only the
+        cells `index` are computed when it is not None.
+        """
         cellmeasure = self.cellmeasure
+        if index is not None:
+            cellmeasure = cellmeasure[index]
         bcs, ws = self.integrator.get_quadrature_points_and_weights()
-        pp = self.mesh.bc_to_point(bcs)
+        pp = self.mesh.bc_to_point(bcs, index=index)
         fval = f(pp)
+        phi = self.basis(bcs)
+        if type(fval) in {float, int}:
+            bb = np.einsum('m, mik, i->ik...',
+                    ws, phi, cellmeasure)
+            bb *= fval
+        else:
+            bb = np.einsum('m, mi..., mik, i->ik...',
+                    ws, fval, phi, cellmeasure)
+        return bb
+
+    def source_vector(self, f, dim=None, workers=None, blocksize=None):
+        p = self.p
+        cellmeasure = self.cellmeasure
 
         gdof = self.number_of_global_dofs()
         shape = gdof if dim is None else (gdof, dim)
         b = np.zeros(shape, dtype=self.ftype)
 
         if p > 0:
-            if type(fval) in {float, int}:
-                if fval == 0.0:
-                    return b
-                else:
-                    phi = self.basis(bcs)
-                    bb = np.einsum('m, mik, i->ik...', 
-                            ws, phi, self.cellmeasure)
-                    bb *= fval
-            else:
-                phi = self.basis(bcs)
-                bb = np.einsum('m, mi..., mik, i->ik...',
-                        ws, fval, phi, self.cellmeasure)
             cell2dof = self.cell_to_dof() #(NC, ldof)
-            if dim is None:
-                np.add.at(b, cell2dof, bb)
+            if (workers is not None) and (workers > 1):
+                blocks = [None]
             else:
-                np.add.at(b, (cell2dof, np.s_[:]), bb)
+                blocks = self.cell_blocks(blocksize=blocksize)
+            for index in blocks:
+                if index is None:
+                    bb = self.cell_map('cell_source_vector', workers=workers, f=f)
+                    c2d = cell2dof
+                else:
+                    bb = self.cell_source_vector(f, index=index)
+                    c2d = cell2dof[index]
+                if dim is None:
+                    np.add.at(b, c2d, bb)
+                else:
+                    np.add.at(b, (c2d, np.s_[:]), bb)
         else:
+            bcs, ws = self.integrator.get_quadrature_points_and_weights()
+            fval = f(self.mesh.bc_to_point(bcs))
             b = np.einsum('i, ik..., k->k...', ws, fval, cellmeasure)
 
         return b
@@ -8,12 +8,16 @@ from .femdof import CPPFEMDof3d
 
 class PrismFiniteElementSpace():
 
-    def __init__(self, mesh, p=1, q=None):
+    def __init__(self, mesh, p=1, q=None, itype=None):
+        """
+        `itype` is the integer type of the dof index arrays, see
+        `femdof.index_type`.
+        """
         self.mesh = mesh
         self.p = p
 
         self.cellmeasure = self.mesh.entity_measure('cell')
-        self.dof = CPPFEMDof3d(mesh, p)
+        self.dof = CPPFEMDof3d(mesh, p, itype=itype)
 
         q = p+3 if q is None else q
         self.integralalg = FEMeshIntegralAlg(self.mesh, q, self.cellmeasure)
@@ -21,7 +25,7 @@ class PrismFiniteElementSpace():
 
 
         self.ftype = mesh.ftype
-        self.itype = mesh.itype
+        self.itype = self.dof.itype
 
         self.GD = 3
         self.TD = 3
@@ -200,7 +204,7 @@ class PrismFiniteElementSpace():
                 optimize=True)
         cell2dof = self.cell_to_dof()
         ldof = self.number_of_local_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
         gdof = self.number_of_global_dofs()
 
@@ -220,7 +224,7 @@ class PrismFiniteElementSpace():
 
         cell2dof = self.cell_to_dof()
         ldof = self.number_of_local_dofs()
-        I = np.einsum('ij, k->ijk',  cell2dof, np.ones(ldof))
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
 
         gdof = self.number_of_global_dofs()
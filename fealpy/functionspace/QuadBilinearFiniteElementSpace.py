@@ -274,7 +274,7 @@ class QuadBilinearFiniteElementSpace():
         A = np.einsum('i, ijkm, ijpm, j->jkp', ws, gphi, gphi, self.cellmeasure, optimize=True)
         cell2dof = self.cell_to_dof()
         ldof = self.number_of_local_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
         gdof = self.number_of_global_dofs()
 
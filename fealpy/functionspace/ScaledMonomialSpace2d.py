@@ -374,7 +374,7 @@ class ScaledMonomialSpace2d():
         A = self.integralalg.integral(f, celltype=True, q=p+3)
         cell2dof = self.cell_to_dof(p=p)
         ldof = self.number_of_local_dofs(p=p)
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
         gdof = self.number_of_global_dofs(p=p)
 
@@ -99,7 +99,7 @@ class SurfaceLagrangeFiniteElementSpace:
         A = np.einsum('i, ijkm, ijpm, j->jkp', ws, gphi, gphi, self.cellmeasure, optimize=True)
         cell2dof = self.cell_to_dof()
         ldof = self.number_of_local_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
 
         # Construct the stiffness matrix
@@ -116,7 +116,7 @@ class SurfaceLagrangeFiniteElementSpace:
         M = np.einsum('m, mij, mik, i->ijk', ws, phi, phi, self.cellmeasure, optimize=True)
         cell2dof = self.cell_to_dof()
         ldof = self.number_of_local_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
 
         # Construct the stiffness matrix
@@ -0,0 +1,435 @@
+import numpy as np
+from scipy.sparse import csr_matrix, kron
+from scipy.sparse.linalg import LinearOperator
+
+from .function import Function
+from .assembler import CSRAssembler
+from ..quadrature import get_quadrature
+
+
+def lagrange_basis_1d(t, x):
+    """
+    The 1D Lagrange basis functions with the nodes `t` and their derivatives.
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        the interpolation nodes in [0, 1] with shape `(p+1, )`
+    x : numpy.ndarray
+        the evaluation points in [0, 1] with shape `(NQ, )`
+
+    Returns
+    -------
+    phi : numpy.ndarray
+        `phi[i, j]` is the value of the `j`-th basis function at `x[i]`
+    dphi : numpy.ndarray
+        `dphi[i, j]` is the derivative of the `j`-th basis function at `x[i]`
+    """
+    n = len(t)
+    d = x[:, None] - t[None, :] # (NQ, p+1)
+    c = t[:, None] - t[None, :] # (p+1, p+1)
+    np.fill_diagonal(c, 1)
+    c = np.prod(c, axis=-1)
+
+    phi = np.zeros((len(x), n), dtype=x.dtype)
+    dphi = np.zeros((len(x), n), dtype=x.dtype)
+    for j in range(n):
+        idx = np.r_[0:j, j+1:n]
+        phi[:, j] = np.prod(d[:, idx], axis=-1)
+        for k in idx:
+            jdx = idx[idx != k]
+            dphi[:, j] += np.prod(d[:, jdx], axis=-1)
+    return phi/c, dphi/c
+
+
+def tensor_contract(U, *mats):
+    """
+    Apply the 1D matrices to the tensor `U` dimension by dimension.
+
+    Parameters
+    ----------
+    U : numpy.ndarray
+        the tensor with shape `(NC, n_0, n_1, ...)`
+    mats : numpy.ndarray
+        `mats[d]` with shape `(m_d, n_d)` is applied to the axis `d+1` of `U`
+
+    Returns
+    -------
+    V : numpy.ndarray
+        the tensor with shape `(NC, m_0, m_1, ...)`
+
+    Notes
+    -----
+    Every `tensordot` contracts the first local axis and appends the new one
+    at the end, so the axes are back in order after all the dimensions are
+    done. This is the sum factorization: the cost of every cell is
+    `O(p^{d+1})` instead of `O(p^{2d})` of the full basis table.
+    """
+    for M in mats:
+        U = np.tensordot(U, M, axes=([1], [1]))
+    return U
+
+
+class TensorProductFiniteElementSpace():
+    """
+    The continuous tensor product Lagrange finite element space Q_p on the
+    structured quadrilateral (`StructureQuadMesh`) and hexahedral
+    (`StructureHexMesh`) meshes.
+
+    The interpolation nodes of every direction are the Gauss-Lobatto points,
+    so the global dofs are the points of a tensor grid numbered in the same
+    order as the mesh nodes (the last direction is the fastest one), and the
+    local dofs of a cell are numbered lexicographically.
+
+    All the cells are the same box with sizes `h`, so the evaluation and the
+    assembly only need the 1D basis matrices `B` and the 1D derivative
+    matrices `D` at the 1D Gauss-Legendre points, which are applied to the
+    cell tensors dimension by dimension (see `tensor_contract`).
+    """
+    def __init__(self, mesh, p=1, q=None):
+        self.mesh = mesh
+        self.p = p
+
+        box = np.array(mesh.box, dtype=np.float)
+        self.TD = len(box)//2
+        self.GD = self.TD
+        ds = mesh.ds
+        self.nc = (ds.nx, ds.ny) if self.TD == 2 else (ds.nx, ds.ny, ds.nz)
+        self.origin = box[0::2]
+        self.h = (box[1::2] - box[0::2])/np.array(self.nc)
+        self.cellmeasure = np.prod(self.h)
+
+        self.itype = np.int_
+        self.ftype = np.float
+
+        # the number of global dofs in every direction
+        self.shape = tuple(n*p + 1 for n in self.nc)
+        self.strides = np.cumprod((1, ) + self.shape[:0:-1])[::-1]
+
+        self.nodes = np.array(get_quadrature('lobatto', index=p+1).quadpts[:, 1])
+        q = q if q is not None else p + 1
+        qf = get_quadrature('interval', index=q)
+        self.quadpts = np.array(qf.quadpts[:, 1])
+        self.weights = qf.weights
+        self.B, self.D = self.basis_matrix(self.quadpts)
+
+        self.cell2dof = self.cell_to_dof()
+        self.assembler = None
+
+    def number_of_global_dofs(self):
+        return np.prod(self.shape)
+
+    def number_of_local_dofs(self):
+        return (self.p + 1)**self.TD
+
+    def geo_dimension(self):
+        return self.GD
+
+    def top_dimension(self):
+        return self.TD
+
+    def basis_matrix(self, x):
+        """
+        The 1D basis matrix and derivative matrix at the reference points `x`
+        in [0, 1].
+        """
+        return lagrange_basis_1d(self.nodes, x)
+
+    def cell_to_dof(self):
+        p = self.p
+        C = np.zeros(1, dtype=self.itype)
+        L = np.zeros(1, dtype=self.itype)
+        for n, s in zip(self.nc, self.strides):
+            C = (C[:, None] + np.arange(n)*p*s).reshape(-1)
+            L = (L[:, None] + np.arange(p+1)*s).reshape(-1)
+        return C[:, None] + L
+
+    def global_assembler(self):
+        if self.assembler is None:
+            gdof = self.number_of_global_dofs()
+            self.assembler = CSRAssembler(self.cell2dof, gdof)
+        return self.assembler
+
+    def boundary_dof(self):
+        index = np.indices(self.shape).reshape(self.TD, -1)
+        shape = np.array(self.shape).reshape(-1, 1)
+        return np.any((index == 0) | (index == shape - 1), axis=0)
+
+    def grid_points(self, x):
+        """
+        The physical coordinates of the reference points `x` in every cell
+        along every direction, `X[d][i, j]` is the coordinate of `x[j]` in
+        the `i`-th cell of direction `d`.
+        """
+        return [o + (np.arange(n)[:, None] + x)*h for o, n, h in zip(
+            self.origin, self.nc, self.h)]
+
+    def cell_points(self, x):
+        """
+        The tensor points of `x` in every cell with shape
+        `(NC, NQ, ..., NQ, GD)`.
+        """
+        TD = self.TD
+        NQ = len(x)
+        X = self.grid_points(x)
+        shape = self.nc + (NQ, )*TD
+        ps = np.zeros(shape + (TD, ), dtype=self.ftype)
+        for d in range(TD):
+            # the axes of the cell index and the reference point of direction d
+            s = [1]*(2*TD)
+            s[d] = self.nc[d]
+            s[TD+d] = NQ
+            ps[..., d] = np.broadcast_to(
+                    X[d].reshape(s), shape)
+        return ps.reshape((-1, ) + (NQ, )*TD + (TD, ))
+
+    def interpolation_points(self):
+        X = self.grid_points(self.nodes[:-1])
+        X = [np.r_[x.flat, o + n*h] for x, o, n, h in zip(
+            X, self.origin, self.nc, self.h)]
+        X = np.meshgrid(*X, indexing='ij')
+        return np.stack([x.flat for x in X], axis=-1)
+
+    def interpolation(self, u, dim=None):
+        ipoint = self.interpolation_points()
+        uI = Function(self, dim=dim)
+        uI[:] = u(ipoint)
+        return uI
+
+    def function(self, dim=None, array=None):
+        f = Function(self, dim=dim, array=array)
+        return f
+
+    def array(self, dim=None):
+        gdof = self.number_of_global_dofs()
+        if dim is None:
+            shape = gdof
+        elif type(dim) is int:
+            shape = (gdof, dim)
+        elif type(dim) is tuple:
+            shape = (gdof, ) + dim
+        return np.zeros(shape, dtype=self.ftype)
+
+    def cell_tensor(self, uh):
+        """
+        Gather the dof values of every cell into the tensor with shape
+        `(NC, p+1, ..., p+1)`.
+        """
+        return uh[self.cell2dof].reshape((-1, ) + (self.p+1, )*self.TD)
+
+    def value(self, uh, bc=None, index=None):
+        """
+        The values of `uh` at the tensor points of the 1D reference points.
+
+        Parameters
+        ----------
+        uh : numpy.ndarray
+        bc : numpy.ndarray
+            the 1D barycentric coordinates with shape `(NQ, 2)`, the default
+            is the Gauss-Legendre points of the space
+        index : numpy.ndarray
+            the index of the cells
+
+        Returns
+        -------
+        val : numpy.ndarray
+            the values with shape `(NC, NQ, ..., NQ)`
+        """
+        B = self.B if bc is None else self.basis_matrix(bc[:, 1])[0]
+        U = self.cell_tensor(uh)
+        if index is not None:
+            U = U[index]
+        return tensor_contract(U, *(B, )*self.TD)
+
+    def grad_value(self, uh, bc=None, index=None):
+        """
+        The gradients of `uh` at the tensor points of the 1D reference
+        points with shape `(NC, NQ, ..., NQ, GD)`, see `value`.
+        """
+        if bc is None:
+            B, D = self.B, self.D
+        else:
+            B, D = self.basis_matrix(bc[:, 1])
+        U = self.cell_tensor(uh)
+        if index is not None:
+            U = U[index]
+        return np.stack(self.tensor_grad(U, B, D), axis=-1)
+
+    def tensor_grad(self, U, B, D):
+        TD = self.TD
+        return [tensor_contract(U, *[D if i == d else B for i in range(TD)])/self.h[d]
+                for d in range(TD)]
+
+    def quadrature_weights(self, cfun=None):
+        """
+        The weights of the cell quadrature points (with the cell measure)
+        times the coefficient `cfun`, with shape `(NQ, ..., NQ)` or
+        `(NC, NQ, ..., NQ)`.
+        """
+        w = self.weights
+        for d in range(1, self.TD):
+            w = np.multiply.outer(w, self.weights)
+        w = w*self.cellmeasure
+        if cfun is None:
+            return w
+        elif callable(cfun):
+            ps = self.cell_points(self.quadpts)
+            return cfun(ps)*w
+        else:
+            return cfun*w
+
+    def stiff_apply(self, uh, cw=None):
+        """
+        The matrix-free product of the stiffness matrix and `uh`.
+
+        Parameters
+        ----------
+        uh : numpy.ndarray
+        cw : numpy.ndarray
+            the quadrature weights with the coefficient, see
+            `quadrature_weights`
+
+        Returns
+        -------
+        r : numpy.ndarray
+            the product `A@uh`
+        """
+        TD = self.TD
+        B, D = self.B, self.D
+        cw = self.quadrature_weights() if cw is None else cw
+        G = self.tensor_grad(self.cell_tensor(uh), B, D)
+        R = 0
+        for d in range(TD):
+            mats = [D.T if i == d else B.T for i in range(TD)]
+            R = R + tensor_contract(cw*G[d], *mats)/self.h[d]
+        return self.cell_scatter(R)
+
+    def mass_apply(self, uh, cw=None):
+        """
+        The matrix-free product of the mass matrix and `uh`, see
+        `stiff_apply`.
+        """
+        TD = self.TD
+        B = self.B
+        cw = self.quadrature_weights() if cw is None else cw
+        V = tensor_contract(self.cell_tensor(uh), *(B, )*TD)
+        R = tensor_contract(cw*V, *(B.T, )*TD)
+        return self.cell_scatter(R)
+
+    def cell_scatter(self, R):
+        gdof = self.number_of_global_dofs()
+        return np.bincount(self.cell2dof.flat, weights=R.flat, minlength=gdof)
+
+    def stiff_operator(self, cfun=None):
+        """
+        The stiffness matrix as a `LinearOperator` without assembling.
+        """
+        gdof = self.number_of_global_dofs()
+        cw = self.quadrature_weights(cfun)
+        return LinearOperator((gdof, gdof),
+                matvec=lambda u: self.stiff_apply(u, cw=cw), dtype=self.ftype)
+
+    def mass_operator(self, cfun=None):
+        """
+        The mass matrix as a `LinearOperator` without assembling.
+        """
+        gdof = self.number_of_global_dofs()
+        cw = self.quadrature_weights(cfun)
+        return LinearOperator((gdof, gdof),
+                matvec=lambda u: self.mass_apply(u, cw=cw), dtype=self.ftype)
+
+    def source_vector(self, f):
+        ps = self.cell_points(self.quadpts)
+        fw = f(ps)*self.quadrature_weights()
+        bb = tensor_contract(fw, *(self.B.T, )*self.TD)
+        return self.cell_scatter(bb)
+
+    def residual(self, uh, f, cfun=None):
+        """
+        The residual `b - A@uh` of the Poisson equation with the source `f`,
+        without assembling the stiffness matrix.
+        """
+        cw = self.quadrature_weights(cfun)
+        return self.source_vector(f) - self.stiff_apply(uh, cw=cw)
+
+    def interval_matrix(self, d):
+        """
+        The 1D global stiffness and mass matrices of the direction `d`.
+        """
+        p = self.p
+        n = self.nc[d]
+        h = self.h[d]
+        B, D = self.B, self.D
+        K = np.einsum('q, qi, qj->ij', self.weights, D, D)/h
+        M = np.einsum('q, qi, qj->ij', self.weights, B, B)*h
+
+        cell2dof = np.arange(n)[:, None]*p + np.arange(p+1)
+        I = np.broadcast_to(cell2dof[:, :, None], (n, p+1, p+1))
+        J = np.broadcast_to(cell2dof[:, None, :], (n, p+1, p+1))
+        N = self.shape[d]
+        K = csr_matrix((np.broadcast_to(K, I.shape).flat, (I.flat, J.flat)), shape=(N, N))
+        M = csr_matrix((np.broadcast_to(M, I.shape).flat, (I.flat, J.flat)), shape=(N, N))
+        return K, M
+
+    def cell_matrix(self, cw, phi):
+        """
+        The element matrices with the coefficients `cw` at the quadrature
+        points, `phi[d]` is the 1D basis (or derivative) matrix of the
+        direction `d`.
+
+        The quadrature axes are contracted one by one with the 1D tensors
+        `phi[d][q, i]*phi[d][q, j]`.
+        """
+        TD = self.TD
+        NC = len(cw)
+        ldof = self.number_of_local_dofs()
+        A = cw
+        for d in range(TD):
+            E = np.einsum('qi, qj->qij', phi[d], phi[d])
+            A = np.tensordot(A, E, axes=([1], [0]))
+        # (NC, i_0, j_0, i_1, j_1, ...) -> (NC, i_0, i_1, ..., j_0, j_1, ...)
+        axes = [0] + list(range(1, 2*TD+1, 2)) + list(range(2, 2*TD+1, 2))
+        return A.transpose(axes).reshape(NC, ldof, ldof)
+
+    def stiff_matrix(self, cfun=None):
+        """
+        Assemble the stiffness matrix.
+
+        For the constant coefficient the matrix is the sum of the Kronecker
+        products of the 1D stiffness and mass matrices.
+        """
+        TD = self.TD
+        if (cfun is None) or np.isscalar(cfun):
+            KM = [self.interval_matrix(d) for d in range(TD)]
+            A = 0
+            for d in range(TD):
+                S = KM[0][int(d != 0)]
+                for i in range(1, TD):
+                    S = kron(S, KM[i][int(d != i)])
+                A = A + S
+            A = A.tocsr()
+            return A if cfun is None else cfun*A
+        else:
+            cw = self.quadrature_weights(cfun)
+            B, D = self.B, self.D
+            A = 0
+            for d in range(TD):
+                phi = [D if i == d else B for i in range(TD)]
+                A = A + self.cell_matrix(cw, phi)/self.h[d]**2
+            return self.global_assembler().assemble(A)
+
+    def mass_matrix(self, cfun=None):
+        """
+        Assemble the mass matrix, see `stiff_matrix`.
+        """
+        TD = self.TD
+        if (cfun is None) or np.isscalar(cfun):
+            M = self.interval_matrix(0)[1]
+            for d in range(1, TD):
+                M = kron(M, self.interval_matrix(d)[1])
+            M = M.tocsr()
+            return M if cfun is None else cfun*M
+        else:
+            cw = self.quadrature_weights(cfun)
+            M = self.cell_matrix(cw, [self.B]*TD)
+            return self.global_assembler().assemble(M)
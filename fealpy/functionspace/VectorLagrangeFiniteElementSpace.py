@@ -5,6 +5,7 @@ from scipy.sparse.linalg import spsolve
 from .function import Function
 from .femdof import CPLFEMDof1d, CPLFEMDof2d, CPLFEMDof3d
 from .femdof import DPLFEMDof1d, DPLFEMDof2d, DPLFEMDof3d
+from .femdof import index_type
 
 from ..quadrature import GaussLegendreQuadrature
 from ..quadrature import FEMeshIntegralAlg
@@ -35,8 +36,9 @@ class VectorLagrangeFiniteElementSpace():
 
     def cell_to_dof(self):
         GD = self.GD
-        cell2dof = self.dof.cell2dof[..., np.newaxis]
-        cell2dof = GD*cell2dof + np.arange(GD)
+        itype = index_type(self.number_of_global_dofs())
+        cell2dof = self.dof.cell2dof[..., np.newaxis].astype(itype)
+        cell2dof = GD*cell2dof + np.arange(GD, dtype=itype)
         NC = cell2dof.shape[0]
         return cell2dof.reshape(NC, -1)
 
@@ -190,8 +192,9 @@ class SymmetricTensorLagrangeFiniteElementSpace():
 
     def cell_to_dof(self):
         tdim = self.tensor_dim()
-        cell2dof = self.dof.cell2dof[..., np.newaxis]
-        cell2dof = tdim*cell2dof + np.arange(tdim)
+        itype = index_type(self.number_of_global_dofs())
+        cell2dof = self.dof.cell2dof[..., np.newaxis].astype(itype)
+        cell2dof = tdim*cell2dof + np.arange(tdim, dtype=itype)
         NC = cell2dof.shape[0]
         return cell2dof.reshape(NC, -1)
 
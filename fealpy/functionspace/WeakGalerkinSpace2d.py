@@ -263,7 +263,7 @@ class WeakGalerkinSpace2d:
         cell2dof = self.cell_to_dof(doftype='cell') # only get the dofs in cell
         ldof = cell2dof.shape[1]
         gdof = self.number_of_global_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+        I = np.broadcast_to(cell2dof[:, :, None], shape=cell2dof.shape + (ldof, ))
         J = I.swapaxes(-1, -2)
         M = csr_matrix(
                 (self.CM.flat, (I.flat, J.flat)), shape=(gdof, gdof)
@@ -319,28 +319,31 @@ class WeakGalerkinSpace2d:
         gdof = self.number_of_global_dofs()
         S = csr_matrix((gdof, gdof), dtype=self.ftype)
 
-        I = np.einsum('ij, k->ijk', cell2dof[edge2cell[:, 0]], np.ones(edof))
-        J = np.einsum('ik, j->ijk', edge2dof, np.ones(cdof))
+        c2d0 = cell2dof[edge2cell[:, 0]]
+        c2d1 = cell2dof[edge2cell[isInEdge, 1]]
+        I = np.broadcast_to(c2d0[:, :, None], shape=c2d0.shape + (edof, ))
+        J = np.broadcast_to(edge2dof[:, None, :], shape=(len(edge2dof), cdof, edof))
         S -= csr_matrix((F0.flat, (I.flat, J.flat)), shape=(gdof, gdof))
         S -= csr_matrix((F0.flat, (J.flat, I.flat)), shape=(gdof, gdof))
 
-        I = np.einsum('ij, k->ijk', cell2dof[edge2cell[isInEdge, 1]], np.ones(edof))
-        J = np.einsum('ik, j->ijk', edge2dof[isInEdge], np.ones(cdof))
+        I = np.broadcast_to(c2d1[:, :, None], shape=c2d1.shape + (edof, ))
+        J = np.broadcast_to(edge2dof[isInEdge, None, :], shape=(len(c2d1), cdof, edof))
         S -= csr_matrix((F1.flat, (I.flat, J.flat)), shape=(gdof, gdof))
         S -= csr_matrix((F1.flat, (J.flat, I.flat)), shape=(gdof, gdof))
 
-        I = np.einsum('ij, k->ijk', cell2dof[edge2cell[:, 0]], np.ones(cdof))
+        I = np.broadcast_to(c2d0[:, :, None], shape=c2d0.shape + (cdof, ))
         J = I.swapaxes(-1, -2)
         S += csr_matrix((F2.flat, (I.flat, J.flat)), shape=(gdof, gdof))
 
-        I = np.einsum('ij, k->ijk', cell2dof[edge2cell[isInEdge, 1]], np.ones(cdof))
+        I = np.broadcast_to(c2d1[:, :, None], shape=c2d1.shape + (cdof, ))
         J = I.swapaxes(-1, -2)
         S += csr_matrix((F3.flat, (I.flat, J.flat)), shape=(gdof, gdof))
 
-        I = np.einsum('ij, k->ijk', edge2dof, np.ones(edof))
+        I = np.broadcast_to(edge2dof[:, :, None], shape=edge2dof.shape + (edof, ))
         J = I.swapaxes(-1, -2)
         S += csr_matrix((F4.flat, (I.flat, J.flat)), shape=(gdof, gdof))
-        I = np.einsum('ij, k->ijk', edge2dof[isInEdge], np.ones(edof))
+        e2d = edge2dof[isInEdge]
+        I = np.broadcast_to(e2d[:, :, None], shape=e2d.shape + (edof, ))
         J = I.swapaxes(-1, -2)
         S += csr_matrix((F5.flat, (I.flat, J.flat)), shape=(gdof, gdof))
         return S
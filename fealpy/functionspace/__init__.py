@@ -5,6 +5,7 @@ from .ConformingVirtualElementSpace2d import CVEMDof2d, ConformingVirtualElement
 from .NonConformingVirtualElementSpace2d import NCVEMDof2d, NonConformingVirtualElementSpace2d
 from .ScaledMonomialSpace2d import ScaledMonomialSpace2d
 from .QuadBilinearFiniteElementSpace import QuadBilinearFiniteElementSpace
+from .TensorProductFiniteElementSpace import TensorProductFiniteElementSpace
 from .WeakGalerkinSpace2d import WeakGalerkinSpace2d
 from .DivFreeNonConformingVirtualElementSpace2d import DivFreeNonConformingVirtualElementSpace2d
 from .ReducedDivFreeNonConformingVirtualElementSpace2d import ReducedDivFreeNonConformingVirtualElementSpace2d
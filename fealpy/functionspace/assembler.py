@@ -0,0 +1,256 @@
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def available_memory():
+    """
+    The available physical memory in bytes, 1 GiB when it can not be found.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 2**30
+
+
+def cell_blocks(NC, nbytes, blocksize=None, fraction=0.125):
+    """
+    Split the cells into the blocks for the assembly.
+
+    Parameters
+    ----------
+    NC : int
+        the number of cells
+    nbytes : int
+        the estimated bytes of the temporaries of one cell
+    blocksize : int
+        the number of cells of every block, by default it is chosen such
+        that the temporaries of a block take at most `fraction` of the
+        available memory
+    fraction : float
+
+    Returns
+    -------
+    blocks : list
+        the slices of the blocks, or `[None]` when all the cells are in one
+        block, so the cell-wise methods are called with `index=None` as
+        before
+    """
+    if blocksize is None:
+        blocksize = int(fraction*available_memory())//max(int(nbytes), 1)
+    blocksize = max(int(blocksize), 1)
+    if blocksize >= NC:
+        return [None]
+    return [np.s_[start:start+blocksize] for start in range(0, NC, blocksize)]
+
+
+class CSRAssembler():
+    """
+    The global assembler of finite element matrices.
+
+    The CSR sparsity pattern of the global matrix and the scatter map from
+    the local entries `(cell, i, j)` to the slots of the CSR data array are
+    computed once from `cell2dof`. Then every assembling is just one
+    `np.bincount` into the data array, there is no COO to CSR conversion
+    (sorting and summing the duplicates) any more.
+
+    The pattern is the one of `C^T C`, where `C` is the cell to dof
+    incidence matrix, so the keys of all the `NC*ldof^2` local entries are
+    never formed at once, and the scatter map is computed block by block of
+    cells. Only the map `pos` with the same shape as the element matrices
+    is kept, the map of the upper triangle entries is gathered from it.
+
+    For symmetric matrices only the upper triangle entries `(i, j), i <= j`
+    of the element matrices are needed, see `upper_triangle_index`.
+
+    The cells with different numbers of local dofs (e.g. the polygons) are
+    given by a list of `cell2dof` arrays, one for every group of cells with
+    the same number of local dofs, and then the element matrices are also
+    given by a list.
+    """
+    def __init__(self, cell2dof, gdof):
+        self.cell2dof = cell2dof
+        self.gdof = gdof
+
+        c2d = cell2dof if isinstance(cell2dof, list) else [cell2dof]
+        self.indices, self.indptr = self.sparsity_pattern(c2d, gdof)
+        self.nnz = len(self.indices)
+
+        # the sorted keys `I*gdof + J` of the nonzeros, only for the setup
+        key = np.repeat(np.arange(gdof, dtype=np.int64), np.diff(self.indptr))
+        key *= gdof
+        key += self.indices
+        pos = [self.local_position(key, c) for c in c2d]
+        del key
+
+        if isinstance(cell2dof, list):
+            self.pos = np.concatenate([p.flat for p in pos])
+        else:
+            self.pos = pos[0]
+            ldof = cell2dof.shape[1]
+
+            # the scatter map of the upper triangle entries, the off-diagonal
+            # entries are scattered to both `(i, j)` and `(j, i)`
+            iu, ju = np.triu_indices(ldof)
+            isOff = iu != ju
+            self.iu = iu
+            self.ju = ju
+            self.si = np.r_[iu, ju[isOff]]
+            self.sj = np.r_[ju, iu[isOff]]
+            self.sidx = np.r_[np.arange(len(iu)), np.nonzero(isOff)[0]]
+
+    @staticmethod
+    def sparsity_pattern(cell2dof, gdof):
+        """
+        The CSR sparsity pattern of `C^T C` with sorted column indices, `C`
+        is the incidence matrix of the cells in the list `cell2dof` and the
+        dofs.
+        """
+        NC = sum(len(c) for c in cell2dof)
+        nentries = sum(c.size for c in cell2dof)
+        cindptr = np.zeros(NC+1, dtype=np.int64)
+        cindptr[1:] = np.cumsum(np.concatenate(
+            [np.full(len(c), c.shape[1]) for c in cell2dof]))
+        cindices = np.concatenate([c.flat for c in cell2dof])
+        C = csr_matrix((np.ones(nentries, dtype=np.int32), cindices, cindptr),
+                shape=(NC, gdof))
+        P = (C.T@C).tocsr()
+        P.sort_indices()
+
+        itype = np.int32 if max(gdof, P.nnz) < 2**31 else np.int64
+        return P.indices.astype(itype, copy=False), P.indptr.astype(itype, copy=False)
+
+    def local_position(self, key, cell2dof, size=2**16):
+        """
+        The slots of the local entries of the cells in the data array, with
+        shape `(NC, ldof, ldof)`, computed block by block of about `size`
+        entries.
+
+        Parameters
+        ----------
+        key : numpy.ndarray
+            the sorted keys of the nonzeros
+        """
+        NC, ldof = cell2dof.shape
+        pos = np.zeros((NC, ldof, ldof), dtype=self.indices.dtype)
+        blocksize = max(size//(ldof*ldof), 1)
+        for start in range(0, NC, blocksize):
+            c = cell2dof[start:start+blocksize]
+            pos[start:start+blocksize] = np.searchsorted(key,
+                    self.local_key(c))
+        return pos
+
+    def local_key(self, cell2dof):
+        """
+        The keys `I*gdof + J` of the entries of the element matrices.
+        """
+        NC, ldof = cell2dof.shape
+        I = np.broadcast_to(cell2dof[:, :, None], (NC, ldof, ldof))
+        J = np.broadcast_to(cell2dof[:, None, :], (NC, ldof, ldof))
+        return I.astype(np.int64)*self.gdof + J
+
+    def number_of_nonzeros(self):
+        return self.nnz
+
+    def upper_triangle_index(self):
+        """
+        The local index `(i, j), i <= j` of the upper triangle entries.
+        """
+        return self.iu, self.ju
+
+    def assemble(self, A, symmetric=False, out=None):
+        """
+        Assemble the element matrices into a CSR matrix.
+
+        Parameters
+        ----------
+        A : numpy.ndarray or list
+            the element matrices with shape `(NC, ldof, ldof)`, or the upper
+            triangle entries with shape `(NC, ldof*(ldof+1)//2)` when
+            `symmetric` is True. For the grouped cells, it is a list of the
+            element matrices of every group.
+        symmetric : bool
+            not supported by the grouped cells
+        out : scipy.sparse.csr_matrix
+            a matrix assembled by this assembler before, its data will be
+            overwritten in place
+
+        Returns
+        -------
+        A : scipy.sparse.csr_matrix
+        """
+        if isinstance(A, list):
+            data = np.bincount(self.pos,
+                    weights=np.concatenate([a.flat for a in A]),
+                    minlength=self.nnz)
+        else:
+            data = np.zeros(self.nnz, dtype=A.dtype)
+            self.add(data, A, symmetric=symmetric)
+        return self.tocsr(data, out=out)
+
+    def add(self, data, A, index=None, symmetric=False):
+        """
+        Add the element matrices `A` of the cells `index` into the CSR data
+        array `data` in place, see `assemble`. The cells can be assembled
+        block by block, then the element matrices of all the cells are never
+        stored at the same time.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            with shape `(nnz, )`
+        A : numpy.ndarray
+            the element matrices of the cells `index`
+        index : slice or numpy.ndarray
+            all the cells when it is None
+        symmetric : bool
+        """
+        index = index if index is not None else np.s_[:]
+        pos = self.pos[index]
+        if symmetric:
+            pos = pos[:, self.si, self.sj]
+            A = A[:, self.sidx]
+        return self.accumulate(data, pos.reshape(-1), A.reshape(-1))
+
+    def accumulate(self, data, pos, val):
+        """
+        `data[pos] += val` with the repeated `pos`. The cost is proportional
+        to the number of the entries of a block instead of `nnz`: the
+        bincount only covers the slots between the smallest and the largest
+        `pos` when they are not too far apart (the bincount of a slot is
+        much cheaper than sorting an entry), otherwise the slots are made
+        unique first.
+        """
+        m = len(pos)
+        if m >= self.nnz:
+            data += np.bincount(pos, weights=val, minlength=self.nnz)
+        elif m > 0:
+            lo = pos.min()
+            hi = pos.max() + 1
+            if hi - lo <= 32*m:
+                data[lo:hi] += np.bincount(pos - lo, weights=val,
+                        minlength=hi-lo)
+            else:
+                slot, pos = np.unique(pos, return_inverse=True)
+                data[slot] += np.bincount(pos, weights=val, minlength=len(slot))
+        return data
+
+    def tocsr(self, data, out=None):
+        """
+        The CSR matrix with the data array `data`, see `assemble`.
+        """
+        if out is None:
+            gdof = self.gdof
+            return csr_matrix(
+                    (data, self.indices.copy(), self.indptr.copy()),
+                    shape=(gdof, gdof))
+        else:
+            out.data[:] = data
+            return out
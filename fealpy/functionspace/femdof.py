@@ -2,6 +2,16 @@ import numpy as np
 import operator as op
 from functools import reduce
 
+def index_type(n, itype=None):
+    """
+    The integer type of the index arrays with the values less than `n`, it
+    is `itype` when given, otherwise `np.int32` when `n < 2**31` and
+    `np.int64` else. scipy.sparse takes the int32 indices without copies.
+    """
+    if itype is not None:
+        return np.dtype(itype)
+    return np.dtype(np.int32) if n < 2**31 else np.dtype(np.int64)
+
 def multi_index_matrix1d(p):
     ldof = p+1
     multiIndex = np.zeros((ldof, 2), dtype=np.int)
@@ -35,9 +45,12 @@ def multi_index_matrix3d(p):
 
 
 class CPLFEMDof1d():
-    def __init__(self, mesh, p):
+    def __init__(self, mesh, p, itype=None):
         self.mesh = mesh
         self.p = p
+        # for p = 1 the cell2dof is the cell array of the mesh itself
+        self.itype = mesh.ds.cell.dtype if p == 1 else \
+                index_type(self.number_of_global_dofs(), itype)
         self.multiIndex = multi_index_matrix1d(p)
         self.cell2dof = self.cell_to_dof()
 
@@ -64,7 +77,7 @@ class CPLFEMDof1d():
             NN = mesh.number_of_nodes()
             NC = mesh.number_of_cells()
             ldof = self.number_of_local_dofs()
-            cell2dof = np.zeros((NC, ldof), dtype=np.int)
+            cell2dof = np.zeros((NC, ldof), dtype=self.itype)
             cell2dof[:, [0, -1]] = cell
             cell2dof[:, 1:-1] = NN + np.arange(NC*(p-1)).reshape(NC, p-1)
             return cell2dof
@@ -111,9 +124,12 @@ class CPLFEMDof1d():
             return ipoint
 
 class CPLFEMDof2d():
-    def __init__(self, mesh, p):
+    def __init__(self, mesh, p, itype=None):
         self.mesh = mesh
         self.p = p
+        # for p = 1 the cell2dof is the cell array of the mesh itself
+        self.itype = mesh.ds.cell.dtype if p == 1 else \
+                index_type(self.number_of_global_dofs(), itype)
         self.multiIndex = multi_index_matrix2d(p)
         self.cell2dof = self.cell_to_dof()
 
@@ -148,7 +164,7 @@ class CPLFEMDof2d():
         NN = mesh.number_of_nodes()
 
         edge = mesh.ds.edge
-        edge2dof = np.zeros((NE, p+1), dtype=np.int)
+        edge2dof = np.zeros((NE, p+1), dtype=self.itype)
         edge2dof[:, [0, -1]] = edge
         if p > 1:
             edge2dof[:, 1:-1] = NN + np.arange(NE*(p-1)).reshape(NE, p-1)
@@ -169,7 +185,7 @@ class CPLFEMDof2d():
             cell2dof = cell
 
         if p > 1:
-            cell2dof = np.zeros((NC, ldof), dtype=np.int)
+            cell2dof = np.zeros((NC, ldof), dtype=self.itype)
 
             isEdgeDof = self.is_on_edge_local_dof()
             edge2dof = self.edge_to_dof()
@@ -247,9 +263,12 @@ class CPLFEMDof2d():
         return (p+1)*(p+2)//2
 
 class CPLFEMDof3d():
-    def __init__(self, mesh, p):
+    def __init__(self, mesh, p, itype=None):
         self.mesh = mesh
         self.p = p
+        # for p = 1 the cell2dof is the cell array of the mesh itself
+        self.itype = mesh.ds.cell.dtype if p == 1 else \
+                index_type(self.number_of_global_dofs(), itype)
         self.multiIndex = multi_index_matrix3d(p)
         self.multiIndex2d = multi_index_matrix2d(p)
         self.cell2dof = self.cell_to_dof()
@@ -283,7 +302,7 @@ class CPLFEMDof3d():
 
         base = N
         edge = mesh.ds.edge
-        edge2dof = np.zeros((NE, p+1), dtype=np.int)
+        edge2dof = np.zeros((NE, p+1), dtype=self.itype)
         edge2dof[:, [0, -1]] = edge
         if p > 1:
             edge2dof[:,1:-1] = base + np.arange(NE*(p-1)).reshape(NE, p-1)
@@ -293,7 +312,7 @@ class CPLFEMDof3d():
         p = self.p
         fdof = (p+1)*(p+2)//2
 
-        edgeIdx = np.zeros((2, p+1), dtype=np.int)
+        edgeIdx = np.zeros((2, p+1), dtype=self.itype)
         edgeIdx[0, :] = range(p+1)
         edgeIdx[1, :] = edgeIdx[0, -1::-1]
 
@@ -309,13 +328,13 @@ class CPLFEMDof3d():
 
         edge2dof = self.edge_to_dof()
 
-        face2dof = np.zeros((NF, fdof), dtype=np.int)
+        face2dof = np.zeros((NF, fdof), dtype=self.itype)
         faceIdx = self.multiIndex2d
         isEdgeDof = (faceIdx == 0)
 
         fe = np.array([1, 0, 0])
         for i in range(3):
-            I = np.ones(NF, dtype=np.int)
+            I = np.ones(NF, dtype=self.itype)
             sign = (face[:, fe[i]] == edge[face2edge[:, i], 0])
             I[sign] = 0
             face2dof[:, isEdgeDof[:, i]] = edge2dof[face2edge[:, [i]], edgeIdx[I]]
@@ -357,10 +376,12 @@ class CPLFEMDof3d():
 
         face = mesh.ds.face
         cell = mesh.ds.cell
+        if p == 1:
+            return cell
 
         cell2face = mesh.ds.cell_to_face()
 
-        cell2dof = np.zeros((NC, ldof), dtype=np.int)
+        cell2dof = np.zeros((NC, ldof), dtype=self.itype)
 
         face2dof = self.face_to_dof()
         isFaceDof = self.is_on_face_local_dof()
@@ -397,13 +418,13 @@ class CPLFEMDof3d():
         NN = mesh.number_of_nodes()
         NC = mesh.number_of_cells()
         ldof = self.number_of_local_dofs()
-        cell2dof = np.zeros((NC, ldof), dtype=np.int)
+        cell2dof = np.zeros((NC, ldof), dtype=self.itype)
 
         idx = np.array([
             0,
             ldof - (p+1)*(p+2)//2 - 1,
             ldof - p -1,
-            ldof - 1], dtype=np.int)
+            ldof - 1], dtype=self.itype)
 
         cell2dof[:, idx] = cell
 
@@ -411,7 +432,7 @@ class CPLFEMDof3d():
             return cell2dof
         if p == 2:
             cell2edge = mesh.ds.cell_to_edge()
-            idx = np.array([1, 2, 3, 5, 6, 8], dtype=np.int)
+            idx = np.array([1, 2, 3, 5, 6, 8], dtype=self.itype)
             cel2dof[:, idx] = cell2edge + NN
             return cell2dof
         else:
@@ -447,13 +468,13 @@ class CPLFEMDof3d():
         NN = mesh.number_of_nodes()
         NC = mesh.number_of_cells()
         ldof = self.number_of_local_dofs()
-        cell2dof = np.zeros((NC, ldof), dtype=np.int)
+        cell2dof = np.zeros((NC, ldof), dtype=self.itype)
 
         idx = np.array([
             0,
             ldof - (p+1)*(p+2)//2 - 1,
             ldof - p -1,
-            ldof - 1], dtype=np.int)
+            ldof - 1], dtype=self.itype)
 
         cell2dof[:, idx] = cell
 
@@ -461,7 +482,7 @@ class CPLFEMDof3d():
             return cell2dof
         if p == 2:
             cell2edge = mesh.ds.cell_to_edge()
-            idx = np.array([1, 2, 3, 5, 6, 8], dtype=np.int)
+            idx = np.array([1, 2, 3, 5, 6, 8], dtype=self.itype)
             cel2dof[:, idx] = cell2edge + NN
             return cell2dof
         else:
@@ -564,9 +585,10 @@ class DPLFEMDof():
     """
     间断单元自由度管理基类.
     """
-    def __init__(self, mesh, p):
+    def __init__(self, mesh, p, itype=None):
         self.mesh = mesh
         self.p = p
+        self.itype = index_type(self.number_of_global_dofs(), itype)
         self.multiIndex = self.multi_index_matrix()
         self.cell2dof = self.cell_to_dof()
 
@@ -574,7 +596,7 @@ class DPLFEMDof():
         mesh = self.mesh
         NC = mesh.number_of_cells()
         ldof = self.number_of_local_dofs()
-        cell2dof = np.arange(NC*ldof).reshape(NC, ldof)
+        cell2dof = np.arange(NC*ldof, dtype=self.itype).reshape(NC, ldof)
         return cell2dof
 
     def number_of_global_dofs(self):
@@ -612,8 +634,8 @@ class DPLFEMDof1d(DPLFEMDof):
     """
     区间间断单元自由度管理类.
     """
-    def __init__(self, mesh, p):
-        super(DPLFEMDof1d, self).__init__(mesh, p)
+    def __init__(self, mesh, p, itype=None):
+        super(DPLFEMDof1d, self).__init__(mesh, p, itype=itype)
 
     def multi_index_matrix(self):
         p = self.p
@@ -628,8 +650,8 @@ class DPLFEMDof2d(DPLFEMDof):
     """
     三角形间断单元自由度管理类.
     """
-    def __init__(self, mesh, p):
-        super(DPLFEMDof2d, self).__init__(mesh, p)
+    def __init__(self, mesh, p, itype=None):
+        super(DPLFEMDof2d, self).__init__(mesh, p, itype=itype)
 
     def multi_index_matrix(self):
         p = self.p
@@ -649,8 +671,8 @@ class DPLFEMDof3d(DPLFEMDof):
     """
     四面体间断单元自由度管理类.
     """
-    def __init__(self, mesh, p):
-        super(DPLFEMDof3d, self).__init__(mesh, p)
+    def __init__(self, mesh, p, itype=None):
+        super(DPLFEMDof3d, self).__init__(mesh, p, itype=itype)
 
     def multi_index_matrix(self):
         p = self.p
@@ -673,9 +695,12 @@ class CPPFEMDof3d():
     """
     三棱柱连续单元自由度管理类.
     """
-    def __init__(self, mesh, p=1):
+    def __init__(self, mesh, p=1, itype=None):
         self.mesh = mesh
         self.p = p
+        # for p = 1 the cell2dof is the cell array of the mesh itself
+        self.itype = mesh.entity('cell').dtype if p == 1 else \
+                index_type(self.number_of_global_dofs(), itype)
         self.cell2dof = self.cell_to_dof()
         self.dpoints = self.interpolation_points()
 
@@ -699,7 +724,7 @@ class CPPFEMDof3d():
         qdof = (p+1)*(p+1)
 
 
-        idx = np.r_['0', [0, 3], 2*np.ones(p-1, dtype=np.int)]
+        idx = np.r_['0', [0, 3], 2*np.ones(p-1, dtype=self.itype)]
         f0 = np.repeat(np.cumsum(np.cumsum(idx)), range(1, p+2)) - np.arange(tdof)
         f1 = np.arange(tdof*p, ldof)
         f2 = np.repeat(
@@ -803,7 +828,7 @@ class CPPFEMDof3d():
                     return_index=True,
                     return_inverse=True,
                     axis=0)
-            return j.reshape(-1, ldof0*ldof1)
+            return j.reshape(-1, ldof0*ldof1).astype(self.itype)
 
     def cell_to_dof_1(self):
         """
@@ -834,7 +859,7 @@ class CPPFEMDof3d():
                     return_index=True,
                     return_inverse=True,
                     axis=0)
-            return j.reshape(-1, ldof)
+            return j.reshape(-1, ldof).astype(self.itype)
 
     def cell_to_dof_2(self):
         p = self.p
@@ -844,14 +869,14 @@ class CPPFEMDof3d():
         NN = mesh.number_of_nodes()
         NC = mesh.number_of_cells()
         ldof = self.number_of_local_dofs()
-        cell2dof = np.zeros((NC, ldof), dtype=np.int)
+        cell2dof = np.zeros((NC, ldof), dtype=self.itype)
         idx = np.array([
             0,
             p*(p+1)//2,
             (p+1)*(p+2)//2-1,
             ldof - (p+1)*(p+2)//2,
             ldof - p - 1,
-            ldof - 1], dtype=np.int)
+            ldof - 1], dtype=self.itype)
         cell2dof[:, idx] = cell
 
         if p == 1:
@@ -935,3 +960,48 @@ class CPPFEMDof3d():
         ps = np.einsum('km, imd->ikd', w, node[cell]).reshape(-1, GD)
         ipoint = ps[self.i0]
         return ipoint
+
+
+class DofUpdate():
+    """
+    The update of the dofs of a space after one refinement step of the mesh,
+    see `LagrangeFiniteElementSpace.refine_update`.
+
+    Attributes
+    ----------
+    gdof0 : int
+        the number of the old dofs
+    new2old : numpy.ndarray
+        the old index of every new dof with shape `(gdof, )`, -1 for the dofs
+        which only belong to the changed cells (except the old nodes), whose
+        values are interpolated on the parent cells
+    P : scipy.sparse.csr_matrix
+        the prolongation matrix from the old space to the new one with shape
+        `(gdof, gdof0)`
+    dirtyCell : numpy.ndarray
+        the index of the changed and the new cells, only their element
+        matrices have to be computed again
+    oldcell2dof : numpy.ndarray
+        the old cell to dof relation of `record.changedCell`
+    record : RefinementRecord
+    """
+    def __init__(self, gdof0, new2old, P, dirtyCell, oldcell2dof, record):
+        self.gdof0 = gdof0
+        self.new2old = new2old
+        self.P = P
+        self.dirtyCell = dirtyCell
+        self.oldcell2dof = oldcell2dof
+        self.record = record
+
+    def number_of_global_dofs(self):
+        return len(self.new2old)
+
+    def prolongate(self, uh):
+        """
+        Map the old dof values `uh` with shape `(gdof0, ...)` to the new
+        space.
+        """
+        if uh.ndim == 1:
+            return self.P@uh
+        shape = uh.shape
+        return (self.P@uh.reshape(shape[0], -1)).reshape((-1, ) + shape[1:])
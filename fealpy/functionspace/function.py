@@ -38,6 +38,18 @@ class Function(np.ndarray):
         space = self.space
         return space.hessian_value(self, bc, index=index)
 
+    def eval_at_points(self, points, nearest=False):
+        """
+        The values at the points, the location of the points in the mesh is
+        cached by the space, see `space.value_at_points`.
+        """
+        space = self.space
+        return space.value_at_points(self, points, nearest=nearest)
+
+    def grad_at_points(self, points, nearest=False):
+        space = self.space
+        return space.grad_value_at_points(self, points, nearest=nearest)
+
     def edge_value(self, bc, index=None):
         space = self.space
         return space.edge_value(self, bc)
@@ -0,0 +1,89 @@
+import numpy as np
+from scipy.sparse.linalg import LinearOperator
+
+from .femdof import index_type
+
+
+class CellOperator(LinearOperator):
+    """
+    The global finite element operator `sum_c P_c^T A_c P_c` applied without
+    assembling any matrix.
+
+    The dof values are gathered by `cell2dof`, the element operators are
+    applied to all the cells at once by `kernel`, and the results are
+    scattered back with `np.bincount`. Only the data needed by `kernel`
+    (e.g. the geometric factors at the quadrature points) is stored.
+
+    Parameters
+    ----------
+    cell2dof : numpy.ndarray
+        with shape `(NC, ldof)`
+    gdof : int
+    kernel : callable
+        `kernel(U)` applies the element operators to `U` with shape
+        `(NC, ldof)` or `(NC, ldof, k)` and returns the same shape
+    diag : numpy.ndarray
+        the diagonals of the element matrices with shape `(NC, ldof)`
+    isDDof : numpy.ndarray
+        the flags of the Dirichlet dofs, on which the operator is the
+        identity, see `dirichlet`
+    """
+    def __init__(self, cell2dof, gdof, kernel, diag, dtype=np.float,
+            isDDof=None):
+        super().__init__(dtype, (gdof, gdof))
+        self.cell2dof = cell2dof
+        self.gdof = gdof
+        self.kernel = kernel
+        self.diag = diag
+        self.isDDof = isDDof
+
+    def apply(self, X):
+        gdof = self.gdof
+        cell2dof = self.cell2dof
+        if self.isDDof is not None:
+            X0 = X.copy()
+            X0[self.isDDof] = 0
+        else:
+            X0 = X
+
+        V = self.kernel(X0[cell2dof])
+        if X.ndim == 1:
+            Y = np.bincount(cell2dof.flat, weights=V.flat, minlength=gdof)
+        else:
+            k = X.shape[1]
+            itype = index_type(gdof*k)
+            idx = cell2dof[..., None].astype(itype)*k + np.arange(k, dtype=itype)
+            Y = np.bincount(idx.flat, weights=V.flat, minlength=gdof*k)
+            Y = Y.reshape(gdof, k)
+
+        if self.isDDof is not None:
+            Y[self.isDDof] = X[self.isDDof]
+        return Y
+
+    def _matvec(self, x):
+        return self.apply(x.reshape(-1))
+
+    def _matmat(self, X):
+        return self.apply(np.asarray(X))
+
+    def _adjoint(self):
+        # all the element operators here are symmetric
+        return self
+
+    def diagonal(self):
+        """
+        The diagonal of the global matrix for the Jacobi preconditioner.
+        """
+        d = np.bincount(self.cell2dof.flat, weights=self.diag.flat,
+                minlength=self.gdof)
+        if self.isDDof is not None:
+            d[self.isDDof] = 1
+        return d
+
+    def dirichlet(self, isDDof):
+        """
+        The operator with the Dirichlet rows and columns replaced by the ones
+        of the identity, which is `T@A@T + Tbd` without assembling.
+        """
+        return CellOperator(self.cell2dof, self.gdof, self.kernel, self.diag,
+                dtype=self.dtype, isDDof=isDDof)
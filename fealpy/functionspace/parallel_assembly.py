@@ -0,0 +1,161 @@
+import pickle
+from contextlib import nullcontext
+
+import numpy as np
+from multiprocessing import get_context
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+
+
+class SharedArray():
+    """
+    A numpy array in a `multiprocessing.shared_memory` block.
+
+    Only the name, the shape and the dtype of the block are pickled, so
+    sending a `SharedArray` to a worker process does not copy the data, the
+    worker attaches the same memory.
+    """
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = max(int(np.prod(self.shape))*self.dtype.itemsize, 1)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.array = np.ndarray(self.shape, dtype=self.dtype,
+                buffer=self.shm.buf)
+
+    @classmethod
+    def from_array(cls, a):
+        a = np.asarray(a)
+        sa = cls(a.shape, a.dtype)
+        sa.array[:] = a
+        return sa
+
+    def __getstate__(self):
+        return (self.shm.name, self.shape, self.dtype.str)
+
+    def __setstate__(self, state):
+        name, shape, dtype = state
+        self.__init__(shape, dtype, name=name)
+
+    def close(self):
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # some views are still alive, the memory is released with them
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def run_chunk(task):
+    kernel, arrays, out, start, end = task
+    try:
+        out.array[start:end] = kernel(
+                {key: a.array for key, a in arrays.items()}, start, end)
+    finally:
+        for a in arrays.values():
+            a.close()
+        out.close()
+
+
+def worker_pool(workers=None):
+    """
+    The process pool of `workers` processes, which can be given to several
+    calls of `cell_kernel_map`, e.g. one for every cell group, so the worker
+    processes are started only once. It is a context manager giving `None`
+    when `workers` is None or 1.
+    """
+    if (workers is None) or (workers <= 1):
+        return nullcontext()
+    # start the resource tracker before the workers are forked, otherwise
+    # every worker starts its own one, which takes the shared memory
+    # attached by the worker as leaked
+    resource_tracker.ensure_running()
+    return get_context().Pool(processes=workers)
+
+
+def is_picklable(obj):
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def cell_kernel_map(kernel, arrays, NC, workers=None, chunksize=None,
+        pool=None):
+    """
+    Compute the cell-wise data `kernel(arrays, start, end)` of all the cells
+    in chunks.
+
+    Parameters
+    ----------
+    kernel : callable
+        `kernel(arrays, start, end)` returns the data of the cells
+        `start:end` with shape `(end - start, ) + shape`. It is sent to the
+        workers when it can be pickled (a module level function, a
+        `functools.partial` of it, or an instance of a module level class
+        with picklable attributes), otherwise, e.g. a lambda or a kernel
+        holding a lambda coefficient, it is called in the current process.
+    arrays : dict
+        the input arrays of `kernel`, e.g. `node` and `cell`, which are
+        shared with the workers by `SharedArray` without copies
+    NC : int
+        the number of cells
+    workers : int
+        the number of the worker processes, the kernel is called in the
+        current process when it is None or 1
+    chunksize : int
+        the number of cells of every chunk, `NC` is split into `4*workers`
+        chunks by default for load balance
+    pool : multiprocessing.pool.Pool
+        the pool of the workers, see `worker_pool`, a new pool is started
+        and closed in this call when it is None
+
+    Returns
+    -------
+    val : numpy.ndarray
+        with shape `(NC, ...)`
+
+    Notes
+    -----
+    The kernel is called on the first cell in the current process to get
+    the shape and the dtype of the output, which is a `SharedArray` written
+    by the workers in place.
+    """
+    if (workers is None) or (workers <= 1) or (NC <= 1) \
+            or (not is_picklable(kernel)):
+        return kernel(arrays, 0, NC)
+
+    val0 = kernel(arrays, 0, 1)
+
+    if chunksize is None:
+        chunksize = -(-NC//(4*workers))
+    start = np.arange(0, NC, chunksize)
+    end = np.minimum(start + chunksize, NC)
+
+    shared = {}
+    out = None
+    try:
+        for key, a in arrays.items():
+            shared[key] = SharedArray.from_array(a)
+        out = SharedArray((NC, ) + val0.shape[1:], val0.dtype)
+        tasks = [(kernel, shared, out, s, e) for s, e in zip(start, end)]
+        if pool is None:
+            with worker_pool(workers) as pool:
+                pool.map(run_chunk, tasks, chunksize=1)
+        else:
+            pool.map(run_chunk, tasks, chunksize=1)
+        val = out.array.copy()
+    finally:
+        for a in shared.values():
+            a.close()
+        if out is not None:
+            out.close()
+    return val
@@ -0,0 +1,72 @@
+import numpy as np
+from collections import OrderedDict
+
+
+class ReferenceBasisCache():
+    """
+    The cache of basis function tables on the reference element.
+
+    The tables only depend on the barycentric points (the quadrature rule),
+    the degree `p`, the topology dimension `TD` and the derivative order, so
+    they can be computed once and shared by all the assembly and evaluation
+    methods of a space. The cache is cleared when the mesh changes.
+
+    Only the reference points with shape `(TD+1, )` or `(NQ, TD+1)` are
+    cached, the cell-wise points (e.g. the points in `edge_basis`) are
+    computed directly.
+    """
+    def __init__(self, mesh, maxsize=32):
+        self.mesh = mesh
+        self.maxsize = maxsize
+        self.tables = OrderedDict()
+        self.stamp = self.mesh_stamp()
+
+    def mesh_stamp(self):
+        mesh = self.mesh
+        cell = mesh.entity('cell')
+        return (mesh.number_of_nodes(), mesh.number_of_cells(), id(cell))
+
+    def clear(self):
+        self.tables.clear()
+        self.stamp = self.mesh_stamp()
+
+    def is_cacheable(self, bc):
+        return isinstance(bc, np.ndarray) and (bc.ndim <= 2)
+
+    def get(self, bc, key, fun):
+        """
+        Get the table of `fun(bc)` with the extra `key`, e.g. `(p, TD, 0)`.
+
+        Parameters
+        ----------
+        bc : numpy.ndarray
+            the barycentric points, `(TD+1, )` or `(NQ, TD+1)`
+        key : tuple
+            the other parts of the key
+        fun : callable
+            compute the table at `bc` when it is not in the cache
+
+        Returns
+        -------
+        val : numpy.ndarray
+            a read-only table
+        """
+        if not self.is_cacheable(bc):
+            return fun(bc)
+
+        stamp = self.mesh_stamp()
+        if stamp != self.stamp:
+            self.tables.clear()
+            self.stamp = stamp
+
+        key = key + (bc.dtype.str, bc.shape, bc.tobytes())
+        val = self.tables.get(key)
+        if val is None:
+            val = fun(bc)
+            val.setflags(write=False)
+            self.tables[key] = val
+            if len(self.tables) > self.maxsize:
+                self.tables.popitem(last=False)
+        else:
+            self.tables.move_to_end(key)
+        return val
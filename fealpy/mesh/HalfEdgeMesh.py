@@ -1,10 +1,106 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye, tril, triu
 from ..quadrature import TriangleQuadrature, QuadrangleQuadrature, GaussLegendreQuadrature 
+from ..quadrature import get_quadrature
 from .Mesh2d import Mesh2d
 from .adaptive_tools import mark
 from .mesh_tools import show_halfedge_mesh
 from ..common.Tools import hash2map
+def cell_halfedge_order(halfedge, start):
+    """
+    Order the halfedges of every cell along the cell boundary, the order of
+    the cell `c` begins with the halfedge `start[c]`.
+
+    The positions of the halfedges are computed by the pointer jumping on
+    the previous halfedges `halfedge[:, 3]`, so the number of the iterations
+    is the logarithm of the maximal number of the cell vertices.
+
+    Returns
+    -------
+    hcell : numpy.ndarray
+        the halfedges ordered by the cells and along the cell boundaries
+    location : numpy.ndarray
+        the halfedges of the cell `c` are `hcell[location[c]:location[c+1]]`
+    """
+    NH = len(halfedge)
+    NC = len(start)
+    NV = np.bincount(halfedge[:, 1], minlength=NC)
+    start = start[NV > 0]
+
+    rank = np.ones(NH, dtype=np.int_)
+    ptr = np.array(halfedge[:, 3], dtype=np.int_)
+    rank[start] = 0
+    ptr[start] = start
+    while True:
+        nptr = ptr[ptr]
+        if np.all(nptr == ptr):
+            break
+        rank += rank[ptr]
+        ptr = nptr
+
+    location = np.zeros(NC+1, dtype=halfedge.dtype)
+    np.cumsum(NV, out=location[1:])
+    hcell = np.zeros(NH, dtype=halfedge.dtype)
+    hcell[location[halfedge[:, 1]] + rank] = np.arange(NH)
+    return hcell, location
+
+
+def shift_cell_halfedge(hcell, location, shift):
+    """
+    Shift the order of the halfedges of every cell by `shift`, see
+    `cell_halfedge_order`.
+    """
+    NV = np.diff(location)
+    cidx = np.repeat(np.arange(len(NV)), NV)
+    start = location[cidx]
+    k = np.arange(len(hcell)) - start
+    return hcell[start + (k + shift)%NV[cidx]]
+
+
+def split_cell_halfedge(halfedge, flag, idx, NC):
+    """
+    Split the boundaries of the cells at the flagged halfedges `idx`, which
+    is used to divide the cells into the new cells `NC, NC+1, ...`.
+
+    Every flagged halfedge `idx[i]` ends a segment of its cell boundary,
+    which begins after the previous flagged halfedge, and all the halfedges
+    of the segment belong to the new cell `NC + i`.
+
+    Returns
+    -------
+    first : numpy.ndarray
+        the first halfedges of the segments
+    cell : numpy.ndarray
+        the new cells of all the halfedges
+    """
+    NH = len(halfedge)
+    cell = halfedge[:, 1].copy()
+    NAC = max(cell.max() + 1, NC)
+    isSplitCell = np.zeros(NAC, dtype=np.bool_)
+    isSplitCell[cell[idx]] = True
+
+    # the orders of the split cells begin after a flagged halfedge
+    start = np.zeros(NAC, dtype=np.int_)
+    start[cell] = np.arange(NH)
+    nex = halfedge[idx, 2]
+    start[cell[nex]] = nex
+    hcell, location = cell_halfedge_order(halfedge, start)
+
+    isSplit = isSplitCell[cell[hcell]]
+    hcell = hcell[isSplit]
+    f = flag[hcell]
+    seg = np.cumsum(f) - f # the segment of every halfedge
+    last = hcell[f] # the flagged halfedges ending the segments
+
+    newcell = np.zeros(NH, dtype=cell.dtype)
+    newcell[idx] = np.arange(NC, NC + len(idx))
+    cell[hcell] = newcell[last[seg]]
+
+    first = np.zeros(NH, dtype=cell.dtype)
+    isFirst = np.r_[True, f[:-1]]
+    first[last] = hcell[isFirst]
+    return first[idx], cell
+
 # fixednode: 节点是否固定标记, 在网格生成与自适应算法中不能移除
 # True: 固定
 # False: 自由
@@ -100,11 +196,11 @@ class HalfEdgeMesh(Mesh2d):
 
     def integrator(self, k, etype='cell'):
         if etype in {'cell', 'tri',  2}:
-            return TriangleQuadrature(k)
+            return get_quadrature('triangle', k)
         elif etype in {'quad'}:
-            return QuadrangleQuadrature(k)
+            return get_quadrature('quadrangle', k)
         elif etype in {'edge', 'face', 1}:
-            return GaussLegendreQuadrature(k)
+            return get_quadrature('interval', k)
 
     @classmethod
     def from_mesh(cls, mesh):
@@ -785,17 +881,9 @@ class HalfEdgeMesh(Mesh2d):
         
         # 修改单元的编号
         cellidx = halfedge[idx0, 1] #需要加密的单元编号
-        halfedge[idx0, 1] = range(NC, NC + NHE)
+        idx1, newcell = split_cell_halfedge(halfedge, flag, idx0, NC)
+        halfedge[:, 1] = newcell
         clevel[isMarkedCell] += 1
-        
-        idx1 = idx0.copy()
-        pre = halfedge[idx1, 3]
-        flag0 = ~flag[pre] # 前一个是不需要细分的半边
-        while np.any(flag0):
-            idx1[flag0] = pre[flag0]
-            pre = halfedge[idx1, 3]
-            flag0 = ~flag[pre] 
-            halfedge[idx1, 1] = halfedge[idx0, 1]
             
         nex1 = halfedge[idx1, 2] # 当前半边的下一个半边
         pre1 = halfedge[idx1, 3] # 当前半边的上一个半边
@@ -1028,6 +1116,7 @@ class HalfEdgeMesh2dDataStructure():
         
         self.cell2hedge = np.zeros(NC, dtype=self.itype)   # 存储每个单元的起始半边
         self.cell2hedge[halfedge[:, 1]] = range(2*self.NE) # 的编号
+        self.hcellkey = None # the order of the halfedges is computed on the first use
 
         if NV is None:
             NC = self.NC
@@ -1063,6 +1152,49 @@ class HalfEdgeMesh2dDataStructure():
     def number_of_faces_of_cells(self):
         return self.NV
 
+    def cell_to_halfedge(self, shift=0, return_all=False):
+        """
+        The halfedges of every cell ordered along the cell boundary, which
+        begins with the `shift`-th halfedge after `cell2hedge`.
+
+        The order of all the cells is computed once, and it is recomputed
+        only when `halfedge` or `cell2hedge` are replaced.
+
+        Returns
+        -------
+        cell2hedge : numpy.ndarray
+        cellLocation : numpy.ndarray
+            the halfedges of the cell `i` are
+            `cell2hedge[cellLocation[i]:cellLocation[i+1]]`
+        """
+        key = (self.halfedge, self.cell2hedge)
+        if (self.hcellkey is None) or any(a is not b for a, b in zip(key, self.hcellkey)):
+            self.hcell, self.hcellLocation = cell_halfedge_order(
+                    self.halfedge, self.cell2hedge)
+            self.hcellkey = key
+
+        hcell, location = self.hcell, self.hcellLocation
+        if shift != 0:
+            hcell = shift_cell_halfedge(hcell, location, shift)
+        if return_all:
+            return hcell, location
+        else:
+            cstart = self.cellstart
+            hcell = hcell[location[cstart]:]
+            location = location[cstart:] - location[cstart]
+            return hcell, location
+
+    def local_edge_shift(self):
+        """
+        The local edges of the triangles begin with the previous halfedge of
+        `cell2hedge`, that is the edge opposite to the first vertex, and the
+        other cells begin with the next halfedge.
+        """
+        if (type(self.NV) is not np.ndarray) and (self.NV == 3):
+            return 2
+        else:
+            return 1
+
     def cell_to_node(self, return_sparse=False):
         NN = self.NN
         NC = self.NC
@@ -1078,45 +1210,33 @@ class HalfEdgeMesh2dDataStructure():
             cell2node = csr_matrix((val, (I, J)), shape=(NC, NN), dtype=np.bool)
             return cell2node
         elif type(self.NV) is np.ndarray: # polygon mesh
-            cellLocation = np.zeros(NC+1, dtype=self.itype)
-            cellLocation[1:] = np.cumsum(self.NV)
-            cell2node = np.zeros(cellLocation[-1], dtype=self.itype)
-            current = self.cell2hedge[cstart:]
-            idx = cellLocation[:-1].copy()
-            cell2node[idx] = halfedge[current, 0]
-            NV0 = np.ones(NC, dtype=self.itype)
-            isNotOK = NV0 < self.NV
-            while isNotOK.sum() > 0:
-               current[isNotOK] = halfedge[current[isNotOK], 2]
-               idx[isNotOK] += 1
-               NV0[isNotOK] += 1
-               cell2node[idx[isNotOK]] = halfedge[current[isNotOK], 0]
-               isNotOK = (NV0 < self.NV)
+            hcell, cellLocation = self.cell_to_halfedge()
+            cell2node = halfedge[hcell, 0]
             return cell2node, cellLocation
-        elif self.NV == 3: # tri mesh
-            cell2node = np.zeros(NC, 3)
-            current = self.cell2hedge[cstart:]
-            cell2node[:, 0] = halfedge[current, 0]
-            current = halfedge[current, 2]
-            cell2node[:, 1] = halfedge[current, 0]
-            current = halfedge[current, 2]
-            cell2node[:, 2] = halfedge[current, 0]
-            return cell2node
-        elif self.NV == 4: # quad mesh
-            cell2node = np.zeros(NC, 3)
-            current = self.cell2hedge[cstart:]
-            cell2node[:, 0] = halfedge[current, 0]
-            current = halfedge[current, 2]
-            cell2node[:, 1] = halfedge[current, 0]
-            current = halfedge[current, 2]
-            cell2node[:, 2] = halfedge[current, 0]
-            current = halfedge[current, 2]
-            cell2node[:, 3] = halfedge[current, 0]
+        elif self.NV in {3, 4}: # tri or quad mesh
+            hcell, _ = self.cell_to_halfedge()
+            cell2node = halfedge[hcell, 0].reshape(NC, self.NV)
             return cell2node
         else:
             raise ValueError('The property NV should be None, 3 or 4! But the NV is {}'.format(self.NV))
 
     def cell_to_edge(self, return_sparse=False):
+        """
+        The edges of every cell.
+
+        Notes
+        -----
+        The local order of the edges is given relative to the vertices
+        returned by `cell_to_node`, with `v_0, v_1, ..., v_{n-1}` the vertices
+        of a cell:
+
+        * triangle: the local edge `i` is opposite to the vertex `v_i`, that
+          is `(v_1, v_2), (v_2, v_0), (v_0, v_1)`;
+        * quadrangle and polygon: the local edge `i` joins `v_i` to
+          `v_{i+1}`, that is `(v_0, v_1), (v_1, v_2), ..., (v_{n-1}, v_0)`.
+
+        This is the order the halfedge walk produces, see `local_edge_shift`.
+        """
         NE = self.NE
         NC = self.NC
 
@@ -1134,40 +1254,12 @@ class HalfEdgeMesh2dDataStructure():
                 J[hflag])), shape=(NC, NE), dtype=np.bool)
             return cell2edge
         elif type(self.NV) is np.ndarray:
-
-            cellLocation = np.zeros(NC+1, dtype=self.itype)
-            cellLocation[1:] = np.cumsum(self.NV)
-
-            cell2edge = np.zeros(cellLocation[-1], dtype=self.itype)
-            current = halfedge[self.cell2hedge[cstart:], 2] # 下一个边
-            idx = cellLocation[:-1]
-            cell2edge[idx] = J[current]
-            NV0 = np.ones(NC, dtype=self.itype)
-            isNotOK = NV0 < self.NV
-            while isNotOK.sum() > 0:
-                current[isNotOK] = halfedge[current[isNotOK], 2]
-                idx[isNotOK] += 1
-                NV0[isNotOK] += 1
-                cell2edge[idx[isNotOK]] = J[current[isNotOK]]
-                isNotOK = (NV0 < self.NV)
+            hcell, _ = self.cell_to_halfedge(shift=1)
+            cell2edge = J[hcell]
             return cell2edge
-        elif self.NV == 3: # tri mesh
-            cell2edge = np.zeros(NC, 3)
-            current = self.cell2hedge[cstart:]
-            cell2edge[:, 1] = J[current]
-            cell2edge[:, 2] = J[halfedge[current, 2]]
-            cell2edge[:, 0] = J[halfedge[current, 3]]
-            return cell2edge
-        elif self.NV == 4: # quad mesh
-            cell2edge = np.zeros(NC, 4)
-            current = self.cell2hedge[cstart:]
-            cell2edge[:, 3] = J[current]
-            current = halfedge[current, 2]
-            cell2edge[:, 0] = J[current] 
-            current = halfedge[current, 2]
-            cell2edge[:, 1] = J[current]
-            current = halfedge[current, 2]
-            cell2edge[:, 2] = J[current]
+        elif self.NV in {3, 4}: # tri or quad mesh
+            hcell, _ = self.cell_to_halfedge(shift=self.local_edge_shift())
+            cell2edge = J[hcell].reshape(NC, self.NV)
             return cell2edge
         else:
             raise ValueError('The property NV should be None, 3 or 4! But the NV is {}'.format(self.NV))
@@ -1184,54 +1276,22 @@ class HalfEdgeMesh2dDataStructure():
         if return_sparse:
             flag = hflag & hflag[halfedge[:, 4]]
             val = np.ones(flag.sum(), dtype=np.bool)
-            I = halfedge[flag, 1]
-            J = halfedge[halfedge[flag, 4], 1]
+            I = cidxmap[halfedge[flag, 1]]
+            J = cidxmap[halfedge[halfedge[flag, 4], 1]]
             cell2cell = coo_matrix((val, (I, J)), shape=(NC, NC), dtype=np.bool)
             cell2cell+= coo_matrix((val, (J, I)), shape=(NC, NC), dtype=np.bool)
             return cell2cell.tocsr()
-        elif type(self.NV) is np.ndarray:
-            cellLocation = np.zeros(NC+1, dtype=self.itype)
-            cellLocation[1:] = np.cumsum(self.NV)
-            cell2cell = np.zeros(cellLocation[-1], dtype=self.itype)
-            current = halfedge[self.cell2hedge[cstart:], 2] # 下一个边
-            idx = cellLocation[:-1]
-            cell2cell[idx] = cidxmap[halfedge[halfedge[current, 4], 1]]
-            NV0 = np.ones(NC, dtype=self.itype)
-            isNotOK = NV0 < self.NV
-            while isNotOK.sum() > 0:
-                current[isNotOK] = halfedge[current[isNotOK], 2]
-                idx[isNotOK] += 1
-                NV0[isNotOK] += 1
-                cell2cell[idx[isNotOK]] = cidxmap[halfedge[halfedge[current[isNotOK], 4], 1]]
-                isNotOK = (NV0 < self.NV)
-            idx = np.repeat(range(NC), self.NV)
-            flag = (cell2cell == -1)
-            cell2cell[flag] = idx[flag]
-            return cell2cell
-        elif self.NV == 3: # tri mesh
-            cell2cell = np.zeros(NC, 3)
-            current = self.cell2hedge[cstart:]
-            cell2cell[:, 1] = cidxmap[halfedge[halfedge[current, 4], 1]]
-            cell2cell[:, 2] = cidxmap[halfedge[halfedge[halfedge[current, 2], 4], 1]]
-            cell2cell[:, 0] = cidxmap[halfedge[halfedge[halfedge[current, 3], 4], 1]]
-            idx = np.repeat(range(NC), 3).reshape(NC, 3)
-            flag = (cell2cell == -1)
-            cell2cell[flag] = idx[flag]
-            return cell2cella
-        elif self.NV == 4: # quad mesh
-            cell2cell = np.zeros(NC, 4)
-            current = self.cell2hedge[cstart:]
-            cell2cell[:, 3] = cidxmap[halfedge[halfedge[current, 4], 1]] 
-            current = halfedge[current, 2]
-            cell2cell[:, 0] = cidxmap[halfedge[halfedge[current, 4], 1]] 
-            current = halfedge[current, 2]
-            cell2cell[:, 1] = cidxmap[halfedge[halfedge[current, 4], 1]] 
-            current = halfedge[current, 2]
-            cell2cell[:, 2] = cidxmap[halfedge[halfedge[current, 4], 1]]
-            idx = np.repeat(range(NC), 4).reshape(NC, 4)
+        elif (type(self.NV) is np.ndarray) or (self.NV in {3, 4}):
+            hcell, _ = self.cell_to_halfedge(shift=self.local_edge_shift())
+            cell2cell = cidxmap[halfedge[halfedge[hcell, 4], 1]]
+            NV = self.number_of_vertices_of_cells()
+            idx = np.repeat(range(NC), NV)
             flag = (cell2cell == -1)
             cell2cell[flag] = idx[flag]
-            return cell2cell
+            if type(self.NV) is np.ndarray:
+                return cell2cell
+            else:
+                return cell2cell.reshape(NC, self.NV)
         else:
             raise ValueError('The property NV should be None, 3 or 4! But the NV is {}'.format(self.NV))
 
@@ -1269,59 +1329,13 @@ class HalfEdgeMesh2dDataStructure():
         edge2cell = np.full((NE, 4), -1, dtype=self.itype)
         edge2cell[J[isMainHEdge], 0] = cidxmap[halfedge[isMainHEdge, 1]]
         edge2cell[J[halfedge[isMainHEdge, 4]], 1] = cidxmap[halfedge[halfedge[isMainHEdge, 4], 1]]
-        if type(self.NV) is np.ndarray:
-            current = halfedge[self.cell2hedge[cstart], 2] # 下一个边
-            end = current.copy()
-            lidx = np.zeros_like(current)
-            isNotOK = np.ones_like(current, dtype=np.bool)
-            while np.any(isNotOK):
-                idx = J[current[isNotOK]]
-                flag = (halfedge[current[isNotOK], 5] == 1)
-                edge2cell[idx[flag], 2] = lidx[isNotOK][flag]
-                edge2cell[idx[~flag], 3] = lidx[isNotOK][~flag]
-                current[isNotOK] = halfedge[current[isNotOK], 2]
-                lidx[isNotOK] += 1
-                isNotOK = (current != end)
-        elif self.NV == 3:
-            current = self.cell2hedge[cstart]
-            idx = J[current]
-            flag = halfedge[current, 5] == 1 
-            edge2cell[idx[flag], 2] = 1
-            edge2cell[idx[~flag], 3] = 1
-
-            idx = J[halfedge[current, 2]]
-            flag = halfedge[halfedge[current, 2], 5] == 1 
-            edge2cell[idx[flag], 2] = 2
-            edge2cell[idx[~flag], 3] = 2
-
-            idx = J[halfedge[current, 3]]
-            flag = halfedge[halfedge[current, 3], 5] == 1 
-            edge2cell[idx[flag], 2] = 0
-            edge2cell[idx[~flag], 3] = 0
-        elif self.NV == 4:
-            current = self.cell2hedge[cstart]
-            idx = J[current]
-            flag = halfedge[current, 5] == 1 
-            edge2cell[idx[flag], 2] = 3
-            edge2cell[idx[~flag], 3] = 3
-
-            current = halfedge[current, 2]
-            idx = J[current]
-            flag = halfedge[current, 5] == 1 
-            edge2cell[idx[flag], 2] = 0
-            edge2cell[idx[~flag], 3] = 0
-
-            current = halfedge[current, 2]
-            idx = J[current]
-            flag = halfedge[current, 5] == 1 
-            edge2cell[idx[flag], 2] = 1
-            edge2cell[idx[~flag], 3] = 1
-
-            current = halfedge[current, 2]
-            idx = J[current]
-            flag = halfedge[current, 5] == 1 
-            edge2cell[idx[flag], 2] = 2
-            edge2cell[idx[~flag], 3] = 2
+        if (type(self.NV) is np.ndarray) or (self.NV in {3, 4}):
+            # the local index of the halfedges in the cells
+            hcell, location = self.cell_to_halfedge(shift=self.local_edge_shift())
+            lidx = np.arange(len(hcell)) - np.repeat(location[:-1], np.diff(location))
+            flag = halfedge[hcell, 5] == 1
+            edge2cell[J[hcell[flag]], 2] = lidx[flag]
+            edge2cell[J[hcell[~flag]], 3] = lidx[~flag]
         else:
             raise ValueError('The property NV should be None, 3 or 4! But the NV is {}'.format(self.NV))
 
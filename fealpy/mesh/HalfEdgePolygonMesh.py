@@ -1,8 +1,11 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye, tril, triu
 from ..quadrature import TriangleQuadrature
+from ..quadrature import get_quadrature
 from .Mesh2d import Mesh2d
 from .adaptive_tools import mark
+from .HalfEdgeMesh import cell_halfedge_order, shift_cell_halfedge
+from .HalfEdgeMesh import split_cell_halfedge
 
 class HalfEdgePolygonMesh(Mesh2d):
     def __init__(self, node, halfedge, NC):
@@ -41,7 +44,7 @@ class HalfEdgePolygonMesh(Mesh2d):
             raise ValueError("`etype` is wrong!")
 
     def integrator(self, k):
-        return TriangleQuadrature(k)
+        return get_quadrature('triangle', k)
 
     @classmethod
     def from_polygonmesh(cls, mesh):
@@ -285,17 +288,12 @@ class HalfEdgePolygonMesh(Mesh2d):
         flag = (halfedge[:, 1] == NC)
         halfedge[flag, 1] = NC + NHE
         cellidx = halfedge[idx0, 1]
-        halfedge[idx0, 1] = range(NC, NC + NHE)
-        
-        idx1 = idx0.copy()
-        pre = halfedge[idx1, 3]
-        flag = (rflag0[pre] != 1)
-        while np.any(flag):
-            idx1[flag] = pre[flag]
-            rflag0[pre[flag]] = np.maximum(rflag0[pre[flag]]-1, 0)
-            pre = halfedge[idx1, 3]
-            flag = (rflag0[pre] != 1)
-            halfedge[idx1, 1] = halfedge[idx0, 1]
+        isFlag = rflag0 == 1
+        idx1, cell = split_cell_halfedge(halfedge, isFlag, idx0, NC)
+        # the other halfedges of the split cells
+        flag = (cell != halfedge[:, 1]) & ~isFlag
+        rflag0[flag] = np.maximum(rflag0[flag]-1, 0)
+        halfedge[:, 1] = cell
         rflag0[idx0] = 0
             
         nex1 = halfedge[idx1, 2] # 下一个
@@ -477,6 +475,7 @@ class HalfEdgePolygonMeshDataStructure():
 
         self.cell2hedge = np.zeros(NC+1, dtype=self.itype)
         self.cell2hedge[halfedge[:, 1]] = range(2*self.NE)
+        self.hcellkey = None
 
     def reinit(self, NN, NC, halfedge):
         self.NN = NN
@@ -488,6 +487,24 @@ class HalfEdgePolygonMeshDataStructure():
 
         self.cell2hedge = np.zeros(NC+1, dtype=self.itype)
         self.cell2hedge[halfedge[:, 1]] = range(2*self.NE)
+        self.hcellkey = None
+
+    def cell_to_halfedge(self, shift=0):
+        """
+        The halfedges of every cell ordered along the cell boundary, see
+        `HalfEdgeMesh2dDataStructure.cell_to_halfedge`.
+        """
+        key = (self.halfedge, self.cell2hedge)
+        if (self.hcellkey is None) or any(a is not b for a, b in zip(key, self.hcellkey)):
+            self.hcell, self.hcellLocation = cell_halfedge_order(
+                    self.halfedge, self.cell2hedge)
+            self.hcellkey = key
+
+        NC = self.NC
+        hcell, location = self.hcell, self.hcellLocation
+        if shift != 0:
+            hcell = shift_cell_halfedge(hcell, location, shift)
+        return hcell[:location[NC]], location[:NC+1]
 
     def number_of_vertices_of_cells(self, returnall=False):
         NC = self.NC
@@ -523,21 +540,8 @@ class HalfEdgePolygonMeshDataStructure():
             cell2node = csr_matrix((val, (I.flat, J.flat)), shape=(NC, NN), dtype=np.bool)
             return cell2node
         else:
-            NV = self.number_of_vertices_of_cells()
-            cellLocation = np.zeros(NC+1, dtype=self.itype)
-            cellLocation[1:] = np.cumsum(NV)
-            cell2node = np.zeros(cellLocation[-1], dtype=self.itype)
-            current = self.cell2hedge.copy()[:NC]
-            idx = cellLocation[:-1].copy()
-            cell2node[idx] = halfedge[current, 0]
-            NV0 = np.ones(NC, dtype=self.itype)
-            isNotOK = NV0 < NV
-            while isNotOK.sum() > 0:
-               current[isNotOK] = halfedge[current[isNotOK], 2]
-               idx[isNotOK] += 1
-               NV0[isNotOK] += 1
-               cell2node[idx[isNotOK]] = halfedge[current[isNotOK], 0]
-               isNotOK = (NV0 < NV)
+            hcell, cellLocation = self.cell_to_halfedge()
+            cell2node = halfedge[hcell, 0]
             return cell2node, cellLocation
 
     def cell_to_edge(self, sparse=False):
@@ -557,21 +561,8 @@ class HalfEdgePolygonMeshDataStructure():
                 J[isInHEdge])), shape=(NC, NE), dtype=np.bool)
             return cell2edge
         else:
-            NV = self.number_of_vertices_of_cells()
-            cellLocation = np.zeros(NC+1, dtype=self.itype)
-            cellLocation[1:] = np.cumsum(NV)
-            cell2edge = np.zeros(cellLocation[-1], dtype=self.itype)
-            current = halfedge[self.cell2hedge[:-1], 2] # 下一个边
-            idx = cellLocation[:-1]
-            cell2edge[idx] = J[current]
-            NV0 = np.ones(NC, dtype=self.itype)
-            isNotOK = NV0 < NV
-            while isNotOK.sum() > 0:
-                current[isNotOK] = halfedge[current[isNotOK], 2]
-                idx[isNotOK] += 1
-                NV0[isNotOK] += 1
-                cell2edge[idx[isNotOK]] = J[current[isNotOK]]
-                isNotOK = (NV0 < NV)
+            hcell, _ = self.cell_to_halfedge(shift=1)
+            cell2edge = J[hcell]
             return cell2edge
 
     def cell_to_face(self, sparse=True):
@@ -627,18 +618,12 @@ class HalfEdgePolygonMeshDataStructure():
             edge2cell[J[isMainHEdge], 0] = halfedge[isMainHEdge, 1]
             edge2cell[J[halfedge[isMainHEdge, 4]], 1] = halfedge[halfedge[isMainHEdge, 4], 1]
 
-            current = halfedge[self.cell2hedge[:-1], 2] # 下一个边
-            end = current.copy()
-            lidx = np.zeros_like(current)
-            isNotOK = np.ones_like(current, dtype=np.bool)
-            while np.any(isNotOK):
-                idx = J[current[isNotOK]]
-                flag = (halfedge[current[isNotOK], 5] == 1)
-                edge2cell[idx[flag], 2] = lidx[isNotOK][flag]
-                edge2cell[idx[~flag], 3] = lidx[isNotOK][~flag]
-                current[isNotOK] = halfedge[current[isNotOK], 2]
-                lidx[isNotOK] += 1
-                isNotOK = (current != end)
+            # the local index of the halfedges in the cells
+            hcell, location = self.cell_to_halfedge(shift=1)
+            lidx = np.arange(len(hcell)) - np.repeat(location[:-1], np.diff(location))
+            flag = halfedge[hcell, 5] == 1
+            edge2cell[J[hcell[flag]], 2] = lidx[flag]
+            edge2cell[J[hcell[~flag]], 3] = lidx[~flag]
 
             isBdEdge = (edge2cell[:, 1] == NC)
             edge2cell[isBdEdge, 1] = edge2cell[isBdEdge, 0]
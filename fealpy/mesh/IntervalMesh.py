@@ -4,6 +4,7 @@ from scipy.sparse import csr_matrix
 from types import ModuleType
 
 from ..quadrature import GaussLegendreQuadrature
+from ..quadrature import get_quadrature
 
 class IntervalMesh():
     def __init__(self, node, cell):
@@ -31,7 +32,7 @@ class IntervalMesh():
 
 
     def integrator(self, k):
-        return GaussLegendreQuadrature(k)
+        return get_quadrature('interval', k)
 
     def number_of_nodes(self):
         return self.ds.NN
@@ -55,10 +56,10 @@ class IntervalMesh():
         else:
             raise ValueError("`entitytype` is wrong!")
 
-    def grad_lambda(self):
+    def grad_lambda(self, index=None):
         node = self.entity('node')
-        cell = self.entity('cell')
-        NC = self.number_of_cells()
+        cell = self.entity('cell') if index is None else self.entity('cell')[index]
+        NC = len(cell)
         v = node[cell[:, 1]] - node[cell[:, 0]]
         GD = self.geo_dimension()
         Dlambda = np.zeros((NC, 2, GD), dtype=np.float)
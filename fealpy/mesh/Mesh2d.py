@@ -1,7 +1,10 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye, tril, triu
-from .mesh_tools import unique_row, find_node, find_entity, show_mesh_2d
+from .mesh_tools import unique_row, unique_entity, find_node, find_entity, show_mesh_2d
 from ..common import ranges
+from .connectivity_cache import ConnectivityCache, cached_connectivity
+from .spatial_index import mesh_spatial_index
+from .entity_store import EntityStore, update_entity
 from types import ModuleType
 
 class Mesh2d():
@@ -141,6 +144,21 @@ class Mesh2d():
         v = node[edge[index, 1],:] - node[edge[index, 0],:]
         return v
 
+    def spatial_index(self, method='auto', rebuild=False):
+        """
+        The cached spatial index of the mesh for the batched queries of the
+        cells containing points, the nearest nodes and the cells in boxes,
+        see `spatial_index.SpatialIndex`.
+
+        Parameters
+        ----------
+        method : str
+            'grid', 'bvh' or 'auto'
+        rebuild : bool
+            rebuild the index, e.g. after the nodes are moved in place
+        """
+        return mesh_spatial_index(self, method=method, rebuild=rebuild)
+
     def add_plot(
             self, plot,
             nodecolor='w', edgecolor='k',
@@ -215,17 +233,52 @@ class Mesh2dDataStructure():
         self.NC = cell.shape[0]
         self.cell = cell
         self.itype = cell.dtype
+        self.conncache = ConnectivityCache()
+        self.store = EntityStore()
         self.construct()
 
     def reinit(self, NN, cell):
         self.NN = NN
         self.NC = cell.shape[0]
         self.cell = cell
+        self.conncache.clear()
         self.construct()
 
+    def update(self, NN, cell, isChangedCell):
+        """ Update the topology after some cells are changed in place or
+        appended, only the edges around the changed cells are recomputed.
+
+        Parameters
+        ----------
+        NN : int
+            the new number of nodes
+        cell : numpy.ndarray
+            the new cells
+        isChangedCell : numpy.ndarray
+            the flags of the changed and the new cells with shape `(NC, )`
+        """
+        if getattr(self, 'edge', None) is None:
+            self.reinit(NN, cell)
+            return
+
+        self.NN = NN
+        self.NC = cell.shape[0]
+        self.cell = cell
+        self.conncache.clear()
+        if not hasattr(self, 'store'):
+            self.store = EntityStore()
+
+        edge = self.store.get('edge', self.edge)
+        edge2cell = self.store.get('edge2cell', self.edge2cell)
+        update_entity(edge, edge2cell, cell, self.localEdge, NN, isChangedCell)
+        self.edge = edge.array
+        self.edge2cell = edge2cell.array
+        self.NE = len(self.edge)
+
     def clear(self):
         self.edge = None
         self.edge2cell = None
+        self.conncache.clear()
 
     def number_of_nodes_of_cells(self):
         return self.V
@@ -258,10 +311,7 @@ class Mesh2dDataStructure():
         E = self.E
 
         totalEdge = self.total_edge()
-        _, i0, j = np.unique(np.sort(totalEdge, axis=-1),
-                return_index=True,
-                return_inverse=True,
-                axis=0)
+        i0, j = unique_entity(totalEdge, self.NN)
         NE = i0.shape[0]
         self.NE = NE
 
@@ -277,6 +327,7 @@ class Mesh2dDataStructure():
 
         self.edge = totalEdge[i0, :]
 
+    @cached_connectivity
     def cell_to_node(self):
         """ 
         """
@@ -291,6 +342,7 @@ class Mesh2dDataStructure():
         cell2node = csr_matrix((val, (I, cell.flatten())), shape=(NC, NN), dtype=np.bool)
         return cell2node
 
+    @cached_connectivity
     def cell_to_edge(self, sparse=False):
         """ The neighbor information of cell to edge
         """
@@ -314,6 +366,7 @@ class Mesh2dDataStructure():
                     shape=(NC, NE), dtype=np.bool)
             return cell2edge 
 
+    @cached_connectivity
     def cell_to_edge_sign(self, sparse=False):
         NC = self.NC
         E = self.E
@@ -329,11 +382,13 @@ class Mesh2dDataStructure():
                     shape=(NC, NE), dtype=np.bool)
         return cell2edgeSign
 
+    @cached_connectivity
     def cell_to_face(self, sparse=False):
         """ The neighbor information of cell to edge
         """
         NE = self.NE
         NC = self.NC
+        E = self.E
 
         edge2cell = self.edge2cell
 
@@ -352,6 +407,7 @@ class Mesh2dDataStructure():
             return cell2edge 
 
 
+    @cached_connectivity
     def cell_to_cell(self, return_sparse=False, return_boundary=True, return_array=False):
         """ Consctruct the neighbor information of cells
         """
@@ -417,6 +473,7 @@ class Mesh2dDataStructure():
         edge2node = self.edge_to_node()
         return edge2node*edge2node.transpose()
 
+    @cached_connectivity
     def edge_to_edge(self):
         edge2node = self.edge_to_node(sparse=True)
         return edge2node*edge2node.transpose()
@@ -446,6 +503,7 @@ class Mesh2dDataStructure():
             face2cell = csr_matrix((val, (I, J)), shape=(NE, NC), dtype=np.bool)
             return face2cell 
 
+    @cached_connectivity
     def node_to_node(self, return_array=False):
         """ The neighbor information of nodes
         """
@@ -472,6 +530,7 @@ class Mesh2dDataStructure():
         node2node = csr_matrix((val, (I, J)), shape=(NN, NN), dtype=np.bool)
         return node2node
 
+    @cached_connectivity
     def node_to_edge(self):
         NN = self.NN
         NE = self.NE
@@ -483,6 +542,7 @@ class Mesh2dDataStructure():
         node2edge = csr_matrix((val, (I, J)), shape=(NN, NE), dtype=np.bool)
         return node2edge
 
+    @cached_connectivity
     def node_to_cell(self, localidx=False):
         """
         """
@@ -503,6 +563,7 @@ class Mesh2dDataStructure():
             node2cell = csr_matrix((val, (I, J)), shape=(NN, NC), dtype=np.bool)
         return node2cell
 
+    @cached_connectivity
     def boundary_edge_to_edge(self):
         NN = self.NN
         edge = self.edge
@@ -516,6 +577,7 @@ class Mesh2dDataStructure():
         _, nex = (m1*m0.T).nonzero()
         return index[pre], index[nex]
 
+    @cached_connectivity
     def boundary_node_flag(self):
         NN = self.NN
         edge = self.edge
@@ -524,6 +586,7 @@ class Mesh2dDataStructure():
         isBdPoint[edge[isBdEdge,:]] = True
         return isBdPoint
 
+    @cached_connectivity
     def boundary_edge_flag(self):
         edge2cell = self.edge2cell
         return edge2cell[:, 0] == edge2cell[:, 1]
@@ -532,6 +595,7 @@ class Mesh2dDataStructure():
         edge = self.edge
         return edge[self.boundary_edge_index()]
 
+    @cached_connectivity
     def boundary_face_flag(self):
         edge2cell = self.edge2cell
         return edge2cell[:, 0] == edge2cell[:, 1]
@@ -540,6 +604,7 @@ class Mesh2dDataStructure():
         edge = self.edge
         return edge[self.boundary_edge_index()]
 
+    @cached_connectivity
     def boundary_cell_flag(self):
         NC = self.NC
         edge2cell = self.edge2cell
@@ -548,21 +613,25 @@ class Mesh2dDataStructure():
         isBdCell[edge2cell[isBdEdge,0]] = True
         return isBdCell 
 
+    @cached_connectivity
     def boundary_node_index(self):
         isBdPoint = self.boundary_node_flag()
         idx, = np.nonzero(isBdPoint)
         return idx 
 
+    @cached_connectivity
     def boundary_edge_index(self):
         isBdEdge = self.boundary_edge_flag()
         idx, = np.nonzero(isBdEdge)
         return idx 
 
+    @cached_connectivity
     def boundary_face_index(self):
         isBdEdge = self.boundary_edge_flag()
         idx, = np.nonzero(isBdEdge)
         return idx 
 
+    @cached_connectivity
     def boundary_cell_index(self):
         isBdCell = self.boundary_cell_flag()
         idx, = np.nonzero(isBdCell)
@@ -2,8 +2,11 @@ import numpy as np
 
 from types import ModuleType
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye, tril, triu
-from .mesh_tools import unique_row, find_entity, show_mesh_3d, find_node
+from .mesh_tools import unique_row, unique_entity, find_entity, show_mesh_3d, find_node
 from ..common import ranges
+from .connectivity_cache import ConnectivityCache, cached_connectivity
+from .spatial_index import mesh_spatial_index
+from .entity_store import EntityStore, update_entity, update_cell_entity
 
 
 class Mesh3d():
@@ -147,6 +150,21 @@ class Mesh3d():
         length = np.sqrt(np.square(v).sum(axis=1))
         return v/length.reshape(-1, 1)
 
+    def spatial_index(self, method='auto', rebuild=False):
+        """
+        The cached spatial index of the mesh for the batched queries of the
+        cells containing points, the nearest nodes and the cells in boxes,
+        see `spatial_index.SpatialIndex`.
+
+        Parameters
+        ----------
+        method : str
+            'grid', 'bvh' or 'auto'
+        rebuild : bool
+            rebuild the index, e.g. after the nodes are moved in place
+        """
+        return mesh_spatial_index(self, method=method, rebuild=rebuild)
+
     def add_plot(
             self, plot,
             nodecolor='k', edgecolor='k', facecolor='w', cellcolor='w',
@@ -232,19 +250,53 @@ class Mesh3dDataStructure():
         self.NN = NN
         self.NC = cell.shape[0]
         self.cell = cell
+        self.conncache = ConnectivityCache()
+        self.store = EntityStore()
         self.construct()
 
     def reinit(self, NN, cell):
         self.NN = NN
         self.NC = cell.shape[0]
         self.cell = cell
+        self.conncache.clear()
         self.construct()
 
+    def update(self, NN, cell, isChangedCell):
+        """ Update the topology after some cells are changed in place or
+        appended, only the faces and the edges around the changed cells are
+        recomputed, see `Mesh2dDataStructure.update`.
+        """
+        if getattr(self, 'face', None) is None:
+            self.reinit(NN, cell)
+            return
+
+        self.NN = NN
+        self.NC = cell.shape[0]
+        self.cell = cell
+        self.conncache.clear()
+        if not hasattr(self, 'store'):
+            self.store = EntityStore()
+
+        face = self.store.get('face', self.face)
+        face2cell = self.store.get('face2cell', self.face2cell)
+        update_entity(face, face2cell, cell, self.localFace, NN, isChangedCell)
+        self.face = face.array
+        self.face2cell = face2cell.array
+        self.NF = len(self.face)
+
+        edge = self.store.get('edge', self.edge)
+        cell2edge = self.store.get('cell2edge', self.cell2edge)
+        update_cell_entity(edge, cell2edge, cell, self.localEdge, NN, isChangedCell)
+        self.edge = edge.array
+        self.cell2edge = cell2edge.array
+        self.NE = len(self.edge)
+
     def clear(self):
         self.face = None
         self.face2cell = None
         self.edge = None
         self.cell2edge = None
+        self.conncache.clear()
 
     def number_of_nodes_of_cells(self):
         return self.V
@@ -272,11 +324,7 @@ class Mesh3dDataStructure():
 
         totalFace = self.total_face()
 
-        _, i0, j = np.unique(
-                np.sort(totalFace, axis=1),
-                return_index=True,
-                return_inverse=True,
-                axis=0)
+        i0, j = unique_entity(totalFace, self.NN)
 
         self.face = totalFace[i0]
 
@@ -295,15 +343,13 @@ class Mesh3dDataStructure():
         self.face2cell[:, 3] = i1 % F
 
         totalEdge = self.total_edge()
-        self.edge, i2, j = np.unique(
-                np.sort(totalEdge, axis=1),
-                return_index=True,
-                return_inverse=True,
-                axis=0)
+        i2, j = unique_entity(totalEdge, self.NN)
+        self.edge = np.sort(totalEdge[i2], axis=1)
         E = self.E
         self.cell2edge = np.reshape(j, (NC, E))
         self.NE = self.edge.shape[0]
 
+    @cached_connectivity
     def cell_to_node(self):
         """
         """
@@ -322,6 +368,7 @@ class Mesh3dDataStructure():
                 ), shape=(NC, NN), dtype=np.bool)
         return cell2node
 
+    @cached_connectivity
     def cell_to_edge(self, sparse=False):
         """ The neighbor information of cell to edge
         """
@@ -351,6 +398,7 @@ class Mesh3dDataStructure():
             cell2edgeSign[:, i] = cell[:, j] < cell[:, k]
         return cell2edgeSign
 
+    @cached_connectivity
     def cell_to_face(self, sparse=False):
         NC = self.NC
         NF = self.NF
@@ -372,6 +420,7 @@ class Mesh3dDataStructure():
                     ), shape=(NC, NF), dtype=np.bool)
             return cell2face
 
+    @cached_connectivity
     def cell_to_cell(
             self, return_sparse=False,
             return_boundary=True, return_array=False):
@@ -442,6 +491,7 @@ class Mesh3dDataStructure():
                     ), shape=(NF, NN), dtype=np.bool)
             return face2node
 
+    @cached_connectivity
     def face_to_edge(self, return_sparse=False):
         cell2edge = self.cell2edge
         face2cell = self.face2cell
@@ -508,6 +558,7 @@ class Mesh3dDataStructure():
         edge2node = self.edge_to_node()
         return edge2node*edge2node.transpose()
 
+    @cached_connectivity
     def edge_to_face(self):
         NF = self.NF
         NE = self.NE
@@ -523,6 +574,7 @@ class Mesh3dDataStructure():
                 ), shape=(NE, NF), dtype=np.bool)
         return edge2face
 
+    @cached_connectivity
     def edge_to_cell(self, localidx=False):
         NC = self.NC
         NE = self.NE
@@ -538,6 +590,7 @@ class Mesh3dDataStructure():
                 ), shape=(NE, NC), dtype=np.bool)
         return edge2cell
 
+    @cached_connectivity
     def node_to_node(self):
         """ The neighbor information of nodes
         """
@@ -554,6 +607,7 @@ class Mesh3dDataStructure():
                 ), shape=(NN, NN), dtype=np.bool)
         return node2node
 
+    @cached_connectivity
     def node_to_edge(self):
         NN = self.NN
         NE = self.NE
@@ -568,6 +622,7 @@ class Mesh3dDataStructure():
                 ), shape=(NE, NN), dtype=np.bool)
         return node2edge
 
+    @cached_connectivity
     def node_to_face(self):
         NN = self.NN
         NF = self.NF
@@ -584,6 +639,7 @@ class Mesh3dDataStructure():
                 ), shape=(NF, NN), dtype=np.bool)
         return node2face
 
+    @cached_connectivity
     def node_to_cell(self, return_local_index=False):
         """
         """
@@ -613,6 +669,7 @@ class Mesh3dDataStructure():
                     ), shape=(NN, NC), dtype=np.bool)
         return node2cell
 
+    @cached_connectivity
     def boundary_node_flag(self):
         NN = self.NN
         face = self.face
@@ -621,6 +678,7 @@ class Mesh3dDataStructure():
         isBdPoint[face[isBdFace, :]] = True
         return isBdPoint
 
+    @cached_connectivity
     def boundary_edge_flag(self):
         NE = self.NE
         face2edge = self.face_to_edge()
@@ -629,10 +687,12 @@ class Mesh3dDataStructure():
         isBdEdge[face2edge[isBdFace, :]] = True
         return isBdEdge
 
+    @cached_connectivity
     def boundary_face_flag(self):
         face2cell = self.face_to_cell()
         return face2cell[:, 0] == face2cell[:, 1]
 
+    @cached_connectivity
     def boundary_cell_flag(self):
         NC = self.NC
         face2cell = self.face_to_cell()
@@ -641,21 +701,25 @@ class Mesh3dDataStructure():
         isBdCell[face2cell[isBdFace, 0]] = True
         return isBdCell
 
+    @cached_connectivity
     def boundary_node_index(self):
         isBdNode = self.boundary_node_flag()
         idx, = np.nonzero(isBdNode)
         return idx
 
+    @cached_connectivity
     def boundary_edge_index(self):
         isBdEdge = self.boundary_edge_flag()
         idx, = np.nonzero(isBdEdge)
         return idx
 
+    @cached_connectivity
     def boundary_face_index(self):
         isBdFace = self.boundary_face_flag()
         idx, = np.nonzero(isBdFace)
         return idx
 
+    @cached_connectivity
     def boundary_cell_index(self):
         isBdCell = self.boundary_cell_flag()
         idx, = np.nonzero(isBdCell)
@@ -1,8 +1,9 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye, tril, triu
 from ..common import ranges
-from .mesh_tools import unique_row, find_entity, show_mesh_2d
+from .mesh_tools import unique_row, unique_entity, find_entity, show_mesh_2d
 from ..quadrature import TriangleQuadrature
+from ..quadrature import get_quadrature
 from .Mesh2d import Mesh2d
 
 class PolygonMesh(Mesh2d):
@@ -26,7 +27,7 @@ class PolygonMesh(Mesh2d):
         self.ftype = node.dtype
 
     def integrator(self, k):
-        return TriangleQuadrature(k)
+        return get_quadrature('triangle', k)
 
     def number_of_vertices_of_cells(self):
         return self.ds.number_of_vertices_of_cells()
@@ -298,10 +299,7 @@ class PolygonMeshDataStructure():
         NV = self.number_of_vertices_of_cells()
 
         totalEdge = self.total_edge()
-        _, i0, j = np.unique(np.sort(totalEdge, axis=1),
-                return_index=True,
-                return_inverse=True,
-                axis=0)
+        i0, j = unique_entity(totalEdge, self.NN)
         NE = i0.shape[0]
         self.NE = NE
         self.edge2cell = np.zeros((NE, 4), dtype=np.int)
@@ -1,6 +1,7 @@
 import numpy as np
 from .Mesh2d import Mesh2d, Mesh2dDataStructure
 from ..quadrature import QuadrangleQuadrature
+from ..quadrature import get_quadrature
 from ..common import hash2map
 
 
@@ -43,7 +44,7 @@ class QuadrangleMesh(Mesh2d):
         self.ds.reinit(NN, cell)
 
     def integrator(self, k):
-        return QuadrangleQuadrature(k)
+        return get_quadrature('quadrangle', k)
 
 
     def area(self, index=None):
@@ -322,11 +322,26 @@ class Quadtree(QuadrangleMesh):
             newParent[:, 1] = ranges(4*np.ones(NCC, dtype=self.itype))
             child[idx, :] = np.arange(NC, NC + 4*NCC).reshape(NCC, 4)
 
-            cell = np.concatenate((cell, newCell), axis=0)
-            self.node = np.concatenate((node, edgeCenter, cellCenter), axis=0)
-            self.parent = np.concatenate((parent, newParent), axis=0)
-            self.child = np.concatenate((child, newChild), axis=0)
-            self.ds.reinit(N + NEC + NCC, cell)
+            # the entity arrays grow in place with spare capacity, and only
+            # the topology around the new cells is updated
+            store = self.ds.store
+            nodes = store.get('node', node)
+            nodes.extend(edgeCenter)
+            nodes.extend(cellCenter)
+            self.node = nodes.array
+
+            cells = store.get('cell', cell)
+            cells.extend(newCell)
+            parents = store.get('parent', parent)
+            parents.extend(newParent)
+            self.parent = parents.array
+            children = store.get('child', child)
+            children.extend(newChild)
+            self.child = children.array
+
+            isNewCell = np.zeros(NC + 4*NCC, dtype=np.bool)
+            isNewCell[NC:] = True
+            self.ds.update(N + NEC + NCC, cells.array, isNewCell)
 
     def coarsen_1(self, isMarkedCell=None, options={'disp': True}):
         """ marker will marke the leaf cells which will be coarsen
@@ -122,8 +122,9 @@ class StructureQuadMesh(Mesh2d):
         ny = self.ds.ny
 
         v = px - np.array(box[0::2], dtype=self.ftype)
-        n0 = v[..., 0]//hx
-        n1 = v[..., 1]//hy
+        # the points on the right and the top boundaries are in the last cells
+        n0 = np.clip(v[..., 0]//hx, 0, nx-1)
+        n1 = np.clip(v[..., 1]//hy, 0, ny-1)
 
         cidx = n0*ny + n1
         return cidx.astype(self.itype)
@@ -207,10 +208,9 @@ class StructureQuadMesh(Mesh2d):
         isBDCell = self.ds.boundary_cell_flag()
         iscell = cellidx == cellidx
 
-        for i in range(NC):
-            for j in range(nx):
-                if j*ny <= cellidx[i] < (j+1)*ny:
-                    newcellidx[i] = cellidx[i] + 2*j + ny + 3
+        # the index of the cells in the (nx+2)*(ny+2) grid with the ghost layer
+        flag = (cellidx >= 0) & (cellidx < nx*ny)
+        newcellidx[flag] = cellidx[flag] + 2*(cellidx[flag]//ny) + ny + 3
 
 
         wx1 = np.zeros((NC, ), dtype=self.ftype)
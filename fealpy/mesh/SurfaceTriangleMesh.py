@@ -4,6 +4,7 @@ from types import ModuleType
 
 from fealpy.functionspace import LagrangeFiniteElementSpace
 from ..quadrature import TriangleQuadrature
+from ..quadrature import get_quadrature
 
 from .mesh_tools import unique_row, find_node, find_entity, show_mesh_2d
 
@@ -65,7 +66,7 @@ class SurfaceTriangleMesh():
             return p*self.scale, d*self.scale
 
     def integrator(self, k):
-        return TriangleQuadrature(k)
+        return get_quadrature('triangle', k)
 
     def entity(self, etype=2):
         if etype in {'cell', 2}:
@@ -3,7 +3,10 @@ from scipy.sparse import coo_matrix, csc_matrix, csr_matrix
 from scipy.sparse import spdiags, eye, tril, triu, bmat
 from .mesh_tools import unique_row
 from .Mesh3d import Mesh3d, Mesh3dDataStructure
+from .entity_store import GrowableArray, RefinementRecord
+from .point_location import locate_points
 from ..quadrature import TetrahedronQuadrature, TriangleQuadrature, GaussLegendreQuadrature
+from ..quadrature import get_quadrature
 
 class TetrahedronMeshDataStructure(Mesh3dDataStructure):
     localFace = np.array([(1, 2, 3),  (0, 3, 2), (0, 1, 3), (0, 2, 1)])
@@ -55,11 +58,11 @@ class TetrahedronMesh(Mesh3d):
 
     def integrator(self, k, etype=3):
         if etype in ['cell', 3]:
-            return TetrahedronQuadrature(k)
+            return get_quadrature('tetrahedron', k)
         elif etype in ['face', 2]:
-            return TriangleQuadrature(k)
+            return get_quadrature('triangle', k)
         elif etype in ['edge', 1]:
-            return GaussLegendreQuadrature(k)
+            return get_quadrature('interval', k)
 
     def delete_cell(self, threshold):
         NN = self.number_of_nodes()
@@ -240,13 +243,13 @@ class TetrahedronMesh(Mesh3d):
 
         return grad/wgt.reshape(-1, 1)
 
-    def grad_lambda(self):
+    def grad_lambda(self, index=None):
         localFace = self.ds.localFace
         node = self.node
-        cell = self.ds.cell
-        NC = self.number_of_cells()
+        cell = self.ds.cell if index is None else self.ds.cell[index]
+        NC = len(cell)
         Dlambda = np.zeros((NC, 4, 3), dtype=self.ftype)
-        volume = self.cell_volume()
+        volume = self.cell_volume(index=index)
         for i in range(4):
             j,k,m = localFace[i]
             vjk = node[cell[:,k],:] - node[cell[:,j],:]
@@ -254,6 +257,15 @@ class TetrahedronMesh(Mesh3d):
             Dlambda[:,i,:] = np.cross(vjm, vjk)/(6*volume.reshape(-1,1))
         return Dlambda
 
+    def location(self, points, nearest=False):
+        """
+        Find the cells containing the points, see `TriangleMesh.location`.
+        """
+        node = self.entity('node')
+        cell = self.entity('cell')
+        return locate_points(node, cell, self.ds.cell_to_cell(), points,
+                nearest=nearest, index=self.spatial_index())
+
     def label(self, node=None, cell=None, cellidx=None):
         """单元顶点的重新排列，使得cell[:, :2] 存储了单元的最长边
         Parameter
@@ -316,7 +328,22 @@ class TetrahedronMesh(Mesh3d):
         for i in range(2*n):
             self.bisect()
 
-    def bisect(self, isMarkedCell=None, data=None, returnim=False):
+    def bisect(self, isMarkedCell=None, data=None, returnim=False,
+            returnrecord=False):
+        """
+        Bisect the marked cells and their neighbors until the mesh is
+        conforming.
+
+        When `returnrecord` is True, a `RefinementRecord` is returned (after
+        the interpolation matrix if `returnim` is also True), see
+        `LagrangeFiniteElementSpace.refine_update`.
+
+        The cell array is updated in place: an array got by
+        `entity('cell')` before the bisection may share its storage with the
+        new one, then the rows of the refined cells in it are overwritten
+        (the new cells are never in it). Copy it to keep the old cells, or
+        use `RefinementRecord.oldcell`, which is a copy of the refined rows.
+        """
 
         NN = self.number_of_nodes()
         NC = self.number_of_cells()
@@ -326,25 +353,41 @@ class TetrahedronMesh(Mesh3d):
         else:
             markedCell, = np.nonzero(isMarkedCell)
 
-        # allocate new memory for node and cell
-        node = np.zeros((9*NN, 3), dtype=self.ftype)
-        cell = np.zeros((4*NC, 4), dtype=self.itype)
+        # the node and cell arrays grow in place with spare capacity
+        store = self.ds.store
+        nodes = store.get('node', self.entity('node'))
+        cells = store.get('cell', self.entity('cell'))
+        node = nodes.array
+        cell = cells.array
+        NN0 = NN
+        NC0 = NC
+        changedCell = []
+
+        # the parents of the cells and the old vertices of the refined cells
+        parent = GrowableArray(np.arange(NC), capacity=2*NC)
+        isSaved = np.zeros(NC, dtype=np.bool)
+        savedCell = [np.zeros(0, dtype=self.itype)]
+        savedRow = [np.zeros((0, 4), dtype=self.itype)]
 
-        node[:NN] = self.entity('node')
-        cell[:NC] = self.entity('cell')
         # 用于存储网格节点的代数，初始所有节点都为第 0 代
-        generation = np.zeros(NN + 6*NC, dtype=np.uint8)
+        generation = GrowableArray(np.zeros(NN, dtype=np.uint8))
 
         # 用于记录被二分的边及其中点编号
-        cutEdge = np.zeros((8*NN, 3), dtype=self.itype)
+        cutEdge = GrowableArray(np.zeros((0, 3), dtype=self.itype), capacity=NN)
 
         # 当前的二分边的数目
         nCut = 0
 
         # 非协调边的标记数组 
-        nonConforming = np.ones(8*NN, dtype=np.bool)
+        nonConforming = GrowableArray(np.zeros(0, dtype=np.bool), capacity=NN)
         IM = eye(NN)
         while len(markedCell) != 0:
+            old = markedCell[markedCell < NC0]
+            old = old[~isSaved[old]]
+            isSaved[old] = True
+            savedCell.append(old)
+            savedRow.append(cell[old])
+
             # 标记最长边
             self.label(node, cell, markedCell)
 
@@ -362,10 +405,10 @@ class TetrahedronMesh(Mesh3d):
                 idx = np.arange(nMarked) # cells introduce new cut edges
             else:
                 # all non-conforming edges
-                ncEdge = np.nonzero(nonConforming[:nCut])
+                ncEdge = np.nonzero(nonConforming.array[:nCut])
                 NE = len(ncEdge)
-                I = cutEdge[ncEdge][:, [2, 2]].reshape(-1)
-                J = cutEdge[ncEdge][:, [0, 1]].reshape(-1)
+                I = cutEdge.array[ncEdge][:, [2, 2]].reshape(-1)
+                J = cutEdge.array[ncEdge][:, [0, 1]].reshape(-1)
                 val = np.ones(len(I), dtype=np.bool)
                 nv2v = csr_matrix(
                         (val, (I, J)),
@@ -390,10 +433,11 @@ class TetrahedronMesh(Mesh3d):
                 # 获得唯一的边 
                 i, j = s.nonzero()
                 nNew = len(i)
-                newCutEdge = np.arange(nCut, nCut+nNew)
-                cutEdge[newCutEdge, 0] = i
-                cutEdge[newCutEdge, 1] = j
-                cutEdge[newCutEdge, 2] = range(NN, NN+nNew)
+                newCutEdge = cutEdge.extend(
+                        np.c_[i, j, np.arange(NN, NN+nNew)])
+                nonConforming.resize(nCut+nNew)[nCut:] = True
+                generation.resize(NN+nNew)[NN:] = 0
+                node = nodes.resize(NN+nNew)
                 node[NN:NN+nNew, :] = (node[i, :] + node[j, :])/2.0
                 if returnim is True:
                     val = np.full(nNew, 0.5)
@@ -410,8 +454,8 @@ class TetrahedronMesh(Mesh3d):
                 NN += nNew
 
                 # 新点和旧点的邻接矩阵 
-                I = cutEdge[newCutEdge][:, [2, 2]].reshape(-1)
-                J = cutEdge[newCutEdge][:, [0, 1]].reshape(-1)
+                I = cutEdge.array[newCutEdge][:, [2, 2]].reshape(-1)
+                J = cutEdge.array[newCutEdge][:, [0, 1]].reshape(-1)
                 val = np.ones(len(I), dtype=np.bool)
                 nv2v = csr_matrix(
                         (val, (I, J)),
@@ -420,12 +464,15 @@ class TetrahedronMesh(Mesh3d):
                 p4[j] = i
 
             # 如果新点的代数仍然为 0
-            idx = (generation[p4] == 0)
+            idx = (generation.array[p4] == 0)
             cellGeneration = np.max(
-                    generation[cell[markedCell[idx]]],
+                    generation.array[cell[markedCell[idx]]],
                     axis=-1)
             # 第几代点 
-            generation[p4[idx]] = cellGeneration + 1
+            generation.array[p4[idx]] = cellGeneration + 1
+            changedCell.append(markedCell)
+            parent.extend(parent.array[markedCell])
+            cell = cells.resize(NC+nMarked)
             cell[markedCell, 0] = p3
             cell[markedCell, 1] = p0
             cell[markedCell, 2] = p2
@@ -438,9 +485,9 @@ class TetrahedronMesh(Mesh3d):
             del cellGeneration, p0, p1, p2, p3, p4
 
             # 找到非协调的单元 
-            checkEdge, = np.nonzero(nonConforming[:nCut])
+            checkEdge, = np.nonzero(nonConforming.array[:nCut])
             isCheckNode = np.zeros(NN, dtype=np.bool)
-            isCheckNode[cutEdge[checkEdge]] = True
+            isCheckNode[cutEdge.array[checkEdge]] = True
             isCheckCell = np.sum(
                     isCheckNode[cell[:NC]],
                     axis= -1) > 0
@@ -451,17 +498,29 @@ class TetrahedronMesh(Mesh3d):
             val = np.ones(len(I), dtype=np.bool)
             cell2node = csr_matrix((val, (I, J)), shape=(NC, NN))
             i, j = np.nonzero(
-                    cell2node[:, cutEdge[checkEdge, 0]].multiply(
-                        cell2node[:, cutEdge[checkEdge, 1]]
+                    cell2node[:, cutEdge.array[checkEdge, 0]].multiply(
+                        cell2node[:, cutEdge.array[checkEdge, 1]]
                         ))
             markedCell = np.unique(i)
-            nonConforming[checkEdge] = False
-            nonConforming[checkEdge[j]] = True;
-
-
-        self.node = node[:NN]
-        cell = cell[:NC]
-        self.ds.reinit(NN, cell)
+            nonConforming.array[checkEdge] = False
+            nonConforming.array[checkEdge[j]] = True;
+
+        self.node = nodes.array
+        isChangedCell = np.zeros(NC, dtype=np.bool)
+        isChangedCell[NC0:] = True
+        for idx in changedCell:
+            isChangedCell[idx] = True
+        self.ds.update(NN, cells.array, isChangedCell)
+
+        if returnrecord is True:
+            savedCell = np.concatenate(savedCell)
+            idx = np.argsort(savedCell)
+            oldcell = np.concatenate(savedRow)[idx]
+            record = RefinementRecord(NN0, NC0, parent.array, isChangedCell,
+                    savedCell[idx], oldcell)
+            if returnim is True:
+                return IM, record
+            return record
 
         if returnim is True:
             return IM
@@ -1,8 +1,11 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, bmat, eye
 from .Mesh2d import Mesh2d, Mesh2dDataStructure
+from .entity_store import RefinementRecord
+from .point_location import simplex_walk, locate_points
 from ..quadrature import TriangleQuadrature
 from ..quadrature import GaussLegendreQuadrature
+from ..quadrature import get_quadrature
 
 class TriangleMeshDataStructure(Mesh2dDataStructure):
     localEdge = np.array([(1, 2), (2, 0), (0, 1)])
@@ -39,9 +42,9 @@ class TriangleMesh(Mesh2d):
 
     def integrator(self, k, etype='cell'):
         if etype in {'cell', 2}:
-            return TriangleQuadrature(k)
+            return get_quadrature('triangle', k)
         elif etype in {'edge', 'face', 1}:
-            return GaussLegendreQuadrature(k)
+            return get_quadrature('interval', k)
 
     def copy(self):
         return TriangleMesh(self.node.copy(), self.ds.cell.copy());
@@ -102,32 +105,53 @@ class TriangleMesh(Mesh2d):
         isShortEdge = h < h0
 
 
-    def line_walk(self, p):
+    def line_walk(self, p, start=None):
+        """
+        Locate the points `p` by the walk through the neighbor cells, which
+        starts from the cells `start` or the random cells.
+
+        Returns
+        -------
+        cidx : numpy.ndarray
+            the cell containing every point, -1 for the points where the
+            walk leaves the mesh
+        """
         NC = self.number_of_cells()
-        NP = p.shape[0]
+        if start is None:
+            start = np.random.randint(0, NC, len(p))
+        node = self.entity('node')
         cell = self.entity('cell')
+        cell2cell = self.ds.cell_to_cell()
+        cidx, isIn = simplex_walk(node, cell, cell2cell, p, start)
+        cidx[~isIn] = -1
+        return cidx
 
-        cidx = np.random.randint(0, NC, NP)
-        isNotOK = np.ones(NP, dtype=np.bool)
-        while isNotOK.sum() > 0:
-            idx0, = np.find(isNotOK)
-            cidx0 = cidx[isNotOK]
-            pp = p[isNotOK]
-
-            a = np.zeros((len(cidx0), 3), dtype=self.ftype)
-            p0 = cell[cidx0, 0]
-            p1 = cell[cidx0, 1]
-            p2 = cell[cidx0, 2]
-
-            v0 = p0 - pp
-            v1 = p1 - pp
-            v2 = p2 - pp
-            a[:, 0] = np.cross(v1, v2)
-            a[:, 1] = np.cross(v2, v0)
-            a[:, 2] = np.cross(v0, v1)
-            idx = np.argmin(a, axis=-1)
-
-            isOK = a[range(a.shape[0]), idx] >= 0
+    def location(self, points, nearest=False):
+        """
+        Find the cells containing the points, see `point_location`.
+
+        Parameters
+        ----------
+        points : numpy.ndarray
+            with shape `(NP, 2)`
+        nearest : bool
+            the points outside the mesh are assigned to the nearby boundary
+            cells when it is True, otherwise their cell index is -1
+
+        Returns
+        -------
+        cidx : numpy.ndarray
+            with shape `(NP, )`
+        bc : numpy.ndarray
+            the barycentric coordinates of the points in the cells with
+            shape `(NP, 3)`
+        """
+        if self.geo_dimension() != 2:
+            raise ValueError("The location only works for the planar mesh!")
+        node = self.entity('node')
+        cell = self.entity('cell')
+        return locate_points(node, cell, self.ds.cell_to_cell(), points,
+                nearest=nearest, index=self.spatial_index())
 
     def circumcenter(self):
         node = self.node
@@ -254,7 +278,22 @@ class TriangleMesh(Mesh2d):
         for i in range(n):
             self.bisect()
 
-    def bisect(self, isMarkedCell='all', returnim=False, refine=None):
+    def bisect(self, isMarkedCell='all', returnim=False, refine=None,
+            returnrecord=False):
+        """
+        Newest vertex bisection of the marked cells.
+
+        When `returnim` is True, the interpolation matrix of the linear
+        element is returned. When `returnrecord` is True, a
+        `RefinementRecord` is returned (after the interpolation matrix if
+        both are required), see `LagrangeFiniteElementSpace.refine_update`.
+
+        The cell array is updated in place: an array got by
+        `entity('cell')` before the bisection may share its storage with the
+        new one, then the rows of the refined cells in it are overwritten
+        (the new cells are never in it). Copy it to keep the old cells, or
+        use `RefinementRecord.oldcell`, which is a copy of the refined rows.
+        """
 
         NN = self.number_of_nodes()
         NC = self.number_of_cells()
@@ -280,9 +319,15 @@ class TriangleMesh(Mesh2d):
         edge2newNode = np.zeros((NE,), dtype=self.itype)
         edge2newNode[isCutEdge] = np.arange(NN, NN+isCutEdge.sum())
 
+        # the node and cell arrays grow in place with spare capacity
+        store = self.ds.store
+        nodes = store.get('node', self.node)
+        cells = store.get('cell', cell)
+
         node = self.node
         newNode =0.5*(node[edge[isCutEdge,0],:] + node[edge[isCutEdge,1],:])
-        self.node = np.concatenate((node, newNode), axis=0)
+        nodes.extend(newNode)
+        self.node = nodes.array
         cell2edge0 = cell2edge[:, 0]
 
         if returnim:
@@ -307,6 +352,12 @@ class TriangleMesh(Mesh2d):
                         )
                     ), shape=(NN+nn, NN), dtype=self.ftype)
 
+        NN0 = NN
+        NC0 = NC
+        parent = np.arange(NC)
+        changedCell = np.zeros(0, dtype=self.itype)
+        oldcell = np.zeros((0, 3), dtype=self.itype)
+        isChangedCell = np.zeros(NC, dtype=np.bool)
         for k in range(2):
             idx, = np.nonzero(edge2newNode[cell2edge0]>0)
             nc = len(idx)
@@ -318,7 +369,14 @@ class TriangleMesh(Mesh2d):
             p1 = cell[idx,1]
             p2 = cell[idx,2]
             p3 = edge2newNode[cell2edge0[idx]]
-            cell = np.concatenate((cell, np.zeros((nc,3), dtype=self.itype)), axis=0)
+            if k == 0:
+                # only the old cells are split in the first loop
+                changedCell = idx
+                oldcell = cell[idx].copy()
+            parent = np.r_[parent, parent[idx]]
+            cell = cells.resize(NC+nc)
+            isChangedCell = np.r_[isChangedCell, np.ones(nc, dtype=np.bool)]
+            isChangedCell[L] = True
             cell[L,0] = p3
             cell[L,1] = p0
             cell[L,2] = p1
@@ -333,7 +391,14 @@ class TriangleMesh(Mesh2d):
             NC = NC+nc
 
         NN = self.node.shape[0]
-        self.ds.reinit(NN, cell)
+        self.ds.update(NN, cell, isChangedCell)
+
+        if returnrecord:
+            record = RefinementRecord(NN0, NC0, parent, isChangedCell,
+                    changedCell, oldcell)
+            if returnim:
+                return IM.tocsr(), record
+            return record
 
         if returnim:
             return IM.tocsr()
@@ -648,10 +713,10 @@ class TriangleMesh(Mesh2d):
 
 
 
-    def grad_lambda(self):
+    def grad_lambda(self, index=None):
         node = self.node
-        cell = self.ds.cell
-        NC = self.number_of_cells()
+        cell = self.ds.cell if index is None else self.ds.cell[index]
+        NC = len(cell)
         v0 = node[cell[:, 2], :] - node[cell[:, 1], :]
         v1 = node[cell[:, 0], :] - node[cell[:, 2], :]
         v2 = node[cell[:, 1], :] - node[cell[:, 0], :]
@@ -730,11 +730,25 @@ class Tritree(TriangleMesh):
             if surface is not None:
                 ec, _ = surface.project(ec)
 
-            self.node = np.r_['0', node, ec]
-            cell = np.r_['0', cell, cell4]
-            self.parent = np.r_['0', self.parent, parent4]
-            self.child = np.r_['0', self.child, child4]
-            self.ds.reinit(NN + NNN, cell)
+            # the entity arrays grow in place with spare capacity, and only
+            # the topology around the new cells is updated
+            store = self.ds.store
+            nodes = store.get('node', node)
+            nodes.extend(ec)
+            self.node = nodes.array
+
+            cells = store.get('cell', cell)
+            cells.extend(cell4)
+            parents = store.get('parent', self.parent)
+            parents.extend(parent4)
+            self.parent = parents.array
+            children = store.get('child', self.child)
+            children.extend(child4)
+            self.child = children.array
+
+            isNewCell = np.zeros(NC + 4*NCC, dtype=np.bool)
+            isNewCell[NC:] = True
+            self.ds.update(NN + NNN, cells.array, isNewCell)
 
     def adaptive_coarsen(self, estimator, surface=None, data=None):
         if data is not None:
@@ -0,0 +1,103 @@
+import numpy as np
+from functools import wraps
+
+
+class ConnectivityCache():
+    """
+    The cache of the connectivity relations of a mesh data structure.
+
+    Every relation is computed on the first access and stored, the integer
+    arrays are stored as `np.int32` when the values allow, and the returned
+    arrays are read-only views, the arrays of the data structure itself stay
+    writable. The cache is cleared by `reinit` and `update` of the data
+    structure.
+
+    The data depending on the node coordinates (e.g. the spatial index and
+    the point location) are stored by `get_geometric` with the node and the
+    cell arrays they are built from, and they are rebuilt when either array
+    is replaced. The nodes moved in place are not detected.
+
+    `hits` and `misses` count the accesses of every relation, see `info`.
+    """
+    def __init__(self):
+        self.data = {}
+        self.geodata = {}
+        self.hits = {}
+        self.misses = {}
+
+    def clear(self):
+        self.data.clear()
+        self.geodata.clear()
+
+    def reset_statistics(self):
+        self.hits.clear()
+        self.misses.clear()
+
+    def info(self):
+        """
+        Return the `(hits, misses)` of every relation.
+        """
+        names = set(self.hits) | set(self.misses)
+        return {name: (self.hits.get(name, 0), self.misses.get(name, 0))
+                for name in sorted(names)}
+
+    def compact(self, val):
+        if isinstance(val, tuple):
+            return tuple(self.compact(v) for v in val)
+        elif isinstance(val, np.ndarray):
+            if (val.dtype.kind in 'iu') and (val.dtype.itemsize > 4) \
+                    and ((val.size == 0) or (val.max() < 2**31 and val.min() >= -2**31)):
+                val = val.astype(np.int32)
+            else:
+                # do not freeze the array owned by the data structure
+                val = val.view()
+            val.setflags(write=False)
+        return val
+
+    def get(self, name, key, fun):
+        if key in self.data:
+            self.hits[name] = self.hits.get(name, 0) + 1
+            return self.data[key]
+        self.misses[name] = self.misses.get(name, 0) + 1
+        val = self.compact(fun())
+        self.data[key] = val
+        return val
+
+    def get_geometric(self, name, key, node, cell, fun):
+        """
+        Get the data built from `node` and `cell`, it is rebuilt when the
+        stored one was built from other arrays.
+        """
+        item = self.geodata.get(key)
+        if (item is not None) and (item[0] is node) and (item[1] is cell):
+            self.hits[name] = self.hits.get(name, 0) + 1
+            return item[2]
+        self.misses[name] = self.misses.get(name, 0) + 1
+        val = fun()
+        self.geodata[key] = (node, cell, val)
+        return val
+
+    def discard_geometric(self, key):
+        self.geodata.pop(key, None)
+
+
+def cached_connectivity(method):
+    """
+    Cache the return value of a connectivity method of a mesh data
+    structure in `self.conncache`, the key is the method name and the
+    arguments.
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        if not hasattr(self, 'conncache'):
+            self.conncache = ConnectivityCache()
+        return self.conncache.get(name, key,
+                lambda: method(self, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,282 @@
+import numpy as np
+from .mesh_tools import unique_entity
+
+
+class GrowableArray():
+    """
+    An array with spare capacity along the first axis.
+
+    `array` is the view of the live part `data[:size]`. The data is
+    reallocated only when the size goes beyond the capacity, and then the
+    capacity is at least doubled, so appending the entities in every
+    refinement step costs amortized O(1) per entity instead of copying all
+    the entities by `np.concatenate`.
+
+    The view `array` is refreshed by every `resize`, write into the new
+    `array` after resizing.
+    """
+    def __init__(self, a, capacity=None):
+        a = np.asarray(a)
+        n = len(a)
+        capacity = max(n, capacity if capacity is not None else n)
+        self.data = np.empty((capacity, ) + a.shape[1:], dtype=a.dtype)
+        self.data[:n] = a
+        self.size = n
+        self.array = self.data[:n]
+
+    def __len__(self):
+        return self.size
+
+    def capacity(self):
+        return len(self.data)
+
+    def reserve(self, n):
+        """
+        Make sure the capacity is not less than `n`.
+        """
+        if n > len(self.data):
+            data = np.empty((max(n, 2*len(self.data)), ) + self.data.shape[1:],
+                    dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def resize(self, n):
+        self.reserve(n)
+        self.size = n
+        self.array = self.data[:n]
+        return self.array
+
+    def extend(self, a):
+        """
+        Append the entities `a`, and return the index of them.
+        """
+        n = self.size
+        self.resize(n + len(a))[n:] = a
+        return np.arange(n, self.size)
+
+
+class EntityStore():
+    """
+    The growable storage of the entity arrays (node, cell, parent, child, ...)
+    of a mesh during the adaptive refinement.
+
+    `get(name, a)` returns the growable array backing `a`. When `a` is not
+    the current view of the stored array of `name` (e.g. the mesh was
+    changed by other methods), the store is rebuilt from `a`.
+
+    The arrays are changed in place while the capacity is enough, so the
+    arrays held by the users before the refinement are the views of the
+    same storage: the appended entities are not in them, but the entities
+    changed in place (e.g. the refined cells) are. The refinement methods
+    save a copy of the changed rows (see `RefinementRecord.oldcell`)
+    instead of copying the whole arrays.
+    """
+    def __init__(self):
+        self.arrays = {}
+
+    def clear(self):
+        self.arrays.clear()
+
+    def get(self, name, a):
+        ga = self.arrays.get(name)
+        if (ga is None) or (ga.array is not a):
+            ga = GrowableArray(a)
+            self.arrays[name] = ga
+        return ga
+
+
+def update_entity(entity, entity2cell, cell, localEntity, NN, isChangedCell):
+    """
+    Update the entities (edges of 2d meshes or faces of 3d meshes) and the
+    entity to cell relation after some cells are changed.
+
+    Parameters
+    ----------
+    entity : GrowableArray
+        the old entities with shape `(NE, m)`
+    entity2cell : GrowableArray
+        the old relation with shape `(NE, 4)`, see `Mesh2dDataStructure`
+    cell : numpy.ndarray
+        the new cells, the cells which are not changed keep the same index
+        and vertices, the new cells are appended
+    localEntity : numpy.ndarray
+    NN : int
+    isChangedCell : numpy.ndarray
+        the flags of the changed (in place) and the new cells with shape
+        `(NC, )`
+
+    Notes
+    -----
+    Only the old entities of the changed cells and the old boundary
+    entities (with `entity2cell[:, 0] == entity2cell[:, 1]`, including the
+    hanging ones of the trees) are compared with the entities of the
+    changed cells. The kept entities keep their index, the new ones fill
+    the slots of the removed ones first, so the cost is proportional to the
+    number of changed cells besides a few vectorized flag operations.
+    """
+    if not np.any(isChangedCell):
+        return
+
+    E = localEntity.shape[0]
+    NE = len(entity)
+    e2c = entity2cell.array
+    isChanged0 = isChangedCell[e2c[:, 0]]
+    isChanged1 = isChangedCell[e2c[:, 1]]
+    isBdEntity = e2c[:, 0] == e2c[:, 1]
+    cand, = np.nonzero(isChanged0 | isChanged1 | isBdEntity)
+
+    # the occurrences of the candidates in the unchanged cells, the first
+    # side goes first to keep the orientation of the kept entities
+    idx0 = cand[~isChanged0[cand]]
+    idx1 = cand[(~isChanged1[cand]) & (~isBdEntity[cand])]
+    changedCell, = np.nonzero(isChangedCell)
+    occCell = np.r_[e2c[idx0, 0], e2c[idx1, 1], np.repeat(changedCell, E)]
+    occLocal = np.r_[e2c[idx0, 2], e2c[idx1, 3], np.tile(np.arange(E), len(changedCell))]
+    occOld = np.r_[idx0, idx1]
+    nold = len(occOld)
+
+    totalEntity = cell[occCell[:, None], localEntity[occLocal]]
+    i0, j = unique_entity(totalEntity, NN)
+    i1 = np.zeros(len(i0), dtype=i0.dtype)
+    i1[j] = np.arange(len(j))
+    if np.any(np.bincount(j) > 2):
+        raise ValueError("An entity is shared by more than two cells!")
+
+    gid = np.full(len(i0), -1, dtype=np.int_)
+    gid[j[:nold]] = occOld
+    isNew = gid < 0
+    isKept = np.zeros(NE, dtype=np.bool)
+    isKept[gid[~isNew]] = True
+    free = cand[~isKept[cand]]
+
+    nnew = isNew.sum()
+    nfill = min(nnew, len(free))
+    gid[isNew] = np.r_[free[:nfill], np.arange(NE, NE + nnew - nfill)]
+
+    NE1 = NE + nnew - nfill
+    ent = entity.resize(NE1)
+    e2c = entity2cell.resize(NE1)
+    ent[gid] = totalEntity[i0]
+    e2c[gid, 0] = occCell[i0]
+    e2c[gid, 1] = occCell[i1]
+    e2c[gid, 2] = occLocal[i0]
+    e2c[gid, 3] = occLocal[i1]
+
+    # move the last entities into the holes
+    hole = free[nfill:]
+    if len(hole) > 0:
+        NE2 = NE1 - len(hole)
+        isHole = np.zeros(NE1, dtype=np.bool)
+        isHole[hole] = True
+        src = NE2 + np.nonzero(~isHole[NE2:])[0]
+        dst = hole[hole < NE2]
+        ent[dst] = ent[src]
+        e2c[dst] = e2c[src]
+        entity.resize(NE2)
+        entity2cell.resize(NE2)
+
+
+def update_cell_entity(entity, cell2entity, cell, localEntity, NN,
+        isChangedCell):
+    """
+    Update the entities (edges of 3d meshes) with the cell to entity
+    relation after some cells are changed, see `update_entity`. The
+    vertices of every entity are sorted.
+
+    Every entity of a changed cell which existed before should be an old
+    entity of a changed cell, which holds for the conforming refinement.
+    """
+    if not np.any(isChangedCell):
+        return
+
+    E = localEntity.shape[0]
+    NE = len(entity)
+    NC0 = len(cell2entity)
+    c2e = cell2entity.array
+    isChanged = isChangedCell[:NC0]
+    cand = np.unique(c2e[isChanged])
+    isUsed = np.zeros(NE, dtype=np.bool)
+    isUsed[c2e[~isChanged]] = True
+
+    changedCell, = np.nonzero(isChangedCell)
+    totalEntity = np.r_['0', entity.array[cand],
+            cell[changedCell][:, localEntity].reshape(-1, localEntity.shape[1])]
+    i0, j = unique_entity(totalEntity, NN)
+    nold = len(cand)
+
+    # only the old entities which still belong to some changed cell are kept
+    gid = np.full(len(i0), -1, dtype=np.int_)
+    gid[j[:nold]] = cand
+    isNew = gid < 0
+    isLive = np.zeros(len(i0), dtype=np.bool)
+    isLive[j[nold:]] = True
+    isKept = isUsed.copy()
+    isKept[gid[isLive & ~isNew]] = True
+    free = cand[~isKept[cand]]
+
+    nnew = isNew.sum()
+    nfill = min(nnew, len(free))
+    gid[isNew] = np.r_[free[:nfill], np.arange(NE, NE + nnew - nfill)]
+
+    NE1 = NE + nnew - nfill
+    ent = entity.resize(NE1)
+    ent[gid[isLive]] = np.sort(totalEntity[i0[isLive]], axis=1)
+    c2e = cell2entity.resize(len(cell))
+    c2e[changedCell] = gid[j[nold:]].reshape(-1, E)
+
+    hole = free[nfill:]
+    if len(hole) > 0:
+        NE2 = NE1 - len(hole)
+        isHole = np.zeros(NE1, dtype=np.bool)
+        isHole[hole] = True
+        src = NE2 + np.nonzero(~isHole[NE2:])[0]
+        dst = hole[hole < NE2]
+        ent[dst] = ent[src]
+        idxmap = np.arange(NE1)
+        idxmap[src] = dst
+        c2e[:] = idxmap[c2e]
+        entity.resize(NE2)
+
+
+
+class RefinementRecord():
+    """
+    The record of one refinement step of a mesh, which is enough for the
+    spaces on the mesh to update themselves instead of being rebuilt.
+
+    Attributes
+    ----------
+    NN0 : int
+        the number of nodes before refinement, the old nodes keep their index
+    NC0 : int
+        the number of cells before refinement
+    parent : numpy.ndarray
+        the old cell containing every new cell with shape `(NC, )`
+    isChangedCell : numpy.ndarray
+        the flags of the changed and the new cells with shape `(NC, )`, the
+        other cells keep their index and vertices
+    changedCell : numpy.ndarray
+        the sorted index of the old cells which are refined
+    oldcell : numpy.ndarray
+        the old vertices of `changedCell`
+    """
+    def __init__(self, NN0, NC0, parent, isChangedCell, changedCell, oldcell):
+        self.NN0 = NN0
+        self.NC0 = NC0
+        self.parent = parent
+        self.isChangedCell = isChangedCell
+        self.changedCell = changedCell
+        self.oldcell = oldcell
+
+    def dirty_cell(self):
+        """
+        The index of the changed and the new cells.
+        """
+        return np.nonzero(self.isChangedCell)[0]
+
+    def parent_index(self, index):
+        """
+        The position of the parents of the cells `index` in `changedCell`,
+        all the cells should be dirty.
+        """
+        return np.searchsorted(self.changedCell, self.parent[index])
@@ -373,6 +373,58 @@ def unique_row(a):
     return (b, i, j)
 
 
+def unique_entity(totalEntity, NN, method='key'):
+    """
+    Find the unique entities (edges or faces) in `totalEntity`, where two
+    entities with the same vertices are the same.
+
+    Parameters
+    ----------
+    totalEntity : numpy.ndarray
+        the shape is `(N, m)`, the vertices of all the local entities
+    NN : int
+        the number of nodes
+    method : str
+        'key', encode the sorted vertices of every entity into one int64
+        key and find the unique keys, the rows are compressed into smaller
+        keys when `NN**m` overflows.
+        'row', the unique rows of the sorted vertex array.
+
+    Returns
+    -------
+    i0 : numpy.ndarray
+        the index of the first appearance of every unique entity
+    j : numpy.ndarray
+        the index of the unique entity of every local entity
+
+    Notes
+    -----
+    The two methods return the same results, the unique entities are in the
+    lexicographic order of their sorted vertices. Both arrays are empty when
+    `totalEntity` is empty, e.g. for a mesh without cells.
+    """
+    sEntity = np.sort(totalEntity, axis=1)
+    if sEntity.shape[0] == 0:
+        i0 = np.zeros(0, dtype=np.int_)
+        return i0, i0.copy()
+    if method == 'row':
+        _, i0, j = np.unique(sEntity,
+                return_index=True,
+                return_inverse=True,
+                axis=0)
+        return i0, j
+
+    maxkey = np.iinfo(np.int64).max//NN
+    key = sEntity[:, 0].astype(np.int64)
+    for k in range(1, sEntity.shape[1]):
+        if key.max() >= maxkey:
+            # compress the keys, the order of the keys is kept
+            _, key = np.unique(key, return_inverse=True)
+        key = key*NN + sEntity[:, k]
+    _, i0, j = np.unique(key, return_index=True, return_inverse=True)
+    return i0, j
+
+
 def show_point(axes, point):
     axes.plot(point[:, 0], point[:, 1], 'ro')
 
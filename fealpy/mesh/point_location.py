@@ -0,0 +1,189 @@
+import numpy as np
+from scipy.spatial import KDTree
+
+
+def barycentric(node, cell, points):
+    """
+    The barycentric coordinates of `points[i]` in the simplex `cell[i]`.
+
+    Parameters
+    ----------
+    node : numpy.ndarray
+        with shape `(NN, GD)`
+    cell : numpy.ndarray
+        with shape `(NP, GD+1)`, the simplices have the same dimension as
+        the space
+    points : numpy.ndarray
+        with shape `(NP, GD)`
+
+    Returns
+    -------
+    lam : numpy.ndarray
+        with shape `(NP, GD+1)`
+    """
+    v0 = node[cell[:, 0]]
+    # the columns are the edges `x_i - x_0`
+    B = (node[cell[:, 1:]] - v0[:, None, :]).swapaxes(-1, -2)
+    lam = np.zeros(cell.shape, dtype=node.dtype)
+    lam[:, 1:] = np.linalg.solve(B, (points - v0)[..., None])[..., 0]
+    lam[:, 0] = 1 - lam[:, 1:].sum(axis=-1)
+    return lam
+
+
+def simplex_walk(node, cell, cell2cell, points, start, maxit=None, eps=1e-12):
+    """
+    Locate the points by the visibility walk through the neighbor simplices,
+    all the points walk at the same time.
+
+    From the current cell every point moves to the neighbor across the face
+    opposite to its most negative barycentric coordinate, until all the
+    coordinates are nonnegative, or the face is on the boundary.
+
+    Parameters
+    ----------
+    node : numpy.ndarray
+    cell : numpy.ndarray
+    cell2cell : numpy.ndarray
+        `cell2cell[c, i]` is the neighbor of `c` across the face opposite to
+        the vertex `i`, and `c` itself on the boundary, see
+        `ds.cell_to_cell()` of the triangle and the tetrahedron meshes
+    points : numpy.ndarray
+    start : numpy.ndarray
+        the initial cell of every point
+    maxit : int
+        the maximal number of steps
+    eps : float
+        the tolerance of the barycentric coordinates
+
+    Returns
+    -------
+    cidx : numpy.ndarray
+        the cell containing every point, or the last cell of the walk
+    isIn : numpy.ndarray
+        the flags of the points which are located
+    """
+    NP = len(points)
+    NC, TD = cell.shape[0], cell.shape[1] - 1
+    if maxit is None:
+        maxit = 10*int(np.ceil(NC**(1/TD))) + 10
+
+    cidx = np.array(start, dtype=np.int_)
+    isIn = np.zeros(NP, dtype=np.bool_)
+    active = np.arange(NP)
+    for it in range(maxit):
+        if len(active) == 0:
+            break
+        c = cidx[active]
+        lam = barycentric(node, cell[c], points[active])
+        k = np.argmin(lam, axis=-1)
+        isFound = lam[np.arange(len(c)), k] >= -eps
+        isIn[active[isFound]] = True
+
+        nc = cell2cell[c, k]
+        isMove = (~isFound) & (nc != c)
+        cidx[active[isMove]] = nc[isMove]
+        active = active[isMove]
+    return cidx, isIn
+
+
+def brute_force_location(node, cell, points, eps=1e-12, maxsize=2**22):
+    """
+    Locate the points by checking all the cells, the points are done in
+    chunks such that at most `maxsize` barycentric coordinates are computed
+    at the same time.
+
+    Returns
+    -------
+    cidx : numpy.ndarray
+        the first cell containing every point, -1 for the points outside
+    """
+    NP = len(points)
+    NC = len(cell)
+    cidx = np.full(NP, -1, dtype=np.int_)
+    chunk = max(maxsize//(NC*cell.shape[1]), 1)
+    for start in range(0, NP, chunk):
+        p = points[start:start+chunk]
+        n = len(p)
+        c = np.tile(cell, (n, 1))
+        lam = barycentric(node, c, np.repeat(p, NC, axis=0))
+        isIn = np.min(lam, axis=-1).reshape(n, NC) >= -eps
+        flag = isIn.any(axis=-1)
+        cidx[start:start+n][flag] = np.argmax(isIn[flag], axis=-1)
+    return cidx
+
+
+def locate_points(node, cell, cell2cell, points, tree=None, nearest=False,
+        eps=1e-12, index=None):
+    """
+    Locate the points in a simplex mesh.
+
+    When the spatial index `index` is given (and `tree` is not), the points
+    are found by `index.find_cell`, which is cached with the mesh, and only
+    the points outside the mesh walk from the cells with the nearest
+    barycenters, see `SpatialIndex.nearest_cell`.
+
+    Otherwise the walk of every point starts from the cell with the nearest
+    barycenter, which is found by the KD-tree `tree`, so most of the points
+    are located in a few steps. The points which walk out of the mesh (e.g.
+    through the concave boundary) or do not stop are checked by
+    `brute_force_location`.
+
+    Parameters
+    ----------
+    node : numpy.ndarray
+    cell : numpy.ndarray
+    cell2cell : numpy.ndarray
+        see `simplex_walk`
+    points : numpy.ndarray
+        with shape `(NP, GD)`
+    tree : scipy.spatial.KDTree
+        the tree of the cell barycenters, it is built when neither `tree`
+        nor `index` is given
+    nearest : bool
+        when it is True, the points outside the mesh are assigned to the
+        boundary cell where the walk stops, and their barycentric coordinates
+        are clipped to the cell, otherwise their cell index is -1
+    eps : float
+    index : SpatialIndex
+        see `spatial_index.SpatialIndex`
+
+    Returns
+    -------
+    cidx : numpy.ndarray
+        with shape `(NP, )`
+    bc : numpy.ndarray
+        the barycentric coordinates in the cells with shape `(NP, GD+1)`
+    """
+    if (tree is None) and (index is not None):
+        start = index.find_cell(points, eps=eps)
+        isChecked = start < 0
+        if np.any(isChecked):
+            # the points outside the mesh only walk to the boundary
+            start[isChecked] = index.nearest_cell(points[isChecked])
+    else:
+        if tree is None:
+            tree = KDTree(np.mean(node[cell], axis=1))
+        _, start = tree.query(points)
+        isChecked = np.zeros(len(points), dtype=np.bool_)
+    cidx, isIn = simplex_walk(node, cell, cell2cell, points, start, eps=eps)
+
+    isOut = ~isIn
+    if np.any(isOut & ~isChecked):
+        idx, = np.nonzero(isOut & ~isChecked)
+        if index is not None:
+            c = index.find_cell(points[idx], eps=eps)
+        else:
+            c = brute_force_location(node, cell, points[idx], eps=eps)
+        isFound = c >= 0
+        cidx[idx[isFound]] = c[isFound]
+        isOut[idx[isFound]] = False
+
+    bc = barycentric(node, cell[cidx], points)
+    if nearest:
+        if np.any(isOut):
+            lam = np.maximum(bc[isOut], 0)
+            bc[isOut] = lam/np.sum(lam, axis=-1, keepdims=True)
+    else:
+        cidx[isOut] = -1
+        bc[isOut] = np.nan
+    return cidx, bc
@@ -0,0 +1,393 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import KDTree
+
+from .connectivity_cache import ConnectivityCache
+
+
+def cell_bounding_boxes(node, cell):
+    """
+    The bounding boxes of the cells.
+
+    Returns
+    -------
+    box : numpy.ndarray
+        with shape `(NC, 2, GD)`, `box[:, 0]` and `box[:, 1]` are the lower
+        and the upper corners
+    """
+    p = node[cell]
+    return np.stack((p.min(axis=1), p.max(axis=1)), axis=1)
+
+
+def segment_index(n):
+    """
+    The local index `0, ..., n[i]-1` of the segments with the lengths `n`.
+    """
+    n = np.asarray(n)
+    N = n.sum()
+    start = np.cumsum(n) - n
+    return np.arange(N) - np.repeat(start, n)
+
+
+def box_multi_index(lo, hi):
+    """
+    All the integer multi-indices in the boxes `[lo[i], hi[i]]`, the bounds
+    are included.
+
+    Returns
+    -------
+    owner : numpy.ndarray
+        the box of every multi-index
+    multi : numpy.ndarray
+        with shape `(M, GD)`
+    """
+    n = hi - lo + 1
+    total = np.prod(n, axis=-1)
+    owner = np.repeat(np.arange(len(lo)), total)
+    r = segment_index(total)
+    multi = np.zeros((len(owner), lo.shape[1]), dtype=np.int_)
+    for k in range(lo.shape[1]-1, -1, -1):
+        nk = n[owner, k]
+        multi[:, k] = lo[owner, k] + r%nk
+        r //= nk
+    return owner, multi
+
+
+def box_overlap(box0, box1):
+    """
+    The flags of `box0[i]` intersecting `box1[i]`.
+    """
+    return np.all((box0[:, 0] <= box1[:, 1]) & (box1[:, 0] <= box0[:, 1]),
+            axis=-1)
+
+
+class BucketGrid():
+    """
+    The uniform grid of buckets, every bucket stores the cells whose
+    bounding boxes intersect it, which fits the quasi-uniform meshes.
+
+    The cells of the buckets are stored in the CSR format, the cells of the
+    bucket `i` are `self.cell[self.location[i]:self.location[i+1]]`.
+    """
+    def __init__(self, box, h=None, maxbucket=None):
+        NC, _, GD = box.shape
+        self.origin = box[:, 0].min(axis=0)
+        extent = box[:, 1].max(axis=0) - self.origin
+        if h is None:
+            h = np.median(np.max(box[:, 1] - box[:, 0], axis=-1))
+        shape = np.ones(GD, dtype=np.int_)
+        if h > 0:
+            shape = np.maximum(np.ceil(extent/h), 1).astype(np.int_)
+        maxbucket = maxbucket if maxbucket is not None else 4*NC
+        NB = np.prod(shape)
+        if NB > maxbucket:
+            shape = np.maximum((shape*(maxbucket/NB)**(1/GD)).astype(np.int_), 1)
+        self.shape = shape
+        self.extent = extent
+        self.h = np.where(extent > 0, extent/shape, 1)
+
+        NB = np.prod(shape)
+        owner, multi = box_multi_index(*self.bucket_range(box))
+        bucket = np.ravel_multi_index(tuple(multi.T), shape)
+        self.cell = owner[np.argsort(bucket, kind='stable')]
+        self.location = np.zeros(NB+1, dtype=np.int_)
+        np.cumsum(np.bincount(bucket, minlength=NB), out=self.location[1:])
+
+    def bucket_range(self, box):
+        lo = np.floor((box[:, 0] - self.origin)/self.h).astype(np.int_)
+        hi = np.floor((box[:, 1] - self.origin)/self.h).astype(np.int_)
+        np.clip(lo, 0, self.shape - 1, out=lo)
+        np.clip(hi, 0, self.shape - 1, out=hi)
+        return lo, hi
+
+    def candidates(self, box):
+        """
+        The pairs of the query boxes and the cells in the buckets which the
+        boxes intersect, a pair may appear more than one time.
+        """
+        isIn = np.all((box[:, 1] >= self.origin)
+                & (box[:, 0] <= self.origin + self.extent), axis=-1)
+        q, = np.nonzero(isIn)
+        owner, multi = box_multi_index(*self.bucket_range(box[q]))
+        bucket = np.ravel_multi_index(tuple(multi.T), self.shape)
+        n = self.location[bucket+1] - self.location[bucket]
+        qidx = np.repeat(q[owner], n)
+        cidx = self.cell[np.repeat(self.location[bucket], n) + segment_index(n)]
+        return qidx, cidx
+
+
+class BoundingVolumeHierarchy():
+    """
+    The binary tree of the bounding boxes, which fits the graded meshes.
+
+    The tree is built level by level, every node with more than `leafsize`
+    cells is split at the median of the cell centers along the longest
+    direction. The cells of the node `i` are
+    `self.perm[self.start[i]:self.end[i]]`, and the children are
+    `self.left[i]` and `self.left[i] + 1`, which is -1 for the leaves.
+    """
+    def __init__(self, box, leafsize=8):
+        NC = box.shape[0]
+        center = box.sum(axis=1)/2
+        perm = np.arange(NC)
+
+        start = [np.array([0])]
+        end = [np.array([NC])]
+        left = []
+        NN = 1
+        while True:
+            s, e = start[-1], end[-1]
+            isSplit = (e - s) > leafsize
+            l = np.full(len(s), -1, dtype=np.int_)
+            l[isSplit] = NN + 2*np.arange(isSplit.sum())
+            left.append(l)
+            if not np.any(isSplit):
+                break
+            s, e = s[isSplit], e[isSplit]
+            n = e - s
+            seg = np.repeat(np.arange(len(s)), n)
+            pos = np.repeat(s, n) + segment_index(n)
+            c = center[perm[pos]]
+            cmin = np.full((len(s), c.shape[1]), np.inf)
+            cmax = np.full((len(s), c.shape[1]), -np.inf)
+            np.minimum.at(cmin, seg, c)
+            np.maximum.at(cmax, seg, c)
+            axis = np.argmax(cmax - cmin, axis=-1)
+            order = np.lexsort((c[np.arange(len(pos)), axis[seg]], seg))
+            perm[pos] = perm[pos[order]]
+
+            mid = (s + e)//2
+            start.append(np.c_[s, mid].flat[:])
+            end.append(np.c_[mid, e].flat[:])
+            NN += 2*len(s)
+
+        self.perm = perm
+        self.start = np.concatenate(start)
+        self.end = np.concatenate(end)
+        self.left = np.concatenate(left)
+
+        # the boxes of the nodes, the cells of a node do not change after
+        # it is created
+        n = self.end - self.start
+        seg = np.repeat(np.arange(len(n)), n)
+        b = box[perm[np.repeat(self.start, n) + segment_index(n)]]
+        self.box = np.zeros((len(n), ) + box.shape[1:], dtype=box.dtype)
+        self.box[:, 0] = np.inf
+        self.box[:, 1] = -np.inf
+        np.minimum.at(self.box[:, 0], seg, b[:, 0])
+        np.maximum.at(self.box[:, 1], seg, b[:, 1])
+
+    def candidates(self, box):
+        """
+        The pairs of the query boxes and the cells in the leaves whose boxes
+        intersect the query boxes.
+        """
+        q = np.arange(len(box))
+        node = np.zeros(len(box), dtype=np.int_)
+        qidx = []
+        cidx = []
+        while len(q) > 0:
+            flag = box_overlap(box[q], self.box[node])
+            q, node = q[flag], node[flag]
+            isLeaf = self.left[node] < 0
+            n = self.end[node[isLeaf]] - self.start[node[isLeaf]]
+            qidx.append(np.repeat(q[isLeaf], n))
+            cidx.append(self.perm[np.repeat(self.start[node[isLeaf]], n)
+                + segment_index(n)])
+            q = np.repeat(q[~isLeaf], 2)
+            node = (self.left[node[~isLeaf], None] + np.arange(2)).flat[:]
+        return np.concatenate(qidx), np.concatenate(cidx)
+
+
+class SpatialIndex():
+    """
+    The spatial index of a mesh for the batched queries of the cells
+    containing the points, the nearest nodes and the cells intersecting the
+    boxes.
+
+    The candidate cells are found by a `BucketGrid` or a
+    `BoundingVolumeHierarchy` of the cell bounding boxes, and the points are
+    checked by the half spaces of the cell faces, so the cells should be
+    convex with planar faces.
+
+    Parameters
+    ----------
+    node : numpy.ndarray
+        with shape `(NN, GD)`
+    cell : numpy.ndarray
+        with shape `(NC, NV)`
+    localface : numpy.ndarray
+        the local faces (the local edges in 2d) of the cells, the point in
+        cell queries are not available when it is None
+    method : str
+        'grid', 'bvh' or 'auto', the 'auto' method uses the bvh when the ratio
+        of the maximal and the median cell sizes is larger than `grading`
+    """
+    def __init__(self, node, cell, localface=None, method='auto', grading=8):
+        self.node = node
+        self.cell = cell
+        self.box = cell_bounding_boxes(node, cell)
+        self.h = np.sqrt(np.sum((self.box[:, 1] - self.box[:, 0])**2, axis=-1))
+
+        if method == 'auto':
+            hm = np.median(self.h)
+            method = 'bvh' if (hm == 0) or (self.h.max() > grading*hm) else 'grid'
+        if method == 'grid':
+            self.tree = BucketGrid(self.box)
+        elif method == 'bvh':
+            self.tree = BoundingVolumeHierarchy(self.box)
+        else:
+            raise ValueError("The method {} is not supported!".format(method))
+        self.method = method
+
+        self.nodetree = None
+        self.celltree = None
+        self.normal = None
+        if localface is not None:
+            self.init_face_half_spaces(localface)
+
+    def init_face_half_spaces(self, localface):
+        """
+        Compute the unit normals of the cell faces pointing into the cells,
+        the point `x` is in the cell `i` when
+        `normal[i] @ x - offset[i] >= 0`.
+        """
+        node = self.node
+        cell = self.cell
+        GD = node.shape[1]
+        v = node[cell[:, localface]] # (NC, NF, NVF, GD)
+        if GD == 2:
+            t = v[..., 1, :] - v[..., 0, :]
+            n = np.stack((t[..., 1], -t[..., 0]), axis=-1)
+        elif localface.shape[1] == 3:
+            n = np.cross(v[..., 1, :] - v[..., 0, :], v[..., 2, :] - v[..., 0, :])
+        else:
+            n = np.cross(v[..., 2, :] - v[..., 0, :], v[..., 3, :] - v[..., 1, :])
+        n /= np.sqrt(np.sum(n**2, axis=-1, keepdims=True))
+        offset = np.sum(n*v.mean(axis=-2), axis=-1)
+
+        # orient the normals by the cell barycenters
+        bc = node[cell].mean(axis=1)
+        sign = np.sign(np.einsum('ijk, ik->ij', n, bc) - offset)
+        self.normal = n*sign[..., None]
+        self.offset = offset*sign
+
+    def contains(self, points, cidx, eps=1e-12):
+        """
+        The flags of `points[i]` in the cell `cidx[i]`.
+        """
+        d = np.einsum('ijk, ik->ij', self.normal[cidx], points) - self.offset[cidx]
+        return np.all(d >= -eps*self.h[cidx, None], axis=-1)
+
+    def find_cell(self, points, eps=1e-12, chunksize=2**16):
+        """
+        Find the cells containing the points.
+
+        Parameters
+        ----------
+        points : numpy.ndarray
+            with shape `(NP, GD)`
+        eps : float
+            the relative tolerance of the points on the cell boundaries
+        chunksize : int
+            the number of points queried at the same time
+
+        Returns
+        -------
+        cidx : numpy.ndarray
+            the first cell containing every point, -1 for the points outside
+        """
+        if self.normal is None:
+            raise ValueError("The point in cell query needs the local faces of the cells!")
+        NP = len(points)
+        cidx = np.full(NP, -1, dtype=np.int_)
+        for start in range(0, NP, chunksize):
+            p = points[start:start+chunksize]
+            q, c = self.tree.candidates(np.stack((p, p), axis=1))
+            flag = box_overlap(np.stack((p[q], p[q]), axis=1), self.box[c])
+            q, c = q[flag], c[flag]
+            flag = self.contains(p[q], c, eps=eps)
+            q, c = q[flag], c[flag]
+            q, k = np.unique(q, return_index=True)
+            cidx[start + q] = c[k]
+        return cidx
+
+    def nearest_node(self, points, return_distance=False):
+        """
+        Find the nearest nodes of the points by the KD-tree of the nodes,
+        which is built on the first query.
+        """
+        if self.nodetree is None:
+            self.nodetree = KDTree(self.node)
+        d, idx = self.nodetree.query(points)
+        if return_distance:
+            return idx, d
+        else:
+            return idx
+
+    def nearest_cell(self, points):
+        """
+        Find the cells with the nearest barycenters of the points by the
+        KD-tree of the barycenters, which is built on the first query.
+        """
+        if self.celltree is None:
+            self.celltree = KDTree(self.node[self.cell].mean(axis=1))
+        _, idx = self.celltree.query(points)
+        return idx
+
+    def cells_in_box(self, box):
+        """
+        Find the cells whose bounding boxes intersect the boxes.
+
+        Parameters
+        ----------
+        box : numpy.ndarray
+            with shape `(2, GD)` for one box, or `(NB, 2, GD)` for the batch
+            of the boxes, the rows are the lower and the upper corners
+
+        Returns
+        -------
+        cidx : numpy.ndarray or scipy.sparse.csr_matrix
+            the sorted cell indices for one box, or the box to cell relation
+            matrix with shape `(NB, NC)` for the batch
+        """
+        box = np.asarray(box, dtype=self.box.dtype)
+        isBatch = box.ndim == 3
+        box = box.reshape(-1, 2, box.shape[-1])
+        q, c = self.tree.candidates(box)
+        flag = box_overlap(box[q], self.box[c])
+        q, c = q[flag], c[flag]
+        if isBatch:
+            NC = len(self.cell)
+            val = np.ones(len(q), dtype=np.bool_)
+            return csr_matrix((val, (q, c)), shape=(len(box), NC))
+        else:
+            return np.unique(c)
+
+
+def mesh_spatial_index(mesh, method='auto', rebuild=False):
+    """
+    The spatial index of a mesh, which is built on the first call and cached
+    in the connectivity cache of the mesh data structure, see
+    `ConnectivityCache.get_geometric`, so it is rebuilt after the mesh
+    topology is changed or the node array is replaced.
+
+    The nodes moved in place are not detected, then use `rebuild=True`.
+    """
+    ds = mesh.ds
+    if not hasattr(ds, 'conncache'):
+        ds.conncache = ConnectivityCache()
+    cache = ds.conncache
+    node = mesh.entity('node')
+    cell = mesh.entity('cell')
+    key = ('spatial_index', method)
+    if rebuild:
+        cache.discard_geometric(key)
+
+    def build():
+        TD = mesh.top_dimension()
+        localface = None
+        if node.shape[1] == TD:
+            localface = ds.localEdge if TD == 2 else ds.localFace
+        return SpatialIndex(node, cell, localface=localface, method=method)
+    return cache.get_geometric('spatial_index', key, node, cell, build)
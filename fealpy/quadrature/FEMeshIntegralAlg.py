@@ -1,5 +1,19 @@
+import inspect
 import numpy as np
 
+
+def accept_index(u):
+    """
+    Whether the function `u` takes the keyword argument `index`.
+    """
+    try:
+        params = inspect.signature(u).parameters
+    except (TypeError, ValueError):
+        return False
+    return ('index' in params) or any(
+            p.kind == p.VAR_KEYWORD for p in params.values())
+
+
 class FEMeshIntegralAlg():
     def __init__(self, mesh, q, cellmeasure=None):
         self.mesh = mesh
@@ -7,29 +21,87 @@ class FEMeshIntegralAlg():
         self.cellmeasure = cellmeasure if cellmeasure is not None \
                 else mesh.entity_measure('cell')
 
+    def bc_to_point(self, bc, index=None):
+        if index is None:
+            return self.mesh.bc_to_point(bc)
+        else:
+            return self.mesh.bc_to_point(bc, index=index)
+
+    def value(self, uh, bc, index=None):
+        """
+        The values `uh(bc)` on the cells `index`, the values on all the cells
+        are computed when `uh` can not take `index`, see `cellwise`.
+        """
+        if index is None:
+            return uh(bc)
+        elif accept_index(uh):
+            return uh(bc, index=index)
+        else:
+            return uh(bc)[:, index]
+
+    def cellwise(self, f, *uh):
+        """
+        The integrand `f(bc, index=None)` of the functions `uh` for
+        `integral`. When some of `uh` can not take `index`, `f` is wrapped
+        into a function of `bc` only, so all the cells are integrated in one
+        block and `uh` is evaluated once, instead of on all the cells for
+        every block.
+        """
+        if all(accept_index(u) for u in uh):
+            return f
+        else:
+            return lambda bc: f(bc)
+
+    def integral(self, u, celltype=False, barycenter=True, blocksize=None):
+        """
+        The integral of `u` on every cell, the cells are integrated block
+        by block of `blocksize` cells to bound the size of the values at the
+        quadrature points. The block size is chosen from the available
+        memory by default, see `assembler.cell_blocks`.
+
+        With `barycenter` the function is called as `u(bcs, index=index)`
+        on a block, and all the cells are done at once when `u` can not take
+        `index`.
+        """
+        # import here, `functionspace` depends on this module
+        from ..functionspace.assembler import cell_blocks
 
-    def integral(self, u, celltype=False, barycenter=True):
         qf = self.integrator
         bcs, ws = qf.quadpts, qf.weights
-        if barycenter:
-            val = u(bcs)
+        NC = len(self.cellmeasure)
+        if barycenter and not accept_index(u):
+            blocks = [None]
         else:
-            ps = self.mesh.bc_to_point(bcs)
-            val = u(ps)
+            GD = self.mesh.geo_dimension()
+            nbytes = 8*4*len(ws)*(GD + 1)
+            blocks = cell_blocks(NC, nbytes, blocksize=blocksize)
+
         dim = len(ws.shape)
         s0 = 'abcde'
         s1 = '{}, {}j..., j->j...'.format(s0[0:dim], s0[0:dim])
-        e = np.einsum(s1, ws, val, self.cellmeasure)
+        e = None
+        for index in blocks:
+            if barycenter:
+                val = u(bcs) if index is None else u(bcs, index=index)
+            else:
+                val = u(self.bc_to_point(bcs, index=index))
+            if index is None:
+                e = np.einsum(s1, ws, val, self.cellmeasure)
+            else:
+                eb = np.einsum(s1, ws, val, self.cellmeasure[index])
+                if e is None:
+                    e = np.zeros((NC, ) + eb.shape[1:], dtype=eb.dtype)
+                e[index] = eb
         if celltype is True:
             return e
         else:
             return e.sum()
 
     def L2_norm(self, uh, celltype=False):
-        def f(x):
-            return uh(x)**2
+        def f(x, index=None):
+            return self.value(uh, x, index=index)**2
 
-        e = self.integral(f, celltype=celltype)
+        e = self.integral(self.cellwise(f, uh), celltype=celltype)
         if celltype is False:
             return np.sqrt(e.sum())
         else:
@@ -46,10 +118,10 @@ class FEMeshIntegralAlg():
             return np.sqrt(e)
 
     def L1_error(self, u, uh, celltype=False):
-        def f(x):
-            xx = self.mesh.bc_to_point(x)
-            return np.abs(u(xx) - uh(x))
-        e = self.integral(f, celltype=celltype)
+        def f(x, index=None):
+            xx = self.bc_to_point(x, index=index)
+            return np.abs(u(xx) - self.value(uh, x, index=index))
+        e = self.integral(self.cellwise(f, uh), celltype=celltype)
         if celltype is False:
             return e.sum()
         else:
@@ -57,10 +129,10 @@ class FEMeshIntegralAlg():
         return
 
     def L2_error(self, u, uh, celltype=False):
-        def f(bc):
-            xx = self.mesh.bc_to_point(bc)
-            return (u(xx) - uh(bc))**2
-        e = self.integral(f, celltype=celltype)
+        def f(bc, index=None):
+            xx = self.bc_to_point(bc, index=index)
+            return (u(xx) - self.value(uh, bc, index=index))**2
+        e = self.integral(self.cellwise(f, uh), celltype=celltype)
         if celltype is False:
             return np.sqrt(e.sum())
         else:
@@ -68,9 +140,10 @@ class FEMeshIntegralAlg():
         return 
 
     def L2_error_uI_uh(self, uI, uh, celltype=False):
-        def f(x):
-            return (uI(x) - uh(x))**2
-        e = self.integral(f, celltype=celltype)
+        def f(x, index=None):
+            return (self.value(uI, x, index=index)
+                    - self.value(uh, x, index=index))**2
+        e = self.integral(self.cellwise(f, uI, uh), celltype=celltype)
         if celltype is False:
             return np.sqrt(e.sum())
         else:
@@ -78,10 +151,10 @@ class FEMeshIntegralAlg():
         return 
 
     def Lp_error(self, u, uh, p, celltype=False):
-        def f(x):
-            xx = self.mesh.bc_to_point(x)
-            return np.abs(u(xx) - uh(x))**p
-        e = self.integral(f, celltype=celltype)
+        def f(x, index=None):
+            xx = self.bc_to_point(x, index=index)
+            return np.abs(u(xx) - self.value(uh, x, index=index))**p
+        e = self.integral(self.cellwise(f, uh), celltype=celltype)
         if celltype is False:
             return e.sum()**(1/p)
         else:
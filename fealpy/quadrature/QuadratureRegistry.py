@@ -0,0 +1,132 @@
+import numpy as np
+from .GaussLegendreQuadrature import GaussLegendreQuadrature
+from .GaussLobattoQuadrature import GaussLobattoQuadrature
+from .TriangleQuadrature import TriangleQuadrature
+from .TetrahedronQuadrature import TetrahedronQuadrature
+from .QuadrangleQuadrature import QuadrangleQuadrature
+from .HexahedronQuadrature import HexahedronQuadrature
+from .PrismQuadrature import PrismQuadrature
+from .TriangleQuadrature1 import TriangleQuadrature as TriangleQuadrature1
+
+
+class QuadratureRegistry():
+    """
+    The registry of the quadrature rules.
+
+    Every rule `(etype, index, dtype)` is built once when it is requested the
+    first time, and then the same object is returned to all the callers, so
+    its arrays are read-only. The tensor product rules (quadrangle,
+    hexahedron and prism) are built lazily in the same way.
+
+    A rule can also be requested by the degree of the polynomials it should
+    integrate exactly, then the rule with the least index is used. The
+    triangle rules in `TriangleQuadrature1` (etype 'triangle1', the index is
+    the degree) are used for the degrees higher than the ones of
+    `TriangleQuadrature`.
+    """
+    def __init__(self):
+        self.rules = {}
+        self.builder = {
+                'interval': GaussLegendreQuadrature,
+                'lobatto': GaussLobattoQuadrature,
+                'triangle': TriangleQuadrature,
+                'triangle1': TriangleQuadrature1,
+                'tetrahedron': TetrahedronQuadrature,
+                'quadrangle': QuadrangleQuadrature,
+                'hexahedron': HexahedronQuadrature,
+                'prism': PrismQuadrature
+                }
+
+        # the algebraic degree of exactness of the rule with every index
+        interval = {k: 2*k-1 for k in range(1, 21)}
+        triangle = {1: 1, 2: 2, 3: 4, 4: 5, 5: 7, 6: 8, 7: 10, 8: 12, 9: 14,
+                10: 15, 11: 17}
+        self.degree = {
+                'interval': interval,
+                'lobatto': {k: 2*k-3 for k in range(2, 12)},
+                'triangle': triangle,
+                'triangle1': {k: k for k in range(1, 30)},
+                'tetrahedron': {1: 1, 2: 2, 3: 3, 4: 5, 5: 6, 6: 8, 7: 9},
+                'quadrangle': interval,
+                'hexahedron': interval,
+                'prism': {k: min(interval[k], triangle[k]) for k in triangle}
+                }
+
+    def clear(self):
+        self.rules.clear()
+
+    def exact_index(self, etype, degree):
+        """
+        The least index of the rules of `etype` which integrate the
+        polynomials of `degree` exactly.
+        """
+        for index, d in sorted(self.degree[etype].items()):
+            if d >= degree:
+                return index
+        raise ValueError("There is no {} quadrature rule exact for degree {}!".format(
+            etype, degree))
+
+    def get(self, etype, index=None, degree=None, dtype=np.float):
+        """
+        Get the shared quadrature rule.
+
+        Parameters
+        ----------
+        etype : str
+            'interval', 'lobatto', 'triangle', 'triangle1', 'tetrahedron',
+            'quadrangle', 'hexahedron' or 'prism'
+        index : int
+            the index of the rule
+        degree : int
+            the degree of the polynomials which the rule should integrate
+            exactly, it is used when `index` is None
+        dtype : numpy.dtype
+
+        Returns
+        -------
+        qf : Quadrature
+            the `quadpts` and `weights` of it are read-only
+        """
+        if etype not in self.builder:
+            raise ValueError("I do not have the {} quadrature rule!".format(etype))
+
+        if index is None:
+            if degree is None:
+                raise ValueError("The index or the degree should be given!")
+            if (etype == 'triangle') and (degree > self.degree['triangle'][11]):
+                etype = 'triangle1'
+            index = self.exact_index(etype, degree)
+
+        dtype = np.dtype(dtype)
+        key = (etype, index, dtype.str)
+        qf = self.rules.get(key)
+        if qf is None:
+            if etype == 'triangle1':
+                # the points are parsed in the precision of dtype
+                qf = TriangleQuadrature1(index, ftype=dtype.type)
+            else:
+                qf = self.builder[etype](index)
+            if isinstance(qf.quadpts, tuple):
+                qf.quadpts = tuple(self.freeze(bcs, dtype) for bcs in qf.quadpts)
+            else:
+                qf.quadpts = self.freeze(qf.quadpts, dtype)
+            qf.weights = self.freeze(qf.weights, dtype)
+            qf.key = key
+            self.rules[key] = qf
+        return qf
+
+    def freeze(self, a, dtype):
+        a = np.array(a, dtype=dtype)
+        a.setflags(write=False)
+        return a
+
+
+registry = QuadratureRegistry()
+
+
+def get_quadrature(etype, index=None, degree=None, dtype=np.float):
+    """
+    Get the shared quadrature rule from the registry, see
+    `QuadratureRegistry.get`.
+    """
+    return registry.get(etype, index=index, degree=degree, dtype=dtype)
@@ -1,7 +1,86 @@
 import numpy as np
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, spdiags
 from fealpy.quadrature import TriangleQuadrature
 
+def patch_scale_coordinate(patch, point):
+    """
+    Scale the coordinates of the points on every patch.
+
+    Parameters
+    ----------
+    patch : scipy.sparse.csr_matrix
+        the shape is `(N, M)`, the i-th row is the patch of the i-th entity,
+        every row is not empty
+    point : numpy.ndarray
+        the shape is `(M, GD)`
+
+    Returns
+    -------
+    I, J : numpy.ndarray
+        the row and column indices of the nonzeros of `patch`
+    x : numpy.ndarray
+        the shape is `(nnz, GD)`, `(point[J] - center[I])/h[I]`
+    center : numpy.ndarray
+        the shape is `(N, GD)`, the mean of the points on every patch
+    h : numpy.ndarray
+        the shape is `(N, )`, the max distance to the center on every patch
+    """
+    patch.sum_duplicates()
+    indptr = patch.indptr
+    J = patch.indices
+    N = patch.shape[0]
+    nn = np.diff(indptr)
+    I = np.repeat(range(N), nn)
+    center = np.add.reduceat(point[J], indptr[:-1], axis=0)/nn.reshape(-1, 1)
+    x = point[J] - center[I]
+    h = np.maximum.reduceat(np.sqrt(np.sum(x**2, axis=-1)), indptr[:-1])
+    x /= h[I].reshape(-1, 1)
+    return I, J, x, center, h
+
+def patch_least_squares(indptr, X, b, return_singular=False):
+    """
+    Solve the least squares problems `min |X_i c_i - b_i|` on all the
+    patches with one batched solve of the normal equations.
+
+    Parameters
+    ----------
+    indptr : numpy.ndarray
+        the rows of the i-th patch are `indptr[i]:indptr[i+1]`
+    X : numpy.ndarray
+        the shape is `(nnz, m)`
+    b : numpy.ndarray
+        the shape is `(nnz, ...)`
+    return_singular : bool
+        if True, do not solve the rank deficient problems and also return
+        their flag, else a `LinAlgError` is raised by them
+
+    Returns
+    -------
+    c : numpy.ndarray
+        the shape is `(N, m, ...)`
+    isSingular : numpy.ndarray
+        the shape is `(N, )`, only when `return_singular` is True
+    """
+    A = np.add.reduceat(np.einsum('ki, kj->kij', X, X), indptr[:-1], axis=0)
+    F = np.add.reduceat(np.einsum('ki, k...->ki...', X, b), indptr[:-1], axis=0)
+    if F.ndim == 2:
+        F = F[..., None]
+
+    if return_singular:
+        isSingular = np.linalg.matrix_rank(A) < A.shape[-1]
+        c = np.zeros(F.shape, dtype=F.dtype)
+        c[~isSingular] = np.linalg.solve(A[~isSingular], F[~isSingular])
+    else:
+        c = np.linalg.solve(A, F)
+
+    if b.ndim == 1:
+        c = c[..., 0]
+
+    if return_singular:
+        return c, isSingular
+    else:
+        return c
+
 def scaleCoor(realp):
     center = np.mean(realp,axis=0)
 
@@ -122,194 +201,177 @@ class FEMFunctionRecoveryAlg():
         return rguh
 
 
-    def SCR(self,uh):
+    def SCR(self, uh):
+        """
+        The superconvergent patch recovery of the gradient of a linear finite
+        element function `uh`. On the node patch of every node, fit `uh` with
+        a linear polynomial in the least squares sense, and take its gradient.
+        """
         space = uh.space
         mesh = space.mesh
         GD = mesh.geo_dimension()
-        rguh = space.function(dim=GD)
-          
-        cell = mesh.ds.cell
-        node = mesh.node
-        
-        NC = mesh.number_of_cells()
         NN = mesh.number_of_nodes()
-        
-        row = np.arange(NC).repeat(3)
-        col = cell.flatten()
-        data = np.ones(NC*3)
-        t2p = csr_matrix((data, (row, col)), shape=(NC,NN)).toarray()
-        p2t = t2p.T
-        p2p = p2t@t2p
-        
-        for i in range(NN):
-            np1, =np.nonzero(p2p[:,i]) 
-            temp0 = node[np1,:]
-            #调用scaleCoor()
-            tempx,_,h = scaleCoor(temp0)
-
-
-            tempp = uh[np1]
-            tempn = tempx.shape[0]
-            X = np.ones((tempn,3))
-            X[:,1:3] = tempx
-            
-            coefficient = np.linalg.solve(X.T@X,X.T@tempp)        
-                    
-            rguh[i,0] = coefficient[1]/h
-            rguh[i,1] = coefficient[2]/h
+        rguh = space.function(dim=GD)
+
+        node = mesh.entity('node')
+        node2cell = mesh.ds.node_to_cell()
+        node2node = node2cell@node2cell.T
+
+        I, J, x, center, h = patch_scale_coordinate(node2node, node)
+        X = np.ones((len(J), GD+1), dtype=mesh.ftype)
+        X[:, 1:] = x
+        c = patch_least_squares(node2node.indptr, X, uh[J])
+        rguh[:NN] = c[:, 1:]/h.reshape(-1, 1)
         return rguh
 
     def ZZ(self, uh):
+        """
+        The Zienkiewicz-Zhu recovery of the gradient of a linear finite
+        element function `uh`. On the cell patch of every node, fit the
+        gradient on the cell barycenters with a linear polynomial, and
+        evaluate it at the node. A boundary node takes the average of the
+        values of the fits of its interior neighbor nodes.
+        """
         space = uh.space
         mesh = space.mesh
         GD = mesh.geo_dimension()
-        rguh = space.function(dim=GD)
-       
-          
-
-        cell = mesh.ds.cell
-        node = mesh.node
-
-        NC = mesh.number_of_cells()
+        TD = mesh.top_dimension()
         NN = mesh.number_of_nodes()
+        rguh = space.function(dim=GD)
 
-        isBdNodes = mesh.ds.boundary_node_flag()
-        xnode = mesh.barycenter()
+        node = mesh.entity('node')
+        isBdNode = mesh.ds.boundary_node_flag()
+        node2cell = mesh.ds.node_to_cell()
+        node2node = (node2cell@node2cell.T).tocoo()
 
-        row = np.arange(NC).repeat(3)
-        col = cell.flatten()
-        data = np.ones(NC*3)
-        t2p = csr_matrix((data, (row, col)), shape=(NC, NN)).toarray()
-        p2t = t2p.T
-        p2p = p2t@t2p
-        
-        bc = np.array([1/3]*3, dtype=np.float)
-        guh = uh.grad_value(bc) 
-        
-        for i in range(NN):
-            if isBdNodes[i]:
-                np1, = np.nonzero(p2p[:, i])
-                ip = np1[~isBdNodes[np1]]
-                ipn = ip.shape[0]
-                if ipn == 0:
-                    ne, = np.nonzero(t2p[:, i])
-                    tempp = guh[ne, :]
-                    rguh[i, :] = np.mean(tempp, axis=0)
-                    #rguh[i, :] = rguh[i, :]
-                else:
-                    for k in range(ipn):
-                        np2, = np.nonzero(t2p[:, ip[k]])
-                        temp0 = xnode[np2,:]
-                        tempx, center, h = scaleCoor(temp0)
-                        tempp = guh[np2, :]
-                        tempn = tempx.shape[0]
-                        X = np.ones((tempn, 3))
-                        X[:, 1:3] = tempx
-                        coefficient1 = np.linalg.solve(X.T@X,X.T@tempp[:,0])
-                        rguh[i,0] = rguh[i,0] + node[i,:]@coefficient1[1:3]/h + coefficient1[0] - center@coefficient1[1:3]/h
-                        coefficient2 = np.linalg.solve(X.T@X,X.T@tempp[:,1])
-                        rguh[i,1] = rguh[i,1] + node[i,:]@coefficient2[1:3]/h + coefficient2[0] - center@coefficient2[1:3]/h
-                    rguh[i, :] = rguh[i, :]/ipn
-            else:
-                ne, = np.nonzero(t2p[:, i])
-                temp0 =xnode[ne, :]
-                tempx,center,h = scaleCoor(temp0)
-                tempp = guh[ne, :]
-                tempn = tempx.shape[0]
-                X = np.ones((tempn, 3))
-                X[:, 1:3] = tempx
-                coefficient3 = np.linalg.solve(X.T@X,X.T@tempp[:,0])
-                rguh[i,0] = node[i,:]@coefficient3[1:3]/h + coefficient3[0] - center@coefficient3[1:3]/h
-                coefficient4 =  np.linalg.solve(X.T@X,X.T@tempp[:,1])
-                rguh[i,1] = node[i,:]@coefficient4[1:3]/h + coefficient4[0] - center@coefficient4[1:3]/h
+        bc = np.array([1/(TD+1)]*(TD+1), dtype=mesh.ftype)
+        guh = uh.grad_value(bc)
+        xc = mesh.entity_barycenter('cell')
+
+        # fit on the cell patches of the interior nodes
+        isInNode = ~isBdNode
+        inIdx, = np.nonzero(isInNode)
+        idxMap = np.zeros(NN, dtype=mesh.itype)
+        idxMap[inIdx] = range(len(inIdx))
+        patch = node2cell[inIdx]
+        I, J, x, center, h = patch_scale_coordinate(patch, xc)
+        X = np.ones((len(J), GD+1), dtype=mesh.ftype)
+        X[:, 1:] = x
+        c = patch_least_squares(patch.indptr, X, guh[J]) # (NI, GD+1, GD)
+
+        def fit_value(k, p):
+            k = idxMap[k]
+            t = (p - center[k])/h[k].reshape(-1, 1)
+            return c[k, 0] + np.einsum('ij, ijk->ik', t, c[k, 1:])
+
+        rguh[inIdx] = fit_value(inIdx, node[inIdx])
+
+        # the boundary node and its interior neighbor nodes
+        flag = isBdNode[node2node.row] & isInNode[node2node.col]
+        i = node2node.row[flag]
+        k = node2node.col[flag]
+        val = fit_value(k, node[i])
+        num = np.bincount(i, minlength=NN)
+        isNbNode = isBdNode & (num > 0)
+        for d in range(GD):
+            rguh[isNbNode, d] = np.bincount(i, weights=val[:, d],
+                    minlength=NN)[isNbNode]/num[isNbNode]
+
+        # the boundary node without interior neighbor nodes
+        isLoneNode = isBdNode & (num == 0)
+        valence = np.asarray(node2cell.sum(axis=1)).reshape(-1)
+        rguh[isLoneNode] = (node2cell[isLoneNode]@guh)/valence[isLoneNode].reshape(-1, 1)
         return rguh
 
-
-    def PPR(self,uh):
+    def PPR(self, uh):
+        """
+        The polynomial preserving recovery of the gradient of a linear
+        finite element function `uh`. On the node patch of every node, fit
+        `uh` with a quadratic polynomial in the least squares sense, and
+        evaluate its gradient at the node. The patch is enlarged when it has
+        less nodes than the quadratic polynomial space dimension (6 in 2D), or
+        the least squares problem on it is rank deficient.
+        """
         space = uh.space
         mesh = space.mesh
         GD = mesh.geo_dimension()
-        rguh = space.function(dim=GD)
-        
-        cell = mesh.ds.cell
-        node = mesh.node
-        
-        NC = mesh.number_of_cells()
         NN = mesh.number_of_nodes()
-        coefficient = np.zeros((NN,6))
-        
-        isBdNodes = mesh.ds.boundary_node_flag()
-        neighbor = mesh.ds.cell_to_cell()
-        
-        row = np.arange(NC).repeat(3)
-        col = cell.flatten()
-        data = np.ones(NC*3)
-        t2p = csr_matrix((data, (row, col)), shape=(NC,NN)).toarray()
-        p2t = t2p.T
-        p2p = p2t@t2p
-        
-        for i in range(NN):
-            #np1 = [j for (j,val) in enumerate(p2p[i,:]) if val>0]
-            np1, = np.nonzero(p2p[i,:])
-
-            npn = np1.shape[0]
-            if isBdNodes[i]:
-                ip = np1[~isBdNodes[np1]]
-                ipn = ip.shape[0]
-                if ipn == 0:
-                    for k in range(npn):
-                        #cp = [j for (j,val) in enumerate(p2p[np1[k],:]) if val>0]
-                        cp, = np.nonzero(p2p[np1[k], :])
-                        np1 = np.hstack((np1,cp))
-                    np1 = np.unique(np1)
-                else:
-                    #cp = [j for (j,val) in enumerate(p2p[ip[0],:]) if val>0]
-                    cp, = np.nonzero(p2p[ip[0],:])
-                    p = np.hstack((np1,cp))
-                    np2 = np.unique(p)
-                    if np1.shape[0] < 6:
-                        for k in range(npn):
-                           # cp = [j for (j,val) in enumerate(p2p[np1[k],:]) if val>0]
-                            cp, = np.nonzero(p2p[np1[k],:])
-                            np1 = np.hstack((np1,cp))
-                        np2 = np.unique(np1)
-                    np1 = np2
-            else:
-                if npn < 6:
-                    ne, =np.nonzero(p2t[i,:]) 
-         #           ne = [j for (j,val) in enumerate(p2t[i,:]) if val>0]
-                    n1 = neighbor[ne,0]
-                    n2 = neighbor[ne,1]
-                    n3 = neighbor[ne,2]
-                    e = np.hstack((ne,n1,n2,n3))
-                    e = np.unique(e)
-                    p = cell[e, :]
-                   # p = p[:]
-                    np1 = np.unique(p)
-            temp0 = node[np1,:]
-            tempp = uh[np1]
-            tempx,center,h = scaleCoor(temp0)
-            tempn = tempx.shape[0]
-            X = np.ones((tempn,6))
-            X[:,1:3] = tempx
-            X[:,3] = tempx[:,0]*tempx[:,1]
-            X[:,4:6] = tempx**2
-            cc = np.linalg.solve(X.T@X,X.T@tempp) 
-            c1 = center[0]
-            c2 = center[1]
-            
-            coefficient[i,0] = cc[0] - cc[1]*c1/h - cc[2]*c2/h +cc[3]*c1*c2/h/h
-            + cc[4]*c1*c1/h/h + cc[5]*c2*c2/h/h
-            coefficient[i,1] = cc[1]/h - cc[3]*c2/h/h - 2*cc[4]*c1/h/h 
-            coefficient[i,2] = cc[2]/h - cc[3]*c1/h/h - 2*cc[5]*c2/h/h
-            coefficient[i,3] = cc[3]/h/h
-            coefficient[i,4] = cc[4]/h/h
-            coefficient[i,5] = cc[5]/h/h   
-
-
-        rguh[:,0] = coefficient[:,1]+coefficient[:,3]*node[:,1]+2*coefficient[:,4]*node[:,0]
-        rguh[:,1] = coefficient[:,2]+coefficient[:,3]*node[:,0]+2*coefficient[:,5]*node[:,1]
+        NC = mesh.number_of_cells()
+        rguh = space.function(dim=GD)
 
+        node = mesh.entity('node')
+        cell = mesh.entity('cell')
+        isBdNode = mesh.ds.boundary_node_flag()
+        node2cell = mesh.ds.node_to_cell()
+        node2node = (node2cell@node2cell.T).tocsr()
+        node2node.sort_indices()
+        npn = np.diff(node2node.indptr)
+
+        # the first interior neighbor node of every node
+        A = node2node@spdiags(~isBdNode, 0, NN, NN)
+        A.eliminate_zeros()
+        A.sort_indices()
+        ipn = np.diff(A.indptr)
+        hasInNode = ipn > 0
+        ip0 = np.zeros(NN, dtype=mesh.itype)
+        ip0[hasInNode] = A.indices[A.indptr[:-1][hasInNode]]
+
+        # the number of the quadratic monomials 1, x_a, x_a*x_b (a <= b)
+        pairs = [(a, b) for a in range(GD) for b in range(a, GD)]
+        m = 1 + GD + len(pairs)
+
+        isSmall = npn < m
+        # the two ring patch
+        flag0 = isBdNode & ((~hasInNode) | isSmall)
+        # the patch of the node and its first interior neighbor node
+        flag1 = isBdNode & hasInNode & (~isSmall)
+        # the nodes of the cells around the node and their neighbor cells
+        flag2 = (~isBdNode) & isSmall
+        # the patch of the node
+        flag3 = (~isBdNode) & (~isSmall)
+
+        cell2cell = mesh.ds.cell_to_cell()
+        CN = cell2cell.shape[1]
+        C = csr_matrix((np.ones(NC*(CN+1), dtype=np.bool),
+            (np.repeat(range(NC), CN+1),
+                np.c_[np.arange(NC), cell2cell].flat)), shape=(NC, NC))
+
+        D = lambda flag: spdiags(flag, 0, NN, NN)
+        F = csr_matrix((np.ones(flag1.sum(), dtype=np.bool),
+            (np.nonzero(flag1)[0], ip0[flag1])), shape=(NN, NN))
+        patch = (D(flag0)@node2node)@node2node \
+                + D(flag1 | flag3)@node2node + F@node2node \
+                + ((D(flag2)@node2cell)@C)@node2cell.T
+        patch = patch.astype(np.bool).tocsr()
+        patch.sort_indices()
+
+        def fit(patch):
+            I, J, x, center, h = patch_scale_coordinate(patch, node)
+            X = np.ones((len(J), m), dtype=mesh.ftype)
+            X[:, 1:GD+1] = x
+            for n, (a, b) in enumerate(pairs):
+                X[:, GD+1+n] = x[:, a]*x[:, b]
+            c, isSingular = patch_least_squares(patch.indptr, X, uh[J],
+                    return_singular=True)
+            return c, center, h, isSingular
+
+        c, center, h, isSingular = fit(patch)
+        if np.any(isSingular):
+            # use the two ring patch on the rank deficient patches
+            idx, = np.nonzero(isSingular)
+            patch = (node2node[idx]@node2node).astype(np.bool).tocsr()
+            c0, center0, h0, isSingular = fit(patch)
+            if np.any(isSingular):
+                raise np.linalg.LinAlgError("Singular matrix")
+            c[idx] = c0
+            center[idx] = center0
+            h[idx] = h0
+
+        # the gradient at the node
+        t = (node - center)/h.reshape(-1, 1)
+        val = c[:, 1:GD+1].copy()
+        for n, (a, b) in enumerate(pairs):
+            val[:, a] += c[:, GD+1+n]*t[:, b]
+            val[:, b] += c[:, GD+1+n]*t[:, a]
+        rguh[:NN] = val/h.reshape(-1, 1)
         return rguh
-
-
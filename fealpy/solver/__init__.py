@@ -1,4 +1,6 @@
 
-from .solve import solve, active_set_solver
+from .solve import solve, block_solve, active_set_solver
 from .amg import AMGSolver
+from .gmg import GeometricMultigridSolver
+from .saddle_point import BlockPreconditioner, SaddlePointSolver
 from .matlab_solver import MatlabSolver
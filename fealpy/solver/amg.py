@@ -1,65 +1,447 @@
 import numpy as np
-from scipy.sparse.linalg import cg, inv, dsolve, spsolve
-from scipy.sparse import spdiags, csr_matrix
-from timeit import default_timer as timer
+from scipy.sparse import csr_matrix, spdiags
 
+from .gmg import MultigridSolver, estimate_lmax
+from ..timeintegratoralg.solver_cache import matrix_fingerprint
 
 
-class AMGSolver():
+def row_max(A, val, fill):
+    """
+    The maximum of `val` (the values on the nonzeros of the csr matrix `A`)
+    in every row of `A`, and `fill` for the empty rows.
+    """
+    N = A.shape[0]
+    m = np.full(N, fill, dtype=val.dtype)
+    isNonEmpty = A.indptr[:-1] < A.indptr[1:]
+    if np.any(isNonEmpty):
+        m[isNonEmpty] = np.maximum.reduceat(val, A.indptr[:-1][isNonEmpty])
+    return m
+
+
+def masked_csr(A, flag, data=None):
+    """
+    The csr matrix of the nonzeros of `A` with `flag`, and the values `data`
+    (the values of `A` when it is None).
+    """
+    N = A.shape[0]
+    row = np.repeat(np.arange(N), np.diff(A.indptr))
+    indptr = np.zeros(N+1, dtype=A.indptr.dtype)
+    np.cumsum(np.bincount(row[flag], minlength=N), out=indptr[1:])
+    data = A.data[flag] if data is None else data[flag]
+    return csr_matrix((data, A.indices[flag], indptr), shape=A.shape)
+
+
+def galerkin(A, P):
+    """
+    The coarse matrix `P^T A P`.
+    """
+    return (P.T.tocsr()@(A@P)).tocsr()
+
+
+def strength_rs(A, theta=0.25):
+    """
+    The classical strength of connection: `i` strongly depends on `j` if
+
+        -a_{ij} >= theta*max_{k != i} (-a_{ik})
+
+    Returns
+    -------
+    S : scipy.sparse.csr_matrix
+        the bool matrix of the strong connections without the diagonal
+    """
+    A = A.tocsr()
+    N = A.shape[0]
+    row = np.repeat(np.arange(N), np.diff(A.indptr))
+    isOff = (row != A.indices) & (A.data != 0)
+    val = np.where(isOff, -A.data, -np.inf)
+    m = row_max(A, val, -np.inf)
+    flag = isOff & (val >= theta*m[row]) & (m[row] > 0)
+    return masked_csr(A, flag, np.ones(len(flag), dtype=np.bool_))
+
+
+def strength_symmetric(A, theta=0.08):
+    """
+    The symmetric strength of connection of the smoothed aggregation:
+    `i` and `j` are strongly connected if
+
+        |a_{ij}| >= theta*sqrt(|a_{ii} a_{jj}|)
+    """
+    A = A.tocsr()
+    N = A.shape[0]
+    row = np.repeat(np.arange(N), np.diff(A.indptr))
+    D = np.abs(A.diagonal())
+    isOff = (row != A.indices) & (A.data != 0)
+    flag = isOff & (np.abs(A.data) >= theta*np.sqrt(D[row]*D[A.indices]))
+    return masked_csr(A, flag, np.ones(len(flag), dtype=np.bool_))
+
+
+def coarsen_pmis(S, seed=0):
+    """
+    The parallel modified independent set (PMIS) coarsening, a vectorized
+    version of the Ruge-Stuben C/F splitting.
+
+    Every point has the weight of the number of the points strongly
+    depending on it plus a random number in [0, 1). In every step the
+    undecided points with the largest weight in their strong neighborhood
+    become C points, and the undecided points strongly depending on them
+    become F points.
+
+    Returns
+    -------
+    isC : numpy.ndarray
+        the flags of the C points
+    """
+    N = S.shape[0]
+    G = (S + S.T).tocsr()
+    w = np.bincount(S.indices, minlength=N) + \
+            np.random.RandomState(seed).rand(N)
+    # 0: undecided, 1: C point, -1: F point
+    state = np.zeros(N, dtype=np.int8)
+    state[w < 1] = -1
+    while np.any(state == 0):
+        wu = np.where(state == 0, w, -np.inf)
+        m = row_max(G, wu[G.indices], -np.inf)
+        isNewC = (state == 0) & (wu > m)
+        state[isNewC] = 1
+        dep = row_max(S, isNewC[S.indices], False)
+        isNewF = (state == 0) & dep
+        state[isNewF] = -1
+        # as the Ruge-Stuben coarsening, the undecided points influencing
+        # the new F points are preferred as the C points
+        flag = isNewF[np.repeat(np.arange(N), np.diff(S.indptr))]
+        w += np.bincount(S.indices[flag], minlength=N)
+    return state == 1
+
+
+def direct_interpolation(A, S, isC):
+    """
+    The direct interpolation from the strongly connected C points. The
+    negative and the positive couplings are scaled separately, and the
+    positive couplings are added to the diagonal when there is no positive
+    strong C coupling.
+
+    The weights only use the values of `A` on the pattern of `S`, so `S` and
+    `isC` can be reused for a new matrix with different values.
+    """
+    A = A.tocsr()
+    N = A.shape[0]
+    row = np.repeat(np.arange(N), np.diff(A.indptr))
+    isOff = row != A.indices
+    row, col, val = row[isOff], A.indices[isOff], A.data[isOff]
+
+    W = A.multiply(S).tocsr()
+    W.data *= isC[W.indices]
+    W.eliminate_zeros()
+    wrow = np.repeat(np.arange(N), np.diff(W.indptr))
+    wcol, wval = W.indices, W.data
+
+    sneg = np.bincount(row, weights=np.minimum(val, 0), minlength=N)
+    spos = np.bincount(row, weights=np.maximum(val, 0), minlength=N)
+    cneg = np.bincount(wrow, weights=np.minimum(wval, 0), minlength=N)
+    cpos = np.bincount(wrow, weights=np.maximum(wval, 0), minlength=N)
+
+    d = A.diagonal().copy()
+    alpha = np.zeros(N, dtype=A.dtype)
+    beta = np.zeros(N, dtype=A.dtype)
+    flag = cneg != 0
+    alpha[flag] = sneg[flag]/cneg[flag]
+    flag = cpos != 0
+    beta[flag] = spos[flag]/cpos[flag]
+    d[~flag] += spos[~flag]
+
+    cidx = np.cumsum(isC) - 1
+    NC = cidx[-1] + 1 if N > 0 else 0
+    isF = ~isC[wrow]
+    wrow, wcol, wval = wrow[isF], wcol[isF], wval[isF]
+    w = -np.where(wval < 0, alpha[wrow], beta[wrow])*wval/d[wrow]
+
+    cpoint, = np.nonzero(isC)
+    I = np.r_[cpoint, wrow]
+    J = np.r_[cidx[cpoint], cidx[wcol]]
+    V = np.r_[np.ones(len(cpoint), dtype=A.dtype), w]
+    return csr_matrix((V, (I, J)), shape=(N, NC))
+
+
+def standard_interpolation(A, S, isC):
+    """
+    The standard interpolation. For every F point `i`, the strong F
+    neighbors `j` are eliminated from the row `i` of `A` by the rows `j`
+
+        a_{i*} - sum_j a_{ij}/a_{jj} a_{j*}
+
+    then the direct interpolation of the new row is from the strong C
+    neighbors of `i` and of the `j`. This interpolation works well with the
+    sparse C points of the PMIS coarsening.
+    """
+    A = A.tocsr()
+    N = A.shape[0]
+    row = np.repeat(np.arange(N), np.diff(S.indptr))
+    col = S.indices
+    isFF = ~isC[row] & ~isC[col]
+    SFF = masked_csr(S, isFF)
+    SC = masked_csr(S, ~isC[row] & isC[col])
+
+    L = A.multiply(SFF).tocsr()
+    L = L@spdiags(1/A.diagonal(), 0, N, N)
+    A = (A - L@A).tocsr()
+    S = (SC + SFF@SC).tocsr()
+    return direct_interpolation(A, S, isC)
+
+
+def aggregate_mis2(S, seed=0):
+    """
+    The aggregation from a maximal independent set of the distance two in the
+    strength graph, which is found by the vectorized Luby's method. Every
+    point of the set is the root of an aggregate, the other points join the
+    aggregate of a neighbor in one or two steps. The points without any
+    strong connection are not aggregated.
+
+    Returns
+    -------
+    agg : numpy.ndarray
+        the aggregate index of every point, -1 for the points which are not
+        aggregated
+    """
+    N = S.shape[0]
+    G = (S + S.T).tocsr()
+    isIsolated = G.indptr[:-1] == G.indptr[1:]
+    G = (G + spdiags(np.ones(N, dtype=np.bool_), 0, N, N)).tocsr()
+    hop = lambda x, fill: row_max(G, x[G.indices], fill)
+
+    w = np.random.RandomState(seed).rand(N)
+    # 0: undecided, 1: root, -1: removed
+    state = np.zeros(N, dtype=np.int8)
+    state[isIsolated] = -1
+    while np.any(state == 0):
+        wu = np.where(state == 0, w, -1.0)
+        m = hop(hop(wu, -1.0), -1.0)
+        state[(state == 0) & (wu == m)] = 1
+        isRoot = state == 1
+        near = hop(hop(isRoot, False), False)
+        state[(state == 0) & near] = -1
+
+    isRoot = state == 1
+    agg = np.full(N, -1, dtype=np.int_)
+    agg[isRoot] = np.arange(isRoot.sum())
+    for i in range(2):
+        a = hop(agg, -1)
+        flag = (agg < 0) & ~isIsolated
+        agg[flag] = a[flag]
+    return agg
+
+
+def tentative_prolongation(agg):
+    """
+    The piecewise constant prolongation on the aggregates with the columns
+    of the unit length.
+    """
+    N = len(agg)
+    NA = agg.max() + 1 if N > 0 else 0
+    idx, = np.nonzero(agg >= 0)
+    size = np.bincount(agg[idx], minlength=NA)
+    val = 1/np.sqrt(size[agg[idx]])
+    return csr_matrix((val, (idx, agg[idx])), shape=(N, NA))
+
+
+def smoothed_prolongation(A, T):
+    """
+    The prolongation `(I - w D^{-1} A) T` of the smoothed aggregation with
+    `w = 4/(3 lmax)`, where `lmax` is the largest eigenvalue of `D^{-1}A`.
+    """
+    A = A.tocsr()
+    N = A.shape[0]
+    Dinv = 1/A.diagonal()
+    w = 4/(3*estimate_lmax(A, Dinv))
+    D = spdiags(w*Dinv, 0, N, N)
+    return (T - D@(A@T)).tocsr()
+
+
+class AMGSolver(MultigridSolver):
     """
     代数多重网格解法器类。用代数多重网格方法求解
 
     Ax = b
 
     要从 A 图结构中生成一个抽象的网格。
+
+    建立 (setup) 分成两部分: 符号部分从 A 的强连接图得到每层的粗点或聚集,
+    数值部分计算每层的延拓矩阵和 Galerkin 粗矩阵。当只有 A 的值改变时,
+    `update` 只重新做数值部分。
+
+    Parameters
+    ----------
+    method : str
+        'rs' (the Ruge-Stuben C/F splitting by the PMIS coarsening with the
+        standard interpolation) or 'sa' (the smoothed aggregation)
+    theta : float
+        the threshold of the strength of connection, the default is 0.25 for
+        'rs' and 0.08 for 'sa'
+    aggressive : int
+        the number of the finest levels with the aggressive coarsening of
+        'rs', where two C/F splittings are done and their interpolations are
+        multiplied
+    coarsesize : int
+        the coarsening stops when the size of the matrix is not larger than
+        it, and the coarsest matrix is solved by the direct method
+    maxlevel : int
+        the maximal number of the levels
+    smoother, presmooth, postsmooth, cycle :
+        see `MultigridSolver`
+
+    Examples
+    --------
+    >>> solver = AMGSolver()
+    >>> solver.setup(A)
+    >>> x = solver.solve(b, tol=1e-10, accel='cg')
+    >>> solver.update(A + dt*M) # the same pattern with new values
+    >>> x = solver.solve(b, tol=1e-10, accel='cg')
     """
-    def __init__(self):
-        pass
+    def __init__(self, method='rs', theta=None, aggressive=0, coarsesize=500,
+            maxlevel=25, smoother='jacobi', presmooth=2, postsmooth=2,
+            cycle='V'):
+        super().__init__(smoother=smoother, presmooth=presmooth,
+                postsmooth=postsmooth, cycle=cycle)
+        if method not in {'rs', 'sa'}:
+            raise ValueError("We don't support method `{}`! ".format(method))
+        if theta is None:
+            theta = 0.25 if method == 'rs' else 0.08
+        self.method = method
+        self.theta = theta
+        self.aggressive = aggressive
+        self.coarsesize = coarsesize
+        self.maxlevel = maxlevel
+        self.coarsening = None
+        # the fingerprint of the finest matrix, see `amg_solver`
+        self.fingerprint = None
+
+    def coarsen_rs(self, A, theta=0.25):
+        """
+        The strong connections and the C points of `A`.
+        """
+        S = strength_rs(A, theta=theta)
+        isC = coarsen_pmis(S)
+        return S, isC
+
+    def coarsen_sa(self, A, theta=0.08):
+        """
+        The tentative prolongation on the aggregates of `A`.
+        """
+        S = strength_symmetric(A, theta=theta)
+        agg = aggregate_mis2(S)
+        return tentative_prolongation(agg)
+
+    def prolongation(self, A, coarsening):
+        """
+        The prolongation on one level from the result of the coarsening,
+        which only depends on the values of `A`.
+        """
+        if self.method == 'sa':
+            return smoothed_prolongation(A, coarsening)
+        P = None
+        for S, isC in coarsening:
+            if P is not None:
+                A = galerkin(A, P0)
+            P0 = standard_interpolation(A, S, isC)
+            P = P0 if P is None else (P@P0).tocsr()
+        return P
 
     def setup(self, A):
-        self.A = A
-
-    def solve(self, b):
-        pass
-
-    def coarsen_rs(self, theta=0.025):
-        A = self.A
-        N = A.shape[0]
-
-        D = A.min(axis=1).toarray()# 最小的副对角线的值， 绝对值是是最大的
-        D = spdiags(1/D.reshape(-1), 0, N, N)
-        Am = D@A
-
-        # 删除弱连通关系
-        i, j = Am.nonzero()
-        val = np.asarray(Am[i, j]).reshape(-1)
-
-        idx = (-val > theta)
-        data = np.ones(idx.sum(), dtype=np.int)
-        As = csr_matrix( # 有向图的非对称矩阵
-                (data, (i[idx], j[idx])), shape=(N, N), dtype=np.int)
-        Am = csr_matrix(
-                (val[idx], (i[idx], j[idx])), shape=(N, N), dtype=A.dtype)
-        Ass = (As + As.T)/2 # 无向图的对称矩阵
-
-        # 把孤立点放到 F 集合
-        isF = np.zeros(N, dtype=np.bool) # 细点
-        dgIn = np.asarray(As.sum(axis=1)).reshape(-1) # 接入强联接顶点的数目
-        isF[digIn == 0] = True # 孤立点是细点
-
-        # 发现一个逼近的极大独立集做为粗点
-        isC = np.zeros(N, dtype=np.bool) # C: coarse node
-        U = np.arange(N)                 # U: undecided node 
-        degFin = np.zeros(N, dtype=np.int) # number of F nodes strong connected to
-
-        while isC.sum() < N/2 and U.shape[0] > 20:
-            # S: selected set, changing in the coarsening
-            isS = np.zeros(N, dtype=np.bool)
-            degInAll = digIn + degFin
-            flag = (np.randdom.rand(N) < 0.85*degInAll/degInAll.mean()) & \
-                    (degInAll > 0)
-            isS[flag] = True
-            S, = isS.nonzero()
-
-            
+        """
+        Coarsen the matrix level by level, and compute the prolongations and
+        the coarse matrices.
+        """
+        A = A.tocsr()
+        self.shape = A.shape
+        self.coarsening = []
+        As = [A]
+        Ps = []
+        while (A.shape[0] > self.coarsesize) and (len(As) < self.maxlevel):
+            if self.method == 'sa':
+                coarsening = self.coarsen_sa(A, theta=self.theta)
+                NC = coarsening.shape[1]
+                if (NC == 0) or (NC >= A.shape[0]):
+                    break
+                P = smoothed_prolongation(A, coarsening)
+            else:
+                nstage = 2 if len(As) <= self.aggressive else 1
+                coarsening = []
+                P = None
+                A0 = A
+                for i in range(nstage):
+                    if P is not None:
+                        A0 = galerkin(A0, P0)
+                    S, isC = self.coarsen_rs(A0, theta=self.theta)
+                    if np.all(isC) or not np.any(isC):
+                        break
+                    coarsening.append((S, isC))
+                    P0 = standard_interpolation(A0, S, isC)
+                    P = P0 if P is None else (P@P0).tocsr()
+                if P is None:
+                    break
+            A = galerkin(A, P)
+            self.coarsening.append(coarsening)
+            Ps.append(P)
+            As.append(A)
+        self.set_levels(As, Ps)
+
+    def update(self, A, reuse_interpolation=False):
+        """
+        Recompute the prolongations and the coarse matrices of a matrix with
+        new values on the coarsening of the last `setup`. The full setup is
+        done when there is no coarsening of the same size.
+
+        When `reuse_interpolation` is True, the prolongations are also kept
+        and only the coarse matrices are recomputed, which is the cheapest
+        way when the values change a little, e.g. in the time stepping.
+        """
+        if (self.coarsening is None) or (A.shape != self.shape):
+            self.setup(A)
+            return
+        A = A.tocsr()
+        As = [A]
+        Ps = []
+        for i, coarsening in enumerate(self.coarsening):
+            if reuse_interpolation:
+                P = self.P[-1-i]
+            else:
+                P = self.prolongation(A, coarsening)
+            A = galerkin(A, P)
+            Ps.append(P)
+            As.append(A)
+        self.set_levels(As, Ps)
+
+    def set_levels(self, As, Ps):
+        # the levels are stored from the coarsest to the finest
+        self.A = As[::-1]
+        self.P = Ps[::-1]
+        self.R = [P.T.tocsr() for P in self.P]
+        self.fingerprint = matrix_fingerprint(As[0])
+        self.setup_levels()
+
+
+def amg_solver(solver, A, reuse_interpolation=False, **kwargs):
+    """
+    Return an `AMGSolver` set up for `A`, reusing `solver` when it is given.
+
+    The matrices are compared by their fingerprints (the digests of the
+    sparsity pattern and of the values, see `matrix_fingerprint`) taken at
+    the last setup, so the values of `A` changed in place, e.g. by
+    `CSRAssembler.tocsr(out=A)` or the Dirichlet elimination, are noticed.
+    The solver is returned as it is when the fingerprints are the same, only
+    the numerical part is recomputed by `update` when `A` has the same
+    sparsity pattern with new values, and the full setup is done otherwise.
+    The other keyword arguments are passed to `AMGSolver` when a new solver
+    is created.
+    """
+    A = A.tocsr()
+    if solver is None:
+        solver = AMGSolver(**kwargs)
+        solver.setup(A)
+        return solver
 
+    pkey, vkey = matrix_fingerprint(A)
+    if (solver.fingerprint is None) or (solver.fingerprint[0] != pkey):
+        solver.setup(A)
+    elif solver.fingerprint[1] != vkey:
+        solver.update(A, reuse_interpolation=reuse_interpolation)
+    return solver
@@ -0,0 +1,93 @@
+import numpy as np
+
+
+def bcg(A, B, X0=None, tol=1e-8, maxiter=None, M=None, callback=None):
+    """
+    The preconditioned block conjugate gradient method for `AX = B` with
+    many right hand sides.
+
+    All the columns share the matrix products and the preconditioner, and
+    the search space of every column is the sum of the Krylov spaces of all
+    the columns, so it needs fewer iterations than solving them one by one.
+    The converged columns are removed from the block, and the iteration
+    restarts with the other columns.
+
+    Parameters
+    ----------
+    A : scipy.sparse.spmatrix or LinearOperator
+        symmetric positive definite
+    B : numpy.ndarray
+        with shape `(N, k)`
+    X0 : numpy.ndarray
+        the initial guess
+    tol : float
+        the tolerance of the relative residual of every column
+    maxiter : int
+    M : callable
+        `M(R)` approximates `A^{-1}R` for a block `R` with shape `(N, m)`,
+        e.g. one multigrid cycle
+    callback : callable
+        `callback(X)` is called after every iteration
+
+    Returns
+    -------
+    X : numpy.ndarray
+    info : int
+        0 for the convergence, otherwise the number of the iterations
+    """
+    B = np.asarray(B)
+    N, k = B.shape
+    dtype = np.result_type(A.dtype, B.dtype)
+    X = np.zeros((N, k), dtype=dtype) if X0 is None else \
+            np.array(X0, dtype=dtype).reshape(N, k)
+    if M is None:
+        M = lambda R: R
+    if maxiter is None:
+        maxiter = 10*N
+
+    bnorm = np.linalg.norm(B, axis=0)
+    bnorm[bnorm == 0] = 1.0
+    R = B - A@X
+    active, = np.nonzero(np.linalg.norm(R, axis=0) >= tol*bnorm)
+    # the active columns are kept in the contiguous blocks, which is much
+    # faster than the fancy indexing on the columns of `X` and `R`
+    Xa = X[:, active]
+    Ra = R[:, active]
+
+    itn = 0
+    restart = True
+    while len(active) > 0 and itn < maxiter:
+        if restart:
+            Z = M(Ra)
+            P = Z
+            gamma = Z.T@Ra
+            restart = False
+        Q = A@P
+        # the pseudo inverse is safe for the dependent columns
+        alpha = np.linalg.pinv(P.T@Q)@gamma
+        Xa += P@alpha
+        Ra -= Q@alpha
+        itn += 1
+        if callback is not None:
+            X[:, active] = Xa
+            callback(X)
+
+        isConv = np.linalg.norm(Ra, axis=0) < tol*bnorm[active]
+        if np.any(isConv):
+            X[:, active] = Xa
+            active = active[~isConv]
+            Xa = Xa[:, ~isConv]
+            Ra = Ra[:, ~isConv]
+            restart = True
+            continue
+
+        Z = M(Ra)
+        gamma0 = gamma
+        gamma = Z.T@Ra
+        P = Z + P@(np.linalg.pinv(gamma0)@gamma)
+
+    info = 0
+    if len(active) > 0:
+        X[:, active] = Xa
+        info = itn
+    return X, info
@@ -1,6 +1,6 @@
 import numpy as np
 from numpy.linalg import norm
-import pyamg
+from .amg import amg_solver
 
 
 def picard(A, M, u0, tol=1e-12, atol = 1e-12, ml=None, sigma=None):
@@ -8,7 +8,7 @@ def picard(A, M, u0, tol=1e-12, atol = 1e-12, ml=None, sigma=None):
         A += sigma*M
 
     if ml is None:
-        ml = pyamg.ruge_stuben_solver(A)
+        ml = amg_solver(None, A)
     else:
         if sigma is not None:
             print('Please make sure that you have shift matrix A!')
@@ -33,4 +33,52 @@ def picard(A, M, u0, tol=1e-12, atol = 1e-12, ml=None, sigma=None):
     return u0, d0
 
 
+def subspace_iteration(A, M, U0, tol=1e-10, maxit=200, ml=None, sigma=None):
+    """
+    The smallest `k` eigenpairs of `Ax = dMx` by the subspace iteration.
 
+    Every step is one block inverse iteration followed by the Rayleigh-Ritz
+    projection. The `k` vectors are solved together by the block CG with one
+    AMG hierarchy.
+
+    Parameters
+    ----------
+    A, M : scipy.sparse.csr_matrix
+    U0 : numpy.ndarray
+        the initial vectors with shape `(N, k)`
+    tol : float
+        the tolerance of the relative change of the eigenvalues
+    maxit : int
+    ml : AMGSolver
+        the solver of `A` (of `A + sigma*M` when `sigma` is given)
+    sigma : float
+        the shift for the singular `A`
+
+    Returns
+    -------
+    U : numpy.ndarray
+        the M-orthonormal eigenvectors with shape `(N, k)`
+    d : numpy.ndarray
+        the eigenvalues in the ascending order (of `A`, not of the shifted
+        `A + sigma*M`)
+    """
+    from scipy.linalg import eigh
+
+    if sigma is not None:
+        A = A + sigma*M
+    ml = amg_solver(ml, A)
+
+    U = np.array(U0, dtype=A.dtype)
+    d0 = None
+    for i in range(maxit):
+        X = ml.solve(M@U, x0=U, tol=1e-12, accel='cg')
+        # the Rayleigh-Ritz projection on the new subspace
+        d, V = eigh(X.T@(A@X), X.T@(M@X))
+        U = X@V
+        if (d0 is not None) and np.all(np.abs(d - d0) < tol*np.abs(d)):
+            break
+        d0 = d
+
+    if sigma is not None:
+        d = d - sigma
+    return U, d
@@ -0,0 +1,101 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+from scipy.sparse.linalg import aslinearoperator
+
+
+def fgmres(A, b, x0=None, tol=1e-5, restart=30, maxiter=None, M=None,
+        callback=None):
+    """
+    The flexible GMRES with the right preconditioner, the preconditioner can
+    change between the iterations, e.g. an inner Krylov solver or a
+    multigrid cycle with a stopping tolerance.
+
+    Parameters
+    ----------
+    A : scipy.sparse.spmatrix or LinearOperator
+    b : numpy.ndarray
+    x0 : numpy.ndarray
+        the initial guess
+    tol : float
+        the tolerance of the relative residual
+    restart : int
+        the number of the iterations between the restarts
+    maxiter : int
+        the maximal number of the iterations (not the restarts)
+    M : LinearOperator
+        the preconditioner, `M.matvec(r)` approximates `A^{-1}r`
+    callback : callable
+        `callback(rnorm)` is called after every iteration with the residual
+        norm of the least squares problem
+
+    Returns
+    -------
+    x : numpy.ndarray
+    info : int
+        0 for the convergence, or the number of the iterations
+    """
+    A = aslinearoperator(A)
+    n = A.shape[0]
+    psolve = (lambda r: r) if M is None else aslinearoperator(M).matvec
+    dtype = np.result_type(A.dtype, b.dtype)
+    x = np.zeros(n, dtype=dtype) if x0 is None else np.array(x0, dtype=dtype)
+    if maxiter is None:
+        maxiter = 10*n
+
+    bnorm = np.linalg.norm(b)
+    if bnorm == 0:
+        bnorm = 1.0
+
+    itn = 0
+    while True:
+        r = b - A.matvec(x)
+        beta = np.linalg.norm(r)
+        if beta < tol*bnorm:
+            return x, 0
+        if itn >= maxiter:
+            return x, itn
+
+        m = min(restart, maxiter - itn)
+        V = np.zeros((m+1, n), dtype=dtype)
+        Z = np.zeros((m, n), dtype=dtype)
+        H = np.zeros((m+1, m), dtype=dtype)
+        cs = np.zeros(m, dtype=dtype)
+        sn = np.zeros(m, dtype=dtype)
+        g = np.zeros(m+1, dtype=dtype)
+        g[0] = beta
+        V[0] = r/beta
+
+        k = 0
+        while k < m:
+            Z[k] = psolve(V[k])
+            w = A.matvec(Z[k])
+            # the modified Gram-Schmidt orthogonalization
+            for i in range(k+1):
+                H[i, k] = np.dot(V[i], w)
+                w -= H[i, k]*V[i]
+            H[k+1, k] = np.linalg.norm(w)
+            if H[k+1, k] != 0:
+                V[k+1] = w/H[k+1, k]
+
+            # the Givens rotations of the Hessenberg matrix
+            for i in range(k):
+                t = cs[i]*H[i, k] + sn[i]*H[i+1, k]
+                H[i+1, k] = -sn[i]*H[i, k] + cs[i]*H[i+1, k]
+                H[i, k] = t
+            d = np.hypot(H[k, k], H[k+1, k])
+            cs[k] = H[k, k]/d
+            sn[k] = H[k+1, k]/d
+            H[k, k] = d
+            H[k+1, k] = 0
+            g[k+1] = -sn[k]*g[k]
+            g[k] = cs[k]*g[k]
+
+            k += 1
+            itn += 1
+            rnorm = abs(g[k])
+            if callback is not None:
+                callback(rnorm)
+            if rnorm < tol*bnorm:
+                break
+        y = solve_triangular(H[:k, :k], g[:k])
+        x += Z[:k].T@y
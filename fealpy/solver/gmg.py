@@ -0,0 +1,298 @@
+import numpy as np
+from scipy.sparse import spdiags
+from scipy.sparse.linalg import cg, splu, LinearOperator
+
+from .bcg import bcg
+
+
+def estimate_lmax(A, Dinv, maxit=15):
+    """
+    Estimate the largest eigenvalue of `D^{-1}A` by the power iteration, the
+    estimate is enlarged by 10 percent to be safe for the smoothers.
+    """
+    x = np.random.RandomState(0).rand(A.shape[0])
+    lmax = 0.0
+    for i in range(maxit):
+        y = Dinv*(A@x)
+        lmax = np.linalg.norm(y)/np.linalg.norm(x)
+        x = y/np.linalg.norm(y)
+    return 1.1*lmax
+
+
+class MultigridSolver():
+    """
+    多重网格解法器的基类, 给出光滑子和 V, W, F 循环。
+
+    子类要给出从最粗层到最细层的矩阵 `self.A`, 第 `i` 层到第 `i+1` 层的延拓
+    矩阵 `self.P[i]` 和限制矩阵 `self.R[i]`, 然后调用 `setup_levels`。
+
+    Parameters
+    ----------
+    smoother : str
+        'jacobi' (the weighted Jacobi) or 'chebyshev' (the Chebyshev
+        polynomial of the Jacobi preconditioned matrix), both of them only
+        need matrix vector products
+    presmooth, postsmooth : int
+        the number of the Jacobi sweeps, or the degree of the Chebyshev
+        polynomial
+    cycle : str
+        'V', 'W' or 'F'
+
+    Notes
+    -----
+    The same number of the pre- and post-smoothing steps gives a symmetric
+    cycle, which can be used as a preconditioner of CG.
+    """
+    def __init__(self, smoother='jacobi', presmooth=2, postsmooth=2,
+            cycle='V'):
+        if smoother not in {'jacobi', 'chebyshev'}:
+            raise ValueError("We don't support smoother `{}`! ".format(smoother))
+        if cycle not in {'V', 'W', 'F'}:
+            raise ValueError("We don't support cycle `{}`! ".format(cycle))
+        self.smoother = smoother
+        self.presmooth = presmooth
+        self.postsmooth = postsmooth
+        self.cycle = cycle
+
+    def setup_levels(self):
+        """
+        Compute the smoothing parameters and the factorization of the
+        coarsest matrix.
+        """
+        self.Dinv = [1/a.diagonal() for a in self.A]
+        self.lmax = [estimate_lmax(a, d) for a, d in zip(self.A, self.Dinv)]
+        # the LU solve also works on a block of right hand sides
+        self.coarse_solver = splu(self.A[0].tocsc()).solve
+
+    def number_of_levels(self):
+        return len(self.A)
+
+    def __str__(self):
+        s = "{} with {} levels\n".format(type(self).__name__, len(self.A))
+        s += "  level    unknowns     nonzeros\n"
+        for i, A in enumerate(self.A[::-1]):
+            s += "  {:>5d} {:>11d} {:>12d}\n".format(i, A.shape[0], A.nnz)
+        s += "operator complexity: {:.3f}\n".format(
+                sum(A.nnz for A in self.A)/self.A[-1].nnz)
+        return s
+
+    def smooth(self, level, b, x, nu):
+        A = self.A[level]
+        Dinv = self.Dinv[level]
+        if x.ndim == 2:
+            Dinv = Dinv[:, None]
+        lmax = self.lmax[level]
+        if self.smoother == 'jacobi':
+            w = 4/(3*lmax)
+            for i in range(nu):
+                r = A@x
+                np.subtract(b, r, out=r)
+                r *= Dinv
+                r *= w
+                x += r
+        else:
+            # the Chebyshev polynomial on [lmax/4, lmax], which damps the high
+            # frequencies
+            lmin = lmax/4
+            theta = (lmax + lmin)/2
+            delta = (lmax - lmin)/2
+            sigma = theta/delta
+            rho = 1/sigma
+            r = b - A@x
+            d = Dinv*r/theta
+            for i in range(nu):
+                x += d
+                r -= A@d
+                rho1 = 1/(2*sigma - rho)
+                d *= rho1*rho
+                d += 2*rho1/delta*(Dinv*r)
+                rho = rho1
+        return x
+
+    def vcycle(self, level, b, x, cycle):
+        """
+        One multigrid cycle on the level starting from `x`, `b` and `x` can
+        be the blocks of many vectors with shape `(N, k)`.
+        """
+        if level == 0:
+            return self.coarse_solver(b)
+
+        A = self.A[level]
+        x = self.smooth(level, b, x, self.presmooth)
+        rc = self.R[level-1]@(b - A@x)
+        ec = np.zeros(rc.shape, dtype=rc.dtype)
+        if cycle == 'V':
+            ec = self.vcycle(level-1, rc, ec, 'V')
+        elif cycle == 'W':
+            ec = self.vcycle(level-1, rc, ec, 'W')
+            ec = self.vcycle(level-1, rc, ec, 'W')
+        else:
+            ec = self.vcycle(level-1, rc, ec, 'F')
+            ec = self.vcycle(level-1, rc, ec, 'V')
+        x += self.P[level-1]@ec
+        x = self.smooth(level, b, x, self.postsmooth)
+        return x
+
+    def aspreconditioner(self, cycle=None):
+        """
+        One cycle from the zero initial guess as a `LinearOperator`.
+        """
+        cycle = self.cycle if cycle is None else cycle
+        A = self.A[-1]
+        level = len(self.A) - 1
+
+        def matvec(r):
+            r = np.asarray(r).reshape(-1)
+            return self.vcycle(level, r, np.zeros(len(r), dtype=A.dtype),
+                    cycle)
+        return LinearOperator(A.shape, matvec=matvec, dtype=A.dtype)
+
+    def solve(self, b, x0=None, tol=1e-8, maxiter=100, cycle=None,
+            accel=None, residuals=None):
+        """
+        Solve `Ax = b` by the multigrid cycles, or by CG preconditioned with
+        one cycle when `accel` is 'cg'.
+
+        Parameters
+        ----------
+        b : numpy.ndarray
+            with shape `(N, )`, or `(N, k)` for `k` right hand sides, which
+            are solved together by the cycles on the blocks, or by the block
+            CG (see `bcg`) when `accel` is 'cg'
+        x0 : numpy.ndarray
+            the initial guess
+        tol : float
+            the tolerance of the relative residual (of every column)
+        maxiter : int
+        cycle : str
+            the default is the cycle of the solver
+        accel : str
+            None or 'cg'
+        residuals : list
+            the residual norms (the Frobenius norms for a block) are appended
+            to it when it is given
+
+        Returns
+        -------
+        x : numpy.ndarray
+        """
+        cycle = self.cycle if cycle is None else cycle
+        A = self.A[-1]
+        level = len(self.A) - 1
+        x = np.zeros(b.shape, dtype=A.dtype) if x0 is None else \
+                np.array(x0, dtype=A.dtype).reshape(b.shape)
+
+        bnorm = np.linalg.norm(b, axis=0)
+        bnorm = np.where(bnorm == 0, 1.0, bnorm)
+        if residuals is not None:
+            residuals.append(np.linalg.norm(b - A@x))
+
+        if accel is None:
+            for i in range(maxiter):
+                x = self.vcycle(level, b, x, cycle)
+                r = b - A@x
+                if residuals is not None:
+                    residuals.append(np.linalg.norm(r))
+                if np.all(np.linalg.norm(r, axis=0) < tol*bnorm):
+                    break
+        elif accel == 'cg':
+            callback = None
+            if residuals is not None:
+                callback = lambda xk: residuals.append(np.linalg.norm(b - A@xk))
+            if b.ndim == 1:
+                x, info = cg(A, b, x0=x, tol=tol, maxiter=maxiter,
+                        M=self.aspreconditioner(cycle=cycle), callback=callback)
+            else:
+                M = lambda r: self.vcycle(level, r, np.zeros(r.shape,
+                    dtype=A.dtype), cycle)
+                x, info = bcg(A, b, X0=x, tol=tol, maxiter=maxiter, M=M,
+                        callback=callback)
+        else:
+            raise ValueError("We don't support accel `{}`! ".format(accel))
+        return x
+
+
+class GeometricMultigridSolver(MultigridSolver):
+    """
+    几何多重网格解法器类。用网格加密过程中得到的延拓矩阵求解
+
+    Ax = b
+
+    粗网格上的矩阵由 Galerkin 方法 P^T A P 得到, 所以不需要像代数多重网格那
+    样从 A 的图结构中粗化, 建立的代价只是几次稀疏矩阵的乘积。
+
+    Parameters
+    ----------
+    A : scipy.sparse.csr_matrix
+        the matrix on the finest mesh
+    P : list of scipy.sparse.csr_matrix
+        the prolongation matrices from the coarsest level to the finest
+        level, `P[i]` maps the level `i` to the level `i+1`, e.g. the node
+        interpolation matrices returned by
+        `TriangleMesh.uniform_refine(n, returnim=True)`, or the matrices
+        returned by `TriangleMesh.bisect(returnim=True)` and
+        `TetrahedronMesh.bisect(returnim=True)` in the order of the
+        refinement
+    isDDof : numpy.ndarray
+        the flags of the Dirichlet dofs on the finest level. The rows of
+        `A` of these dofs should be the identity, e.g. by `DirichletHandler`.
+        The Dirichlet dofs of the coarse levels are found from the
+        prolongations, and they are removed from the prolongations, so the
+        coarse operators only see the free dofs
+    smoother, presmooth, postsmooth, cycle :
+        see `MultigridSolver`
+
+    Examples
+    --------
+    >>> IM, _ = mesh.uniform_refine(n=4, returnim=True)
+    >>> ... # assemble A and b on the fine mesh, apply the Dirichlet condition
+    >>> solver = GeometricMultigridSolver(A, IM, isDDof=isBdDof)
+    >>> x = solver.solve(b, tol=1e-10, accel='cg')
+    """
+    def __init__(self, A, P, isDDof=None, smoother='jacobi', presmooth=2,
+            postsmooth=2, cycle='V'):
+        super().__init__(smoother=smoother, presmooth=presmooth,
+                postsmooth=postsmooth, cycle=cycle)
+
+        P = [p.tocsr() for p in P]
+        self.isDDof = [None]*(len(P) + 1)
+        if isDDof is not None:
+            # the corrections are zero on the Dirichlet dofs of all the
+            # levels, a coarse dof is a Dirichlet dof when the fine dof with
+            # its largest interpolation weight (the same node) is
+            isDDof = np.asarray(isDDof, dtype=np.bool_)
+            self.isDDof[-1] = isDDof
+            for i in range(len(P)-1, -1, -1):
+                N, M = P[i].shape
+                W = abs(P[i]).tocoo()
+                wmax = W.max(axis=0).toarray().reshape(-1)
+                flag = W.data == wmax[W.col]
+                isCDof = np.zeros(M, dtype=np.bool_)
+                isCDof[W.col[flag]] = isDDof[W.row[flag]]
+                Df = spdiags((~isDDof).astype(P[i].dtype), 0, N, N)
+                Dc = spdiags((~isCDof).astype(P[i].dtype), 0, M, M)
+                P[i] = (Df@P[i]@Dc).tocsr()
+                P[i].eliminate_zeros()
+                self.isDDof[i] = isDDof = isCDof
+        self.P = P
+        self.R = [p.T.tocsr() for p in P]
+        self.setup(A)
+
+    def setup(self, A):
+        """
+        Compute the coarse operators, the smoothing parameters and the
+        factorization of the coarsest matrix of a new matrix `A` on the same
+        hierarchy, e.g. in the time stepping.
+        """
+        A = A.tocsr()
+        NL = len(self.P) + 1
+        self.A = [None]*NL
+        self.A[-1] = A
+        for i in range(NL-2, -1, -1):
+            self.A[i] = (self.R[i]@self.A[i+1]@self.P[i]).tocsr()
+            if self.isDDof[i] is not None:
+                # the identity on the Dirichlet dofs
+                N = self.A[i].shape[0]
+                D = spdiags(self.isDDof[i].astype(A.dtype), 0, N, N)
+                self.A[i] = (self.A[i] + D).tocsr()
+        self.setup_levels()
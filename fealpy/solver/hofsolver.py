@@ -3,9 +3,10 @@ from scipy.sparse import coo_matrix, csc_matrix, csr_matrix
 from scipy.sparse import spdiags, eye, bmat, tril, triu
 from scipy.sparse.linalg import cg, spsolve, LinearOperator
 from timeit import default_timer as timer
-import pyamg
 from ..functionspace.lagrange_fem_space import LagrangeFiniteElementSpace
 from ..femmodel.doperator import stiff_matrix
+from ..boundarycondition import DirichletHandler
+from .amg import amg_solver
 
 
 class HOFEMFastSovler():
@@ -24,12 +25,9 @@ class HOFEMFastSovler():
         # construct amg solver for linear 
         A1 = stiff_matrix(linspace, integrator, measure)
         isBdDof = linspace.boundary_dof()
-        bdIdx = np.zeros((A1.shape[0], ), np.int)
-        bdIdx[isBdDof] = 1
-        Tbd = spdiags(bdIdx, 0, A1.shape[0], A1.shape[0])
-        T = spdiags(1-bdIdx, 0, A1.shape[0], A1.shape[0])
-        A1 = T@A1@T + Tbd
-        self.ml = pyamg.ruge_stuben_solver(A1)  
+        A1 = A1.tocsr()
+        A1 = DirichletHandler(A1, isBdDof).apply_on_matrix(A1)
+        self.ml = amg_solver(None, A1)
 
         # Get interpolation matrix 
         NC = space.mesh.number_of_cells()
@@ -38,8 +36,8 @@ class HOFEMFastSovler():
         c2d0 = space.cell_to_dof()
         c2d1 = linspace.cell_to_dof()
 
-        I = np.einsum('ij, k->ijk', c2d0, np.ones(3))
-        J = np.einsum('ik, j->ijk', c2d1, np.ones(len(bc)))
+        I = np.broadcast_to(c2d0[:, :, None], shape=c2d0.shape + (3, ))
+        J = np.broadcast_to(c2d1[:, None, :], shape=(len(c2d1), len(bc), c2d1.shape[1]))
         gdof = space.number_of_global_dofs()
         lgdof = linspace.number_of_global_dofs()
         self.PI = csr_matrix((val.flat, (I.flat, J.flat)), shape=(gdof, lgdof))
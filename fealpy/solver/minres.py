@@ -2,7 +2,10 @@
 from numpy import sqrt, inner, finfo, zeros
 from numpy.linalg import norm
 
-from scipy.sparse.linalg.isolve.utils import make_system
+try:
+    from scipy.sparse.linalg._isolve.utils import make_system
+except ImportError:
+    from scipy.sparse.linalg.isolve.utils import make_system
 
 
 def minres(A, b, x0=None, shift=0.0, tol=1e-5, maxiter=None,
@@ -49,6 +52,9 @@ def minres(A, b, x0=None, shift=0.0, tol=1e-5, maxiter=None,
 
     eps = finfo(xtype).eps
 
+    # solve the correction of the initial guess
+    x0 = x
+    b = b - (matvec(x0) - shift*x0)
     x = zeros(n, dtype=xtype)
 
     # Set up y and v for the first Lanczos vector v1.
@@ -65,7 +71,7 @@ def minres(A, b, x0=None, shift=0.0, tol=1e-5, maxiter=None,
     if beta1 < 0:
         raise ValueError('indefinite preconditioner')
     elif beta1 == 0:
-        return (postprocess(x), 0)
+        return (postprocess(x0 + x), 0)
 
     beta1 = sqrt(beta1)
 
@@ -222,7 +228,7 @@ def minres(A, b, x0=None, shift=0.0, tol=1e-5, maxiter=None,
                 istop = 6
             if Acond >= 0.1/eps:
                 istop = 4
-            if epsx >= beta:
+            if epsx >= beta1:
                 istop = 3
             # if rnorm <= epsx   : istop = 2
             # if rnorm <= epsr   : istop = 1
@@ -262,11 +268,10 @@ def minres(A, b, x0=None, shift=0.0, tol=1e-5, maxiter=None,
                 print()
 
         if callback is not None:
-            callback(x)
+            callback(x0 + x)
 
-        if istop in [1, 2]:
-            pass
-            #break  # TODO check this
+        if istop != 0:
+            break
 
     if show:
         print()
@@ -281,4 +286,4 @@ def minres(A, b, x0=None, shift=0.0, tol=1e-5, maxiter=None,
     else:
         info = 0
 
-    return (postprocess(x),info)
+    return (postprocess(x0 + x),info)
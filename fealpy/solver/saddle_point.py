@@ -0,0 +1,241 @@
+import numpy as np
+from scipy.sparse import bmat, spdiags
+from scipy.sparse.linalg import factorized, LinearOperator
+
+from .amg import AMGSolver
+from .minres import minres
+from .fgmres import fgmres
+
+
+def split_blocks(A, n0=None):
+    """
+    Split the 2x2 block matrix
+
+        [[A00, A01],
+         [A10, A11]]
+
+    Parameters
+    ----------
+    A : scipy.sparse.spmatrix or list
+        the matrix from `bmat`, or the list of the blocks in which `A11` can
+        be None
+    n0 : int
+        the size of the first block when `A` is a matrix
+
+    Returns
+    -------
+    A00, A01, A10, A11 :
+        `A11` is None when it is zero
+    """
+    if isinstance(A, (list, tuple)):
+        (A00, A01), (A10, A11) = A
+        A00, A01, A10 = A00.tocsr(), A01.tocsr(), A10.tocsr()
+        if A11 is not None:
+            A11 = A11.tocsr()
+    else:
+        if n0 is None:
+            raise ValueError("The size `n0` of the first block is needed!")
+        A = A.tocsr()
+        A00 = A[:n0, :n0]
+        A01 = A[:n0, n0:]
+        A10 = A[n0:, :n0]
+        A11 = A[n0:, n0:]
+    if (A11 is not None) and (abs(A11).sum() == 0):
+        A11 = None
+    return A00, A01, A10, A11
+
+
+def inner_solver(A, method, **kwargs):
+    """
+    The approximate inverse of a diagonal block.
+
+    Parameters
+    ----------
+    A : scipy.sparse.spmatrix
+    method : str or callable
+        'amg' (one cycle of `AMGSolver`, the parameters are in `kwargs`),
+        'jacobi' (the inverse of the diagonal), 'direct' (the sparse LU), or
+        a function (e.g. a `LinearOperator`) `method(r)` approximating
+        `A^{-1}r`
+
+    Returns
+    -------
+    solve : callable
+    """
+    if callable(method):
+        return method
+    elif method == 'amg':
+        ml = AMGSolver(**kwargs)
+        ml.setup(A)
+        return ml.aspreconditioner().matvec
+    elif method == 'jacobi':
+        d = 1/A.diagonal()
+        return lambda r: d*r
+    elif method == 'direct':
+        return factorized(A.tocsc())
+    else:
+        raise ValueError("We don't support method `{}`! ".format(method))
+
+
+class BlockPreconditioner():
+    """
+    鞍点问题的块预条件子。对于
+
+        [[A, B^T],
+         [B, -C]]
+
+    用 A 的近似逆和 Schur 补 S = C + B A^{-1} B^T 的近似逆组装块对角
+    (用于 MINRES) 或者块三角 (用于 FGMRES) 预条件子, 只需要矩阵向量乘积和
+    每个块上的 AMG, 不用分解整个矩阵。
+
+    Parameters
+    ----------
+    A : scipy.sparse.spmatrix or list
+        see `split_blocks`
+    n0 : int
+        the size of the first block, e.g. the number of the velocity dofs
+    S : scipy.sparse.spmatrix
+        the approximation of the Schur complement, e.g. the pressure mass
+        matrix scaled by `1/nu` for the Stokes equation. The default is
+        `C + B diag(A)^{-1} B^T`, which is a good choice for the mixed
+        Darcy and elasticity systems with a mass-like block `A`
+    structure : str
+        'diagonal', 'lower' or 'upper'
+    ainv, sinv : str or callable
+        the inner solvers of `A` and `S`, see `inner_solver`
+    amg_options : dict
+        the parameters of `AMGSolver` of the inner solvers
+
+    Notes
+    -----
+    The block diagonal preconditioner is symmetric positive definite when
+    the inner solvers are, which is needed by MINRES. The triangular ones
+    are better but nonsymmetric, they go with FGMRES. The Dirichlet rows of
+    `A` should be the identity, and the pressure of an enclosed flow is
+    defined up to a constant, then `S` should be the mass matrix with
+    'jacobi' or 'amg', whose coarsest matrix is not singular.
+    """
+    def __init__(self, A, n0=None, S=None, structure='diagonal', ainv='amg',
+            sinv='jacobi', amg_options=None):
+        if structure not in {'diagonal', 'lower', 'upper'}:
+            raise ValueError("We don't support structure `{}`! ".format(structure))
+        amg_options = {} if amg_options is None else amg_options
+
+        A00, A01, A10, A11 = split_blocks(A, n0)
+        if S is None:
+            N = A00.shape[0]
+            D = spdiags(1/A00.diagonal(), 0, N, N)
+            S = (A10@D@A01).tocsr()
+            if A11 is not None:
+                S = (S - A11).tocsr()
+
+        self.A01 = A01
+        self.A10 = A10
+        self.S = S
+        self.n0 = A00.shape[0]
+        self.shape = (A00.shape[0] + A10.shape[0], )*2
+        self.dtype = A00.dtype
+        self.structure = structure
+        self.ainv = inner_solver(A00, ainv, **amg_options)
+        self.sinv = inner_solver(S, sinv, **amg_options)
+
+    def __call__(self, r):
+        return self.matvec(r)
+
+    def matvec(self, r):
+        r = np.asarray(r).reshape(-1)
+        n0 = self.n0
+        r0, r1 = r[:n0], r[n0:]
+        if self.structure == 'diagonal':
+            y0 = self.ainv(r0)
+            y1 = self.sinv(r1)
+        elif self.structure == 'lower':
+            # [[A, 0], [B, -S]]
+            y0 = self.ainv(r0)
+            y1 = self.sinv(self.A10@y0 - r1)
+        else:
+            # [[A, B^T], [0, -S]]
+            y1 = -self.sinv(r1)
+            y0 = self.ainv(r0 - self.A01@y1)
+        return np.r_[y0, y1]
+
+    def aspreconditioner(self):
+        return LinearOperator(self.shape, matvec=self.matvec, dtype=self.dtype)
+
+
+class SaddlePointSolver():
+    """
+    用块预条件的 MINRES 或 FGMRES 求解鞍点问题。
+
+    Parameters
+    ----------
+    A : scipy.sparse.spmatrix or list
+        the 2x2 block matrix, see `split_blocks`
+    n0 : int
+        the size of the first block
+    method : str
+        'minres' (with the block diagonal preconditioner) or 'fgmres' (with
+        the block upper triangular preconditioner by default)
+    **kwargs :
+        the parameters of `BlockPreconditioner`
+
+    Examples
+    --------
+    >>> A = bmat([[A, B.T], [B, None]], format='csr')
+    >>> solver = SaddlePointSolver(A, n0, S=Mp, method='minres')
+    >>> x = solver.solve(b, tol=1e-8)
+    """
+    def __init__(self, A, n0=None, method='minres', **kwargs):
+        if method not in {'minres', 'fgmres'}:
+            raise ValueError("We don't support method `{}`! ".format(method))
+        if isinstance(A, (list, tuple)):
+            blocks = A
+            A = bmat(A, format='csr')
+        else:
+            blocks = A = A.tocsr()
+        if method == 'fgmres':
+            kwargs.setdefault('structure', 'upper')
+        elif kwargs.get('structure', 'diagonal') != 'diagonal':
+            raise ValueError("MINRES needs the block diagonal preconditioner!")
+
+        self.A = A
+        self.method = method
+        self.P = BlockPreconditioner(blocks, n0=n0, **kwargs)
+
+    def solve(self, b, x0=None, tol=1e-8, maxiter=None, restart=30,
+            residuals=None):
+        """
+        Parameters
+        ----------
+        b : numpy.ndarray
+        x0 : numpy.ndarray
+        tol : float
+            the tolerance of the relative residual
+        maxiter : int
+        restart : int
+            the restart of FGMRES
+        residuals : list
+            the residual norms are appended to it when it is given
+
+        Returns
+        -------
+        x : numpy.ndarray
+            `self.info` is 0 for the convergence, otherwise the number of the
+            iterations
+        """
+        A = self.A
+        M = self.P.aspreconditioner()
+        if self.method == 'minres':
+            callback = None
+            if residuals is not None:
+                callback = lambda xk: residuals.append(np.linalg.norm(b - A@xk))
+            x, info = minres(A, b, x0=x0, tol=tol, maxiter=maxiter, M=M,
+                    callback=callback)
+        else:
+            callback = None
+            if residuals is not None:
+                callback = residuals.append
+            x, info = fgmres(A, b, x0=x0, tol=tol, restart=restart,
+                    maxiter=maxiter, M=M, callback=callback)
+        self.info = info
+        return x
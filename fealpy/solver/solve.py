@@ -2,12 +2,16 @@
 import numpy as np
 from scipy.sparse.linalg import cg, inv, dsolve
 
-from scipy.sparse.linalg import spsolve
+from scipy.sparse.linalg import spsolve, splu
 
 from scipy.sparse import spdiags
 from timeit import default_timer as timer
 import pyamg
 
+from ..boundarycondition import dirichlet_handler
+from .amg import amg_solver
+from .bcg import bcg
+
 def solve1(a, L, uh, dirichlet=None, neuman=None, solver='cg'):
     space = a.space
 
@@ -90,6 +94,43 @@ def solve(dmodel, uh, dirichlet=None, solver='direct'):
     return AD, b 
 
 
+def block_solve(A, B, solver='direct', ml=None, tol=1e-12, maxiter=200):
+    """
+    Solve `AX = B` with many right hand sides at the same time.
+
+    Parameters
+    ----------
+    A : scipy.sparse.spmatrix
+    B : numpy.ndarray
+        with shape `(N, k)`
+    solver : str
+        'direct' (one LU factorization and the triangular solves on all the
+        columns), 'amg' (the block CG preconditioned by one AMG hierarchy for
+        the symmetric positive definite `A`) or 'cg' (the block CG with the
+        Jacobi preconditioner)
+    ml : AMGSolver
+        the AMG solver to be reused, see `amg_solver`
+
+    Returns
+    -------
+    X : numpy.ndarray
+        with the same shape as `B`
+    """
+    B = np.asarray(B)
+    if solver == 'direct':
+        return splu(A.tocsc()).solve(B)
+    elif solver == 'amg':
+        ml = amg_solver(ml, A)
+        return ml.solve(B, tol=tol, maxiter=maxiter, accel='cg')
+    elif solver == 'cg':
+        D = 1/A.diagonal()
+        X, info = bcg(A, B.reshape(B.shape[0], -1), tol=tol, maxiter=maxiter,
+                M=lambda R: D[:, None]*R)
+        return X.reshape(B.shape)
+    else:
+        raise ValueError("We don't support solver `{}`! ".format(solver))
+
+
 def active_set_solver(dmodel, uh, gh, maxit=5000, dirichlet=None,
         solver='direct'):
     space = uh.space
@@ -102,13 +143,18 @@ def active_set_solver(dmodel, uh, gh, maxit=5000, dirichlet=None,
     if dirichlet is not None:
         AD, b = dirichlet.apply(A, b)
 
-    AD = AD.tolil()
+    AD = AD.tocsr()
     start = timer()
     lam = space.function()
 
     gdof = space.number_of_global_dofs()
     I = np.ones(gdof, dtype=np.bool)
     
+    # the active dofs are fixed as the Dirichlet dofs, the sparsity pattern
+    # of the matrix does not change, so the AMG coarsening of the first step
+    # is reused in the following steps
+    handler = None
+    ml = None
     k = 0
     while k < maxit:
         print(k)
@@ -118,18 +164,13 @@ def active_set_solver(dmodel, uh, gh, maxit=5000, dirichlet=None,
         if np.all(I == I0) & (k > 1):
             break
 
-        M = AD.copy()
-        F = b.copy()
-
-        idx, = np.nonzero(I)
-        M[idx, :] = 0
-        M[idx, idx] = 1
-        F[idx] = gh[idx]
+        handler = dirichlet_handler(handler, AD, I)
+        M, F = handler.apply(handler.copy(AD), b.copy(), gh)
 
         if solver == 'direct':
-            uh[:] = spsolve(M.tocsr(), F)
+            uh[:] = spsolve(M, F)
         elif solver == 'amg':
-            ml = pyamg.ruge_stuben_solver(M.tocsr())  
+            ml = amg_solver(ml, M)
             uh[:] = ml.solve(F, tol=1e-12, accel='cg').reshape(-1)
         lam[:] = AD@uh - b
     end = timer()
@@ -1,14 +1,16 @@
 import numpy as np
-from ..solver import MatlabSolver
+from .solver_cache import SolverCache
 
 
 class TimeIntegrationAlg:
-    def __init__(self):
+    def __init__(self, solver=None):
         """
         Parameter
         ---------
+        solver: the function `solver(A, b)`, the default is a `SolverCache`,
+            which factorizes the same left matrix only once
         """
-        self.solver = MatlabSolver()
+        self.solver = SolverCache() if solver is None else solver
 
     def run(self, uh, dmodel, timeline):
         timeline.reset()
@@ -16,7 +18,7 @@ class TimeIntegrationAlg:
         for i in range(NL-1):
             A = dmodel.get_current_left_matrix(timeline)
             b = dmodel.get_current_right_vector(uh[:, i], timeline)
-            AD, bd = dmodel.apply_boundary_condition()
-            uh[:, i+1] = self.solver.divide(AD, bd)
+            AD, bd = dmodel.apply_boundary_condition(A, b, timeline)
+            uh[:, i+1] = self.solver(AD, bd)
             timeline.advance()
         timeline.reset()
@@ -0,0 +1,187 @@
+import hashlib
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import issparse
+from scipy.sparse.linalg import splu
+
+
+def matrix_fingerprint(A):
+    """
+    The fingerprint of the sparsity pattern and the values of a matrix.
+
+    Returns
+    -------
+    pkey : tuple
+        the key of the pattern, the shape and the digest of the indices
+    vkey : str
+        the digest of the values
+    """
+    def digest(a):
+        return hashlib.blake2b(np.ascontiguousarray(a).view(np.uint8),
+                digest_size=16).hexdigest()
+
+    if issparse(A):
+        A = A.tocsr()
+        if not A.has_sorted_indices:
+            A = A.sorted_indices()
+        pkey = (A.shape, str(A.dtype), digest(A.indptr), digest(A.indices))
+        vkey = digest(A.data)
+    else:
+        A = np.asarray(A)
+        pkey = (A.shape, str(A.dtype))
+        vkey = digest(A)
+    return pkey, vkey
+
+
+class SolverCache():
+    """
+    时间推进中线性方程组解法器的缓存。
+
+    左端矩阵由指纹 (稀疏结构和数值的摘要) 或者用户给出的关键字 (比如时间步长)
+    来识别, 相同的矩阵只做一次 LU 分解或 AMG 建立, 之后的时间层只做回代或多重
+    网格迭代。缓存按最近最少使用 (LRU) 的顺序淘汰。
+
+    对象本身可以像 `spsolve` 一样调用, 所以可以直接作为 `solver` 传给
+    `UniformTimeLine.time_integration` 和模型的 `solve` 方法。
+
+    Parameters
+    ----------
+    method : str or callable
+        'direct' (the sparse LU by `scipy.sparse.linalg.splu`), 'amg'
+        (`fealpy.solver.AMGSolver` as the preconditioner of CG), or a function
+        `method(A)` returning a function `solve(b)`
+    maxsize : int
+        the maximal number of the cached solvers
+    **kwargs :
+        the parameters of `AMGSolver` and of its `solve` method (`tol`,
+        `maxiter`, `accel`) when `method` is 'amg'
+
+    Examples
+    --------
+    >>> cache = SolverCache(maxsize=4)
+    >>> timeline.time_integration(uh, dmodel, cache)
+    >>> print(cache)
+    """
+    def __init__(self, method='direct', maxsize=8, **kwargs):
+        if not callable(method) and method not in {'direct', 'amg'}:
+            raise ValueError("We don't support method `{}`! ".format(method))
+        self.method = method
+        self.maxsize = maxsize
+        self.solve_options = {'tol': kwargs.pop('tol', 1e-10),
+                'maxiter': kwargs.pop('maxiter', 200),
+                'accel': kwargs.pop('accel', 'cg')}
+        self.options = kwargs
+        self.cache = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                'setup_time': 0.0, 'solve_time': 0.0}
+
+    def __call__(self, A, b, key=None):
+        return self.solve(A, b, key=key)
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __str__(self):
+        s = "SolverCache({}) with {}/{} solvers\n".format(
+                self.method if not callable(self.method) else
+                self.method.__name__, len(self.cache), self.maxsize)
+        s += "  hits: {hits}, misses: {misses}, evictions: {evictions}\n".format(
+                **self.stats)
+        s += "  setup time: {setup_time:.3f}s, solve time: {solve_time:.3f}s\n".format(
+                **self.stats)
+        return s
+
+    def hit_rate(self):
+        n = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits']/n if n > 0 else 0.0
+
+    def clear(self):
+        self.cache.clear()
+
+    def get_solver(self, A, key=None):
+        """
+        Get the solver of `A` from the cache, or set it up.
+
+        Parameters
+        ----------
+        A : scipy.sparse.spmatrix
+        key : hashable
+            the key of `A` given by the user, e.g. the time step length of a
+            constant operator. The fingerprint of `A` is used when it is None.
+            The user should make sure that the same key means the same matrix
+
+        Returns
+        -------
+        solve : callable
+            `solve(b)` returns the solution of `Ax = b`
+        """
+        if key is None:
+            pkey, vkey = matrix_fingerprint(A)
+            key = (pkey, vkey)
+        else:
+            pkey = None
+            key = ('user', key)
+
+        if key in self.cache:
+            self.stats['hits'] += 1
+            self.cache.move_to_end(key)
+            return self.cache[key][1]
+
+        self.stats['misses'] += 1
+        victim = None
+        if len(self.cache) >= self.maxsize:
+            _, victim = self.cache.popitem(last=False)
+            self.stats['evictions'] += 1
+
+        start = timer()
+        entry = self.setup(A, pkey, victim)
+        self.stats['setup_time'] += timer() - start
+        if self.maxsize > 0:
+            self.cache[key] = entry
+        return entry[1]
+
+    def setup(self, A, pkey, victim=None):
+        """
+        Set up the solver of `A`, the AMG hierarchy of the evicted solver is
+        updated instead when it has the same pattern.
+
+        Returns
+        -------
+        entry : tuple
+            `(pkey, solve, ml)`, `ml` is the `AMGSolver` or None
+        """
+        if callable(self.method):
+            return (pkey, self.method(A), None)
+        elif self.method == 'direct':
+            if issparse(A):
+                # the triangular solves also work on a block of right hand
+                # sides with shape `(N, k)`
+                return (pkey, splu(A.tocsc()).solve, None)
+            else:
+                lu = lu_factor(A)
+                return (pkey, lambda b: lu_solve(lu, b), None)
+        else:
+            from ..solver.amg import AMGSolver
+            A = A.tocsr()
+            if (victim is not None) and (victim[2] is not None) and \
+                    (pkey is not None) and (victim[0] == pkey):
+                ml = victim[2]
+                ml.update(A)
+            else:
+                ml = AMGSolver(**self.options)
+                ml.setup(A)
+            options = self.solve_options
+            return (pkey, lambda b: ml.solve(b, **options), ml)
+
+    def solve(self, A, b, key=None):
+        """
+        Solve `Ax = b` by the cached solver of `A`.
+        """
+        solve = self.get_solver(A, key=key)
+        start = timer()
+        x = solve(b)
+        self.stats['solve_time'] += timer() - start
+        return x
@@ -1,6 +1,8 @@
 import numpy as np
 from scipy.fftpack import dct, idct
 
+from .solver_cache import SolverCache
+
 class UniformTimeLine():
     def __init__(self, T0, T1, NT):
         """
@@ -15,12 +17,15 @@ class UniformTimeLine():
         self.NL = NT + 1 # the number of time levels
         self.dt = (self.T1 - self.T0)/NT
         self.current = 0
+        # the factorizations of the left matrices, the step length is constant
+        self.cache = SolverCache(maxsize=2)
 
     def uniform_refine(self, n=1):
         for i in range(n):
             self.NL = 2*(self.NL - 1) + 1
             self.dt = (self.T1 - self.T0)/(self.NL - 1)
         self.current = 0
+        self.cache.clear()
 
     def number_of_time_levels(self):
         return self.NL
@@ -49,7 +54,14 @@ class UniformTimeLine():
     def reset(self):
         self.current = 0
 
-    def time_integration(self, data, dmodel, solver):
+    def time_integration(self, data, dmodel, solver=None):
+        """
+        Parameter
+        ---------
+        solver: the function `solver(A, b)`, the default is `self.cache`, which
+            factorizes the same left matrix only once, see `SolverCache`
+        """
+        solver = self.cache if solver is None else solver
         self.reset()
         while not self.stop():
             A = dmodel.get_current_left_matrix(self)
@@ -74,6 +86,9 @@ class ChebyshevTimeLine():
         self.time = 0.5*(T0 + T1) - 0.5*(T1 - T0)*np.cos(self.theta)
         self.dt = self.time[1:] - self.time[0:-1]
         self.current = 0
+        # every time level has its own step length, the factorizations of all
+        # the levels are kept for the correction sweeps
+        self.cache = SolverCache(maxsize=NT)
 
     def uniform_refine(self):
         self.NL = 2*(self.NL - 1) + 1
@@ -82,6 +97,8 @@ class ChebyshevTimeLine():
         self.time = 0.5*(self.T0 + self.T1) - 0.5*(self.T1 - self.T0)*np.cos(self.theta)
         self.dt = self.time[1:] - self.time[0:-1]
         self.current = 0
+        self.cache.clear()
+        self.cache.maxsize = NT
 
     def number_of_time_levels(self):
         return self.NL
@@ -136,7 +153,15 @@ class ChebyshevTimeLine():
         intq *= 0.5*(self.time[-1] - self.time[0])
         return intq
 
-    def time_integration(self, data, dmodel, solver, nupdate=1):
+    def time_integration(self, data, dmodel, solver=None, nupdate=1):
+        """
+        Parameter
+        ---------
+        solver: the function `solver(A, b)`, the default is `self.cache`, see
+            `SolverCache`
+        nupdate: the number of the spectral deferred correction sweeps
+        """
+        solver = self.cache if solver is None else solver
         self.reset()
         while not self.stop():
             A = dmodel.get_current_left_matrix(self)
@@ -161,15 +186,3 @@ class ChebyshevTimeLine():
                 self.current += 1
             self.reset()
             data[0] += data[-1]
-
-
-
-
-
-
-
-
-
-
-
-
@@ -3,6 +3,8 @@ from ..quadrature import GaussLobattoQuadrature, GaussLegendreQuadrature
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye
 from numpy.linalg import inv
 
+from ..functionspace.ConformingVirtualElementSpace2d import edge_to_cell_add
+
 
 class BasicMatrix():
     def __init__(self, V, area):
@@ -254,7 +256,7 @@ def matrix_B(V):
     smldof = V.smspace.number_of_local_dofs()
     mesh = V.mesh
     NV = mesh.number_of_vertices_of_cells()
-    h = V.smspace.h
+    h = V.smspace.cellsize
     cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
     B = np.zeros((smldof, cell2dof.shape[0]), dtype=np.float)
     if p == 1:
@@ -275,39 +277,27 @@ def matrix_B(V):
             B[idx0, idx1] -= r[i-2::-1]
             B[idx0+2, idx1] -= r[0:i-1]
             start += i+1
-        node = mesh.node
-        edge = mesh.ds.edge
-        edge2cell = mesh.ds.edge2cell
+        node = mesh.entity('node')
+        edge = mesh.entity('edge')
+        edge2cell = mesh.ds.edge_to_cell()
         isInEdge = (edge2cell[:, 0] != edge2cell[:, 1])
 
         qf = GaussLobattoQuadrature(p + 1)
         bcs, ws = qf.quadpts, qf.weights
         ps = np.einsum('ij, kjm->ikm', bcs, node[edge])
-        gphi0 = V.smspace.grad_basis(ps, cellidx=edge2cell[:, 0])
-        gphi1 = V.smspace.grad_basis(ps[-1::-1, isInEdge, :], cellidx=edge2cell[isInEdge, 1])
+        gphi0 = V.smspace.grad_basis(ps, index=edge2cell[:, 0])
+        gphi1 = V.smspace.grad_basis(ps[-1::-1, isInEdge, :], index=edge2cell[isInEdge, 1])
         nm = mesh.edge_normal()
 
         val = np.einsum('ijmk, jk->jmi', gphi0, nm)
         val = np.einsum('i, jmi->jmi', ws, val)
-
-        #TODO: vectorize
-        NE = mesh.number_of_edges()
-        for i in range(NE):
-            idx0 = edge2cell[i, 0]
-            idx1 = cell2dofLocation[idx0] + (edge2cell[i, 2]*p + np.arange(p+1))%(NV[idx0]*p)
-            B[:, idx1] += val[i]
+        edge_to_cell_add(B, val, edge2cell[:, 0], edge2cell[:, 2],
+                cell2dofLocation, NV, p)
 
         val = np.einsum('ijmk, jk->jmi', gphi1, -nm[isInEdge])
         val = np.einsum('i, jmi->jmi', ws, val)
-
-        #TODO: vectorize
-        j = 0
-        for i in range(NE):
-            if isInEdge[i]:
-                idx0 = edge2cell[i, 1]
-                idx1 = cell2dofLocation[idx0] + (edge2cell[i, 3]*p + np.arange(p+1))%(NV[idx0]*p)
-                B[:, idx1] += val[j]
-                j += 1
+        edge_to_cell_add(B, val, edge2cell[isInEdge, 1], edge2cell[isInEdge, 3],
+                cell2dofLocation, NV, p)
         return B
 
 def matrix_G(V, B, D):
@@ -7,7 +7,7 @@ from scipy.sparse import bmat
 
 from fealpy.pde.poisson_2d import CosCosData
 from fealpy.functionspace import LagrangeFiniteElementSpace
-from fealpy.boundarycondition import BoundaryCondition
+from fealpy.boundarycondition import BoundaryCondition, DirichletHandler
 
 class BoundaryConditionTest:
     def __init__(self):
@@ -53,7 +53,52 @@ class BoundaryConditionTest:
             print(error)
             mesh.uniform_refine()
 
+    def dirichlet_handler_test(self, p=2):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=3)
+        space = LagrangeFiniteElementSpace(mesh, p=p)
+        A = space.stiff_matrix()
+        b = space.source_vector(pde.source)
+        uh = space.function()
+        isDDof = space.set_dirichlet_bc(uh, pde.dirichlet)
+
+        handler = DirichletHandler(A, isDDof)
+        A0, b0 = handler.condense(A, b, uh)
+        x = handler.expand(spsolve(A0, b0), uh.copy())
+        AD, bD = handler.apply(A.copy(), b.copy(), uh)
+        assert np.allclose(spsolve(AD, bD), x)
+        AD0, bD0, x0 = AD.copy(), bD.copy(), x.copy()
+
+        # the boundary values change with the same matrix
+        bD = handler.apply_on_vector(b.copy(), 2*uh)
+        A0, b0 = handler.condense(A, b, 2*uh)
+        x = handler.expand(spsolve(A0, b0), 2*uh)
+        assert np.allclose(spsolve(AD, bD), x)
+
+        # the handler is reused for the same matrix
+        bc = BoundaryCondition(space, dirichlet=pde.dirichlet)
+        bc.apply_dirichlet_bc(A, b.copy(), space.function())
+        handler = bc.handler
+        bc.apply_dirichlet_bc(A, b.copy(), space.function())
+        assert bc.handler is handler
+
+        # the missing diagonal entries of the Dirichlet dofs are inserted
+        A1 = A.tolil()
+        idx, = np.nonzero(isDDof)
+        A1[idx, idx] = 0
+        A1 = A1.tocsr()
+        A1.eliminate_zeros()
+        handler = DirichletHandler(A1, isDDof)
+        AD1, bD1 = handler.apply(A1, b.copy(), uh)
+        assert AD1.nnz == A1.nnz + len(idx)
+        assert np.allclose(bD1, bD0)
+        assert abs(AD1 - AD0).max() == 0
+        A0, b0 = handler.condense(A1, b, uh)
+        assert np.allclose(handler.expand(spsolve(A0, b0), uh.copy()), x0)
+        print('The Dirichlet handler is OK!')
+
 
 test = BoundaryConditionTest()
 #test.poisson_fem_2d_test(p=2)
 test.poisson_fem_2d_neuman_test(p=3)
+test.dirichlet_handler_test()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+
+from fealpy.functionspace import ConformingVirtualElementSpace2d
+from fealpy.functionspace.ConformingVirtualElementSpace2d import edge_to_cell_add
+from fealpy.functionspace.ConformingVirtualElementSpace2d import cell_projection
+from fealpy.quadrature import GaussLobattoQuadrature
+from fealpy.mesh import Quadtree
+from fealpy.vem import doperator
+
+
+class ConformingVirtualElementSpace2dTest:
+    def __init__(self):
+        pass
+
+    def polygon_mesh(self, n=2):
+        node = np.array([
+            (0.0, 0.0),
+            (1.0, 0.0),
+            (1.0, 1.0),
+            (0.0, 1.0)], dtype=np.float)
+        cell = np.array([(0, 1, 2, 3)], dtype=np.int)
+        qtree = Quadtree(node, cell)
+        qtree.uniform_refine(n)
+        c = qtree.entity_barycenter('cell')
+        isMarkedCell = qtree.is_leaf_cell() & (np.sum(c**2, axis=1) < 0.3)
+        qtree.refine_1(isMarkedCell, options={'disp': False})
+        return qtree.to_pmesh()
+
+    def edge_value(self, space):
+        p = space.p
+        mesh = space.mesh
+        node = mesh.entity('node')
+        edge = mesh.entity('edge')
+        edge2cell = mesh.ds.edge_to_cell()
+        isInEdge = (edge2cell[:, 0] != edge2cell[:, 1])
+
+        qf = GaussLobattoQuadrature(p + 1)
+        bcs, ws = qf.quadpts, qf.weights
+        ps = np.einsum('ij, kjm->ikm', bcs, node[edge])
+        gphi0 = space.smspace.grad_basis(ps, index=edge2cell[:, 0])
+        gphi1 = space.smspace.grad_basis(ps[-1::-1, isInEdge, :], index=edge2cell[isInEdge, 1])
+        nm = mesh.edge_normal()
+        val0 = np.einsum('i, ijmk, jk->jmi', ws, gphi0, nm)
+        val1 = np.einsum('i, ijmk, jk->jmi', ws, gphi1, -nm[isInEdge])
+        return val0, val1
+
+    def edge_to_cell_add_test(self, p=2):
+        mesh = self.polygon_mesh()
+        space = ConformingVirtualElementSpace2d(mesh, p=p)
+        val0, val1 = self.edge_value(space)
+
+        NV = mesh.number_of_vertices_of_cells()
+        cell2dof, cell2dofLocation = space.cell_to_dof()
+        smldof = space.smspace.number_of_local_dofs()
+        edge2cell = mesh.ds.edge_to_cell()
+        isInEdge = (edge2cell[:, 0] != edge2cell[:, 1])
+
+        # the edge loop
+        B0 = np.zeros((smldof, cell2dof.shape[0]), dtype=np.float)
+        NE = mesh.number_of_edges()
+        j = 0
+        for i in range(NE):
+            idx0 = edge2cell[i, 0]
+            idx1 = cell2dofLocation[idx0] + (edge2cell[i, 2]*p + np.arange(p+1))%(NV[idx0]*p)
+            B0[:, idx1] += val0[i]
+            if isInEdge[i]:
+                idx0 = edge2cell[i, 1]
+                idx1 = cell2dofLocation[idx0] + (edge2cell[i, 3]*p + np.arange(p+1))%(NV[idx0]*p)
+                B0[:, idx1] += val1[j]
+                j += 1
+
+        B1 = np.zeros((smldof, cell2dof.shape[0]), dtype=np.float)
+        edge_to_cell_add(B1, val0, edge2cell[:, 0], edge2cell[:, 2],
+                cell2dofLocation, NV, p)
+        edge_to_cell_add(B1, val1, edge2cell[isInEdge, 1], edge2cell[isInEdge, 3],
+                cell2dofLocation, NV, p)
+        assert np.allclose(B0, B1, rtol=0, atol=1e-13)
+        print('edge_to_cell_add with p =', p, 'is OK!')
+
+    def matrix_B_test(self, p=2):
+        mesh = self.polygon_mesh()
+        space = ConformingVirtualElementSpace2d(mesh, p=p)
+        B0 = space.matrix_B()
+        B1 = doperator.matrix_B(space)
+        assert np.all(B0 == B1)
+        print('matrix_B with p =', p, 'is OK!')
+
+    def group_test(self, p=2):
+        mesh = self.polygon_mesh()
+        space = ConformingVirtualElementSpace2d(mesh, p=p)
+        PI1 = doperator.matrix_PI_1(space, space.G, space.B)
+        for index, location in space.cellgroup:
+            m = space.group_stack(space.PI1, index)
+            assert np.allclose(m, np.array([PI1[i] for i in index]))
+        L = space.group_split([space.group_stack(space.PI1, index)
+            for index, location in space.cellgroup])
+        assert all(np.all(a == b) for a, b in zip(L, space.PI1))
+        print('group_stack and group_split with p =', p, 'are OK!')
+
+    def cell_projection_test(self, p=2):
+        mesh = self.polygon_mesh()
+        space = ConformingVirtualElementSpace2d(mesh, p=p)
+        for index, location in space.cellgroup:
+            P = cell_projection(p, space.group_geometry(index), 0, len(index),
+                    pi0=True)
+            B = space.B[:, location].swapaxes(0, 1)
+            assert np.allclose(P['D'], space.D[location], rtol=0, atol=1e-14)
+            assert np.allclose(P['B'], B, rtol=0, atol=1e-14)
+            for key in ['H', 'PI1', 'PI0']:
+                m = space.group_stack(getattr(space, key), index)
+                assert np.allclose(P[key], m, rtol=0, atol=1e-13*abs(m).max())
+        print('cell_projection with p =', p, 'is OK!')
+
+    def parallel_assembly_test(self, p=2, workers=2):
+        mesh = self.polygon_mesh()
+        space = ConformingVirtualElementSpace2d(mesh, p=p)
+        A = space.stiff_matrix(cfun=lambda x: 1 + x[..., 0]**2, workers=workers)
+        M = space.mass_matrix(workers=workers)
+        # the projections are computed by the workers only
+        assert 'PI1' not in space.__dict__
+        A0 = space.stiff_matrix(cfun=lambda x: 1 + x[..., 0]**2)
+        M0 = space.mass_matrix()
+        assert abs(A - A0).max() < 1e-12*abs(A0).max()
+        assert abs(M - M0).max() < 1e-12*abs(M0).max()
+        print('The parallel assembly with p =', p, 'is OK!')
+
+
+test = ConformingVirtualElementSpace2dTest()
+test.edge_to_cell_add_test(p=2)
+test.edge_to_cell_add_test(p=3)
+test.matrix_B_test(p=2)
+test.matrix_B_test(p=3)
+test.group_test(p=1)
+test.group_test(p=3)
+test.cell_projection_test(p=1)
+test.cell_projection_test(p=3)
+test.parallel_assembly_test(p=1)
+test.parallel_assembly_test(p=3)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+
+
+class ConnectivityCacheTest:
+    def __init__(self):
+        pass
+
+    def readonly_test(self):
+        mesh = CosCosCosData().init_mesh(n=1)
+        cell2edge = mesh.ds.cell_to_edge()
+        assert not cell2edge.flags.writeable
+        assert cell2edge is mesh.ds.cell_to_edge()
+        # the array of the data structure itself is still writable
+        assert mesh.ds.cell2edge.flags.writeable
+        mesh.ds.cell2edge = mesh.ds.cell2edge.copy()
+        print('The read-only connectivity is OK!')
+
+    def geometric_test(self):
+        mesh = CosCosData().init_mesh(n=3)
+        index = mesh.spatial_index()
+        assert mesh.spatial_index() is index
+
+        # the node array is replaced
+        mesh.node = mesh.node*2
+        index1 = mesh.spatial_index()
+        assert index1 is not index
+        assert np.all(index1.find_cell(np.array([[1.5, 1.5]])) >= 0)
+
+        # the topology is changed
+        isMarkedCell = np.zeros(mesh.number_of_cells(), dtype=np.bool_)
+        isMarkedCell[:2] = True
+        mesh.bisect(isMarkedCell)
+        assert mesh.spatial_index() is not index1
+        print('The geometric cache is OK!')
+
+    def point_location_test(self):
+        mesh = CosCosData().init_mesh(n=3)
+        space = LagrangeFiniteElementSpace(mesh, p=1)
+        points = np.array([[0.3, 0.3], [1.5, 1.5]])
+        cidx, bc = space.point_location(points)
+        assert space.point_location(points)[0] is cidx
+        assert cidx[1] == -1
+
+        # the cached location is dropped with the old node array
+        mesh.node = mesh.node*2
+        cidx, bc = space.point_location(points)
+        assert cidx[1] >= 0
+        node = mesh.entity('node')
+        cell = mesh.entity('cell')
+        assert np.allclose(np.einsum('ij, ijk->ik', bc, node[cell[cidx]]), points)
+        print('The cached point location is OK!')
+
+
+test = ConnectivityCacheTest()
+test.readonly_test()
+test.geometric_test()
+test.point_location_test()
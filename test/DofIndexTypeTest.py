@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.mesh import PrismMesh
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.functionspace import PrismFiniteElementSpace
+
+
+class DofIndexTypeTest:
+    def __init__(self):
+        pass
+
+    def init_mesh(self, TD):
+        pde = CosCosData() if TD == 2 else CosCosCosData()
+        return pde.init_mesh(n=2 if TD == 2 else 1)
+
+    def lagrange_test(self, TD=2, p=1):
+        mesh = self.init_mesh(TD)
+        spaces = [LagrangeFiniteElementSpace(mesh, p=p, itype=itype)
+                for itype in [np.int32, np.int64]]
+        for space, itype in zip(spaces, [np.int32, np.int64]):
+            cell2dof = space.cell_to_dof()
+            if p == 1:
+                # the cell array of the mesh itself, not a copy
+                assert np.shares_memory(cell2dof, mesh.entity('cell'))
+                assert space.itype == mesh.entity('cell').dtype
+            else:
+                assert space.itype == itype
+            assert cell2dof.dtype == space.itype
+            assert space.dof.edge_to_dof().dtype == space.itype
+            if TD == 3:
+                assert space.dof.face_to_dof().dtype == space.itype
+            ipoint = space.interpolation_points()
+            assert ipoint.dtype == mesh.ftype
+            assert len(ipoint) == space.number_of_global_dofs()
+
+        space0, space1 = spaces
+        assert np.all(space0.cell_to_dof() == space1.cell_to_dof())
+        assert np.all(space0.interpolation_points() ==
+                space1.interpolation_points())
+        A0 = space0.stiff_matrix()
+        A1 = space1.stiff_matrix()
+        assert abs(A0 - A1).max() == 0
+        M0 = space0.mass_matrix()
+        M1 = space1.mass_matrix()
+        assert abs(M0 - M1).max() == 0
+        print('The dof index type with TD =', TD, 'p =', p, 'is OK!')
+
+    def prism_test(self, p=1):
+        node = np.array([
+            [0, 0, 0], [1, 0, 0], [0, 1, 0],
+            [0, 0, 1], [1, 0, 1], [0, 1, 1]], dtype=np.float64)
+        cell = np.array([[0, 1, 2, 3, 4, 5]], dtype=np.int64)
+        mesh = PrismMesh(node, cell)
+        mesh.uniform_refine(1)
+        spaces = [PrismFiniteElementSpace(mesh, p=p, itype=itype)
+                for itype in [np.int32, np.int64]]
+        for space, itype in zip(spaces, [np.int32, np.int64]):
+            cell2dof = space.cell_to_dof()
+            assert space.itype == (mesh.entity('cell').dtype if p == 1 else
+                    itype)
+            assert cell2dof.dtype == space.itype
+            assert space.interpolation_points().dtype == mesh.ftype
+        assert np.all(spaces[0].cell_to_dof() == spaces[1].cell_to_dof())
+        print('The prism dof index type with p =', p, 'is OK!')
+
+
+test = DofIndexTypeTest()
+for TD in [2, 3]:
+    for p in [1, 2, 3]:
+        test.lagrange_test(TD=TD, p=p)
+for p in [1, 2, 3]:
+    test.prism_test(p=p)
@@ -163,6 +163,27 @@ class HalfEdgeMeshTest:
             mesh.find_cell(axes, showindex=True)
             plt.show()
 
+    def cell_to_edge_test(self):
+        mesh = self.refine_poly_test(plot=False)
+        NE = mesh.number_of_edges()
+
+        edge = mesh.ds.edge_to_node()
+        cell, cellLocation = mesh.ds.cell_to_node()
+        cell2edge = mesh.ds.cell_to_edge()
+        edge2cell = mesh.ds.edge_to_cell()
+
+        # the i-th edge of a cell starts at the i-th vertex
+        flag = (edge[cell2edge, 0] == cell) | (edge[cell2edge, 1] == cell)
+        assert np.all(flag)
+
+        NV = cellLocation[1:] - cellLocation[:-1]
+        cidx = np.repeat(range(len(NV)), NV)
+        lidx = np.arange(len(cell2edge)) - np.repeat(cellLocation[:-1], NV)
+        isLeft = edge2cell[cell2edge, 0] == cidx
+        assert np.all(lidx[isLeft] == edge2cell[cell2edge[isLeft], 2])
+        assert np.all(lidx[~isLeft] == edge2cell[cell2edge[~isLeft], 3])
+        assert np.all(cidx[~isLeft] == edge2cell[cell2edge[~isLeft], 1])
+
     def refine_tri_test(self, plot=True):
         node = np.array([
             (0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)
@@ -272,6 +293,9 @@ if sys.argv[1] == 'coarsen_poly':
     mesh = test.refine_poly_test(plot=False)
     test.coarsen_poly_test(mesh, plot=True)
 
+if sys.argv[1] == 'cell_to_edge':
+    test.cell_to_edge_test()
+
 if sys.argv[1] == 'advance_trimesh':
     test.advance_trimesh_test()
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+
+
+class LagrangeFiniteElementSpaceRefineTest:
+    def __init__(self):
+        pass
+
+    def init_mesh(self, TD):
+        pde = CosCosData() if TD == 2 else CosCosCosData()
+        return pde.init_mesh(n=2)
+
+    def update_test(self, TD=2, p=1, marked=True):
+        mesh = self.init_mesh(TD)
+        space = LagrangeFiniteElementSpace(mesh, p=p)
+        A = space.stiff_matrix()
+        M = space.mass_matrix()
+        f = lambda x: x[..., 0]**p + x[..., 1]
+        u0 = space.interpolation(f)
+
+        NC = mesh.number_of_cells()
+        isMarkedCell = np.zeros(NC, dtype=np.bool_)
+        if marked:
+            isMarkedCell[::3] = True
+        cell = mesh.entity('cell').copy()
+        record = mesh.bisect(isMarkedCell, returnrecord=True)
+        assert np.all(record.oldcell == cell[record.changedCell])
+
+        update = space.refine_update(record)
+        A = space.update_matrix(A, update, cellmatrix='stiff')
+        M = space.update_matrix(M, update, cellmatrix='mass')
+
+        # compare with the space built on the refined mesh
+        space1 = LagrangeFiniteElementSpace(mesh, p=p)
+        assert space1.number_of_global_dofs() == update.number_of_global_dofs()
+        assert np.all(space1.cell_to_dof() == space.cell_to_dof())
+        A1 = space1.stiff_matrix()
+        M1 = space1.mass_matrix()
+        assert abs(A - A1).max() < 1e-10*abs(A1).max()
+        assert abs(M - M1).max() < 1e-10*abs(M1).max()
+
+        # the prolongation is exact for the polynomials of degree p
+        u1 = space1.interpolation(f)
+        assert np.allclose(update.prolongate(u0), u1, rtol=0, atol=1e-12)
+        print('update_matrix with TD =', TD, 'p =', p, 'marked =', marked,
+                'is OK!')
+
+
+test = LagrangeFiniteElementSpaceRefineTest()
+for TD in [2, 3]:
+    for p in [1, 2, 3]:
+        test.update_test(TD=TD, p=p)
+        test.update_test(TD=TD, p=p, marked=False)
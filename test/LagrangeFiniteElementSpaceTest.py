@@ -78,12 +78,93 @@ class LagrangeFiniteElementSpaceTest:
         plt.show()
         
 
-        
+    def test_operator(self, p=3):
+        pde = CosCosCosData()
+        mesh = pde.init_mesh(1)
+        space = LagrangeFiniteElementSpace(mesh, p=p)
+        cfun = lambda x: 1 + x[..., 0]**2
+        x = np.random.rand(space.number_of_global_dofs(), 2)
+        for c in [None, cfun]:
+            A = space.stiff_matrix(cfun=c)
+            Ao = space.stiff_operator(cfun=c)
+            assert np.allclose(A@x, Ao@x, atol=1e-12)
+            assert np.allclose(A.diagonal(), Ao.diagonal(), atol=1e-12)
+
+            M = space.mass_matrix(cfun=c)
+            Mo = space.mass_operator(cfun=c)
+            assert np.allclose(M@x, Mo@x, atol=1e-12)
+            assert np.allclose(M.diagonal(), Mo.diagonal(), atol=1e-12)
+        print('The matrix-free operators with p =', p, 'are OK!')
+
+    def test_parallel_assembly(self, p=2, workers=2):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=3)
+        space = LagrangeFiniteElementSpace(mesh, p=p)
+        A = space.stiff_matrix(workers=workers)
+        M = space.mass_matrix(workers=workers)
+        b = space.source_vector(pde.source, workers=workers)
+        assert np.allclose((A - space.stiff_matrix()).data, 0, atol=1e-12)
+        assert np.allclose((M - space.mass_matrix()).data, 0, atol=1e-12)
+        assert np.allclose(b, space.source_vector(pde.source), atol=1e-12)
+        print('The parallel assembly with', workers, 'workers is OK!')
+
+    def test_block_assembly(self, p=2, blocksize=10):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=3)
+        space = LagrangeFiniteElementSpace(mesh, p=p)
+        A = space.stiff_matrix(blocksize=blocksize)
+        M = space.mass_matrix(blocksize=blocksize)
+        b = space.source_vector(pde.source, blocksize=blocksize)
+        assert np.allclose((A - space.stiff_matrix()).data, 0, atol=1e-12)
+        assert np.allclose((M - space.mass_matrix()).data, 0, atol=1e-12)
+        assert np.allclose(b, space.source_vector(pde.source), atol=1e-12)
+        e0 = space.integralalg.integral(pde.solution, barycenter=False)
+        e1 = space.integralalg.integral(pde.solution, barycenter=False,
+                blocksize=blocksize)
+        assert abs(e0 - e1) < 1e-12
+        print('The block assembly with', blocksize, 'cells per block is OK!')
+
+    def test_interpolate_from(self, p=2):
+        pde = CosCosData()
+        mesh0 = pde.init_mesh(n=2)
+        mesh1 = pde.init_mesh(n=3)
+        node = mesh0.entity('node')
+        isBdNode = mesh0.ds.boundary_node_flag()
+        node[~isBdNode] += 0.01
+        space0 = LagrangeFiniteElementSpace(mesh0, p=p)
+        space1 = LagrangeFiniteElementSpace(mesh1, p=p)
+        f = lambda x: x[..., 0]**p - 2*x[..., 1]**p + x[..., 0]*x[..., 1]
+        uh = space0.interpolation(f)
+        uI = space1.interpolate_from(uh)
+        assert np.allclose(uI, f(space1.interpolation_points()), atol=1e-12)
+        cidx, bc = mesh1.location(np.array([[0.3, 0.7], [2.0, 2.0]]))
+        assert (cidx[0] >= 0) and (cidx[1] == -1)
+        print('The interpolation between nonmatching meshes is OK!')
+
+    def test_eval_at_points(self, p=2):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=4)
+        space = LagrangeFiniteElementSpace(mesh, p=p)
+        uh = space.interpolation(lambda x: x[..., 0]**2 - x[..., 0]*x[..., 1])
+        points = np.random.rand(100, 2)
+        for i in range(2): # the second evaluation uses the cached location
+            val = uh.eval_at_points(points)
+            gval = uh.grad_at_points(points)
+            x, y = points[:, 0], points[:, 1]
+            assert np.allclose(val, x**2 - x*y, atol=1e-12)
+            assert np.allclose(gval, np.c_[2*x - y, -x], atol=1e-10)
+        assert np.all(np.isnan(uh.eval_at_points(np.array([[2.0, 2.0]]))))
+        print('The evaluation at points is OK!')
 
 
 test = LagrangeFiniteElementSpaceTest()
 #test.test_space_on_triangle()
 #test.test_space_on_tet()
+test.test_operator()
+test.test_parallel_assembly()
+test.test_block_assembly()
+test.test_interpolate_from()
+test.test_eval_at_points()
 test.plot_basis()
 
 
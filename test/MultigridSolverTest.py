@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+from scipy.sparse.linalg import spsolve
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.boundarycondition import DirichletBC
+from fealpy.solver import GeometricMultigridSolver, AMGSolver
+from fealpy.solver.amg import amg_solver
+from fealpy.solver import block_solve
+from fealpy.solver.eigns import subspace_iteration
+
+class MultigridSolverTest:
+    def __init__(self):
+        pass
+
+    def linear_system(self, pde, mesh):
+        space = LagrangeFiniteElementSpace(mesh, p=1)
+        A = space.stiff_matrix()
+        b = space.source_vector(pde.source)
+        bc = DirichletBC(space, pde.dirichlet)
+        A, b = bc.apply(A, b)
+        return A, b, space.boundary_dof()
+
+    def gmg_2d_test(self):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=1)
+        IM, _ = mesh.uniform_refine(n=5, returnim=True)
+        A, b, isBdDof = self.linear_system(pde, mesh)
+        x = spsolve(A, b)
+        for cycle in ['V', 'W', 'F']:
+            for smoother in ['jacobi', 'chebyshev']:
+                solver = GeometricMultigridSolver(A, IM, isDDof=isBdDof,
+                        smoother=smoother, cycle=cycle)
+                res = []
+                x0 = solver.solve(b, tol=1e-10, residuals=res)
+                assert np.allclose(x0, x) and (len(res) < 30)
+                res = []
+                x0 = solver.solve(b, tol=1e-10, accel='cg', residuals=res)
+                assert np.allclose(x0, x) and (len(res) < 20)
+        print(solver)
+        print('The geometric multigrid solver in 2d is OK!')
+
+    def gmg_3d_test(self):
+        pde = CosCosCosData()
+        mesh = pde.init_mesh(n=1)
+        IM = [mesh.bisect(returnim=True) for i in range(6)]
+        A, b, isBdDof = self.linear_system(pde, mesh)
+        solver = GeometricMultigridSolver(A, IM, isDDof=isBdDof)
+        res = []
+        x = solver.solve(b, tol=1e-10, accel='cg', residuals=res)
+        assert np.allclose(x, spsolve(A, b)) and (len(res) < 20)
+
+        # the same hierarchy for a new matrix
+        solver.setup(2*A)
+        x = solver.solve(b, tol=1e-10, accel='cg')
+        assert np.allclose(2*x, spsolve(A, b))
+        print('The geometric multigrid solver in 3d is OK!')
+
+    def amg_test(self):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=6)
+        A, b, isBdDof = self.linear_system(pde, mesh)
+        x = spsolve(A, b)
+        for kw in [{'method':'rs'}, {'method':'rs', 'aggressive':1},
+                {'method':'sa'}]:
+            solver = AMGSolver(**kw)
+            solver.setup(A)
+            res = []
+            x0 = solver.solve(b, tol=1e-10, accel='cg', residuals=res)
+            assert np.allclose(x0, x) and (len(res) < 40)
+
+            # only the values change
+            solver.update(2*A)
+            x0 = solver.solve(b, tol=1e-10, accel='cg')
+            assert np.allclose(2*x0, x)
+            solver.update(3*A, reuse_interpolation=True)
+            x0 = solver.solve(b, tol=1e-10)
+            assert np.allclose(3*x0, x)
+        print(solver)
+
+        solver = amg_solver(None, A)
+        assert amg_solver(solver, A) is solver
+        coarsening = solver.coarsening
+        solver = amg_solver(solver, 2*A)
+        assert solver.coarsening is coarsening
+
+        # the values changed in place are noticed by the fingerprint
+        A = A.copy()
+        solver = amg_solver(None, A)
+        coarsening = solver.coarsening
+        A.data *= 4
+        solver = amg_solver(solver, A)
+        assert solver.coarsening is coarsening
+        x0 = solver.solve(b, tol=1e-10, accel='cg')
+        assert np.allclose(4*x0, x)
+        print('The algebraic multigrid solver is OK!')
+
+    def block_solve_test(self):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=6)
+        IM, _ = mesh.uniform_refine(n=1, returnim=True)
+        A, b, isBdDof = self.linear_system(pde, mesh)
+        B = np.random.RandomState(0).rand(A.shape[0], 8)
+        B[isBdDof] = 0
+        B[:, 1] = 2*B[:, 0] # the dependent columns
+        X = spsolve(A.tocsc(), B)
+        for solver in ['direct', 'amg', 'cg']:
+            X0 = block_solve(A, B, solver=solver, maxiter=1000)
+            assert np.allclose(X0, X)
+
+        solver = GeometricMultigridSolver(A, IM, isDDof=isBdDof)
+        for accel in [None, 'cg']:
+            X0 = solver.solve(B, tol=1e-10, accel=accel)
+            assert np.allclose(X0, X)
+
+        # the smallest eigenvalues of the Laplacian with the Dirichlet
+        # condition on [0, 1]^2: 2, 5, 5, 8 times pi^2
+        mesh = pde.init_mesh(n=5)
+        space = LagrangeFiniteElementSpace(mesh, p=1)
+        isFreeDof = ~space.boundary_dof()
+        A = space.stiff_matrix()[isFreeDof][:, isFreeDof]
+        M = space.mass_matrix()[isFreeDof][:, isFreeDof]
+        U0 = np.random.RandomState(0).rand(A.shape[0], 6)
+        U, d = subspace_iteration(A, M, U0, tol=1e-8)
+        assert np.allclose(U.T@(M@U), np.eye(6))
+        assert np.allclose(d[:4]/np.pi**2, [2, 5, 5, 8], rtol=5e-2)
+        print('The block solvers are OK!')
+
+
+test = MultigridSolverTest()
+test.gmg_2d_test()
+test.gmg_3d_test()
+test.amg_test()
+test.block_solve_test()
@@ -4,6 +4,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from fealpy.mesh import QuadrangleMesh
+from fealpy.mesh.mesh_tools import unique_entity
 
 
 class QuadrangleMeshTest:
@@ -37,7 +38,63 @@ class QuadrangleMeshTest:
             mesh.print()
             plt.show()
 
+    def spatial_index_test(self, n=4):
+        node = np.array([
+            (0.0, 0.0),
+            (1.0, 0.0),
+            (1.0, 1.0),
+            (0.0, 1.0)], dtype=np.float)
+        cell = np.array([[0, 1, 2, 3]], dtype=np.int)
+        mesh = QuadrangleMesh(node, cell)
+        mesh.uniform_refine(n)
+
+        points = np.random.rand(1000, 2)*1.2 - 0.1
+        isIn = np.all((points >= 0) & (points <= 1), axis=-1)
+        bc = mesh.entity_barycenter('cell')
+        for method in ['grid', 'bvh']:
+            index = mesh.spatial_index(method=method)
+            cidx = index.find_cell(points)
+            assert np.all((cidx >= 0) == isIn)
+            h = 1/2**n
+            assert np.all(np.abs(bc[cidx[isIn]] - points[isIn]) <= h/2 + 1e-12)
+            cidx = index.cells_in_box(np.array([(0.1, 0.1), (0.3, 0.2)]))
+            flag = np.all((bc > 0.1 - h/2) & (bc < [0.3 + h/2, 0.2 + h/2]), axis=-1)
+            assert np.all(cidx == np.nonzero(flag)[0])
+        nidx = mesh.spatial_index().nearest_node(points)
+        d = np.sum((points[:, None, :] - mesh.entity('node'))**2, axis=-1)
+        assert np.all(nidx == np.argmin(d, axis=-1))
+
+        # the index is rebuilt when the cell array is replaced
+        index = mesh.spatial_index()
+        assert mesh.spatial_index() is index
+        mesh.ds.cell = mesh.ds.cell.copy()
+        assert mesh.spatial_index() is not index
+        print('The spatial index is OK!')
+
+    def unique_entity_test(self, n=3):
+        node = np.array([
+            (0.0, 0.0),
+            (1.0, 0.0),
+            (1.0, 1.0),
+            (0.0, 1.0)], dtype=np.float)
+        cell = np.array([[0, 1, 2, 3]], dtype=np.int)
+        mesh = QuadrangleMesh(node, cell)
+        mesh.uniform_refine(n)
+        NN = mesh.number_of_nodes()
+        totalEdge = mesh.entity('cell')[:, mesh.ds.localEdge].reshape(-1, 2)
+        i0, j = unique_entity(totalEdge, NN)
+        i1, j1 = unique_entity(totalEdge, NN, method='row')
+        assert np.all(i0 == i1) and np.all(j == j1)
+        assert len(i0) == mesh.number_of_edges()
+
+        # no entity
+        for method in ['key', 'row']:
+            i0, j = unique_entity(totalEdge[:0], NN, method=method)
+            assert (i0.shape == (0, )) and (j.shape == (0, ))
+        print('The unique entity is OK!')
+
 
 test = QuadrangleMeshTest()
 test.refine_RB_test()
-
+test.spatial_index_test()
+test.unique_entity_test()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+from scipy.sparse import coo_matrix, bmat, block_diag, spdiags
+from scipy.sparse.linalg import spsolve
+
+from fealpy.pde.stokes_model_2d import StokesModelData_0
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.solver import SaddlePointSolver
+
+
+class SaddlePointSolverTest:
+    def __init__(self):
+        pass
+
+    def stokes_system(self, n):
+        """
+        The Taylor-Hood (P2-P1) discretization of the Stokes equation with
+        the Dirichlet condition of the velocity.
+        """
+        pde = StokesModelData_0()
+        mesh = pde.init_mesh(n=n)
+        uspace = LagrangeFiniteElementSpace(mesh, p=2)
+        pspace = LagrangeFiniteElementSpace(mesh, p=1)
+        ugdof = uspace.number_of_global_dofs()
+        pgdof = pspace.number_of_global_dofs()
+
+        A = uspace.stiff_matrix()
+        A = block_diag((A, A), format='csr')
+
+        # B[i, j] = -(div phi_j, q_i)
+        bcs, ws = uspace.integrator.get_quadrature_points_and_weights()
+        gphi = uspace.grad_basis(bcs)
+        qphi = pspace.basis(bcs)
+        cellmeasure = mesh.entity_measure('cell')
+        B = np.einsum('i, ijk, ijmn, j->njkm', ws, qphi, gphi, cellmeasure)
+        ucell2dof = uspace.cell_to_dof()
+        pcell2dof = pspace.cell_to_dof()
+        I = np.broadcast_to(pcell2dof[:, :, None], B.shape[1:])
+        J = np.broadcast_to(ucell2dof[:, None, :], B.shape[1:])
+        B = [-coo_matrix((B[i].flat, (I.flat, J.flat)), shape=(pgdof, ugdof))
+                for i in range(2)]
+        B = bmat([B], format='csr')
+        Mp = pspace.mass_matrix()
+
+        F = uspace.source_vector(pde.source, dim=2).T.reshape(-1)
+        g = np.zeros(pgdof, dtype=np.float64)
+
+        # the Dirichlet condition, the identity rows of A
+        isBdDof = np.tile(uspace.boundary_dof(), 2)
+        u = uspace.interpolation(pde.dirichlet).T.reshape(-1)
+        u[~isBdDof] = 0
+        F -= A@u
+        g -= B@u
+        F[isBdDof] = u[isBdDof]
+        T = spdiags((~isBdDof).astype(np.float64), 0, 2*ugdof, 2*ugdof)
+        D = spdiags(isBdDof.astype(np.float64), 0, 2*ugdof, 2*ugdof)
+        A = T@A@T + D
+        B = B@T
+        return A, B, Mp, np.r_[F, g]
+
+    def stokes_test(self, n=4):
+        A, B, Mp, b = self.stokes_system(n)
+        n0 = A.shape[0]
+        AA = bmat([[A, B.T], [B, None]], format='csr')
+
+        # the pressure is defined up to a constant, fix one for the direct
+        # solver
+        idx = np.arange(AA.shape[0] - 1)
+        x = spsolve(AA[idx][:, idx].tocsc(), b[idx])
+        u = x[:n0]
+
+        for method, structure in [('minres', 'diagonal'), ('fgmres', 'upper'),
+                ('fgmres', 'lower')]:
+            solver = SaddlePointSolver(AA, n0, S=Mp, method=method,
+                    structure=structure)
+            res = []
+            x0 = solver.solve(b, tol=1e-10, maxiter=500, residuals=res)
+            assert solver.info == 0
+            assert np.linalg.norm(b - AA@x0) < 1e-8*np.linalg.norm(b)
+            assert np.allclose(x0[:n0], u)
+            print(method, structure, len(res))
+
+        # the blocks as a list
+        solver = SaddlePointSolver([[A, B.T], [B, None]], S=Mp,
+                method='fgmres')
+        x0 = solver.solve(b, tol=1e-10)
+        assert np.allclose(x0[:n0], u)
+        print('The block preconditioned saddle point solvers are OK!')
+
+
+test = SaddlePointSolverTest()
+test.stokes_test()
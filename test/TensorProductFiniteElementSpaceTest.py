@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+
+from fealpy.mesh.StructureQuadMesh import StructureQuadMesh
+from fealpy.mesh.StructureHexMesh import StructureHexMesh
+from fealpy.functionspace import TensorProductFiniteElementSpace
+
+
+class TensorProductFiniteElementSpaceTest:
+    def __init__(self):
+        pass
+
+    def mesh(self, TD=2, n=3):
+        if TD == 2:
+            return StructureQuadMesh([0, 1, 0, 2], n, n)
+        else:
+            return StructureHexMesh([0, 1, 0, 1, 0, 1], n, n, n)
+
+    def operator_test(self, TD=2, p=3):
+        space = TensorProductFiniteElementSpace(self.mesh(TD), p=p)
+        cfun = lambda x: 1 + x[..., 0]**2
+        uh = np.random.rand(space.number_of_global_dofs())
+
+        A = space.stiff_matrix()
+        M = space.mass_matrix()
+        assert np.allclose(A@uh, space.stiff_apply(uh), atol=1e-12)
+        assert np.allclose(M@uh, space.mass_apply(uh), atol=1e-12)
+
+        A = space.stiff_matrix(cfun=cfun)
+        M = space.mass_matrix(cfun=cfun)
+        assert np.allclose(A@uh, space.stiff_operator(cfun=cfun)@uh, atol=1e-12)
+        assert np.allclose(M@uh, space.mass_operator(cfun=cfun)@uh, atol=1e-12)
+        print('The operators with TD =', TD, 'and p =', p, 'are OK!')
+
+    def value_test(self, TD=2, p=3):
+        space = TensorProductFiniteElementSpace(self.mesh(TD), p=p)
+        u = lambda x: np.sum(x**p, axis=-1)
+        uI = space.interpolation(u)
+        bc = np.array([(0.7, 0.3), (0.2, 0.8)], dtype=np.float)
+        ps = space.cell_points(bc[:, 1])
+        assert np.allclose(uI.value(bc), u(ps))
+        assert np.allclose(uI.grad_value(bc), p*ps**(p-1))
+        print('The values with TD =', TD, 'and p =', p, 'are OK!')
+
+
+test = TensorProductFiniteElementSpaceTest()
+test.operator_test(TD=2, p=3)
+test.operator_test(TD=3, p=4)
+test.value_test(TD=2, p=3)
+test.value_test(TD=3, p=2)
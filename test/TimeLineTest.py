@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+from scipy.sparse.linalg import spsolve
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.timeintegratoralg.timeline_new import UniformTimeLine, ChebyshevTimeLine
+from fealpy.timeintegratoralg.solver_cache import SolverCache
+
+
+class HeatEquationModel():
+    """
+    The Crank-Nicolson scheme of the heat equation with the homogeneous
+    Neumann condition.
+    """
+    def __init__(self, space):
+        self.M = space.mass_matrix()
+        self.A = space.stiff_matrix()
+        self.space = space
+
+    def init_solution(self, timeline):
+        NL = timeline.number_of_time_levels()
+        node = self.space.interpolation_points()
+        uh = np.zeros((len(node), NL), dtype=np.float64)
+        uh[:, 0] = np.cos(np.pi*node[:, 0])*np.cos(np.pi*node[:, 1])
+        return uh
+
+    def get_current_left_matrix(self, timeline):
+        dt = timeline.current_time_step_length()
+        return self.M + 0.5*dt*self.A
+
+    def get_current_right_vector(self, uh, timeline):
+        i = timeline.current
+        dt = timeline.current_time_step_length()
+        return self.M@uh[:, i] - 0.5*dt*self.A@uh[:, i]
+
+    def solve(self, uh, A, b, solver, timeline):
+        i = timeline.current
+        uh[:, i+1] = solver(A, b)
+
+
+class TimeLineTest():
+    def __init__(self):
+        pass
+
+    def solver_cache_test(self):
+        pde = CosCosData()
+        mesh = pde.init_mesh(n=4)
+        space = LagrangeFiniteElementSpace(mesh, p=1)
+        model = HeatEquationModel(space)
+
+        timeline = UniformTimeLine(0, 0.1, 50)
+        uh = model.init_solution(timeline)
+        timeline.time_integration(uh, model, spsolve)
+        uh0 = model.init_solution(timeline)
+        timeline.time_integration(uh0, model)
+        assert np.allclose(uh, uh0)
+        # the step length is constant, only one factorization
+        stats = timeline.cache.stats
+        assert stats['misses'] == 1 and stats['hits'] == 49
+        print(timeline.cache)
+
+        # the user key, and the AMG solver
+        cache = SolverCache(method='amg', maxsize=2)
+        A = model.get_current_left_matrix(timeline)
+        b = model.M@uh[:, 0]
+        x = spsolve(A, b)
+        for i in range(3):
+            assert np.allclose(cache(A, b, key=timeline.dt), x)
+        assert cache.stats['misses'] == 1 and cache.hit_rate() == 2/3
+
+        # the LRU eviction
+        cache = SolverCache(maxsize=2)
+        for c in [1, 2, 1, 3, 2]:
+            cache(c*A, b)
+        assert cache.stats['misses'] == 4 and cache.stats['evictions'] == 2
+
+        # the second sweep on the Chebyshev timeline only does the triangular
+        # solves, the equal step lengths share the factorization
+        timeline = ChebyshevTimeLine(0, 0.1, 8)
+        misses = []
+        for i in range(2):
+            uh = model.init_solution(timeline)
+            while not timeline.stop():
+                A = model.get_current_left_matrix(timeline)
+                b = model.get_current_right_vector(uh, timeline)
+                model.solve(uh, A, b, timeline.cache, timeline)
+                timeline.advance()
+            timeline.reset()
+            misses.append(timeline.cache.stats['misses'])
+        assert misses[0] <= 8 and misses[1] == misses[0]
+        print('The solver cache of the timelines is OK!')
+
+
+test = TimeLineTest()
+test.solver_cache_test()